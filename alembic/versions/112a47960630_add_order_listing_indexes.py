@@ -0,0 +1,34 @@
+"""add order listing indexes
+
+Revision ID: 112a47960630
+Revises: b16e2fd4ac70
+Create Date: 2026-10-17 13:24:51.309175
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '112a47960630'
+down_revision: Union[str, None] = 'b16e2fd4ac70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keyset pagination walks (created_at, id) - optionally within one status or one user
+    op.create_index('ix_orders_created_at_id', 'orders', ['created_at', 'id'])
+    op.create_index('ix_orders_status_created_at', 'orders', ['status', 'created_at'])
+    op.create_index('ix_orders_user_id_created_at', 'orders', ['user_id', 'created_at'])
+    # Item count subquery per listed order
+    op.create_index('ix_order_items_order_id', 'order_items', ['order_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_order_items_order_id', table_name='order_items')
+    op.drop_index('ix_orders_user_id_created_at', table_name='orders')
+    op.drop_index('ix_orders_status_created_at', table_name='orders')
+    op.drop_index('ix_orders_created_at_id', table_name='orders')
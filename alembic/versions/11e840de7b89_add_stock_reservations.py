@@ -0,0 +1,48 @@
+"""add stock reservations
+
+Revision ID: 11e840de7b89
+Revises: d82e34d21848
+Create Date: 2026-10-17 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '11e840de7b89'
+down_revision: Union[str, None] = 'd82e34d21848'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Quantity held by active reservations (available = stock_quantity - reserved_quantity)
+    op.add_column('product_sizes', sa.Column('reserved_quantity', sa.Integer(), nullable=False, server_default='0'))
+
+    op.create_table(
+        'stock_reservations',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('order_id', sa.Integer(), sa.ForeignKey('orders.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('size_id', sa.Integer(), sa.ForeignKey('product_sizes.id'), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False, server_default='active'),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_stock_reservations_order_id', 'stock_reservations', ['order_id'])
+    op.create_index('ix_stock_reservations_size_id', 'stock_reservations', ['size_id'])
+    op.create_index(
+        'ix_stock_reservations_active_expires_at', 'stock_reservations', ['expires_at'],
+        postgresql_where=sa.text("status = 'active'")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_stock_reservations_active_expires_at', table_name='stock_reservations')
+    op.drop_index('ix_stock_reservations_size_id', table_name='stock_reservations')
+    op.drop_index('ix_stock_reservations_order_id', table_name='stock_reservations')
+    op.drop_table('stock_reservations')
+    op.drop_column('product_sizes', 'reserved_quantity')
@@ -0,0 +1,30 @@
+"""add orders shipped partial index
+
+Revision ID: 2db2d612d6de
+Revises: 895aad1f6e87
+Create Date: 2026-10-17 17:48:27.106294
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2db2d612d6de'
+down_revision: Union[str, None] = '895aad1f6e87'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Auto-delivery chunks: shipped orders oldest first (only the shipped ones are indexed)
+    op.create_index(
+        'ix_orders_shipped_at_shipped', 'orders', ['shipped_at'],
+        postgresql_where=sa.text("status = 'shipped'")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_orders_shipped_at_shipped', table_name='orders')
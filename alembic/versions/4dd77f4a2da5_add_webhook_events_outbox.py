@@ -0,0 +1,51 @@
+"""add webhook_events outbox
+
+Revision ID: 4dd77f4a2da5
+Revises: 8152208635fa
+Create Date: 2026-10-17 16:05:41.207319
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4dd77f4a2da5'
+down_revision: Union[str, None] = '8152208635fa'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+UTC_NOW = sa.text("(now() at time zone 'utc')")
+
+
+def upgrade() -> None:
+    op.create_table(
+        'webhook_events',
+        sa.Column('id', sa.String(255), primary_key=True),
+        sa.Column('type', sa.String(100), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('ordering_key', sa.String(100), nullable=True),
+        sa.Column('event_created', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False, server_default=UTC_NOW),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('received_at', sa.DateTime(), nullable=False, server_default=UTC_NOW),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index(
+        'ix_webhook_events_pending_due', 'webhook_events', ['next_attempt_at'],
+        postgresql_where=sa.text("status = 'pending'")
+    )
+    op.create_index(
+        'ix_webhook_events_pending_ordering', 'webhook_events', ['ordering_key', 'event_created', 'id'],
+        postgresql_where=sa.text("status = 'pending'")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_webhook_events_pending_ordering', table_name='webhook_events')
+    op.drop_index('ix_webhook_events_pending_due', table_name='webhook_events')
+    op.drop_table('webhook_events')
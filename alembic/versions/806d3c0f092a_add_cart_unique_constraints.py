@@ -0,0 +1,61 @@
+"""add cart unique constraints
+
+Revision ID: 806d3c0f092a
+Revises: 112a47960630
+Create Date: 2026-10-17 14:05:12.774310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '806d3c0f092a'
+down_revision: Union[str, None] = '112a47960630'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Merge duplicate carts into the oldest cart of each user
+    op.execute("""
+        UPDATE cart_items ci SET cart_id = k.keep_id
+        FROM (SELECT id, min(id) OVER (PARTITION BY user_id) AS keep_id FROM carts) k
+        WHERE ci.cart_id = k.id AND k.id <> k.keep_id
+    """)
+    op.execute("""
+        DELETE FROM carts c
+        USING (SELECT id, min(id) OVER (PARTITION BY user_id) AS keep_id FROM carts) k
+        WHERE c.id = k.id AND k.id <> k.keep_id
+    """)
+
+    # Merge duplicate lines (same product size in one cart), summing quantities
+    op.execute("""
+        UPDATE cart_items ci SET quantity = d.total
+        FROM (
+            SELECT id, min(id) OVER w AS keep_id, sum(quantity) OVER w AS total
+            FROM cart_items
+            WINDOW w AS (PARTITION BY cart_id, product_id, product_size_id)
+        ) d
+        WHERE ci.id = d.id AND d.id = d.keep_id AND ci.quantity <> d.total
+    """)
+    op.execute("""
+        DELETE FROM cart_items ci
+        USING (
+            SELECT id, min(id) OVER (PARTITION BY cart_id, product_id, product_size_id) AS keep_id
+            FROM cart_items
+        ) d
+        WHERE ci.id = d.id AND d.id <> d.keep_id
+    """)
+
+    op.create_unique_constraint('uq_carts_user_id', 'carts', ['user_id'])
+    op.create_unique_constraint(
+        'uq_cart_items_cart_product_size', 'cart_items', ['cart_id', 'product_id', 'product_size_id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_cart_items_cart_product_size', 'cart_items', type_='unique')
+    op.drop_constraint('uq_carts_user_id', 'carts', type_='unique')
@@ -0,0 +1,26 @@
+"""add token_version to user
+
+Revision ID: 8152208635fa
+Revises: 806d3c0f092a
+Create Date: 2026-10-17 14:48:33.620187
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8152208635fa'
+down_revision: Union[str, None] = '806d3c0f092a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('token_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'token_version')
@@ -0,0 +1,53 @@
+"""add background_jobs queue
+
+Revision ID: 895aad1f6e87
+Revises: 4dd77f4a2da5
+Create Date: 2026-10-17 17:12:09.533812
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '895aad1f6e87'
+down_revision: Union[str, None] = '4dd77f4a2da5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+UTC_NOW = sa.text("(now() at time zone 'utc')")
+
+
+def upgrade() -> None:
+    op.create_table(
+        'background_jobs',
+        sa.Column('id', sa.String(32), primary_key=True),
+        sa.Column('name', sa.String(255), nullable=False),
+        sa.Column('queue', sa.String(50), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('run_at', sa.DateTime(), nullable=False, server_default=UTC_NOW),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.Column('unique_key', sa.String(255), nullable=True, unique=True),
+        sa.Column('result', sa.Text(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=UTC_NOW),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index(
+        'ix_background_jobs_pending_due', 'background_jobs', ['queue', 'run_at'],
+        postgresql_where=sa.text("status = 'pending'")
+    )
+    op.create_index(
+        'ix_background_jobs_running_lease', 'background_jobs', ['locked_until'],
+        postgresql_where=sa.text("status = 'running'")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_background_jobs_running_lease', table_name='background_jobs')
+    op.drop_index('ix_background_jobs_pending_due', table_name='background_jobs')
+    op.drop_table('background_jobs')
@@ -0,0 +1,117 @@
+"""add updated_at tracking and search sync tables
+
+Revision ID: b16e2fd4ac70
+Revises: 11e840de7b89
+Create Date: 2026-10-17 11:02:15.482913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b16e2fd4ac70'
+down_revision: Union[str, None] = '11e840de7b89'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+UTC_NOW = sa.text("(now() at time zone 'utc')")
+
+
+def upgrade() -> None:
+    op.add_column('products', sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=UTC_NOW))
+    op.create_index('ix_products_updated_at', 'products', ['updated_at'])
+    op.add_column('product_sizes', sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=UTC_NOW))
+    op.add_column('product_categories', sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=UTC_NOW))
+
+    op.create_table(
+        'product_tombstones',
+        sa.Column('product_id', sa.Integer(), primary_key=True),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False, server_default=UTC_NOW),
+    )
+    op.create_index('ix_product_tombstones_deleted_at', 'product_tombstones', ['deleted_at'])
+
+    op.create_table(
+        'search_sync_state',
+        sa.Column('name', sa.String(50), primary_key=True),
+        sa.Column('watermark', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    )
+
+    # Any UPDATE on products (ORM or raw SQL such as stock deduction) moves updated_at
+    op.execute("""
+        CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := now() at time zone 'utc';
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_products_updated_at BEFORE UPDATE ON products
+        FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+    """)
+
+    # Size and category link changes touch the parent product. Size stock/reservation
+    # updates are excluded on purpose: they are not part of the search document.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION touch_parent_product() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                UPDATE products SET updated_at = now() at time zone 'utc' WHERE id = OLD.product_id;
+                RETURN OLD;
+            END IF;
+            IF TG_OP = 'UPDATE' AND OLD.product_id IS DISTINCT FROM NEW.product_id THEN
+                UPDATE products SET updated_at = now() at time zone 'utc' WHERE id = OLD.product_id;
+            END IF;
+            UPDATE products SET updated_at = now() at time zone 'utc' WHERE id = NEW.product_id;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_product_sizes_touch_product
+        AFTER INSERT OR DELETE OR UPDATE OF size, product_id ON product_sizes
+        FOR EACH ROW EXECUTE FUNCTION touch_parent_product();
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_product_categories_touch_product
+        AFTER INSERT OR DELETE OR UPDATE ON product_categories
+        FOR EACH ROW EXECUTE FUNCTION touch_parent_product();
+    """)
+
+    # Deletes leave a tombstone so delta sync can remove the ES document
+    op.execute("""
+        CREATE OR REPLACE FUNCTION record_product_tombstone() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO product_tombstones (product_id, deleted_at)
+            VALUES (OLD.id, now() at time zone 'utc')
+            ON CONFLICT (product_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_products_tombstone AFTER DELETE ON products
+        FOR EACH ROW EXECUTE FUNCTION record_product_tombstone();
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_products_tombstone ON products")
+    op.execute("DROP TRIGGER IF EXISTS trg_product_categories_touch_product ON product_categories")
+    op.execute("DROP TRIGGER IF EXISTS trg_product_sizes_touch_product ON product_sizes")
+    op.execute("DROP TRIGGER IF EXISTS trg_products_updated_at ON products")
+    op.execute("DROP FUNCTION IF EXISTS record_product_tombstone()")
+    op.execute("DROP FUNCTION IF EXISTS touch_parent_product()")
+    op.execute("DROP FUNCTION IF EXISTS set_updated_at()")
+
+    op.drop_table('search_sync_state')
+    op.drop_index('ix_product_tombstones_deleted_at', table_name='product_tombstones')
+    op.drop_table('product_tombstones')
+    op.drop_column('product_categories', 'updated_at')
+    op.drop_column('product_sizes', 'updated_at')
+    op.drop_index('ix_products_updated_at', table_name='products')
+    op.drop_column('products', 'updated_at')
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 from contextlib import asynccontextmanager
@@ -14,10 +14,19 @@ from app.routers.webhook_router import webhook_router
 from app.routers.search_router import router as search_router
 from app.routers.upload_router import upload_router
 
-from app.db import create_tables
+from app.db import create_tables, dispose_async_engine, DBSessionScopeMiddleware, QueryInstrumentationMiddleware
+from app.metrics import PrometheusMiddleware, render_metrics
 from app.models.sqlalchemy import *
 from app.cache import init_redis, close_redis
-from app.search.product_index import ensure_product_index
+from app.search.product_index import ensure_product_index_async
+from app.search.elastic_client import init_async_es_client, close_async_es_client
+from app.search.product_sync import product_sync_pipeline
+from app.search.sync_events import product_sync_events
+from app.search.prefix_index import suggestion_index
+from app.search.local_engine import local_search_engine
+from app.services.cart_store import cart_write_behind
+from app.services.password_hasher import password_hasher
+from app.services.webhook_service import webhook_worker
 
 from fastapi_pagination import Page, add_pagination, paginate
 
@@ -76,10 +85,24 @@ async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
     # Startup
     await init_redis()
-    ensure_product_index()  # Create ES index if not exists
+    await init_async_es_client()
+    await ensure_product_index_async()  # Create ES index if not exists
+    product_sync_pipeline.start()  # Batched product -> ES sync
+    product_sync_events.register(suggestion_index)  # Autocomplete fallback
+    product_sync_events.register(local_search_engine)  # Search fallback while ES is down
+    product_sync_events.start()  # Loads in-process search structures, then follows syncs
+    cart_write_behind.start()  # Redis carts -> Postgres (CART_STORE=redis only)
+    webhook_worker.start()  # Drains the Stripe webhook_events outbox
     yield
     # Shutdown
+    await product_sync_pipeline.stop()  # Flush pending product syncs
+    await product_sync_events.stop()
+    await cart_write_behind.stop()  # Flush dirty carts
+    await webhook_worker.stop()  # Finish in-flight webhook events
     await close_redis()
+    await close_async_es_client()
+    await dispose_async_engine()
+    password_hasher.shutdown()
 
 
 description = """
@@ -122,6 +145,12 @@ app = FastAPI(
 # Security Headers Middleware (Helmet equivalent)
 app.add_middleware(SecurityHeadersMiddleware)
 
+# One sync DB session per request for services using app.db.ScopedSession
+app.add_middleware(DBSessionScopeMiddleware)
+
+# Query count/time per request: N+1 and slow-query log, Server-Timing header in development
+app.add_middleware(QueryInstrumentationMiddleware)
+
 # CORS Middleware - Tightened security
 app.add_middleware(
     CORSMiddleware,
@@ -138,6 +167,9 @@ app.add_middleware(
     expose_headers=["Content-Range", "X-Total-Count"],
 )
 
+# Prometheus: outermost, so the latency includes every other middleware
+app.add_middleware(PrometheusMiddleware)
+
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 app.include_router(product_router)
 app.include_router(cart_router)
@@ -155,3 +187,10 @@ create_tables()
 @app.get("/")
 async def root():
     return {"message": "Hello, world!"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint (all gunicorn workers when PROMETHEUS_MULTIPROC_DIR is set)"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -1,9 +1,14 @@
 import os
-import json
+import time
+import uuid
 import asyncio
-from typing import Optional, Any, List
+from typing import Optional, Any, List, Callable, Awaitable, Dict, Union
 from dotenv import load_dotenv
 
+from app.cache.local import LocalCache
+from app.cache.codec import Codec, codec_from_env
+from app.metrics import count_cache
+
 load_dotenv()
 
 REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
@@ -15,16 +20,33 @@ _redis_available: bool = True
 # Default TTL: 300 seconds (5 minutes)
 DEFAULT_TTL = 300
 
+# Values are stored as bytes with a format header (see app.cache.codec)
+codec: Codec = codec_from_env()
+
+# L1: per-worker in-process cache in front of Redis. Its TTL is capped by L1_TTL and by
+# the Redis TTL of the entry, so a missed invalidation message is bounded by L1_TTL seconds.
+L1_ENABLED = os.getenv('CACHE_L1_ENABLED', 'true').lower() == 'true'
+L1_TTL = float(os.getenv('CACHE_L1_TTL', '30'))
+l1 = LocalCache(
+    max_entries=int(os.getenv('CACHE_L1_MAX_ENTRIES', '2048')),
+    max_bytes=int(os.getenv('CACHE_L1_MAX_BYTES', str(32 * 1024 * 1024))),
+    default_ttl=L1_TTL,
+)
+
+# Invalidation messages: "key:<key>" or "pattern:<glob>", published by whichever worker deletes
+INVALIDATION_CHANNEL = "cache:invalidate"
+_invalidation_task: Optional[asyncio.Task] = None
+
 
 async def init_redis():
     """Initialize Redis connection - call this on app startup"""
     global redis, _redis_available
     try:
         import redis.asyncio as aioredis
+        # Raw bytes: cached values are binary (codec header + payload)
         redis = await aioredis.from_url(
             REDIS_URL,
-            encoding="utf-8",
-            decode_responses=True,
+            decode_responses=False,
             socket_connect_timeout=3,
             socket_timeout=3,
         )
@@ -32,6 +54,8 @@ async def init_redis():
         await redis.ping()
         print(f"Redis connected successfully to {REDIS_URL[:30]}...")
         _redis_available = True
+        if L1_ENABLED:
+            _start_invalidation_listener()
     except Exception as e:
         print(f"Redis unavailable, running without cache: {e}")
         _redis_available = False
@@ -40,34 +64,130 @@ async def init_redis():
 
 async def close_redis():
     """Close Redis connection - call this on app shutdown"""
-    global redis
+    global redis, _invalidation_task
+    if _invalidation_task:
+        _invalidation_task.cancel()
+        try:
+            await _invalidation_task
+        except asyncio.CancelledError:
+            pass
+        _invalidation_task = None
     if redis:
         await redis.close()
         redis = None
+    l1.clear()
+
+
+# =====================
+# L1 Invalidation (Redis pub/sub)
+# =====================
+
+def _start_invalidation_listener():
+    global _invalidation_task
+    if _invalidation_task is None or _invalidation_task.done():
+        _invalidation_task = asyncio.create_task(_listen_for_invalidations())
+
+
+def _apply_invalidation(message: str):
+    kind, _, target = message.partition(":")
+    if kind == "key":
+        l1.delete(target)
+    elif kind == "keys":
+        for key in target.split("\n"):
+            l1.delete(key)
+    elif kind == "pattern":
+        l1.delete_pattern(target)
+    else:
+        l1.clear()
+
+
+async def _listen_for_invalidations():
+    """Evict L1 entries deleted by other workers; reconnects until cancelled"""
+    while True:
+        pubsub = None
+        try:
+            pubsub = redis.pubsub()
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Messages may have been missed while disconnected
+            l1.clear()
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    _apply_invalidation(message["data"].decode("utf-8"))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Cache invalidation listener error: {e}")
+            l1.clear()
+            await asyncio.sleep(1)
+        finally:
+            if pubsub is not None:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+
+async def _publish_invalidation(message: str):
+    """Evict locally right away, then tell the other workers"""
+    _apply_invalidation(message)
+    if L1_ENABLED and redis:
+        await redis.publish(INVALIDATION_CHANNEL, message)
 
 
 async def cache_get(key: str) -> Optional[Any]:
-    """Get value from cache - returns None if cache unavailable"""
+    """Get value from cache (L1 first, then Redis) - returns None if cache unavailable"""
     global redis, _redis_available
     if not _redis_available or not redis:
         return None
+    if L1_ENABLED:
+        value = l1.get(key)
+        if value is not None:
+            count_cache("l1", "hit")
+            return value
+        count_cache("l1", "miss")
     try:
-        data = await redis.get(key)
+        if L1_ENABLED:
+            # Fetch the remaining TTL in the same round trip so L1 never outlives Redis
+            async with redis.pipeline(transaction=False) as pipe:
+                data, pttl = await pipe.get(key).pttl(key).execute()
+        else:
+            data, pttl = await redis.get(key), -1
         if data:
-            return json.loads(data)
+            value = codec.decode(data)
+            if L1_ENABLED and pttl and pttl > 0:
+                l1.set(key, value, len(data), ttl=pttl / 1000)
+            count_cache("redis", "hit")
+            return value
+        count_cache("redis", "miss")
         return None
     except Exception as e:
+        count_cache("redis", "error")
         print(f"Cache get error: {e}")
         return None
 
 
-async def cache_set(key: str, value: Any, ttl: int = DEFAULT_TTL) -> bool:
-    """Set value in cache with expiration (TTL in seconds)"""
+async def cache_set(key: str, value: Any, ttl: int = DEFAULT_TTL, tags: Optional[List[str]] = None) -> bool:
+    """
+    Set value in cache with expiration (TTL in seconds)
+    `tags` registers the key in tag sets so invalidate_tags() can drop it without KEYS/SCAN.
+    """
     global redis, _redis_available
     if not _redis_available or not redis:
         return False
     try:
-        await redis.setex(key, ttl, json.dumps(value))
+        data = codec.encode(value)  # datetimes (e.g. created_at) as ISO strings
+        if tags:
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.setex(key, ttl, data)
+                for tag in set(tags):
+                    # Tag sets outlive every member; stale members are harmless (UNLINK ignores them)
+                    pipe.sadd(tag_key(tag), key)
+                    pipe.expire(tag_key(tag), max(ttl, TAG_SET_TTL))
+                await pipe.execute()
+        else:
+            await redis.setex(key, ttl, data)
+        if L1_ENABLED:
+            l1.set(key, value, len(data), ttl=ttl)
         return True
     except Exception as e:
         print(f"Cache set error: {e}")
@@ -75,12 +195,13 @@ async def cache_set(key: str, value: Any, ttl: int = DEFAULT_TTL) -> bool:
 
 
 async def cache_delete(key: str) -> bool:
-    """Delete key from cache"""
+    """Delete key from cache (Redis and every worker's L1)"""
     global redis, _redis_available
     if not _redis_available or not redis:
         return False
     try:
         await redis.delete(key)
+        await _publish_invalidation(f"key:{key}")
         return True
     except Exception as e:
         print(f"Cache delete error: {e}")
@@ -88,20 +209,240 @@ async def cache_delete(key: str) -> bool:
 
 
 async def cache_delete_pattern(pattern: str) -> bool:
-    """Delete all keys matching pattern"""
+    """
+    Delete all keys matching pattern (Redis and every worker's L1)
+    Walks the keyspace with incremental SCAN and UNLINKs in batches, so Redis is never
+    blocked the way KEYS is. Prefer invalidate_tags() for anything on a hot path.
+    """
     global redis, _redis_available
     if not _redis_available or not redis:
         return False
     try:
-        keys = await redis.keys(pattern)
-        if keys:
-            await asyncio.gather(*[redis.delete(k) for k in keys])
+        batch = []
+        async for key in redis.scan_iter(match=pattern, count=SCAN_BATCH_SIZE):
+            batch.append(key)
+            if len(batch) >= SCAN_BATCH_SIZE:
+                await redis.unlink(*batch)
+                batch = []
+        if batch:
+            await redis.unlink(*batch)
+        await _publish_invalidation(f"pattern:{pattern}")
         return True
     except Exception as e:
         print(f"Cache delete pattern error: {e}")
         return False
 
 
+# =====================
+# Tags
+# =====================
+
+# Tag sets must outlive their members (longest cache TTL in use is 10 minutes)
+TAG_SET_TTL = 3600
+SCAN_BATCH_SIZE = 500
+
+# Entries whose content can change when any product changes (unfiltered/q-only searches)
+TAG_SEARCH = "search"
+
+
+def tag_key(tag: str) -> str:
+    """Redis set holding the cache keys registered under a tag"""
+    return f"tag:{tag}"
+
+
+def product_tag(product_id: int) -> str:
+    return f"product:{product_id}"
+
+
+def category_tag(name: str) -> str:
+    return f"category:{name}"
+
+
+def type_tag(product_type: str) -> str:
+    return f"type:{product_type}"
+
+
+async def invalidate_tags(*tags: str) -> int:
+    """
+    Drop every key registered under the given tags with pipelined UNLINK
+    (plus the tag sets themselves) and evict them from every worker's L1.
+    Returns the number of cache keys dropped.
+    """
+    global redis, _redis_available
+    tags = [t for t in dict.fromkeys(tags) if t]
+    if not tags or not _redis_available or not redis:
+        return 0
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                pipe.smembers(tag_key(tag))
+            members = await pipe.execute()
+        keys = sorted(k.decode("utf-8") for k in set().union(*members))
+
+        async with redis.pipeline(transaction=False) as pipe:
+            for i in range(0, len(keys), SCAN_BATCH_SIZE):
+                pipe.unlink(*keys[i:i + SCAN_BATCH_SIZE])
+            pipe.unlink(*[tag_key(t) for t in tags])
+            await pipe.execute()
+
+        if keys:
+            await _publish_invalidation("keys:" + "\n".join(keys))
+        return len(keys)
+    except Exception as e:
+        print(f"Cache invalidate tags error: {e}")
+        return 0
+
+
+# =====================
+# Cached Loader (stampede protection)
+# =====================
+
+# Entries written by cached() carry their soft expiry; Redis TTL is the hard expiry
+_ENVELOPE = "__cached__"
+LOCK_TTL_MS = 10_000          # longest a loader may hold the cross-process lock
+LOCK_WAIT_SECONDS = 5.0       # how long followers wait for the leader's value
+LOCK_POLL_SECONDS = 0.05
+
+_RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# In-process single flight: key -> future of the load in progress
+_inflight: Dict[str, asyncio.Future] = {}
+# Background refreshes in progress: key -> task (keeps a reference so the task isn't collected)
+_refreshing: Dict[str, asyncio.Task] = {}
+
+
+async def _acquire_lock(key: str) -> Optional[str]:
+    """Cross-process lock (SET NX PX). Returns the owner token, or None if held elsewhere."""
+    if not _redis_available or not redis:
+        return ""
+    token = uuid.uuid4().hex
+    try:
+        if await redis.set(f"lock:{key}", token, nx=True, px=LOCK_TTL_MS):
+            return token
+        return None
+    except Exception as e:
+        print(f"Cache lock error: {e}")
+        return ""
+
+
+async def _release_lock(key: str, token: str):
+    if not token or not redis:
+        return
+    try:
+        await redis.eval(_RELEASE_LOCK, 1, f"lock:{key}", token)
+    except Exception as e:
+        print(f"Cache unlock error: {e}")
+
+
+async def _lock_held(key: str) -> bool:
+    try:
+        return bool(redis and await redis.exists(f"lock:{key}"))
+    except Exception:
+        return False
+
+
+def _unwrap(entry: Any):
+    """Return (value, is_fresh) for a cached entry; plain (legacy) entries count as fresh"""
+    if isinstance(entry, dict) and entry.get(_ENVELOPE):
+        return entry["value"], time.time() < entry["soft"]
+    return entry, True
+
+
+async def _load_and_store(key, loader, ttl, stale_ttl, tags) -> Any:
+    value = await loader()
+    entry = {_ENVELOPE: 1, "soft": time.time() + ttl, "value": value}
+    entry_tags = tags(value) if callable(tags) else tags
+    await cache_set(key, entry, ttl=ttl + stale_ttl, tags=entry_tags)
+    return value
+
+
+async def _load_single_flight(key, loader, ttl, stale_ttl, tags) -> Any:
+    """One load per key per process; across processes the Redis lock picks a leader"""
+    future = _inflight.get(key)
+    if future is not None:
+        return await asyncio.shield(future)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        token = await _acquire_lock(key)
+        if token is None:
+            # Another process is loading - wait for its value instead of hitting the backend too
+            deadline = time.monotonic() + LOCK_WAIT_SECONDS
+            while time.monotonic() < deadline:
+                await asyncio.sleep(LOCK_POLL_SECONDS)
+                entry = await cache_get(key)
+                if entry is not None:
+                    value, _ = _unwrap(entry)
+                    future.set_result(value)
+                    return value
+                if not await _lock_held(key):
+                    break  # leader finished without a value (its loader raised) - don't wait it out
+            token = ""  # leader failed, is slow or died - load ourselves
+        try:
+            value = await _load_and_store(key, loader, ttl, stale_ttl, tags)
+        finally:
+            await _release_lock(key, token)
+        future.set_result(value)
+        return value
+    except BaseException as e:
+        if not future.done():
+            future.set_exception(e)
+            # Mark retrieved so an error nobody else awaited isn't logged as "never retrieved"
+            future.exception()
+        raise
+    finally:
+        _inflight.pop(key, None)
+
+
+async def _refresh_in_background(key, loader, ttl, stale_ttl, tags):
+    try:
+        token = await _acquire_lock(key)
+        if token is None:
+            return  # another process is already refreshing
+        try:
+            await _load_and_store(key, loader, ttl, stale_ttl, tags)
+        finally:
+            await _release_lock(key, token)
+    except Exception as e:
+        print(f"Cache background refresh error for {key}: {e}")
+    finally:
+        _refreshing.pop(key, None)
+
+
+async def cached(
+    key: str,
+    loader: Callable[[], Awaitable[Any]],
+    ttl: int = DEFAULT_TTL,
+    stale_ttl: Optional[int] = None,
+    tags: Union[List[str], Callable[[Any], List[str]], None] = None,
+) -> Any:
+    """
+    Read-through cache with stampede protection
+    
+    - Fresh (younger than `ttl`): served from cache
+    - Stale (up to `ttl + stale_ttl`): served from cache while one worker refreshes it in the background
+    - Missing: one loader call per key - concurrent callers in this process share it, other
+      processes wait on a Redis lock and read the leader's value
+    
+    The loader must not depend on request-scoped resources (it may run after the request ended).
+    `tags` may be a list or a function of the loaded value.
+    """
+    stale_ttl = ttl if stale_ttl is None else stale_ttl
+    entry = await cache_get(key)
+    if entry is not None:
+        value, fresh = _unwrap(entry)
+        if not fresh and key not in _refreshing and key not in _inflight:
+            _refreshing[key] = asyncio.create_task(_refresh_in_background(key, loader, ttl, stale_ttl, tags))
+        return value
+    return await _load_single_flight(key, loader, ttl, stale_ttl, tags)
+
+
 # =====================
 # Cache Key Builders
 # =====================
@@ -129,28 +470,45 @@ def search_cache_key(query: str = "", **filters) -> str:
     return f"search:{query_part}:{filter_str}" if filter_str else f"search:{query_part}"
 
 
-def autocomplete_cache_key(query: str) -> str:
-    """Generate cache key for autocomplete results"""
-    return f"autocomplete:{query.lower()}"
+def principal_cache_key(user_id: str) -> str:
+    """Generate cache key for an authenticated user's principal (see UserServices.get_current_user)"""
+    return f"principal:{user_id}"
 
 
 # =====================
 # Cache Invalidation
 # =====================
 
-async def invalidate_product_cache(product_id: int = None, slug: str = None):
-    """Invalidate product cache when admin creates/updates/deletes product"""
-    # Delete specific product cache
-    if product_id:
-        await cache_delete(product_cache_key(product_id))
+async def invalidate_principal(user_id: str):
+    """Drop a cached principal after role/status/profile/password changes"""
+    await cache_delete(principal_cache_key(str(user_id)))
+
+
+async def invalidate_product_cache(
+    product_id: int = None,
+    slug: str = None,
+    product_types: List[Optional[str]] = (),
+    categories: List[Optional[str]] = (),
+    listings: bool = True,
+):
+    """
+    Invalidate product cache when admin creates/updates/deletes product
+    
+    Only the affected tags are dropped:
+    - product:{id}       - detail entry and every search page that contains the product
+    - type:/category:    - filtered searches the product was or now is part of (pass old and new values)
+    - search             - unfiltered searches (the product may enter/leave them or move within them)
+    Pass listings=False for edits that cannot move a product between result sets (e.g. stock).
+    """
     if slug:
         await cache_delete(product_slug_cache_key(slug))
     
-    # Delete all product list caches
-    await cache_delete_pattern("products:*")
-    
-    # Delete all search caches (search results depend on product data)
-    await cache_delete_pattern("search:*")
+    tags = []
+    if product_id:
+        tags.append(product_tag(product_id))
+    if listings:
+        tags.append(TAG_SEARCH)
+        tags.extend(type_tag(t) for t in product_types if t)
+        tags.extend(category_tag(c) for c in categories if c)
     
-    # Delete all autocomplete caches
-    await cache_delete_pattern("autocomplete:*")
+    await invalidate_tags(*tags)
@@ -0,0 +1,147 @@
+"""
+Cache codecs - serialization + optional compression for values stored in Redis
+
+Every encoded entry starts with a 3-byte header: b"C", serializer id, compressor id.
+Decoding reads the header, so the configured format can change (or roll out worker by
+worker) without flushing Redis. Entries without a header are legacy JSON text.
+
+orjson/msgpack/zstandard/lz4 are optional: a format whose library is missing falls back
+to json/zlib when encoding, and raises when an entry needs it for decoding.
+"""
+
+import os
+import json
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover - optional dependency
+    lz4_frame = None
+
+
+MAGIC = b"C"
+HEADER_SIZE = 3
+
+# Ids are written into stored entries - never renumber, only append
+SERIALIZER_IDS = {"json": 1, "orjson": 2, "msgpack": 3}
+COMPRESSOR_IDS = {"none": 0, "zlib": 1, "zstd": 2, "lz4": 3}
+
+
+# =====================
+# Serializers
+# =====================
+
+def _json_dumps(value: Any) -> bytes:
+    return json.dumps(value, default=str, separators=(",", ":")).encode("utf-8")
+
+
+def _orjson_dumps(value: Any) -> bytes:
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _msgpack_dumps(value: Any) -> bytes:
+    return msgpack.packb(value, default=str, use_bin_type=True)
+
+
+def _msgpack_loads(data: bytes) -> Any:
+    return msgpack.unpackb(data, raw=False)
+
+
+_SERIALIZERS: Dict[int, Tuple[Optional[Callable], Optional[Callable]]] = {
+    1: (_json_dumps, json.loads),
+    2: (_orjson_dumps, orjson.loads) if orjson else (None, None),
+    3: (_msgpack_dumps, _msgpack_loads) if msgpack else (None, None),
+}
+
+
+# =====================
+# Compressors
+# =====================
+
+def _zstd_compress(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+_COMPRESSORS: Dict[int, Tuple[Optional[Callable], Optional[Callable]]] = {
+    0: (lambda data: data, lambda data: data),
+    1: (lambda data: zlib.compress(data, 6), zlib.decompress),
+    2: (_zstd_compress, _zstd_decompress) if zstandard else (None, None),
+    3: (lz4_frame.compress, lz4_frame.decompress) if lz4_frame else (None, None),
+}
+
+
+class Codec:
+    """Encodes values with one serializer/compressor pair; decodes any known header"""
+
+    def __init__(self, serializer: str = "orjson", compression: str = "zstd", compress_min_bytes: int = 1024):
+        serializer_id = SERIALIZER_IDS.get(serializer, 1)
+        if _SERIALIZERS[serializer_id][0] is None:
+            serializer_id = SERIALIZER_IDS["json"]
+        compressor_id = COMPRESSOR_IDS.get(compression, 0)
+        if _COMPRESSORS[compressor_id][0] is None:
+            compressor_id = COMPRESSOR_IDS["zlib"]
+
+        self.serializer_id = serializer_id
+        self.compressor_id = compressor_id
+        self.compress_min_bytes = compress_min_bytes
+        self._dumps = _SERIALIZERS[serializer_id][0]
+        self._compress = _COMPRESSORS[compressor_id][0]
+
+    @property
+    def name(self) -> str:
+        serializer = next(k for k, v in SERIALIZER_IDS.items() if v == self.serializer_id)
+        compressor = next(k for k, v in COMPRESSOR_IDS.items() if v == self.compressor_id)
+        return f"{serializer}+{compressor}"
+
+    def encode(self, value: Any) -> bytes:
+        payload = self._dumps(value)
+        compressor_id = 0
+        if self.compressor_id and len(payload) >= self.compress_min_bytes:
+            compressed = self._compress(payload)
+            # Keep the raw payload when compression doesn't pay off
+            if len(compressed) < len(payload):
+                payload, compressor_id = compressed, self.compressor_id
+        return MAGIC + bytes((self.serializer_id, compressor_id)) + payload
+
+    @staticmethod
+    def decode(data: bytes) -> Any:
+        if isinstance(data, str):
+            return json.loads(data)
+        if data[:1] != MAGIC or len(data) < HEADER_SIZE:
+            # Legacy entry written as plain JSON text
+            return json.loads(data)
+        serializer_id, compressor_id = data[1], data[2]
+        loads = _SERIALIZERS.get(serializer_id, (None, None))[1]
+        decompress = _COMPRESSORS.get(compressor_id, (None, None))[1]
+        if loads is None or decompress is None:
+            raise ValueError(f"Unsupported cache entry format {serializer_id}/{compressor_id}")
+        return loads(decompress(data[HEADER_SIZE:]))
+
+
+def codec_from_env() -> Codec:
+    """Codec configured by CACHE_SERIALIZER / CACHE_COMPRESSION / CACHE_COMPRESS_MIN_BYTES"""
+    return Codec(
+        serializer=os.getenv("CACHE_SERIALIZER", "orjson"),
+        compression=os.getenv("CACHE_COMPRESSION", "zstd"),
+        compress_min_bytes=int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "1024")),
+    )
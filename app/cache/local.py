@@ -0,0 +1,91 @@
+"""
+In-process L1 cache - bounded LRU with per-entry TTL
+Sits in front of Redis so the hottest keys are served without a network round trip.
+Each worker has its own copy; cross-worker invalidation goes over Redis pub/sub (see app.cache).
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from typing import Any, Optional, Tuple
+
+
+class LocalCache:
+    """LRU cache bounded by entry count and by (approximate) payload bytes"""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024, default_ttl: float = 30):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        # key -> (expires_at, size, value)
+        self._data: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None when missing/expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, size, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, size: int, ttl: Optional[float] = None) -> bool:
+        """
+        Store a value. `size` is the encoded payload length, used for the byte budget.
+        Entries larger than a quarter of the budget are not kept (they would evict everything else).
+        """
+        ttl = self.default_ttl if ttl is None else min(ttl, self.default_ttl)
+        if ttl <= 0 or size > self.max_bytes // 4:
+            return False
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + ttl, size, value)
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+        return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def delete_pattern(self, pattern: str) -> int:
+        """Evict every key matching a Redis-style glob pattern"""
+        with self._lock:
+            keys = [k for k in self._data if fnmatchcase(k, pattern)]
+            for k in keys:
+                self._remove(k)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
@@ -1,14 +1,37 @@
 import os
+import itertools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator, Optional
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session, Session
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from dotenv import load_dotenv
 from colorama import Fore
 
+from app.metrics import instrument_pool
+from app.db.instrumentation import instrument_engine, QueryInstrumentationMiddleware
+
 load_dotenv()
 
 DATABASE_URL = os.getenv('DATABASE_URL')
 
+
+def _to_async_url(url: str) -> str:
+    """Map a sync postgres URL (postgresql:// or postgresql+psycopg2://) to asyncpg"""
+    if not url:
+        return url
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+# Override when the async driver needs a different URL (e.g. pgbouncer port)
+ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL') or _to_async_url(DATABASE_URL)
+
 Base = declarative_base()
 
 # Create engine ONCE with connection pool
@@ -27,6 +50,8 @@ def get_db_engine():
                 pool_pre_ping=True,  # Check connection health before use
                 pool_recycle=3600,  # Recycle connections after 1 hour
             )
+            instrument_pool(_engine, "sync")
+            instrument_engine(_engine)  # Per-request query stats, N+1 and slow-query log
             print(f"{Fore.GREEN}Database engine created with connection pool{Fore.WHITE}")
         except Exception as e:
             print(f"{Fore.RED}Error creating database engine: {e}{Fore.WHITE}")
@@ -46,3 +71,115 @@ def get_db_session():
 def create_tables():
     engine = get_db_engine()
     Base.metadata.create_all(bind=engine)
+
+
+# =====================
+# Request-scoped sync sessions
+# =====================
+
+# Current request scope id - set per HTTP request by DBSessionScopeMiddleware.
+# contextvars are copied into the threadpool for `def` routes, so a sync route
+# and the async middleware around it see the same scope.
+_session_scope: ContextVar[Optional[int]] = ContextVar("db_session_scope", default=None)
+_scope_ids = itertools.count(1)
+
+
+def _current_scope():
+    scope_id = _session_scope.get()
+    if scope_id is not None:
+        return scope_id
+    # Outside a request (scripts, cron, background threads): one session per thread
+    return ("thread", threading.get_ident())
+
+
+# Registry proxy: `ScopedSession.query(...)` resolves to the session of the current scope.
+# The factory looks up get_db_session at call time so tests can override it.
+ScopedSession = scoped_session(lambda: get_db_session(), scopefunc=_current_scope)
+
+
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """Open a fresh scope for code running outside a request (scripts, jobs)"""
+    token = _session_scope.set(next(_scope_ids))
+    try:
+        yield ScopedSession()
+    finally:
+        ScopedSession.remove()
+        _session_scope.reset(token)
+
+
+class DBSessionScopeMiddleware:
+    """Pure ASGI middleware: give every HTTP request its own ScopedSession and close it afterwards"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = _session_scope.set(next(_scope_ids))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # close() rolls back anything left open, so a failed request can't poison the next one
+            ScopedSession.remove()
+            _session_scope.reset(token)
+
+
+# =====================
+# Async engine (asyncpg)
+# =====================
+
+_async_engine = None
+
+def get_async_engine():
+    """Async engine with its own pool - used by async def routes so DB waits don't hold a threadpool worker"""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            echo=False,
+            pool_size=int(os.getenv('ASYNC_DB_POOL_SIZE', '20')),
+            max_overflow=int(os.getenv('ASYNC_DB_MAX_OVERFLOW', '20')),
+            pool_pre_ping=True,
+            pool_recycle=3600,
+        )
+        instrument_pool(_async_engine.sync_engine, "async")
+        instrument_engine(_async_engine.sync_engine)
+        print(f"{Fore.GREEN}Async database engine created with connection pool{Fore.WHITE}")
+    return _async_engine
+
+_AsyncSessionLocal = None
+
+def get_async_session() -> AsyncSession:
+    """Create a new AsyncSession (caller owns it - prefer the get_async_db dependency in routes)"""
+    global _AsyncSessionLocal
+    if _AsyncSessionLocal is None:
+        _AsyncSessionLocal = async_sessionmaker(
+            bind=get_async_engine(),
+            autoflush=False,
+            # Keep loaded attributes usable after commit (responses are built after commit)
+            expire_on_commit=False,
+        )
+    return _AsyncSessionLocal()
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """FastAPI dependency: one AsyncSession per request, rolled back on error and always closed"""
+    session = get_async_session()
+    try:
+        yield session
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+async def dispose_async_engine():
+    """Close all pooled async connections - call this on app shutdown"""
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _AsyncSessionLocal = None
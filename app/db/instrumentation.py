@@ -0,0 +1,141 @@
+"""
+Query instrumentation on the SQLAlchemy engines
+
+- per-request query count and time (QueryInstrumentationMiddleware keeps a QueryStats per request)
+- N+1 detector: the same statement executed SQL_N_PLUS_ONE_THRESHOLD+ times in one request
+  (only the parameters differ - a lazy load or a query inside a loop) is logged once per request
+- slow-query log: statements slower than SQL_SLOW_QUERY_MS, with the route that ran them
+- Server-Timing header ("db;dur=...") in development (ENV=development) or with SQL_SERVER_TIMING=true
+"""
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+SERVER_TIMING = os.getenv(
+    "SQL_SERVER_TIMING", "true" if os.getenv("ENV", "").lower() == "development" else "false"
+).lower() == "true"
+
+STATEMENT_LOG_CHARS = 500
+
+
+class QueryStats:
+    """Queries run on behalf of one request"""
+
+    __slots__ = ("route", "count", "total_time", "statements")
+
+    def __init__(self, route: str = "-"):
+        self.route = route
+        self.count = 0
+        self.total_time = 0.0
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.total_time += elapsed
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> list:
+        """(statement, times) executed at least `threshold` times, most repeated first"""
+        return [(stmt, n) for stmt, n in self.statements.most_common() if n >= threshold]
+
+
+# Set per HTTP request; sync routes see it too (contextvars are copied into the threadpool and
+# the QueryStats object is shared, not copied)
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _query_stats.get()
+
+
+# =====================
+# Engine listeners
+# =====================
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        route = stats.route if stats is not None else "-"
+        logger.warning(
+            f"[SQL] Slow query {elapsed * 1000:.1f}ms route={route}: "
+            f"{' '.join(statement.split())[:STATEMENT_LOG_CHARS]}"
+        )
+
+
+def _handle_error(exception_context):
+    # The failed statement never reaches after_cursor_execute - drop its start time
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+def instrument_engine(engine):
+    """Attach the listeners (pass async_engine.sync_engine for async engines)"""
+    from sqlalchemy import event
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# =====================
+# Per-request middleware
+# =====================
+
+def report_request(method: str, stats: QueryStats):
+    for statement, times in stats.repeated():
+        logger.warning(
+            f"[SQL] Possible N+1 on {method} {stats.route}: statement ran {times}x "
+            f"({stats.count} queries, {stats.total_time * 1000:.1f}ms total): "
+            f"{' '.join(statement.split())[:STATEMENT_LOG_CHARS]}"
+        )
+
+
+class QueryInstrumentationMiddleware:
+    """Pure ASGI middleware: collect the queries of every HTTP request, report N+1 patterns"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        from app.metrics import route_template
+
+        stats = QueryStats(route_template(scope))
+        token = _query_stats.set(stats)
+
+        async def send_with_timing(message):
+            if SERVER_TIMING and message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((
+                    b"server-timing",
+                    f'db;dur={stats.total_time * 1000:.1f};desc="{stats.count} queries"'.encode(),
+                ))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _query_stats.reset(token)
+            report_request(scope["method"], stats)
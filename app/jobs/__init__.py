@@ -0,0 +1,7 @@
+"""
+Background jobs: @job functions enqueued on Redis (or Postgres) and run by
+`python -m app.jobs.worker` - see registry.py for the API
+"""
+from .registry import job, enqueue, get_job, registered_jobs, JobDefinition
+from .backends import get_backend, set_backend, JobRecord, MemoryBackend, RedisBackend, PostgresBackend
+from .metrics import job_metrics
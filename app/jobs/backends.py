@@ -0,0 +1,470 @@
+"""
+Job queue backends
+
+- RedisBackend     per-queue sorted set scored by run-at time; claimed jobs move to a
+                   "running" set scored by their lease deadline (Lua, atomic)
+- PostgresBackend  background_jobs table, claimed with FOR UPDATE SKIP LOCKED
+- MemoryBackend    in-process (tests, local scripts)
+
+A claimed job is leased for the visibility timeout and the worker extends the lease while
+the job runs (extend); leases of crashed workers expire and recover() puts those jobs back
+on their queue (at-least-once delivery). Finished jobs are kept JOB_RESULT_TTL seconds.
+
+JOBS_BACKEND = redis | postgres | memory | auto (default: Redis when it answers, else Postgres)
+"""
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+JOBS_BACKEND = os.getenv("JOBS_BACKEND", "auto").lower()
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "86400"))
+UNIQUE_KEY_TTL = 7 * 86400
+
+
+@dataclass
+class JobRecord:
+    id: str
+    name: str
+    queue: str
+    args: list = field(default_factory=list)
+    kwargs: dict = field(default_factory=dict)
+    attempts: int = 0           # failed attempts so far
+    run_at: float = 0.0         # epoch seconds the job is due
+    enqueued_at: float = 0.0
+    unique_key: Optional[str] = None
+    last_error: Optional[str] = None
+
+    @classmethod
+    def new(cls, name: str, queue: str, args: list, kwargs: dict, delay: float = 0,
+            unique_key: Optional[str] = None) -> "JobRecord":
+        now = time.time()
+        return cls(id=uuid.uuid4().hex, name=name, queue=queue, args=args, kwargs=kwargs,
+                   run_at=now + max(0.0, delay), enqueued_at=now, unique_key=unique_key)
+
+    def dumps(self) -> str:
+        return json.dumps(asdict(self), separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, data) -> "JobRecord":
+        return cls(**json.loads(data))
+
+
+def _dump_result(result: Any) -> str:
+    try:
+        return json.dumps(result, default=str)
+    except (TypeError, ValueError):
+        return json.dumps(repr(result))
+
+
+# =====================
+# Memory
+# =====================
+
+class MemoryBackend:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues: Dict[str, list] = {}
+        self._running: Dict[str, tuple] = {}  # id -> (record, lease deadline)
+        self._unique: set = set()
+        self.results: Dict[str, dict] = {}
+        self.failed: List[JobRecord] = []
+
+    def push(self, record: JobRecord) -> bool:
+        with self._lock:
+            if record.unique_key:
+                if record.unique_key in self._unique:
+                    return False
+                self._unique.add(record.unique_key)
+            heapq.heappush(self._queues.setdefault(record.queue, []), (record.run_at, record.id, record))
+            return True
+
+    def claim(self, queues: List[str], limit: int, visibility_timeout: float) -> List[JobRecord]:
+        now = time.time()
+        claimed = []
+        with self._lock:
+            for queue in queues:
+                heap = self._queues.get(queue, [])
+                while heap and heap[0][0] <= now and len(claimed) < limit:
+                    _, _, record = heapq.heappop(heap)
+                    self._running[record.id] = (record, now + visibility_timeout)
+                    claimed.append(record)
+        return claimed
+
+    def extend(self, record: JobRecord, visibility_timeout: float):
+        with self._lock:
+            if record.id in self._running:
+                self._running[record.id] = (record, time.time() + visibility_timeout)
+
+    def ack(self, record: JobRecord, result: Any = None):
+        with self._lock:
+            self._running.pop(record.id, None)
+            self.results[record.id] = {"status": "done", "result": json.loads(_dump_result(result))}
+
+    def retry(self, record: JobRecord, run_at: float, error: str):
+        with self._lock:
+            self._running.pop(record.id, None)
+            record.attempts += 1
+            record.run_at = run_at
+            record.last_error = error
+            heapq.heappush(self._queues.setdefault(record.queue, []), (record.run_at, record.id, record))
+
+    def fail(self, record: JobRecord, error: str):
+        with self._lock:
+            self._running.pop(record.id, None)
+            record.attempts += 1
+            record.last_error = error
+            self.failed.append(record)
+            self.results[record.id] = {"status": "failed", "error": error}
+
+    def recover(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [rid for rid, (_, deadline) in self._running.items() if deadline < now]
+            for rid in expired:
+                record, _ = self._running.pop(rid)
+                heapq.heappush(self._queues.setdefault(record.queue, []), (now, record.id, record))
+            return len(expired)
+
+    def purge(self) -> int:
+        return 0
+
+    def get_result(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            return self.results.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "queued": {q: len(h) for q, h in self._queues.items()},
+                "running": len(self._running),
+                "failed": len(self.failed),
+            }
+
+
+# =====================
+# Redis
+# =====================
+
+_QUEUE_KEY = "jobs:queue:{}"
+_DATA_KEY = "jobs:data"
+_RUNNING_KEY = "jobs:running"
+_FAILED_KEY = "jobs:failed"
+_RESULT_KEY = "jobs:result:{}"
+_UNIQUE_KEY = "jobs:unique:{}"
+
+# KEYS: queue, running, data   ARGV: now, limit, lease deadline
+_CLAIM = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+local out = {}
+for _, id in ipairs(ids) do
+    redis.call('ZREM', KEYS[1], id)
+    local data = redis.call('HGET', KEYS[3], id)
+    if data then
+        redis.call('ZADD', KEYS[2], ARGV[3], id)
+        table.insert(out, data)
+    end
+end
+return out
+"""
+
+# KEYS: running, data   ARGV: now, queue key prefix
+_RECOVER = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+for _, id in ipairs(ids) do
+    redis.call('ZREM', KEYS[1], id)
+    local data = redis.call('HGET', KEYS[2], id)
+    if data then
+        redis.call('ZADD', ARGV[2] .. cjson.decode(data)['queue'], ARGV[1], id)
+    end
+end
+return #ids
+"""
+
+
+class RedisBackend:
+    """Sync client: enqueues come from sync services and the worker's threads"""
+
+    def __init__(self, client=None):
+        if client is None:
+            import redis as redis_sync
+            from app.cache import REDIS_URL
+            client = redis_sync.from_url(REDIS_URL, socket_connect_timeout=3, socket_timeout=5)
+        self.client = client
+        self._claim = client.register_script(_CLAIM)
+        self._recover = client.register_script(_RECOVER)
+
+    def push(self, record: JobRecord) -> bool:
+        if record.unique_key and not self.client.set(
+            _UNIQUE_KEY.format(record.unique_key), record.id, nx=True, ex=UNIQUE_KEY_TTL
+        ):
+            return False
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(_DATA_KEY, record.id, record.dumps())
+        pipe.zadd(_QUEUE_KEY.format(record.queue), {record.id: record.run_at})
+        pipe.execute()
+        return True
+
+    def claim(self, queues: List[str], limit: int, visibility_timeout: float) -> List[JobRecord]:
+        now = time.time()
+        claimed = []
+        for queue in queues:
+            if len(claimed) >= limit:
+                break
+            rows = self._claim(
+                keys=[_QUEUE_KEY.format(queue), _RUNNING_KEY, _DATA_KEY],
+                args=[now, limit - len(claimed), now + visibility_timeout],
+            )
+            claimed.extend(JobRecord.loads(row) for row in rows)
+        return claimed
+
+    def ack(self, record: JobRecord, result: Any = None):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zrem(_RUNNING_KEY, record.id)
+        pipe.hdel(_DATA_KEY, record.id)
+        pipe.set(_RESULT_KEY.format(record.id), json.dumps({"status": "done", "result": json.loads(_dump_result(result))}),
+                 ex=JOB_RESULT_TTL)
+        pipe.execute()
+
+    def extend(self, record: JobRecord, visibility_timeout: float):
+        # XX: a job that was already acked / recovered is not put back into the running set
+        self.client.zadd(_RUNNING_KEY, {record.id: time.time() + visibility_timeout}, xx=True)
+
+    def retry(self, record: JobRecord, run_at: float, error: str):
+        record.attempts += 1
+        record.run_at = run_at
+        record.last_error = error
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zrem(_RUNNING_KEY, record.id)
+        pipe.hset(_DATA_KEY, record.id, record.dumps())
+        pipe.zadd(_QUEUE_KEY.format(record.queue), {record.id: run_at})
+        pipe.execute()
+
+    def fail(self, record: JobRecord, error: str):
+        record.attempts += 1
+        record.last_error = error
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zrem(_RUNNING_KEY, record.id)
+        pipe.hdel(_DATA_KEY, record.id)
+        pipe.lpush(_FAILED_KEY, record.dumps())
+        pipe.set(_RESULT_KEY.format(record.id), json.dumps({"status": "failed", "error": error}), ex=JOB_RESULT_TTL)
+        pipe.execute()
+
+    def recover(self) -> int:
+        return int(self._recover(keys=[_RUNNING_KEY, _DATA_KEY], args=[time.time(), _QUEUE_KEY.format("")]))
+
+    def purge(self) -> int:
+        # Results expire on their own (JOB_RESULT_TTL)
+        return 0
+
+    def get_result(self, job_id: str) -> Optional[dict]:
+        raw = self.client.get(_RESULT_KEY.format(job_id))
+        return json.loads(raw) if raw else None
+
+    def stats(self) -> dict:
+        queued = {}
+        for key in self.client.scan_iter(match=_QUEUE_KEY.format("*"), count=100):
+            name = key.decode() if isinstance(key, bytes) else key
+            queued[name[len(_QUEUE_KEY.format("")):]] = self.client.zcard(name)
+        return {
+            "backend": "redis",
+            "queued": queued,
+            "running": self.client.zcard(_RUNNING_KEY),
+            "failed": self.client.llen(_FAILED_KEY),
+        }
+
+
+# =====================
+# Postgres
+# =====================
+
+_PG_PUSH = """
+    INSERT INTO background_jobs (id, name, queue, payload, status, attempts, run_at, unique_key, created_at)
+    VALUES (:id, :name, :queue, :payload, 'pending', 0, to_timestamp(:run_at) at time zone 'utc', :unique_key,
+            now() at time zone 'utc')
+    ON CONFLICT DO NOTHING
+    RETURNING id
+"""
+
+_PG_CLAIM = """
+    UPDATE background_jobs j
+    SET status = 'running', locked_until = (now() at time zone 'utc') + make_interval(secs => :lease)
+    FROM (
+        SELECT id FROM background_jobs
+        WHERE status = 'pending' AND queue = ANY(:queues) AND run_at <= now() at time zone 'utc'
+        ORDER BY run_at
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    ) due
+    WHERE j.id = due.id
+    RETURNING j.id, j.name, j.queue, j.payload, j.attempts,
+              extract(epoch from j.run_at), extract(epoch from j.created_at), j.unique_key, j.last_error
+"""
+
+_PG_EXTEND = """
+    UPDATE background_jobs SET locked_until = (now() at time zone 'utc') + make_interval(secs => :lease)
+    WHERE id = :id AND status = 'running'
+"""
+
+_PG_ACK = """
+    UPDATE background_jobs
+    SET status = 'done', result = :result, locked_until = NULL, finished_at = now() at time zone 'utc'
+    WHERE id = :id
+"""
+
+_PG_RETRY = """
+    UPDATE background_jobs
+    SET status = 'pending', attempts = attempts + 1, last_error = :error, locked_until = NULL,
+        run_at = to_timestamp(:run_at) at time zone 'utc'
+    WHERE id = :id
+"""
+
+_PG_FAIL = """
+    UPDATE background_jobs
+    SET status = 'failed', attempts = attempts + 1, last_error = :error, locked_until = NULL,
+        finished_at = now() at time zone 'utc'
+    WHERE id = :id
+"""
+
+_PG_RECOVER = """
+    UPDATE background_jobs SET status = 'pending', locked_until = NULL
+    WHERE status = 'running' AND locked_until < now() at time zone 'utc'
+"""
+
+_PG_PURGE = """
+    DELETE FROM background_jobs
+    WHERE status = 'done' AND finished_at < (now() at time zone 'utc') - make_interval(secs => :ttl)
+"""
+
+_PG_RESULT = "SELECT status, result, last_error FROM background_jobs WHERE id = :id"
+
+_PG_STATS = "SELECT queue, status, count(*) FROM background_jobs WHERE status <> 'done' GROUP BY queue, status"
+
+
+class PostgresBackend:
+
+    def _execute(self, sql: str, params: Optional[dict] = None, fetch: bool = False):
+        from sqlalchemy import text
+        from app.db import get_db_session
+
+        db = get_db_session()
+        try:
+            result = db.execute(text(sql), params or {})
+            rows = result.all() if fetch else result.rowcount
+            db.commit()
+            return rows
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def push(self, record: JobRecord) -> bool:
+        rows = self._execute(_PG_PUSH, {
+            "id": record.id, "name": record.name, "queue": record.queue,
+            "payload": json.dumps({"args": record.args, "kwargs": record.kwargs}),
+            "run_at": record.run_at, "unique_key": record.unique_key,
+        }, fetch=True)
+        return bool(rows)
+
+    def claim(self, queues: List[str], limit: int, visibility_timeout: float) -> List[JobRecord]:
+        rows = self._execute(_PG_CLAIM, {"queues": list(queues), "limit": limit, "lease": visibility_timeout},
+                             fetch=True)
+        claimed = []
+        for job_id, name, queue, payload, attempts, run_at, created_at, unique_key, last_error in rows:
+            data = json.loads(payload)
+            claimed.append(JobRecord(
+                id=job_id, name=name, queue=queue, args=data["args"], kwargs=data["kwargs"],
+                attempts=attempts, run_at=float(run_at), enqueued_at=float(created_at),
+                unique_key=unique_key, last_error=last_error,
+            ))
+        return claimed
+
+    def extend(self, record: JobRecord, visibility_timeout: float):
+        self._execute(_PG_EXTEND, {"id": record.id, "lease": visibility_timeout})
+
+    def ack(self, record: JobRecord, result: Any = None):
+        self._execute(_PG_ACK, {"id": record.id, "result": _dump_result(result)})
+
+    def retry(self, record: JobRecord, run_at: float, error: str):
+        self._execute(_PG_RETRY, {"id": record.id, "run_at": run_at, "error": error})
+        record.attempts += 1
+
+    def fail(self, record: JobRecord, error: str):
+        self._execute(_PG_FAIL, {"id": record.id, "error": error})
+        record.attempts += 1
+
+    def recover(self) -> int:
+        return self._execute(_PG_RECOVER)
+
+    def purge(self) -> int:
+        """Delete done jobs older than JOB_RESULT_TTL (failed ones stay for inspection)"""
+        return self._execute(_PG_PURGE, {"ttl": JOB_RESULT_TTL})
+
+    def get_result(self, job_id: str) -> Optional[dict]:
+        rows = self._execute(_PG_RESULT, {"id": job_id}, fetch=True)
+        if not rows:
+            return None
+        status, result, error = rows[0]
+        if status == "done":
+            return {"status": status, "result": json.loads(result) if result else None}
+        return {"status": status, "error": error}
+
+    def stats(self) -> dict:
+        queued, running, failed = {}, 0, 0
+        for queue, status, count in self._execute(_PG_STATS, fetch=True):
+            if status == "pending":
+                queued[queue] = count
+            elif status == "running":
+                running += count
+            elif status == "failed":
+                failed += count
+        return {"backend": "postgres", "queued": queued, "running": running, "failed": failed}
+
+
+# =====================
+# Selection
+# =====================
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _make_backend(kind: str):
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "redis":
+        return RedisBackend()
+    if kind == "postgres":
+        return PostgresBackend()
+    try:
+        backend = RedisBackend()
+        backend.client.ping()
+        return backend
+    except Exception as e:
+        logger.warning(f"[Jobs] Redis unavailable ({e}) - using the Postgres queue")
+        return PostgresBackend()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _make_backend(JOBS_BACKEND)
+    return _backend
+
+
+def set_backend(backend):
+    """Swap the backend (tests: set_backend(MemoryBackend()))"""
+    global _backend
+    _backend = backend
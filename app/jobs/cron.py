@@ -0,0 +1,72 @@
+"""
+Minimal 5-field cron expressions (minute hour day-of-month month day-of-week), in UTC
+
+Fields take *, n, a-b, */step, a-b/step and comma lists; day-of-week 0-7 (0 and 7 = Sunday).
+When both day fields are restricted a day matches either of them (as in cron).
+"""
+from datetime import datetime, timedelta
+from typing import Set
+
+_FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def _parse_field(spec: str, low: int, high: int) -> Set[int]:
+    values = set()
+    for part in spec.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"bad step in {spec!r}")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(v) for v in part.split("-", 1))
+        else:
+            start = end = int(part)
+            if step > 1:
+                end = high
+        if start < low or end > high or start > end:
+            raise ValueError(f"{spec!r} is outside {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_field(spec, low, high) for spec, (low, high) in zip(fields, _FIELD_RANGES)
+        )
+        self.weekdays = {d % 7 for d in weekdays}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, t: datetime) -> bool:
+        day_ok = t.day in self.days
+        weekday_ok = (t.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, dt: datetime) -> datetime:
+        """First matching minute strictly after dt (naive UTC)"""
+        t = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"cron expression never matches: {self.expression!r}")
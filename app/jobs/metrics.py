@@ -0,0 +1,85 @@
+"""
+Job counters: outcomes, run time and queue latency (due -> started) per job name
+
+Every record goes to the Prometheus metrics in app.metrics (job_runs_total, job_runtime_seconds,
+job_queue_latency_seconds - scraped from the worker, see JOB_METRICS_PORT) and to the
+in-process snapshot() below (tests, one-off scripts).
+"""
+from typing import Dict
+import threading
+
+from app.metrics import JOB_QUEUE_LATENCY, JOB_RUNS, JOB_RUNTIME, JOBS_ENQUEUED
+
+
+class _JobStats:
+    __slots__ = ("enqueued", "succeeded", "retried", "failed", "runtime_total", "runtime_max",
+                 "latency_total", "latency_max", "last_error")
+
+    def __init__(self):
+        self.enqueued = 0
+        self.succeeded = 0
+        self.retried = 0
+        self.failed = 0
+        self.runtime_total = 0.0
+        self.runtime_max = 0.0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.last_error = None
+
+
+class JobMetrics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, _JobStats] = {}
+
+    def _get(self, name: str) -> _JobStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = _JobStats()
+        return stats
+
+    def record_enqueued(self, name: str):
+        JOBS_ENQUEUED.labels(name).inc()
+        with self._lock:
+            self._get(name).enqueued += 1
+
+    def record_run(self, name: str, outcome: str, runtime: float, latency: float, error: str = None):
+        """outcome: succeeded / retried / failed"""
+        JOB_RUNS.labels(name, outcome).inc()
+        JOB_RUNTIME.labels(name).observe(runtime)
+        JOB_QUEUE_LATENCY.labels(name).observe(latency)
+        with self._lock:
+            stats = self._get(name)
+            setattr(stats, outcome, getattr(stats, outcome) + 1)
+            stats.runtime_total += runtime
+            stats.runtime_max = max(stats.runtime_max, runtime)
+            stats.latency_total += latency
+            stats.latency_max = max(stats.latency_max, latency)
+            if error is not None:
+                stats.last_error = error
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            result = {}
+            for name, s in self._stats.items():
+                runs = s.succeeded + s.retried + s.failed
+                result[name] = {
+                    "enqueued": s.enqueued,
+                    "succeeded": s.succeeded,
+                    "retried": s.retried,
+                    "failed": s.failed,
+                    "avg_runtime_ms": round(s.runtime_total / runs * 1000, 1) if runs else 0.0,
+                    "max_runtime_ms": round(s.runtime_max * 1000, 1),
+                    "avg_latency_ms": round(s.latency_total / runs * 1000, 1) if runs else 0.0,
+                    "max_latency_ms": round(s.latency_max * 1000, 1),
+                    "last_error": s.last_error,
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+job_metrics = JobMetrics()
@@ -0,0 +1,111 @@
+"""
+Job registry and the @job decorator
+
+    @job(retries=5, timeout=60)
+    def send_receipt(order_id: int): ...
+
+    send_receipt.delay(42)                      # run on a worker as soon as possible
+    send_receipt.enqueue(args=(42,), delay=30)  # ... in 30 seconds
+    send_receipt(42)                            # still callable inline
+
+    @job(cron="0 2 * * *")                      # periodic, enqueued by the workers' scheduler
+    def nightly_cleanup(): ...
+
+Jobs are referenced by name on the queue, so the worker must import the module that
+defines them (see JOB_MODULES in app.jobs.worker). Arguments must be JSON-serializable.
+"""
+from typing import Callable, Dict, Optional
+import asyncio
+import os
+import random
+
+from .cron import CronSchedule
+
+DEFAULT_QUEUE = "default"
+DEFAULT_RETRIES = int(os.getenv("JOB_DEFAULT_RETRIES", "3"))
+DEFAULT_BACKOFF = 2.0
+DEFAULT_BACKOFF_MAX = 600.0
+
+_registry: Dict[str, "JobDefinition"] = {}
+
+
+class JobDefinition:
+
+    def __init__(self, func: Callable, name: str, queue: str = DEFAULT_QUEUE, retries: int = DEFAULT_RETRIES,
+                 backoff: float = DEFAULT_BACKOFF, backoff_max: float = DEFAULT_BACKOFF_MAX,
+                 timeout: Optional[float] = None, cron: Optional[str] = None):
+        self.func = func
+        self.name = name
+        self.queue = queue
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.schedule = CronSchedule(cron) if cron else None
+        self.is_async = asyncio.iscoroutinefunction(func)
+        self.__doc__ = func.__doc__
+        self.__wrapped__ = func
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"<job {self.name} queue={self.queue}>"
+
+    def retry_delay(self, attempt: int) -> float:
+        """Exponential backoff with jitter for the retry after `attempt` failed attempts"""
+        delay = min(self.backoff * (2 ** max(0, attempt - 1)), self.backoff_max)
+        return delay * random.uniform(0.5, 1.0)
+
+    def delay(self, *args, **kwargs) -> str:
+        """Enqueue to run as soon as a worker is free; returns the job id"""
+        return self.enqueue(args=args, kwargs=kwargs)
+
+    def enqueue(self, args: tuple = (), kwargs: Optional[dict] = None, delay: float = 0,
+                unique_key: Optional[str] = None) -> Optional[str]:
+        """
+        Enqueue with options; unique_key makes the enqueue happen at most once
+        (returns None when a job with that key was already enqueued)
+        """
+        from .backends import get_backend, JobRecord
+        from .metrics import job_metrics
+
+        record = JobRecord.new(self.name, self.queue, list(args), dict(kwargs or {}), delay, unique_key)
+        if not get_backend().push(record):
+            return None
+        job_metrics.record_enqueued(self.name)
+        return record.id
+
+
+def job(func: Optional[Callable] = None, *, name: Optional[str] = None, queue: str = DEFAULT_QUEUE,
+        retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF, backoff_max: float = DEFAULT_BACKOFF_MAX,
+        timeout: Optional[float] = None, cron: Optional[str] = None):
+    """Register a function as a background job (sync functions run in the worker's threads)"""
+
+    def register(f: Callable) -> JobDefinition:
+        job_name = name or f"{f.__module__}.{f.__qualname__}"
+        definition = JobDefinition(f, job_name, queue=queue, retries=retries, backoff=backoff,
+                                   backoff_max=backoff_max, timeout=timeout, cron=cron)
+        _registry[job_name] = definition
+        return definition
+
+    return register(func) if func is not None else register
+
+
+def get_job(name: str) -> Optional[JobDefinition]:
+    return _registry.get(name)
+
+
+def registered_jobs() -> Dict[str, JobDefinition]:
+    return dict(_registry)
+
+
+def enqueue(name: str, *args, **kwargs) -> Optional[str]:
+    """Enqueue a job by name (for callers that can't import the job's module)"""
+    definition = get_job(name)
+    if definition is not None:
+        return definition.delay(*args, **kwargs)
+    from .backends import get_backend, JobRecord
+    record = JobRecord.new(name, DEFAULT_QUEUE, list(args), kwargs, 0, None)
+    get_backend().push(record)
+    return record.id
@@ -0,0 +1,74 @@
+"""
+Periodic maintenance jobs (previously system cron entries running the scripts/ files)
+and side effects services push off the request path
+
+The scripts still work for one-off runs; with a job worker running, these replace the crontab.
+"""
+import logging
+
+from .registry import job
+
+logger = logging.getLogger(__name__)
+
+
+def _check(result: dict, label: str) -> dict:
+    """Raise on a {"success": False} result so the worker retries the job"""
+    if not result.get("success"):
+        raise RuntimeError(f"{label} failed: {result.get('error') or result}")
+    return result
+
+
+@job(name="orders.auto_delivery", cron="0 2 * * *", timeout=600)
+def auto_delivery():
+    """Mark orders shipped more than 14 days ago as delivered"""
+    from app.services.auto_delivery_service import AutoDeliveryService
+    result = _check(AutoDeliveryService.process_auto_delivery(dry_run=False), "auto-delivery")
+    return {"updated_count": result["updated_count"]}
+
+
+@job(name="stock.release_expired_reservations", cron="*/5 * * * *", retries=0, timeout=240)
+def release_expired_reservations():
+    """Give back stock held by unpaid orders past their TTL (the next run retries anyway)"""
+    from app.services.stock_service import StockService
+    return _check(StockService.release_expired_reservations(), "reservation sweeper")
+
+
+@job(name="search.delta_sync", queue="search", cron="* * * * *", retries=0, timeout=50)
+def search_delta_sync():
+    """Index products changed since the last watermark"""
+    from app.search.delta_sync import run_delta_sync
+    return _check(run_delta_sync(), "delta sync")
+
+
+@job(name="search.checksum", queue="search", cron="0 3 * * *", timeout=1800)
+def search_checksum():
+    """Compare Postgres and ES, repair differences, drop old tombstones"""
+    from app.search.delta_sync import run_checksum, purge_tombstones
+    result = _check(run_checksum(repair=True), "checksum")
+    result["tombstones_purged"] = purge_tombstones()
+    return result
+
+
+@job(name="webhooks.purge_processed", cron="30 3 * * *")
+def purge_webhook_events():
+    """Drop processed Stripe events older than the dedupe window"""
+    from app.services.webhook_service import WebhookService
+    return {"purged": WebhookService.purge_processed()}
+
+
+@job(name="jobs.purge_finished", cron="15 4 * * *")
+def purge_finished_jobs():
+    """Delete finished jobs past JOB_RESULT_TTL from the Postgres queue (Redis expires them itself)"""
+    from .backends import get_backend
+    return {"purged": get_backend().purge()}
+
+
+# =====================
+# Side effects
+# =====================
+
+@job(name="refunds.return_refund", retries=5, timeout=60)
+def return_refund(order_id: int):
+    """Stripe refund of a return the admin marked received (RefundService.admin_confirm_received)"""
+    from app.services.refund_service import RefundService
+    return RefundService.create_return_refund(order_id)
@@ -0,0 +1,279 @@
+"""
+Job worker
+
+    python -m app.jobs.worker --concurrency 8 --queues default,search
+
+Runs up to `concurrency` jobs at once: async jobs on the event loop, sync jobs in a thread
+pool of the same size. A failed job is retried with its exponential backoff until it has
+used its retries, then marked failed. Every worker also runs the cron scheduler; cron fires
+are enqueued with a unique key, so several workers enqueue each fire once.
+
+A running job's lease is extended every third of its length, so recover() only re-queues
+jobs of workers that died. A sync job that times out is retried only once its thread has
+returned - a job never runs twice at the same time.
+"""
+from datetime import datetime
+from functools import partial
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import calendar
+import importlib
+import logging
+import os
+import signal
+import time
+
+from .backends import get_backend, JobRecord
+from .metrics import job_metrics
+from .registry import DEFAULT_QUEUE, get_job, registered_jobs
+
+logger = logging.getLogger(__name__)
+
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))
+JOB_QUEUES = [q.strip() for q in os.getenv("JOB_QUEUES", f"{DEFAULT_QUEUE},search").split(",") if q.strip()]
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_VISIBILITY_TIMEOUT = float(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))
+JOB_METRICS_PORT = int(os.getenv("JOB_METRICS_PORT", "9101"))
+RECOVER_INTERVAL = 30.0
+LEASE_MARGIN = 60.0
+
+# Modules defining jobs - imported by the worker so their names resolve
+JOB_MODULES = ["app.jobs.tasks"]
+
+
+def load_job_modules(modules: List[str] = JOB_MODULES):
+    for module in modules:
+        importlib.import_module(module)
+
+
+def _epoch(dt: datetime) -> int:
+    return calendar.timegm(dt.utctimetuple())
+
+
+class Worker:
+
+    def __init__(self, backend=None, queues: Optional[List[str]] = None, concurrency: int = JOB_CONCURRENCY,
+                 poll_interval: float = JOB_POLL_INTERVAL, visibility_timeout: float = JOB_VISIBILITY_TIMEOUT,
+                 scheduler: bool = True):
+        self.backend = backend or get_backend()
+        self.queues = queues or list(JOB_QUEUES)
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.scheduler = scheduler
+        self._executor = None
+        self._inflight: set = set()
+        self._next_fire: Dict[str, datetime] = {}
+        self._last_recover = 0.0
+        self._stopping = False
+
+    # =====================
+    # Running one job
+    # =====================
+
+    async def _call(self, definition, record: JobRecord):
+        if definition.is_async:
+            return await asyncio.wait_for(definition.func(*record.args, **record.kwargs), timeout=definition.timeout)
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, partial(definition.func, *record.args, **record.kwargs))
+        done, _ = await asyncio.wait({future}, timeout=definition.timeout)
+        if not done:
+            # A thread can't be cancelled: hold the job (and its lease) until it returns
+            logger.warning(f"[Jobs] {record.name} ({record.id}) exceeded {definition.timeout}s, "
+                           f"waiting for its thread before retrying")
+            try:
+                await future
+            except Exception:
+                pass
+            raise asyncio.TimeoutError(f"timed out after {definition.timeout}s")
+        return future.result()
+
+    async def _keep_leased(self, record: JobRecord, lease: float):
+        while True:
+            await asyncio.sleep(max(1.0, lease / 3))
+            try:
+                await asyncio.to_thread(self.backend.extend, record, lease)
+            except Exception as e:
+                logger.warning(f"[Jobs] could not extend the lease of {record.name} ({record.id}): {e}")
+
+    async def execute(self, record: JobRecord):
+        definition = get_job(record.name)
+        started = time.time()
+        latency = max(0.0, started - record.run_at)
+        if definition is None:
+            error = f"unknown job {record.name!r}"
+            logger.error(f"[Jobs] {error} ({record.id})")
+            await asyncio.to_thread(self.backend.fail, record, error)
+            job_metrics.record_run(record.name, "failed", 0.0, latency, error)
+            return
+
+        lease = max(self.visibility_timeout, (definition.timeout or 0) + LEASE_MARGIN)
+        if lease > self.visibility_timeout:
+            await asyncio.to_thread(self.backend.extend, record, lease)
+        heartbeat = asyncio.create_task(self._keep_leased(record, lease))
+        error = None
+        try:
+            result = await self._call(definition, record)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:2000]
+        finally:
+            heartbeat.cancel()
+        runtime = time.time() - started
+
+        if error is None:
+            await asyncio.to_thread(self.backend.ack, record, result)
+            job_metrics.record_run(record.name, "succeeded", runtime, latency)
+            return
+
+        failures = record.attempts + 1
+        if failures <= definition.retries:
+            delay = definition.retry_delay(failures)
+            await asyncio.to_thread(self.backend.retry, record, time.time() + delay, error)
+            job_metrics.record_run(record.name, "retried", runtime, latency, error)
+            logger.warning(f"[Jobs] {record.name} ({record.id}) attempt {failures} failed, retry in {delay:.1f}s: {error}")
+        else:
+            await asyncio.to_thread(self.backend.fail, record, error)
+            job_metrics.record_run(record.name, "failed", runtime, latency, error)
+            logger.error(f"[Jobs] {record.name} ({record.id}) failed after {failures} attempts: {error}")
+
+    # =====================
+    # Scheduler
+    # =====================
+
+    def schedule_due(self, now: Optional[datetime] = None) -> int:
+        """Enqueue the cron jobs whose fire time has come; returns the number enqueued"""
+        now = now or datetime.utcnow()
+        enqueued = 0
+        for name, definition in registered_jobs().items():
+            if definition.schedule is None:
+                continue
+            fire = self._next_fire.get(name)
+            if fire is None:
+                self._next_fire[name] = definition.schedule.next_after(now)
+                continue
+            if fire > now:
+                continue
+            # Missed fires while the worker was down are not replayed, only the latest one runs
+            if definition.enqueue(unique_key=f"cron:{name}:{_epoch(fire)}") is not None:
+                enqueued += 1
+            self._next_fire[name] = definition.schedule.next_after(now)
+        return enqueued
+
+    # =====================
+    # Loop
+    # =====================
+
+    async def _housekeeping(self):
+        if self.scheduler:
+            try:
+                await asyncio.to_thread(self.schedule_due)
+            except Exception as e:
+                logger.error(f"[Jobs] scheduler error: {e}")
+        if time.monotonic() - self._last_recover >= RECOVER_INTERVAL:
+            self._last_recover = time.monotonic()
+            try:
+                recovered = await asyncio.to_thread(self.backend.recover)
+                if recovered:
+                    logger.warning(f"[Jobs] Re-queued {recovered} jobs with an expired lease")
+            except Exception as e:
+                logger.error(f"[Jobs] recover error: {e}")
+
+    async def _claim(self, limit: int) -> List[JobRecord]:
+        try:
+            return await asyncio.to_thread(self.backend.claim, self.queues, limit, self.visibility_timeout)
+        except Exception as e:
+            logger.error(f"[Jobs] claim error: {e}")
+            return []
+
+    async def run(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="job")
+        self._stopping = False
+        logger.info(f"[Jobs] Worker started: queues={self.queues} concurrency={self.concurrency} "
+                    f"backend={type(self.backend).__name__}")
+        try:
+            while not self._stopping:
+                await self._housekeeping()
+                free = self.concurrency - len(self._inflight)
+                records = await self._claim(free) if free > 0 else []
+                for record in records:
+                    task = asyncio.create_task(self.execute(record))
+                    self._inflight.add(task)
+                    task.add_done_callback(self._inflight.discard)
+                if records and len(self._inflight) < self.concurrency:
+                    continue
+                if self._inflight:
+                    # Full (or idle queue): wake up when a job finishes or after poll_interval
+                    await asyncio.wait(self._inflight, timeout=self.poll_interval,
+                                       return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    await asyncio.sleep(self.poll_interval)
+            if self._inflight:
+                await asyncio.gather(*self._inflight, return_exceptions=True)
+        finally:
+            self._executor.shutdown(wait=False)
+            logger.info("[Jobs] Worker stopped")
+
+    def stop(self):
+        """Stop claiming; run() returns once in-flight jobs finish"""
+        self._stopping = True
+
+    async def drain(self) -> int:
+        """Run every job that is due now, until the queues are empty (tests, one-off scripts)"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="job")
+        processed = 0
+        try:
+            while True:
+                records = self.backend.claim(self.queues, self.concurrency, self.visibility_timeout)
+                if not records:
+                    return processed
+                await asyncio.gather(*(self.execute(record) for record in records))
+                processed += len(records)
+        finally:
+            self._executor.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background jobs")
+    parser.add_argument("--concurrency", type=int, default=JOB_CONCURRENCY, help="Jobs run at the same time")
+    parser.add_argument("--queues", default=",".join(JOB_QUEUES), help="Comma-separated queues to consume")
+    parser.add_argument("--no-scheduler", action="store_true", help="Do not enqueue cron jobs from this worker")
+    parser.add_argument("--metrics-port", type=int, default=JOB_METRICS_PORT,
+                        help="Port serving Prometheus /metrics (0 disables)")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    load_job_modules()
+    if args.metrics_port:
+        from app.metrics import start_metrics_server
+        try:
+            start_metrics_server(args.metrics_port)
+            logger.info(f"[Jobs] Metrics on :{args.metrics_port}/metrics")
+        except OSError as e:
+            # Another worker on this host serves them (shared PROMETHEUS_MULTIPROC_DIR)
+            logger.warning(f"[Jobs] Metrics port {args.metrics_port} unavailable: {e}")
+    worker = Worker(
+        queues=[q.strip() for q in args.queues.split(",") if q.strip()],
+        concurrency=args.concurrency,
+        scheduler=not args.no_scheduler,
+    )
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.stop)
+        await worker.run()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
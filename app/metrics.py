@@ -0,0 +1,194 @@
+"""
+Prometheus metrics (GET /metrics)
+
+- http_request_duration_seconds / http_requests_in_progress   per route template
+- db_pool_*                                                     sync and async SQLAlchemy pools
+- cache_requests_total                                          L1 / Redis hits and misses
+- dependency_request_duration_seconds                           Elasticsearch, Stripe, OpenAI, Cloudinary
+- job_runs_total / job_runtime_seconds / job_queue_latency_seconds  background jobs (app.jobs),
+  served by the job worker on JOB_METRICS_PORT
+
+Under gunicorn set PROMETHEUS_MULTIPROC_DIR to an empty directory (see gunicorn.conf.py):
+every worker then writes its samples there and /metrics aggregates all workers.
+"""
+from contextlib import contextmanager
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest,
+)
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests being served",
+    ["method", "route"], multiprocess_mode="livesum",
+)
+
+DB_POOL_SIZE = Gauge(
+    "db_pool_size", "Configured pool size (per worker, summed)",
+    ["pool"], multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Connections currently checked out",
+    ["pool"], multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "Connections open beyond pool_size",
+    ["pool"], multiprocess_mode="livesum",
+)
+
+CACHE_REQUESTS = Counter(
+    "cache_requests", "Cache lookups by layer and result (hit / miss / error)",
+    ["layer", "result"],
+)
+
+DEPENDENCY_DURATION = Histogram(
+    "dependency_request_duration_seconds", "Latency of calls to external services",
+    ["dependency", "operation", "outcome"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+JOBS_ENQUEUED = Counter(
+    "jobs_enqueued", "Background jobs enqueued",
+    ["name"],
+)
+JOB_RUNS = Counter(
+    "job_runs", "Background job runs by outcome (succeeded / retried / failed)",
+    ["name", "outcome"],
+)
+JOB_RUNTIME = Histogram(
+    "job_runtime_seconds", "Background job run time",
+    ["name"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900),
+)
+JOB_QUEUE_LATENCY = Histogram(
+    "job_queue_latency_seconds", "Time from a job being due to a worker starting it",
+    ["name"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900),
+)
+
+
+# =====================
+# Helpers
+# =====================
+
+@contextmanager
+def track_dependency(dependency: str, operation: str):
+    """Time a call to an external service: with track_dependency("stripe", "refund_create"): ..."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        DEPENDENCY_DURATION.labels(dependency, operation, outcome).observe(time.perf_counter() - started)
+
+
+def count_cache(layer: str, result: str):
+    CACHE_REQUESTS.labels(layer, result).inc()
+
+
+def instrument_pool(engine, name: str):
+    """Track checkouts of an engine's pool (pass async_engine.sync_engine for async engines)"""
+    from sqlalchemy import event
+
+    pool = engine.pool
+    if hasattr(pool, "size"):
+        DB_POOL_SIZE.labels(name).inc(pool.size())
+
+    def overflow() -> int:
+        return max(0, pool.overflow()) if hasattr(pool, "overflow") else 0
+
+    @event.listens_for(pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.labels(name).inc()
+        DB_POOL_OVERFLOW.labels(name).set(overflow())
+
+    @event.listens_for(pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.labels(name).dec()
+        DB_POOL_OVERFLOW.labels(name).set(overflow())
+
+
+def route_template(scope) -> str:
+    """Route path template ("/products/{slug}") so labels don't explode with ids (memoized in the scope)"""
+    template = scope.get("route_template")
+    if template is not None:
+        return template
+
+    from starlette.routing import Match
+
+    template = "unmatched"
+    app = scope.get("app")
+    for route in getattr(getattr(app, "router", None), "routes", []):
+        match, _ = route.matches(scope)
+        if match != Match.NONE:
+            template = route.path
+            break
+    scope["route_template"] = template
+    return template
+
+
+class PrometheusMiddleware:
+    """Pure ASGI middleware: latency histogram and in-flight gauge per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(scope)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUEST_DURATION.labels(method, route, str(status)).observe(time.perf_counter() - started)
+            in_progress.dec()
+
+
+def _scrape_registry():
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics() -> tuple:
+    """(body, content type) for the /metrics response"""
+    return generate_latest(_scrape_registry()), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port: int):
+    """Serve /metrics on its own port - for processes without the API (the job worker)"""
+    from prometheus_client import start_http_server
+
+    start_http_server(port, registry=_scrape_registry())
+
+
+def mark_process_dead(pid: int):
+    """gunicorn child_exit hook: drop the live gauges of a dead worker"""
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
@@ -5,6 +5,11 @@ from .product import Product, ProductSize
 from .order import Order, OrderItem
 from .category import Category
 from .cart import Cart, Cart_Item
+from .reservation import StockReservation
+from .search_sync import ProductTombstone, SearchSyncState
+from .webhook_event import WebhookEvent
+from .background_job import BackgroundJob
 
 models_arr = [User, Review, Order, OrderItem,
-              Product, ProductSize, Category, Cart, Cart_Item]
+              Product, ProductSize, Category, Cart, Cart_Item, StockReservation,
+              ProductTombstone, SearchSyncState, WebhookEvent, BackgroundJob]
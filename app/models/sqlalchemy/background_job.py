@@ -0,0 +1,42 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index, text
+from datetime import datetime
+from app.db import Base
+import enum
+
+
+class BackgroundJobStatus(str, enum.Enum):
+    PENDING = "pending"    # Waiting for run_at (new or between retries)
+    RUNNING = "running"    # Claimed by a worker until locked_until
+    DONE = "done"          # Succeeded (see result)
+    FAILED = "failed"      # Out of retries (see last_error)
+
+
+class BackgroundJob(Base):
+    """Postgres job queue (app.jobs, used when Redis is not available)"""
+    __tablename__ = 'background_jobs'
+    __table_args__ = (
+        # Worker claim: due pending jobs per queue
+        Index(
+            'ix_background_jobs_pending_due', 'queue', 'run_at',
+            postgresql_where=text("status = 'pending'")
+        ),
+        # Lease recovery of crashed workers
+        Index(
+            'ix_background_jobs_running_lease', 'locked_until',
+            postgresql_where=text("status = 'running'")
+        ),
+    )
+
+    id = Column(String(32), primary_key=True)
+    name = Column(String(255), nullable=False)
+    queue = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=False)  # JSON {"args": [...], "kwargs": {...}}
+    status = Column(String(20), nullable=False, default=BackgroundJobStatus.PENDING.value)
+    attempts = Column(Integer, nullable=False, default=0)
+    run_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = Column(DateTime, nullable=True)
+    unique_key = Column(String(255), nullable=True, unique=True)  # e.g. cron fire "cron:<job>:<ts>"
+    result = Column(Text, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, Integer, Text, ForeignKey, DateTime, Table
+from sqlalchemy import Column, String, Float, Integer, Text, ForeignKey, DateTime, Table, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db import Base
@@ -6,5 +6,7 @@ from app.db import Base
 #Join Tables
 product_categories = Table('product_categories', Base.metadata,
     Column('product_id', Integer, ForeignKey('products.id'), primary_key=True),
-    Column('category_id', Integer, ForeignKey('categories.id'), primary_key=True)
+    Column('category_id', Integer, ForeignKey('categories.id'), primary_key=True),
+    Column('updated_at', DateTime, default=datetime.utcnow,
+           server_default=text("(now() at time zone 'utc')"), nullable=False)
 )
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, Integer, Text, ForeignKey, DateTime, Table, Enum, JSON
+from sqlalchemy import Column, String, Float, Integer, Text, ForeignKey, DateTime, Table, Enum, JSON, Index, text
 from sqlalchemy.orm import relationship, Mapped
 from datetime import datetime
 from app.db import Base
@@ -29,6 +29,14 @@ class OrderStatus(str, enum.Enum):
 
 class Order(Base):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # Keyset pagination on (created_at, id): admin list, per-status tabs, per-user history
+        Index('ix_orders_created_at_id', 'created_at', 'id'),
+        Index('ix_orders_status_created_at', 'status', 'created_at'),
+        Index('ix_orders_user_id_created_at', 'user_id', 'created_at'),
+        # Auto-delivery: shipped orders by shipping date
+        Index('ix_orders_shipped_at_shipped', 'shipped_at', postgresql_where=text("status = 'shipped'")),
+    )
     
     id = Column("id", Integer, primary_key=True, index=True)
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.uuid'), nullable=False)
@@ -81,7 +89,7 @@ class OrderItem(Base):
     __tablename__ = 'order_items'
     
     id = Column("id", Integer, primary_key=True, index=True)
-    order_id = Column("order_id", Integer, ForeignKey('orders.id'))
+    order_id = Column("order_id", Integer, ForeignKey('orders.id'), index=True)
     product_id = Column("product_id", Integer, ForeignKey('products.id'))
     product_name = Column("product_name", String(255), nullable=False)
     product_image = Column("product_image", String(500), nullable=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, Integer, Text, ForeignKey, DateTime, Table, Date
+from sqlalchemy import Column, String, Float, Integer, Text, ForeignKey, DateTime, Table, Date, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db import Base
@@ -20,6 +20,12 @@ class Product(Base):
     description = Column(Text, nullable=True)
     image_url = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Delta search sync watermark column - also bumped by DB triggers on raw UPDATEs
+    # and on size/category link changes (see migration b16e2fd4ac70)
+    updated_at = Column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+        server_default=text("(now() at time zone 'utc')"), nullable=False, index=True
+    )
     
     # Supplement-specific fields
     serving_size = Column(String(100), nullable=True)
@@ -47,6 +53,12 @@ class ProductSize(Base):
     product_id = Column("product_id", Integer, ForeignKey('products.id'), nullable=False)
     size = Column("size", String)
     stock_quantity = Column("stock_quantity", Integer, nullable=False, default=0)
+    # Held by active StockReservations - available = stock_quantity - reserved_quantity
+    reserved_quantity = Column("reserved_quantity", Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(
+        "updated_at", DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+        server_default=text("(now() at time zone 'utc')"), nullable=False
+    )
 
     product = relationship("Product", back_populates="sizes")
     cart_items = relationship("Cart_Item", back_populates="product_size")
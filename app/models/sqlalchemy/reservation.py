@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index, text
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from app.db import Base
+import enum
+
+
+class ReservationStatus(str, enum.Enum):
+    ACTIVE = "active"          # Holding stock while the order is PENDING
+    COMMITTED = "committed"    # Turned into a deduction on checkout.session.completed
+    RELEASED = "released"      # Order cancelled before payment
+    EXPIRED = "expired"        # Checkout expired or TTL passed (sweeper)
+
+
+class StockReservation(Base):
+    """Quantity held on a ProductSize for a pending order (see StockService)"""
+    __tablename__ = 'stock_reservations'
+    __table_args__ = (
+        # Sweeper scans only active rows ordered by expiry
+        Index(
+            'ix_stock_reservations_active_expires_at', 'expires_at',
+            postgresql_where=text("status = 'active'")
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey('orders.id', ondelete='CASCADE'), nullable=False, index=True)
+    size_id = Column(Integer, ForeignKey('product_sizes.id'), nullable=False, index=True)
+    quantity = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False, default=ReservationStatus.ACTIVE.value)
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    order = relationship("Order")
+    product_size = relationship("ProductSize")
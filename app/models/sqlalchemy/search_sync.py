@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, DateTime, text
+from datetime import datetime
+from app.db import Base
+
+
+class ProductTombstone(Base):
+    """Written by an AFTER DELETE trigger on products so delta sync can remove ES documents"""
+    __tablename__ = 'product_tombstones'
+
+    product_id = Column(Integer, primary_key=True)
+    deleted_at = Column(
+        DateTime, default=datetime.utcnow,
+        server_default=text("(now() at time zone 'utc')"), nullable=False, index=True
+    )
+
+
+class SearchSyncState(Base):
+    """Persisted watermark per sync stream (e.g. 'products')"""
+    __tablename__ = 'search_sync_state'
+
+    name = Column(String(50), primary_key=True)
+    watermark = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,39 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index, text
+from datetime import datetime
+from app.db import Base
+import enum
+
+
+class WebhookEventStatus(str, enum.Enum):
+    PENDING = "pending"    # Stored by the webhook endpoint, waiting for (or between) worker attempts
+    DONE = "done"          # Processed
+    FAILED = "failed"      # Gave up after WEBHOOK_MAX_ATTEMPTS (see last_error)
+
+
+class WebhookEvent(Base):
+    """Stripe event outbox: stored by the webhook endpoint, processed by WebhookWorker"""
+    __tablename__ = 'webhook_events'
+    __table_args__ = (
+        # Worker claim: due pending events in Stripe order
+        Index(
+            'ix_webhook_events_pending_due', 'next_attempt_at',
+            postgresql_where=text("status = 'pending'")
+        ),
+        # Per-order ordering check (an earlier pending event for the same key blocks later ones)
+        Index(
+            'ix_webhook_events_pending_ordering', 'ordering_key', 'event_created', 'id',
+            postgresql_where=text("status = 'pending'")
+        ),
+    )
+
+    id = Column(String(255), primary_key=True)  # Stripe event id - retries of an event dedupe here
+    type = Column(String(100), nullable=False)
+    payload = Column(Text, nullable=False)  # Raw verified request body
+    ordering_key = Column(String(100), nullable=True)  # e.g. "order:42"
+    event_created = Column(DateTime, nullable=False)
+    status = Column(String(20), nullable=False, default=WebhookEventStatus.PENDING.value)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    received_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = Column(DateTime, nullable=True)
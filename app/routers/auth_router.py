@@ -3,6 +3,8 @@ from datetime import timedelta, datetime, timezone
 import traceback
 import secrets
 from typing import List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.schemas.user_schemas import (
     UserCreate, UserResponse, LoginRequest, TokenResponse, 
@@ -10,8 +12,10 @@ from app.schemas.user_schemas import (
 )
 from app.services.user_service import UserServices, require_user, require_admin
 from app.models.sqlalchemy import User
-from app.db import get_db_session
+from app.db import get_async_db
 from app.i18n_keys import I18nKeys
+from app.cache import invalidate_principal
+from app.services.password_hasher import password_hasher
 
 
 router = APIRouter()
@@ -19,9 +23,9 @@ router = APIRouter()
 
 # Registration route
 @router.post("/register", response_model=UserResponse)
-def register(user: UserCreate):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     try:
-        user_obj = UserServices.register(user.model_dump())
+        user_obj = await UserServices.register(db, user.model_dump())
         return user_obj
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -33,15 +37,16 @@ def register(user: UserCreate):
 
 # Login route
 @router.post("/login", response_model=TokenResponse)
-def login(login_data: LoginRequest):
-    user = UserServices.authenticate(login_data.email, login_data.password)
+async def login(login_data: LoginRequest, db: AsyncSession = Depends(get_async_db)):
+    user = await UserServices.authenticate(db, login_data.email, login_data.password)
     if not user:
         raise HTTPException(status_code=401, detail=I18nKeys.AUTH_INVALID_CREDENTIALS)
 
     access_token = UserServices.create_access_token(
         str(user.uuid),
         user.role,
-        timedelta(minutes=UserServices.ACCESS_TOKEN_EXPIRE_MINUTES)
+        timedelta(minutes=UserServices.ACCESS_TOKEN_EXPIRE_MINUTES),
+        token_version=user.token_version or 0
     )
     
     user_response = UserResponse.model_validate(user)
@@ -54,181 +59,187 @@ def login(login_data: LoginRequest):
 
 # Get current user info
 @router.get("/me", response_model=UserResponse)
-def get_me(current_user = Depends(require_user)):
-    return UserResponse.model_validate(current_user)
+async def get_me(current_user = Depends(require_user), db: AsyncSession = Depends(get_async_db)):
+    # current_user is the cached principal - the profile fields come from the row
+    user = await db.scalar(select(User).where(User.uuid == current_user.uuid))
+    if not user:
+        raise HTTPException(status_code=404, detail=I18nKeys.USER_NOT_FOUND)
+    return UserResponse.model_validate(user)
 
 
 # Update profile
 @router.put("/profile", response_model=UserResponse)
-def update_profile(profile_data: ProfileUpdate, current_user = Depends(require_user)):
-    db = get_db_session()
-    try:
-        user = db.query(User).filter(User.uuid == current_user.uuid).first()
-        if not user:
-            raise HTTPException(status_code=404, detail=I18nKeys.USER_NOT_FOUND)
-        
-        # Update fields if provided
-        if profile_data.first_name is not None:
-            user.first_name = profile_data.first_name
-        if profile_data.last_name is not None:
-            user.last_name = profile_data.last_name
-        if profile_data.phone_number is not None:
-            user.phone_number = profile_data.phone_number
-        if profile_data.address is not None:
-            user.address = profile_data.address
-        
-        db.commit()
-        db.refresh(user)
-        return UserResponse.model_validate(user)
-    finally:
-        db.close()
+async def update_profile(
+    profile_data: ProfileUpdate,
+    current_user = Depends(require_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    user = await db.scalar(select(User).where(User.uuid == current_user.uuid))
+    if not user:
+        raise HTTPException(status_code=404, detail=I18nKeys.USER_NOT_FOUND)
+    
+    # Update fields if provided
+    if profile_data.first_name is not None:
+        user.first_name = profile_data.first_name
+    if profile_data.last_name is not None:
+        user.last_name = profile_data.last_name
+    if profile_data.phone_number is not None:
+        user.phone_number = profile_data.phone_number
+    if profile_data.address is not None:
+        user.address = profile_data.address
+    
+    await db.commit()
+    await db.refresh(user)
+    await invalidate_principal(user.uuid)
+    return UserResponse.model_validate(user)
 
 
 # Change password
 @router.put("/change-password")
-def change_password(password_data: PasswordChange, current_user = Depends(require_user)):
-    db = get_db_session()
-    try:
-        user = db.query(User).filter(User.uuid == current_user.uuid).first()
-        if not user:
-            raise HTTPException(status_code=404, detail=I18nKeys.USER_NOT_FOUND)
-        
-        # Verify current password
-        if not UserServices.verify_password(password_data.current_password, user.hashed_password, user.salt):
-            raise HTTPException(status_code=400, detail=I18nKeys.PROFILE_WRONG_PASSWORD)
-        
-        # Hash new password
-        new_hashed, new_salt = UserServices.hash_password(password_data.new_password)
-        user.hashed_password = new_hashed
-        user.salt = new_salt
-        
-        db.commit()
-        return {"message": I18nKeys.PROFILE_PASSWORD_CHANGED}
-    finally:
-        db.close()
+async def change_password(
+    password_data: PasswordChange,
+    current_user = Depends(require_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    user = await db.scalar(select(User).where(User.uuid == current_user.uuid))
+    if not user:
+        raise HTTPException(status_code=404, detail=I18nKeys.USER_NOT_FOUND)
+    
+    # Verify current password
+    if not await UserServices.verify_password_async(
+        password_data.current_password, user.hashed_password, user.salt
+    ):
+        raise HTTPException(status_code=400, detail=I18nKeys.PROFILE_WRONG_PASSWORD)
+    
+    # Hash new password
+    new_hashed, new_salt = await UserServices.hash_password_async(password_data.new_password)
+    user.hashed_password = new_hashed
+    user.salt = new_salt
+    # Revoke tokens issued before the change (other sessions); this one gets a fresh token
+    user.token_version = (user.token_version or 0) + 1
+    
+    await db.commit()
+    await invalidate_principal(user.uuid)
+    access_token = UserServices.create_access_token(
+        str(user.uuid),
+        user.role,
+        timedelta(minutes=UserServices.ACCESS_TOKEN_EXPIRE_MINUTES),
+        token_version=user.token_version
+    )
+    return {"message": I18nKeys.PROFILE_PASSWORD_CHANGED, "access_token": access_token, "token_type": "bearer"}
 
 
 # Forgot password - generate reset token
 @router.post("/forgot-password")
-def forgot_password(request: ForgotPasswordRequest):
+async def forgot_password(request: ForgotPasswordRequest, db: AsyncSession = Depends(get_async_db)):
     """Request password reset - generates token and mocks email sending"""
-    db = get_db_session()
-    try:
-        user = db.query(User).filter(User.email == request.email).first()
-        
-        # Always return success to prevent email enumeration
-        if not user:
-            return {"message": I18nKeys.AUTH_RESET_EMAIL_SENT}
-        
-        # Generate reset token
-        reset_token = secrets.token_urlsafe(32)
-        reset_expires = datetime.now(timezone.utc) + timedelta(hours=1)
-        
-        user.reset_token = reset_token
-        user.reset_token_expires = reset_expires
-        db.commit()
-        
-        # Mock email sending (in production, send actual email)
-        print(f"[MOCK EMAIL] Password reset link for {user.email}:")
-        print(f"[MOCK EMAIL] http://localhost:3000/reset-password?token={reset_token}")
-        
+    user = await db.scalar(select(User).where(User.email == request.email))
+    
+    # Always return success to prevent email enumeration
+    if not user:
         return {"message": I18nKeys.AUTH_RESET_EMAIL_SENT}
-    finally:
-        db.close()
+    
+    # Generate reset token
+    reset_token = secrets.token_urlsafe(32)
+    reset_expires = datetime.now(timezone.utc) + timedelta(hours=1)
+    
+    user.reset_token = reset_token
+    user.reset_token_expires = reset_expires
+    await db.commit()
+    
+    # Mock email sending (in production, send actual email)
+    print(f"[MOCK EMAIL] Password reset link for {user.email}:")
+    print(f"[MOCK EMAIL] http://localhost:3000/reset-password?token={reset_token}")
+    
+    return {"message": I18nKeys.AUTH_RESET_EMAIL_SENT}
 
 
 # Reset password with token
 @router.post("/reset-password")
-def reset_password(request: ResetPasswordRequest):
+async def reset_password(request: ResetPasswordRequest, db: AsyncSession = Depends(get_async_db)):
     """Reset password using token from email"""
-    db = get_db_session()
-    try:
-        user = db.query(User).filter(User.reset_token == request.token).first()
-        
-        if not user:
-            raise HTTPException(status_code=400, detail=I18nKeys.AUTH_INVALID_RESET_TOKEN)
-        
-        # Check if token expired
-        if user.reset_token_expires and user.reset_token_expires < datetime.now(timezone.utc):
-            raise HTTPException(status_code=400, detail=I18nKeys.AUTH_RESET_TOKEN_EXPIRED)
-        
-        # Update password
-        new_hashed, new_salt = UserServices.hash_password(request.new_password)
-        user.hashed_password = new_hashed
-        user.salt = new_salt
-        
-        # Clear reset token
-        user.reset_token = None
-        user.reset_token_expires = None
-        
-        db.commit()
-        return {"message": I18nKeys.AUTH_PASSWORD_RESET_SUCCESS}
-    finally:
-        db.close()
+    user = await db.scalar(select(User).where(User.reset_token == request.token))
+    
+    if not user:
+        raise HTTPException(status_code=400, detail=I18nKeys.AUTH_INVALID_RESET_TOKEN)
+    
+    # Check if token expired
+    if user.reset_token_expires and user.reset_token_expires < datetime.now(timezone.utc):
+        raise HTTPException(status_code=400, detail=I18nKeys.AUTH_RESET_TOKEN_EXPIRED)
+    
+    # Update password
+    new_hashed, new_salt = await UserServices.hash_password_async(request.new_password)
+    user.hashed_password = new_hashed
+    user.salt = new_salt
+    
+    # Clear reset token
+    user.reset_token = None
+    user.reset_token_expires = None
+    # Revoke every token issued with the old password
+    user.token_version = (user.token_version or 0) + 1
+    
+    await db.commit()
+    await invalidate_principal(user.uuid)
+    return {"message": I18nKeys.AUTH_PASSWORD_RESET_SUCCESS}
 
 
 # Protected route example (user only)
 @router.get("/protected")
-def protected_route(current_user = Depends(require_user)):
+async def protected_route(current_user = Depends(require_user)):
     return {"message": I18nKeys.AUTH_LOGIN_REQUIRED, "user": current_user.email}
 
 
 # Admin only route example
 @router.get("/admin-only")
-def admin_only_route(current_user = Depends(require_admin)):
+async def admin_only_route(current_user = Depends(require_admin)):
     return {"message": I18nKeys.AUTH_ADMIN_ONLY, "user": current_user.email}
 
 
 # Get all users (admin only)
 @router.get("/users", response_model=List[UserResponse])
-def get_all_users(current_user = Depends(require_admin)):
-    db = get_db_session()
-    try:
-        users = db.query(User).all()
-        return [UserResponse.model_validate(u) for u in users]
-    finally:
-        db.close()
+async def get_all_users(current_user = Depends(require_admin), db: AsyncSession = Depends(get_async_db)):
+    users = (await db.scalars(select(User))).all()
+    return [UserResponse.model_validate(u) for u in users]
 
 
 # Promote user to admin (admin only)
 @router.put("/users/{user_id}/promote", response_model=UserResponse)
-def promote_user(user_id: str, current_user = Depends(require_admin)):
-    db = get_db_session()
-    try:
-        user = db.query(User).filter(User.uuid == user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail=I18nKeys.USER_NOT_FOUND)
-        
-        if user.role == "admin":
-            raise HTTPException(status_code=400, detail=I18nKeys.USER_ALREADY_ADMIN)
-        
-        user.role = "admin"
-        db.commit()
-        db.refresh(user)
-        return UserResponse.model_validate(user)
-    finally:
-        db.close()
+async def promote_user(user_id: str, current_user = Depends(require_admin), db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(User).where(User.uuid == user_id))
+    if not user:
+        raise HTTPException(status_code=404, detail=I18nKeys.USER_NOT_FOUND)
+    
+    if user.role == "admin":
+        raise HTTPException(status_code=400, detail=I18nKeys.USER_ALREADY_ADMIN)
+    
+    user.role = "admin"
+    await db.commit()
+    await db.refresh(user)
+    await invalidate_principal(user.uuid)
+    return UserResponse.model_validate(user)
 
 
 # Demote admin to user (admin only)
 @router.put("/users/{user_id}/demote", response_model=UserResponse)
-def demote_user(user_id: str, current_user = Depends(require_admin)):
-    db = get_db_session()
-    try:
-        user = db.query(User).filter(User.uuid == user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail=I18nKeys.USER_NOT_FOUND)
-        
-        if str(user.uuid) == str(current_user.uuid):
-            raise HTTPException(status_code=400, detail=I18nKeys.USER_CANNOT_DEMOTE_SELF)
-        
-        if user.role == "user":
-            raise HTTPException(status_code=400, detail=I18nKeys.USER_ALREADY_USER)
-        
-        user.role = "user"
-        db.commit()
-        db.refresh(user)
-        return UserResponse.model_validate(user)
-    finally:
-        db.close()
+async def demote_user(user_id: str, current_user = Depends(require_admin), db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(User).where(User.uuid == user_id))
+    if not user:
+        raise HTTPException(status_code=404, detail=I18nKeys.USER_NOT_FOUND)
+    
+    if str(user.uuid) == str(current_user.uuid):
+        raise HTTPException(status_code=400, detail=I18nKeys.USER_CANNOT_DEMOTE_SELF)
+    
+    if user.role == "user":
+        raise HTTPException(status_code=400, detail=I18nKeys.USER_ALREADY_USER)
+    
+    user.role = "user"
+    await db.commit()
+    await db.refresh(user)
+    await invalidate_principal(user.uuid)
+    return UserResponse.model_validate(user)
+
 
+# Password hashing pool counters (admin only)
+@router.get("/admin/password-hasher")
+async def password_hasher_stats(current_user = Depends(require_admin)):
+    return password_hasher.stats()
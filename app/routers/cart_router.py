@@ -1,48 +1,66 @@
 from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas.cart_schemas import CartBase, AddToCartRequest, UpdateCartItemRequest
 from app.services.cart_service import CartService
+from app.services import cart_store
 from app.services.user_service import require_user
 from app.models.sqlalchemy.user import User
+from app.db import get_async_db
 
 cart_router = APIRouter()
 
 # NOTE: Cart uses Optimistic UI pattern
 # - GET /cart: Full cart for hydration (on login/refresh)
 # - POST/PUT/DELETE: Return {status: ok} only, FE manages state locally
+# CART_STORE=redis serves every cart endpoint from Redis (see app.services.cart_store);
+# cart item ids are product size ids in that mode.
+
+
+def _store():
+    return cart_store if cart_store.enabled() else CartService
 
 
 @cart_router.get("/cart", response_model=CartBase)
-def get_user_cart(current_user: User = Depends(require_user)):
+async def get_user_cart(current_user: User = Depends(require_user), db: AsyncSession = Depends(get_async_db)):
     """Get current user's cart for hydration (on login/page refresh)"""
-    return CartService.get_cart(str(current_user.uuid))
+    return await _store().get_cart(db, str(current_user.uuid))
 
 
 @cart_router.post("/cart", response_model=CartBase)
-def add_to_cart(request: AddToCartRequest, current_user: User = Depends(require_user)):
+async def add_to_cart(
+    request: AddToCartRequest,
+    current_user: User = Depends(require_user),
+    db: AsyncSession = Depends(get_async_db)
+):
     """Add item to cart - returns full cart (FE needs new item ID)"""
-    return CartService.add_to_cart(str(current_user.uuid), request)
+    return await _store().add_to_cart(db, str(current_user.uuid), request)
 
 
 @cart_router.put("/cart/{cart_item_id}")
-def update_cart_item(
+async def update_cart_item(
     cart_item_id: int,
     request: UpdateCartItemRequest,
-    current_user: User = Depends(require_user)
+    current_user: User = Depends(require_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update quantity - return status only (FE uses optimistic UI)"""
-    CartService.update_cart_item(str(current_user.uuid), cart_item_id, request.quantity)
+    await _store().update_cart_item(db, str(current_user.uuid), cart_item_id, request.quantity)
     return {"status": "ok"}
 
 
 @cart_router.delete("/cart/{cart_item_id}")
-def remove_from_cart(cart_item_id: int, current_user: User = Depends(require_user)):
+async def remove_from_cart(
+    cart_item_id: int,
+    current_user: User = Depends(require_user),
+    db: AsyncSession = Depends(get_async_db)
+):
     """Remove item - return status only (FE uses optimistic UI)"""
-    CartService.remove_from_cart(str(current_user.uuid), cart_item_id)
+    await _store().remove_from_cart(db, str(current_user.uuid), cart_item_id)
     return {"status": "ok"}
 
 
 @cart_router.delete("/cart")
-def clear_cart(current_user: User = Depends(require_user)):
+async def clear_cart(current_user: User = Depends(require_user), db: AsyncSession = Depends(get_async_db)):
     """Clear cart - return status only"""
-    CartService.clear_cart(str(current_user.uuid))
+    await _store().clear_cart(db, str(current_user.uuid))
     return {"status": "ok"}
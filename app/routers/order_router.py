@@ -1,5 +1,6 @@
 from typing import List, Optional
 from fastapi import APIRouter, Depends, Query, Body
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas.order_schemas import (
     CreateOrderRequest, OrderResponse, OrderListItem,
     AdminOrdersResponse, UpdateOrderStatusRequest
@@ -7,6 +8,7 @@ from app.schemas.order_schemas import (
 from app.services.order_service import OrderService
 from app.services.user_service import require_user, require_admin
 from app.models.sqlalchemy.user import User
+from app.db import get_async_db
 
 order_router = APIRouter()
 
@@ -22,15 +24,19 @@ def create_order(
 
 
 @order_router.get("/orders", response_model=List[OrderListItem])
-def get_my_orders(current_user: User = Depends(require_user)):
+async def get_my_orders(current_user: User = Depends(require_user), db: AsyncSession = Depends(get_async_db)):
     """Get all orders for current user"""
-    return OrderService.get_user_orders(str(current_user.uuid))
+    return await OrderService.get_user_orders_async(db, str(current_user.uuid))
 
 
 @order_router.get("/orders/{order_id}", response_model=OrderResponse)
-def get_order_detail(order_id: int, current_user: User = Depends(require_user)):
+async def get_order_detail(
+    order_id: int,
+    current_user: User = Depends(require_user),
+    db: AsyncSession = Depends(get_async_db)
+):
     """Get order detail by ID"""
-    return OrderService.get_order_detail(str(current_user.uuid), order_id)
+    return await OrderService.get_order_detail_async(db, str(current_user.uuid), order_id)
 
 
 @order_router.post("/orders/{order_id}/cancel", response_model=OrderResponse)
@@ -93,10 +99,14 @@ def admin_get_all_orders(
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
     status: Optional[str] = Query(None, description="Filter by status"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page (keyset pagination, page is ignored)"),
+    estimate: bool = Query(False, description="Use the planner's row estimate for total on large tables"),
     current_user: User = Depends(require_admin)
 ):
     """Get all orders with pagination (admin only)"""
-    return OrderService.admin_get_all_orders(page=page, size=size, status_filter=status)
+    return OrderService.admin_get_all_orders(
+        page=page, size=size, status_filter=status, cursor=cursor, estimate_count=estimate
+    )
 
 
 @order_router.get("/admin/orders/{order_id}", response_model=OrderResponse)
@@ -126,10 +136,13 @@ def admin_update_order_status(
 def admin_get_pending_returns(
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
     current_user: User = Depends(require_admin)
 ):
     """Get all pending return requests (admin only)"""
-    return OrderService.admin_get_all_orders(page=page, size=size, status_filter="return_requested")
+    return OrderService.admin_get_all_orders(
+        page=page, size=size, status_filter="return_requested", cursor=cursor
+    )
 
 
 @order_router.post("/admin/orders/{order_id}/returns/approve")
@@ -219,3 +232,19 @@ def admin_trigger_auto_delivery(
     """Manually trigger auto-delivery job (admin only)"""
     from app.services.auto_delivery_service import AutoDeliveryService
     return AutoDeliveryService.process_auto_delivery(dry_run=dry_run)
+
+
+@order_router.get("/admin/jobs")
+def admin_job_stats(current_user: User = Depends(require_admin)):
+    """Background job queues (admin only) - per-job run metrics are on the worker's /metrics"""
+    from app.jobs import get_backend, registered_jobs
+    from app.jobs.worker import load_job_modules
+
+    load_job_modules()
+    return {
+        **get_backend().stats(),
+        "jobs": {
+            name: {"queue": d.queue, "cron": d.schedule.expression if d.schedule else None, "retries": d.retries, "timeout": d.timeout}
+            for name, d in registered_jobs().items()
+        },
+    }
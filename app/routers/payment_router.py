@@ -1,17 +1,24 @@
 import os
+import time
 import stripe
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 
 from app.services.user_service import require_user
 from app.services.order_service import OrderService
+from app.services.stock_service import StockService, RESERVATION_TTL_MINUTES
+from app.models.sqlalchemy.order import OrderStatus
 from app.models.sqlalchemy.user import User
+from app.metrics import track_dependency
 
 # Initialize Stripe
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
 
 payment_router = APIRouter()
 
+# Stripe only accepts session expiry between 30 minutes and 24 hours from now
+CHECKOUT_SESSION_TTL_MINUTES = min(max(RESERVATION_TTL_MINUTES, 30), 24 * 60)
+
 
 class CreateCheckoutRequest(BaseModel):
     """Request to create Stripe checkout session"""
@@ -32,6 +39,7 @@ def create_checkout_session(
     """
     Create Stripe Checkout Session for an order
     - Get order from DB
+    - Hold the order's stock for as long as the session lives
     - Create Stripe session with line items
     - Return checkout URL for redirect
     """
@@ -41,6 +49,17 @@ def create_checkout_session(
     order = OrderService.get_order_detail(user_id, request.order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
+    if order.status != OrderStatus.PENDING.value:
+        raise HTTPException(status_code=400, detail=f"Order is not awaiting payment (status: {order.status})")
+    
+    # Extend the reservation (or re-reserve if it already expired) slightly past the
+    # session expiry, so checkout.session.expired releases it before the sweeper does
+    reservation = StockService.reserve_for_order(order.id, ttl_minutes=CHECKOUT_SESSION_TTL_MINUTES + 5)
+    if reservation["order_status"] != OrderStatus.PENDING.value:
+        # Paid or cancelled since the check above
+        raise HTTPException(status_code=400, detail=f"Order is not awaiting payment (status: {reservation['order_status']})")
+    if reservation["short"]:
+        raise HTTPException(status_code=400, detail="Some items are out of stock")
     
     # Build line items for Stripe
     line_items = []
@@ -72,18 +91,20 @@ def create_checkout_session(
     
     try:
         # Create Stripe checkout session
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=line_items,
-            mode="payment",
-            success_url=f"{os.getenv('FRONTEND_SUCCESS_URL')}?session_id={{CHECKOUT_SESSION_ID}}&order_id={order.id}",
-            cancel_url=f"{os.getenv('FRONTEND_CANCEL_URL')}?order_id={order.id}",
-            metadata={
-                "order_id": str(order.id),
-                "user_id": user_id,
-            },
-            customer_email=order.shipping_email,
-        )
+        with track_dependency("stripe", "checkout_session_create"):
+            session = stripe.checkout.Session.create(
+                payment_method_types=["card"],
+                line_items=line_items,
+                mode="payment",
+                success_url=f"{os.getenv('FRONTEND_SUCCESS_URL')}?session_id={{CHECKOUT_SESSION_ID}}&order_id={order.id}",
+                cancel_url=f"{os.getenv('FRONTEND_CANCEL_URL')}?order_id={order.id}",
+                metadata={
+                    "order_id": str(order.id),
+                    "user_id": user_id,
+                },
+                customer_email=order.shipping_email,
+                expires_at=int(time.time()) + CHECKOUT_SESSION_TTL_MINUTES * 60 + 60,
+            )
         
         return CheckoutSessionResponse(
             checkout_url=session.url,
@@ -105,7 +126,8 @@ def verify_payment_session(
     """
     try:
         # Retrieve session from Stripe
-        session = stripe.checkout.Session.retrieve(session_id)
+        with track_dependency("stripe", "checkout_session_retrieve"):
+            session = stripe.checkout.Session.retrieve(session_id)
         
         # Check if payment was successful
         if session.payment_status == "paid":
@@ -122,10 +144,10 @@ def verify_payment_session(
                     if order and order.status == OrderStatus.PENDING.value:
                         order.status = OrderStatus.CONFIRMED.value
                         order.payment_intent_id = session.payment_intent
-                        db.commit()
                         
-                        # Deduct stock
-                        OrderService.deduct_stock_on_payment(int(order_id))
+                        # Deduct stock (same transaction)
+                        OrderService.deduct_stock_on_payment(int(order_id), db=db)
+                        db.commit()
                         
                         return {
                             "success": True,
@@ -10,7 +10,8 @@ from app.services.review_service import ReviewService
 from app.services.cloudinary_service import CloudinaryService
 from app.services.user_service import require_admin, require_user
 from app.i18n_keys import I18nKeys
-from app.cache import cache_get, cache_set, invalidate_product_cache
+from app.cache import cached, invalidate_product_cache, product_tag
+from app.db import get_async_session
 
 product_router = APIRouter()
 
@@ -55,7 +56,8 @@ async def read_products(
         on_sale=on_sale,
         page=page,
         limit=limit,
-        sort_by=sort_by
+        sort_by=sort_by,
+        cursor=None
     )
 
 
@@ -64,38 +66,43 @@ async def read_product(product_slug: str):
     """Get single product by slug - with Redis cache"""
     cache_key = build_product_cache_key(product_slug)
     
-    # Try cache first
-    cached = await cache_get(cache_key)
-    if cached:
-        return cached
+    async def load() -> dict:
+        # Own session: a stale-while-revalidate refresh may run after this request has finished
+        async with get_async_session() as db:
+            product = await Product_Service.get_product_async(db, product_slug)
+            # Convert to dict for caching (Pydantic model -> dict)
+            from app.services.product_service import map_product_to_response
+            return map_product_to_response(product).dict()
     
-    # Cache miss - query DB  
-    product = Product_Service.get_product(product_slug)
-    
-    # Convert to dict for caching (Pydantic model -> dict)
-    from app.services.product_service import map_product_to_response
-    product_dict = map_product_to_response(product).dict()
-    
-    # Set cache (TTL 5 minutes)
-    await cache_set(cache_key, product_dict, ttl=300)
-    
-    return product
+    # Cache 5 minutes, then serve stale for up to 5 more while one worker refreshes
+    return await cached(cache_key, load, ttl=300, tags=lambda data: [product_tag(data["id"])])
 
 @product_router.post("/products", response_model=dict)
 async def create_product(product: ProductCreate, current_user = Depends(require_admin)):
     """Create a new product (admin only)"""
     # product: ProductCreate đã nhận sizes/colors
     result = Product_Service.create_product(product)
-    await invalidate_product_cache()
+    await invalidate_product_cache(
+        product_types=[result.get("product_type")],
+        categories=[c["name"] for c in result.get("categories", [])]
+    )
     return result
 
 
 @product_router.put("/products/{product_slug}", response_model=dict)
 async def update_product(product_slug: str, product: ProductUpdate, current_user = Depends(require_admin)):
     """Update a product (admin only)"""
-    result = Product_Service.update_product(product_slug, product.dict(exclude_unset=True))
-    # Invalidate caches (specific product + list)
-    await invalidate_product_cache(slug=product_slug)
+    changes = product.dict(exclude_unset=True)
+    # Tags the product belonged to before the edit (type/category may change)
+    before = Product_Service.get_product_cache_info(product_slug) or {}
+    result = Product_Service.update_product(product_slug, changes)
+    # Invalidate caches (specific product + the listings it was/is part of)
+    await invalidate_product_cache(
+        product_id=result["id"],
+        slug=product_slug,
+        product_types=[before.get("product_type"), result.get("product_type")],
+        categories=before.get("categories", []) + [c["name"] for c in result.get("categories", [])],
+    )
     return result
 
 
@@ -106,8 +113,11 @@ async def update_product_stock(product_slug: str, stock: int, current_user = Dep
         raise HTTPException(status_code=400, detail="Stock cannot be negative")
     
     result = Product_Service.update_product_stock(product_slug, stock)
-    # Invalidate caches
-    await invalidate_product_cache(slug=product_slug)
+    # Stock doesn't move a product between result sets - only entries showing it are stale
+    info = Product_Service.get_product_cache_info(product_slug) or {}
+    await invalidate_product_cache(
+        product_id=info.get("id"), slug=product_slug, listings=False
+    )
     return result
 
 
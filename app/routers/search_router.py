@@ -3,33 +3,51 @@ Search router for Elasticsearch-powered product search
 Provides advanced search capabilities with Vietnamese text support
 """
 from fastapi import APIRouter, Query, HTTPException
-from typing import List, Optional
-from app.search.elastic_client import get_es_client, check_es_health
-from app.search.product_index import INDEX_NAME, get_index_stats
-from app.cache import cache_get, cache_set
+from typing import Dict, List, Optional
+from app.search.elastic_client import get_async_es_client, check_es_health_async
+from app.search.product_index import INDEX_NAME, get_index_stats_async
+from app.search.prefix_index import suggestion_index
+from app.search.local_engine import local_search_engine
+from app.search.circuit_breaker import es_search_breaker, es_suggest_breaker
+from app.metrics import track_dependency
+from app.cache import (
+    cached, product_tag, category_tag, type_tag, TAG_SEARCH
+)
+import asyncio
 import logging
+import os
 import hashlib
+import base64
 import json
+import time
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/search", tags=["Search"])
 
+# Autocomplete fires on every keystroke: give ES this long before answering locally
+AUTOCOMPLETE_ES_TIMEOUT = float(os.getenv("AUTOCOMPLETE_ES_TIMEOUT", "0.2"))
+# A search slower than this counts as an ES failure (circuit breaker) and is answered locally
+SEARCH_ES_TIMEOUT = float(os.getenv("SEARCH_ES_TIMEOUT", "3"))
+
 
 @router.get("/health")
-def elasticsearch_health():
+async def elasticsearch_health():
     """
-    Check Elasticsearch health status
+    Check Elasticsearch health status (plus the circuit breaker and local fallback engine)
     """
-    return check_es_health()
+    health = await check_es_health_async()
+    health["circuit_breaker"] = es_search_breaker.stats()
+    health["local_engine"] = local_search_engine.stats()
+    return health
 
 
 @router.get("/stats")
-def index_statistics():
+async def index_statistics():
     """
     Get product index statistics
     """
-    return get_index_stats()
+    return await get_index_stats_async()
 
 
 def build_search_cache_key(params: dict) -> str:
@@ -40,6 +58,135 @@ def build_search_cache_key(params: dict) -> str:
     return f"search:{hash_obj.hexdigest()}"
 
 
+def search_cache_tags(product_type: Optional[str], category: Optional[str], items: List[dict]) -> List[str]:
+    """
+    Tags for a cached search page: every product on it, plus the filter that bounds the
+    result set (type/category), or the global search tag when nothing bounds it
+    """
+    tags = [product_tag(item["id"]) for item in items]
+    if product_type:
+        tags.append(type_tag(product_type))
+    if category:
+        tags.append(category_tag(category))
+    if not product_type and not category:
+        tags.append(TAG_SEARCH)
+    return tags
+
+
+def build_search_query(
+    q: Optional[str],
+    product_type: Optional[str],
+    category: Optional[str],
+    manufacturer: Optional[str],
+    certification: Optional[str],
+    min_price: Optional[float],
+    max_price: Optional[float],
+    on_sale: Optional[bool],
+) -> dict:
+    """Bool query shared by page and cursor pagination"""
+    must = []
+    filter_queries = []
+    
+    # Search query
+    if q:
+        must.append({
+            "multi_match": {
+                "query": q,
+                "fields": [
+                    "product_name^4",           # Highest priority
+                    "product_name.autocomplete^3",
+                    "blurb^2",
+                    "description^2",
+                    "ingredients",
+                    "usage_instructions",
+                    "health_benefits",
+                ],
+                "fuzziness": "AUTO",            # Typo tolerance
+                "operator": "or",
+                "minimum_should_match": "75%"   # Relevance threshold
+            }
+        })
+    
+    # Filter: product_type
+    if product_type:
+        filter_queries.append({"term": {"product_type": product_type}})
+    
+    # Filter: category (exact match on categories array)
+    if category:
+        filter_queries.append({"term": {"categories": category}})
+    
+    # Filter: manufacturer (exact match)
+    if manufacturer:
+        filter_queries.append({"term": {"manufacturer.keyword": manufacturer}})
+    
+    # Filter: certification (match query for partial matching)
+    if certification:
+        filter_queries.append({"match": {"certification": certification}})
+    
+    # Filter: price range
+    if min_price is not None or max_price is not None:
+        price_range = {}
+        if min_price is not None:
+            price_range["gte"] = min_price
+        if max_price is not None:
+            price_range["lte"] = max_price
+        filter_queries.append({"range": {"price": price_range}})
+    
+    # Filter: on_sale
+    if on_sale:
+        filter_queries.append({"term": {"has_sale": True}})
+    
+    return {
+        "bool": {
+            "must": must if must else [{"match_all": {}}],
+            "filter": filter_queries
+        }
+    }
+
+
+def build_search_sort(sort_by: Optional[str], tiebreaker: bool = False) -> list:
+    """
+    Sort clause for sort_by (empty list = relevance)
+    tiebreaker=True makes the order total (needed for search_after): ties on the
+    sort keys are broken by created_at and then the product id
+    """
+    if sort_by == "price_asc":
+        sort = [{"price": {"order": "asc"}}]
+    elif sort_by == "price_desc":
+        sort = [{"price": {"order": "desc"}}]
+    elif sort_by == "newest":
+        sort = [{"created_at": {"order": "desc"}}]
+    else:  # relevance (default _score)
+        sort = [{"_score": {"order": "desc"}}] if tiebreaker else []
+    
+    if tiebreaker:
+        if sort_by != "newest":
+            sort.append({"created_at": {"order": "desc"}})
+        sort.append({"id": {"order": "asc"}})
+    return sort
+
+
+def format_search_hits(hits: list) -> List[dict]:
+    products = []
+    for hit in hits:
+        source = hit["_source"]
+        products.append({
+            "id": source["id"],
+            "product_name": source["product_name"],
+            "slug": source["slug"],
+            "product_type": source.get("product_type"),
+            "price": source["price"],
+            "sale_price": source.get("sale_price"),
+            "stock": source.get("stock", 0),
+            "image_url": source.get("image_url"),
+            "blurb": source.get("blurb"),
+            "has_sale": source.get("has_sale", False),
+            "discount_percentage": source.get("discount_percentage", 0),
+            "score": hit["_score"]  # Relevance score
+        })
+    return products
+
+
 @router.get("/products")
 async def search_products(
     q: Optional[str] = Query(None, min_length=1, description="Search query"),
@@ -52,7 +199,10 @@ async def search_products(
     on_sale: Optional[bool] = Query(None, description="Filter products on sale"),
     page: int = Query(0, ge=0, description="Page number (0-indexed)"),
     limit: int = Query(20, ge=1, le=100, description="Items per page"),
-    sort_by: Optional[str] = Query("relevance", description="Sort by: relevance, price_asc, price_desc, newest")
+    sort_by: Optional[str] = Query("relevance", description="Sort by: relevance, price_asc, price_desc, newest"),
+    cursor: Optional[str] = Query(
+        None, description="Cursor pagination: '*' for the first page, then the previous response's next_cursor"
+    )
 ):
     """
     Search products with Elasticsearch
@@ -65,8 +215,9 @@ async def search_products(
     - Price range filtering
     - Product type filtering
     - Sale items filtering
-    - Pagination
+    - Pagination (page/limit for shallow pages, cursor for deep/infinite scroll)
     - Multiple sort options
+    - Falls back to the in-process engine (app.search.local_engine) while ES is failing
     
     Args:
         q: Search query string (optional, returns all if not provided)
@@ -80,136 +231,73 @@ async def search_products(
         page: Page number (0-indexed)
         limit: Items per page (1-100)
         sort_by: Sort order (relevance, price_asc, price_desc, newest)
+        cursor: '*' or a next_cursor - walks the results with point-in-time + search_after
+            (page is ignored; filters and sort must stay the same for the whole walk)
         
     Returns:
-        dict: Search results with items, total, page info
+        dict: Search results with items, total, page info (next_cursor in cursor mode)
     """
-    try:
-        # Build cache key from all params
-        cache_params = {
-            "q": q,
-            "product_type": product_type,
-            "category": category,
-            "manufacturer": manufacturer,
-            "certification": certification,
-            "min_price": min_price,
-            "max_price": max_price,
-            "on_sale": on_sale,
-            "page": page,
-            "limit": limit,
-            "sort_by": sort_by
-        }
-        cache_key = build_search_cache_key(cache_params)
-        
-        # Try cache first
-        cached = await cache_get(cache_key)
-        if cached:
-            logger.info(f"Cache HIT for search: {cache_key[:20]}...")
-            return cached
-        
+    filters = (q, product_type, category, manufacturer, certification, min_price, max_price, on_sale)
+    if es_search_breaker.allow():
+        try:
+            result = await search_elasticsearch(filters, sort_by, page, limit, cursor)
+            es_search_breaker.record_success()
+            return result
+        except HTTPException:
+            # ES answered; the request itself is bad (e.g. cursor)
+            es_search_breaker.record_success()
+            raise
+        except Exception as e:
+            es_search_breaker.record_failure(e)
+            logger.error(f"Search failed, answering from the local engine: {e}", exc_info=True)
+    # Fuzzy matching scans the vocabulary - keep it off the event loop
+    return await asyncio.to_thread(search_local, filters, sort_by, page, limit, cursor)
+
+
+async def search_elasticsearch(filters: tuple, sort_by: Optional[str], page: int, limit: int,
+                               cursor: Optional[str]) -> dict:
+    if cursor:
+        return await search_with_cursor(filters, sort_by, limit, cursor)
+    
+    q, product_type, category, manufacturer, certification, min_price, max_price, on_sale = filters
+    # Build cache key from all params
+    cache_params = {
+        "q": q,
+        "product_type": product_type,
+        "category": category,
+        "manufacturer": manufacturer,
+        "certification": certification,
+        "min_price": min_price,
+        "max_price": max_price,
+        "on_sale": on_sale,
+        "page": page,
+        "limit": limit,
+        "sort_by": sort_by
+    }
+    cache_key = build_search_cache_key(cache_params)
+    
+    async def load() -> dict:
         logger.info(f"Cache MISS for search: {cache_key[:20]}...")
         
-        es = get_es_client()
-        
-        # Build query
-        must = []
-        filter_queries = []
-        
-        # Search query
-        if q:
-            must.append({
-                "multi_match": {
-                    "query": q,
-                    "fields": [
-                        "product_name^4",           # Highest priority
-                        "product_name.autocomplete^3",
-                        "blurb^2",
-                        "description^2",
-                        "ingredients",
-                        "usage_instructions",
-                        "health_benefits",
-                    ],
-                    "fuzziness": "AUTO",            # Typo tolerance
-                    "operator": "or",
-                    "minimum_should_match": "75%"   # Relevance threshold
-                }
-            })
-        
-        # Filter: product_type
-        if product_type:
-            filter_queries.append({"term": {"product_type": product_type}})
-        
-        # Filter: category (exact match on categories array)
-        if category:
-            filter_queries.append({"term": {"categories": category}})
-        
-        # Filter: manufacturer (exact match)
-        if manufacturer:
-            filter_queries.append({"term": {"manufacturer.keyword": manufacturer}})
-        
-        # Filter: certification (match query for partial matching)
-        if certification:
-            filter_queries.append({"match": {"certification": certification}})
-        
-        # Filter: price range
-        if min_price is not None or max_price is not None:
-            price_range = {}
-            if min_price is not None:
-                price_range["gte"] = min_price
-            if max_price is not None:
-                price_range["lte"] = max_price
-            filter_queries.append({"range": {"price": price_range}})
-        
-        # Filter: on_sale
-        if on_sale:
-            filter_queries.append({"term": {"has_sale": True}})
+        es = get_async_es_client()
         
-        # Build query body
         query_body = {
-            "query": {
-                "bool": {
-                    "must": must if must else [{"match_all": {}}],
-                    "filter": filter_queries
-                }
-            },
+            "query": build_search_query(*filters),
             "from": page * limit,
             "size": limit,
         }
-        
-        # Sort
-        if sort_by == "price_asc":
-            query_body["sort"] = [{"price": {"order": "asc"}}]
-        elif sort_by == "price_desc":
-            query_body["sort"] = [{"price": {"order": "desc"}}]
-        elif sort_by == "newest":
-            query_body["sort"] = [{"created_at": {"order": "desc"}}]
-        # else: relevance (default _score)
+        sort = build_search_sort(sort_by)
+        if sort:
+            query_body["sort"] = sort
         
         # Execute search
-        result = es.search(index=INDEX_NAME, body=query_body)
+        with track_dependency("elasticsearch", "search"):
+            result = await asyncio.wait_for(es.search(index=INDEX_NAME, body=query_body), timeout=SEARCH_ES_TIMEOUT)
         
         # Format results
-        hits = result["hits"]["hits"]
+        products = format_search_hits(result["hits"]["hits"])
         total = result["hits"]["total"]["value"]
         
-        products = []
-        for hit in hits:
-            source = hit["_source"]
-            products.append({
-                "id": source["id"],
-                "product_name": source["product_name"],
-                "slug": source["slug"],
-                "product_type": source.get("product_type"),
-                "price": source["price"],
-                "sale_price": source.get("sale_price"),
-                "stock": source.get("stock", 0),
-                "image_url": source.get("image_url"),
-                "blurb": source.get("blurb"),
-                "has_sale": source.get("has_sale", False),
-                "discount_percentage": source.get("discount_percentage", 0),
-                "score": hit["_score"]  # Relevance score
-            })
-        
         result_data = {
             "items": products,
             "total": total,
@@ -220,14 +308,212 @@ async def search_products(
             "took_ms": result["took"]  # Search time in milliseconds
         }
         
-        # Cache search results for 5 minutes (300 seconds)
-        await cache_set(cache_key, result_data, ttl=300)
-        
         return result_data
-        
+    
+    # Cache search results for 5 minutes (300 seconds), serve stale for another 5 while refreshing
+    return await cached(
+        cache_key, load, ttl=300,
+        tags=lambda data: search_cache_tags(product_type, category, data["items"])
+    )
+
+
+def search_local(filters: tuple, sort_by: Optional[str], page: int, limit: int, cursor: Optional[str]) -> dict:
+    """
+    search_products on the in-process engine (ES down or circuit open). Not cached - it is
+    already in memory, and cached pages would outlive the outage.
+    Cursors are interchangeable with ES ones (same sort values; "pit" is None).
+    """
+    if not local_search_engine.loaded:
+        raise HTTPException(status_code=503, detail="Search is temporarily unavailable")
+    
+    sort = build_search_sort(sort_by, tiebreaker=True)
+    if cursor:
+        fingerprint = _cursor_fingerprint(filters, sort_by)
+        if cursor == CURSOR_START:
+            state = {"pit": None, "sa": None, "f": fingerprint}
+        else:
+            state = decode_cursor(cursor)
+            if state.get("f") != fingerprint:
+                raise HTTPException(status_code=400, detail="Cursor does not match the search parameters")
+        try:
+            result = local_search_engine.search(*filters, sort=sort, size=limit, search_after=state["sa"])
+        except ValueError:
+            # e.g. a relevance cursor from ES continued without a query score
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        hits = result["hits"]["hits"]
+        next_cursor = None
+        if len(hits) == limit:
+            next_cursor = encode_cursor({"pit": None, "sa": hits[-1]["sort"], "f": fingerprint})
+        return {
+            "items": format_search_hits(hits),
+            "total": result["hits"]["total"]["value"] if state["sa"] is None else None,
+            "limit": limit,
+            "query": filters[0],
+            "next_cursor": next_cursor,
+            "took_ms": result["took"],
+            "engine": "local",
+        }
+    
+    result = local_search_engine.search(*filters, sort=sort, offset=page * limit, size=limit)
+    total = result["hits"]["total"]["value"]
+    return {
+        "items": format_search_hits(result["hits"]["hits"]),
+        "total": total,
+        "page": page,
+        "limit": limit,
+        "total_pages": (total + limit - 1) // limit,
+        "query": filters[0],
+        "took_ms": result["took"],
+        "engine": "local",
+    }
+
+
+# =====================
+# Cursor pagination (point-in-time + search_after)
+# =====================
+
+PIT_KEEP_ALIVE = "1m"
+PIT_KEEP_ALIVE_SECONDS = 60
+# PITs this process keeps open at once (ES allows search.max_open_pit_context, 300 by default);
+# past it, walks continue with plain search_after on the live index
+PIT_MAX_OPEN = int(os.getenv("SEARCH_PIT_MAX_OPEN", "50"))
+CURSOR_START = "*"
+
+# pit id -> monotonic time its keep_alive runs out, for the PITs this process opened
+_open_pits: Dict[str, float] = {}
+
+
+def encode_cursor(state: dict) -> str:
+    raw = json.dumps(state, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(state, dict) or "sa" not in state:
+            raise ValueError("missing search_after")
+        return state
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _cursor_fingerprint(filters: tuple, sort_by: Optional[str]) -> str:
+    """Binds a cursor to its query so it can't be replayed with different filters/sort"""
+    return hashlib.md5(json.dumps([list(filters), sort_by]).encode()).hexdigest()[:12]
+
+
+def _pit_slots_left() -> int:
+    now = time.monotonic()
+    for pit_id, expires in list(_open_pits.items()):
+        if expires <= now:
+            del _open_pits[pit_id]
+    return PIT_MAX_OPEN - len(_open_pits)
+
+
+def _touch_pit(old_id: str, new_id: str):
+    """A search on the PIT extended its keep_alive (ES may hand back a new id)"""
+    if _open_pits.pop(old_id, None) is not None:
+        _open_pits[new_id] = time.monotonic() + PIT_KEEP_ALIVE_SECONDS
+
+
+async def _open_pit(es) -> Optional[str]:
+    """Open a PIT for the rest of a walk; None when this process holds PIT_MAX_OPEN already or ES refuses"""
+    if _pit_slots_left() <= 0:
+        return None
+    try:
+        with track_dependency("elasticsearch", "open_pit"):
+            pit = await asyncio.wait_for(
+                es.open_point_in_time(index=INDEX_NAME, keep_alive=PIT_KEEP_ALIVE), timeout=SEARCH_ES_TIMEOUT
+            )
     except Exception as e:
-        logger.error(f"Search failed: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+        logger.warning(f"Could not open a point-in-time, continuing without: {e}")
+        return None
+    _open_pits[pit["id"]] = time.monotonic() + PIT_KEEP_ALIVE_SECONDS
+    return pit["id"]
+
+
+async def _close_pit(es, pit_id: str):
+    _open_pits.pop(pit_id, None)
+    try:
+        await asyncio.wait_for(es.close_point_in_time(id=pit_id), timeout=SEARCH_ES_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Failed to close point-in-time: {e}")
+
+
+async def search_with_cursor(filters: tuple, sort_by: Optional[str], limit: int, cursor: str) -> dict:
+    """
+    One page of a point-in-time walk. The PIT keeps results stable while the client scrolls;
+    search_after continues right after the last hit, so deep pages cost the same as the first.
+    
+    The first page runs on the live index, and a PIT is opened only once a page comes back
+    full (most walks stop at page 1). Walks without a PIT (PIT_MAX_OPEN reached, PIT expired
+    and not reopened, started on the local engine) continue with search_after on the live index.
+    """
+    from elasticsearch import NotFoundError
+    
+    es = get_async_es_client()
+    fingerprint = _cursor_fingerprint(filters, sort_by)
+    
+    if cursor == CURSOR_START:
+        state = {"pit": None, "sa": None, "f": fingerprint}
+    else:
+        state = decode_cursor(cursor)
+        if state.get("f") != fingerprint:
+            raise HTTPException(status_code=400, detail="Cursor does not match the search parameters")
+    
+    body = {
+        "query": build_search_query(*filters),
+        "sort": build_search_sort(sort_by, tiebreaker=True),
+        "size": limit,
+        "track_total_hits": state["sa"] is None,  # total only on the first page
+    }
+    if state["sa"] is not None:
+        body["search_after"] = state["sa"]
+    
+    async def run(pit_id: Optional[str]):
+        with track_dependency("elasticsearch", "search_cursor"):
+            if pit_id is None:
+                search = es.search(index=INDEX_NAME, body=body)
+            else:
+                search = es.search(body={**body, "pit": {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE}})
+            return await asyncio.wait_for(search, timeout=SEARCH_ES_TIMEOUT)
+    
+    pit_id = state.get("pit")
+    try:
+        result = await run(pit_id)
+    except NotFoundError:
+        if pit_id is None:
+            raise
+        # PIT expired between pages (client paused longer than keep_alive)
+        _open_pits.pop(pit_id, None)
+        pit_id = await _open_pit(es)
+        result = await run(pit_id)
+    
+    if pit_id is not None:
+        _touch_pit(pit_id, result.get("pit_id", pit_id))
+        pit_id = result.get("pit_id", pit_id)
+    
+    hits = result["hits"]["hits"]
+    next_cursor = None
+    if len(hits) == limit:
+        if pit_id is None:
+            pit_id = await _open_pit(es)
+        next_cursor = encode_cursor({"pit": pit_id, "sa": hits[-1]["sort"], "f": fingerprint})
+    elif pit_id is not None:
+        # Last page - release the PIT instead of waiting for keep_alive
+        await _close_pit(es, pit_id)
+    
+    total = result["hits"].get("total", {}).get("value") if state["sa"] is None else None
+    return {
+        "items": format_search_hits(hits),
+        "total": total,
+        "limit": limit,
+        "query": filters[0],
+        "next_cursor": next_cursor,
+        "took_ms": result["took"]
+    }
 
 
 @router.get("/autocomplete")
@@ -238,6 +524,10 @@ async def autocomplete_search(
     """
     Autocomplete suggestions for search
     
+    Completion suggester (weighted by units sold) with a short timeout; when ES is slow,
+    down or not reindexed with the suggest field yet, the in-process prefix index answers.
+    Nothing is cached per prefix - both paths are cheaper than a Redis round trip.
+    
     Args:
         q: Query string (min 2 chars)
         limit: Maximum suggestions to return
@@ -245,55 +535,50 @@ async def autocomplete_search(
     Returns:
         list: Suggested product names
     """
-    try:
-        # Build cache key for autocomplete
-        cache_key = f"autocomplete:{q.lower()}:{limit}"
-        
-        # Try cache first
-        cached = await cache_get(cache_key)
-        if cached:
-            return cached
-        
-        es = get_es_client()
-        
-        result = es.search(
+    if es_suggest_breaker.allow():
+        try:
+            suggestions = await asyncio.wait_for(es_suggest(q, limit), timeout=AUTOCOMPLETE_ES_TIMEOUT)
+            es_suggest_breaker.record_success()
+            return {"suggestions": suggestions, "source": "elasticsearch"}
+        except Exception as e:
+            # Keystrokes in the next few seconds go straight to the local index
+            es_suggest_breaker.record_failure(e)
+            logger.warning(f"Autocomplete suggester unavailable ({type(e).__name__}: {e}), using local index")
+    
+    if not suggestion_index.loaded:
+        return {"suggestions": [], "source": "none"}
+    return {"suggestions": suggestion_index.suggest(q, limit), "source": "local"}
+
+
+async def es_suggest(q: str, limit: int) -> list:
+    """Completion suggester on the suggest field"""
+    es = get_async_es_client()
+    with track_dependency("elasticsearch", "suggest"):
+        result = await es.search(
             index=INDEX_NAME,
             body={
-                "query": {
-                    "match": {
-                        "product_name.autocomplete": {
-                            "query": q,
-                            "operator": "and"
-                        }
+                "suggest": {
+                    "product-suggest": {
+                        "prefix": q,
+                        "completion": {"field": "suggest", "size": limit, "skip_duplicates": True}
                     }
                 },
-                "size": limit,
                 "_source": ["product_name", "product_type"]
             }
         )
-        
-        suggestions = []
-        for hit in result["hits"]["hits"]:
-            source = hit["_source"]
-            suggestions.append({
-                "name": source["product_name"],
-                "type": source.get("product_type")
-            })
-        
-        result_data = {"suggestions": suggestions}
-        
-        # Cache autocomplete for 10 minutes (autocomplete queries repeat often)
-        await cache_set(cache_key, result_data, ttl=600)
-        
-        return result_data
-        
-    except Exception as e:
-        logger.error(f"Autocomplete failed: {e}")
-        return {"suggestions": []}
+    
+    suggestions = []
+    for option in result["suggest"]["product-suggest"][0]["options"]:
+        source = option["_source"]
+        suggestions.append({
+            "name": source["product_name"],
+            "type": source.get("product_type")
+        })
+    return suggestions
 
 
 @router.get("/aggregations")
-def search_aggregations(
+async def search_aggregations(
     q: Optional[str] = Query(None, description="Search query for aggregations")
 ):
     """
@@ -307,7 +592,7 @@ def search_aggregations(
         dict: Aggregation results (product types, price ranges)
     """
     try:
-        es = get_es_client()
+        es = get_async_es_client()
         
         # Base query
         query = {
@@ -322,35 +607,36 @@ def search_aggregations(
                 }
             }
         
-        result = es.search(
-            index=INDEX_NAME,
-            body={
-                "query": query,
-                "size": 0,  # Don't return documents, just aggregations
-                "aggs": {
-                    "product_types": {
-                        "terms": {
-                            "field": "product_type",
-                            "size": 20
+        with track_dependency("elasticsearch", "aggregations"):
+            result = await es.search(
+                index=INDEX_NAME,
+                body={
+                    "query": query,
+                    "size": 0,  # Don't return documents, just aggregations
+                    "aggs": {
+                        "product_types": {
+                            "terms": {
+                                "field": "product_type",
+                                "size": 20
+                            }
+                        },
+                        "price_ranges": {
+                            "range": {
+                                "field": "price",
+                                "ranges": [
+                                    {"key": "under_100k", "to": 100000},
+                                    {"key": "100k_500k", "from": 100000, "to": 500000},
+                                    {"key": "500k_1m", "from": 500000, "to": 1000000},
+                                    {"key": "over_1m", "from": 1000000}
+                                ]
+                            }
+                        },
+                        "on_sale_count": {
+                            "filter": {"term": {"has_sale": True}}
                         }
-                    },
-                    "price_ranges": {
-                        "range": {
-                            "field": "price",
-                            "ranges": [
-                                {"key": "under_100k", "to": 100000},
-                                {"key": "100k_500k", "from": 100000, "to": 500000},
-                                {"key": "500k_1m", "from": 500000, "to": 1000000},
-                                {"key": "over_1m", "from": 1000000}
-                            ]
-                        }
-                    },
-                    "on_sale_count": {
-                        "filter": {"term": {"has_sale": True}}
                     }
                 }
-            }
-        )
+            )
         
         aggs = result["aggregations"]
         
@@ -2,6 +2,7 @@ from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
 from app.services.cloudinary_service import CloudinaryService
 from app.services.user_service import require_user
 from app.models.sqlalchemy.user import User
+from app.metrics import track_dependency
 
 upload_router = APIRouter()
 
@@ -34,11 +35,12 @@ async def upload_return_evidence(
     if is_video:
         # Upload video without transformation
         import cloudinary.uploader
-        result = cloudinary.uploader.upload(
-            file.file,
-            folder=folder,
-            resource_type="video"
-        )
+        with track_dependency("cloudinary", "upload"):
+            result = cloudinary.uploader.upload(
+                file.file,
+                folder=folder,
+                resource_type="video"
+            )
         return {
             "url": result.get("secure_url"),
             "public_id": result.get("public_id"),
@@ -79,11 +81,12 @@ async def upload_review_media(
     if is_video:
         # Upload video
         import cloudinary.uploader
-        result = cloudinary.uploader.upload(
-            file.file,
-            folder=folder,
-            resource_type="video"
-        )
+        with track_dependency("cloudinary", "upload"):
+            result = cloudinary.uploader.upload(
+                file.file,
+                folder=folder,
+                resource_type="video"
+            )
         return {
             "url": result.get("secure_url"),
             "public_id": result.get("public_id"),
@@ -3,7 +3,7 @@ import stripe
 from fastapi import APIRouter, Request, HTTPException
 import logging
 
-from app.services.order_service import OrderService
+from app.services.webhook_service import WebhookService, webhook_worker, HANDLED_EVENT_TYPES
 
 # Initialize Stripe
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
@@ -20,24 +20,18 @@ async def stripe_webhook(request: Request):
     """
     Handle Stripe webhook events
     - Verify signature
-    - Process checkout.session.completed event
-    - Update order status to 'confirmed' (paid)
+    - Store the event in the webhook_events outbox (deduped by Stripe event id)
+    - Return right away; WebhookWorker applies it (order confirmation + stock deduction,
+      reservation release, refunds) with retries and per-order ordering
     """
     payload = await request.body()
     sig_header = request.headers.get("stripe-signature")
     
-    # DEBUG: Log webhook received
-    logger.info(f"[Webhook] Received webhook request")
-    logger.info(f"[Webhook] Signature header: {sig_header}")
-    logger.info(f"[Webhook] Webhook secret configured: {bool(webhook_secret)}")
-    
     try:
         # Verify webhook signature
         event = stripe.Webhook.construct_event(
             payload, sig_header, webhook_secret
         )
-        logger.info(f"[Webhook] Signature verified successfully")
-        logger.info(f"[Webhook] Event type: {event.get('type')}")
     except ValueError as e:
         # Invalid payload
         logger.error(f"[Webhook] Invalid payload: {e}")
@@ -47,110 +41,20 @@ async def stripe_webhook(request: Request):
         logger.error(f"[Webhook] Signature verification failed: {e}")
         raise HTTPException(status_code=400, detail="Invalid signature")
     
-    # Handle the event
-    if event["type"] == "checkout.session.completed":
-        session = event["data"]["object"]
-        
-        # Get order_id and payment_intent from session
-        order_id = session.get("metadata", {}).get("order_id")
-        payment_intent_id = session.get("payment_intent")
-        
-        logger.info(f"[Webhook] checkout.session.completed - Order ID: {order_id}")
-        logger.info(f"[Webhook] Payment Intent ID: {payment_intent_id}")
-        logger.info(f"[Webhook] Session metadata: {session.get('metadata')}")
-        
-        if order_id:
-            try:
-                # Update order status to confirmed (paid) and save payment_intent_id
-                # Don't store the response in cache - just execute the update
-                from app.db import get_db_session
-                from app.models.sqlalchemy.order import Order, OrderStatus
-                
-                db = get_db_session()
-                try:
-                    order = db.query(Order).filter(Order.id == int(order_id)).first()
-                    if order:
-                        logger.info(f"[Webhook] Found order {order_id}, current status: {order.status}")
-                        order.status = OrderStatus.CONFIRMED.value
-                        if payment_intent_id:
-                            order.payment_intent_id = payment_intent_id
-                            logger.info(f"[Webhook] Set payment_intent_id: {payment_intent_id}")
-                        else:
-                            logger.warning(f"[Webhook] No payment_intent_id in session!")
-                        
-                        db.commit()
-                        logger.info(f"[Webhook] Database committed for order {order_id}")
-                        
-                        # Deduct stock after successful payment
-                        OrderService.deduct_stock_on_payment(int(order_id))
-                        logger.info(f"[Webhook] SUCCESS - Order {order_id} marked as CONFIRMED and stock deducted")
-                        print(f"[Stripe Webhook] Order {order_id} marked as CONFIRMED (paid) with payment_intent={payment_intent_id}")
-                    else:
-                        logger.error(f"[Webhook] Order {order_id} not found in database!")
-                finally:
-                    db.close()
-            except Exception as e:
-                logger.error(f"[Webhook] FAILED - Error updating order {order_id}: {e}", exc_info=True)
-                print(f"[Stripe Webhook] Error updating order {order_id}: {e}")
-        else:
-            logger.warning(f"[Webhook] No order_id found in session metadata")
-    
-    elif event["type"] == "checkout.session.expired":
-        session = event["data"]["object"]
-        order_id = session.get("metadata", {}).get("order_id")
-        
-        logger.info(f"[Webhook] checkout.session.expired - Order ID: {order_id}")
-        
-        if order_id:
-            print(f"[Stripe Webhook] Checkout expired for order {order_id}")
-    
-    elif event["type"] == "charge.refunded":
-        # Handle refund succeeded
-        from app.services.refund_service import RefundService
-        
-        charge = event["data"]["object"]
-        refunds = charge.get("refunds", {}).get("data", [])
-        
-        logger.info(f"[Webhook] charge.refunded event received")
-        
-        for refund in refunds:
-            refund_id = refund.get("id")
-            logger.info(f"[Webhook] Processing refund: {refund_id}")
-            
-            if refund_id:
-                try:
-                    if refund.get("status") == "succeeded":
-                        RefundService.handle_refund_succeeded(refund_id)
-                        logger.info(f"[Webhook] Refund {refund_id} succeeded and processed")
-                    elif refund.get("status") == "failed":
-                        RefundService.handle_refund_failed(refund_id)
-                        logger.warning(f"[Webhook] Refund {refund_id} failed")
-                except Exception as e:
-                    logger.error(f"[Webhook] Error processing refund {refund_id}: {e}")
-    
-    elif event["type"] == "refund.updated":
-        # Handle refund.updated event (alternative to charge.refunded)
-        from app.services.refund_service import RefundService
-        
-        refund = event["data"]["object"]
-        refund_id = refund.get("id")
-        refund_status = refund.get("status")
-        
-        logger.info(f"[Webhook] refund.updated event received - ID: {refund_id}, Status: {refund_status}")
-        
-        if refund_id:
-            try:
-                if refund_status == "succeeded":
-                    RefundService.handle_refund_succeeded(refund_id)
-                    logger.info(f"[Webhook] Refund {refund_id} succeeded (via refund.updated)")
-                elif refund_status == "failed":
-                    RefundService.handle_refund_failed(refund_id)
-                    logger.warning(f"[Webhook] Refund {refund_id} failed (via refund.updated)")
-            except Exception as e:
-                logger.error(f"[Webhook] Error processing refund.updated {refund_id}: {e}")
+    event_type = event.get("type")
+    if event_type not in HANDLED_EVENT_TYPES:
+        logger.info(f"[Webhook] Unhandled event type: {event_type}")
+        return {"status": "success"}
+    if not event.get("id"):
+        raise HTTPException(status_code=400, detail="Invalid payload")
     
+    # A storage failure must reach Stripe as an error so it retries the delivery
+    stored = await WebhookService.record_event(event, payload)
+    if stored:
+        logger.info(f"[Webhook] Queued {event_type} {event['id']}")
+        webhook_worker.notify()
     else:
-        logger.info(f"[Webhook] Unhandled event type: {event.get('type')}")
+        logger.info(f"[Webhook] Duplicate delivery of {event['id']} ignored")
     
     return {"status": "success"}
 
@@ -163,7 +67,7 @@ async def manual_confirm_payment(order_id: int, request: Request):
     Body: {"payment_intent_id": "pi_xxx"}
     """
     from app.db import get_db_session
-    from app.models.sqlalchemy.order import Order, OrderStatus
+    from app.models.sqlalchemy.order import Order
     
     try:
         body = await request.json()
@@ -176,17 +80,13 @@ async def manual_confirm_payment(order_id: int, request: Request):
         
         db = get_db_session()
         try:
-            order = db.query(Order).filter(Order.id == order_id).first()
-            if not order:
+            if db.query(Order.id).filter(Order.id == order_id).first() is None:
                 raise HTTPException(404, "Order not found")
             
-            order.status = OrderStatus.CONFIRMED.value
-            order.payment_intent_id = payment_intent_id
+            # Same transition as the webhook worker (status + stock deduction, applied once)
+            WebhookService.confirm_order_payment(db, order_id, payment_intent_id)
             db.commit()
             
-            # Deduct stock
-            OrderService.deduct_stock_on_payment(order_id)
-            
             logger.info(f"[Manual] Order {order_id} confirmed successfully")
             return {"status": "success", "message": f"Order {order_id} confirmed with payment_intent {payment_intent_id}"}
         finally:
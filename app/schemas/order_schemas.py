@@ -120,6 +120,8 @@ class AdminOrdersResponse(BaseModel):
     page: int
     size: int
     total_pages: int
+    next_cursor: Optional[str] = None  # Pass as cursor= for the next page (keyset pagination)
+    total_is_estimate: bool = False
 
 
 class UpdateOrderStatusRequest(BaseModel):
@@ -0,0 +1,105 @@
+"""
+Circuit breaker for Elasticsearch calls
+
+closed     - calls go to ES; failure_threshold consecutive failures open the circuit
+open       - calls skip ES (callers use the local engine) for reset_timeout seconds
+half_open  - one probe call is let through; success closes, failure re-opens. A probe that
+             never reports back (request cancelled) frees its slot after probe_timeout
+"""
+from typing import Optional
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 10.0,
+                 probe_timeout: Optional[float] = None):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout if probe_timeout is not None else reset_timeout
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        self.short_circuited = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return STATE_HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """May this call go to ES? (counts the short circuit when not)"""
+        with self._lock:
+            if self._state == STATE_CLOSED:
+                return True
+            if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = STATE_HALF_OPEN
+                self._probe_in_flight = False
+            now = time.monotonic()
+            if self._state == STATE_HALF_OPEN and (
+                not self._probe_in_flight or now - self._probe_started >= self.probe_timeout
+            ):
+                self._probe_in_flight = True
+                self._probe_started = now
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != STATE_CLOSED:
+                logger.info(f"Circuit {self.name}: closed")
+            self._state = STATE_CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, error: Optional[BaseException] = None):
+        with self._lock:
+            self._failures += 1
+            self.last_error = f"{type(error).__name__}: {error}" if error is not None else None
+            if self._state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != STATE_OPEN:
+                    logger.warning(f"Circuit {self.name}: open for {self.reset_timeout}s ({self.last_error})")
+                self._state = STATE_OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "short_circuited": self.short_circuited,
+                "last_error": self.last_error,
+            }
+
+
+# Search/listing queries: a few failures in a row, then the local engine for a while
+es_search_breaker = CircuitBreaker(
+    "elasticsearch-search",
+    failure_threshold=int(os.getenv("ES_BREAKER_FAILURES", "3")),
+    reset_timeout=float(os.getenv("ES_BREAKER_RESET_SECONDS", "10")),
+)
+# Autocomplete fires on every keystroke: one slow suggest is enough to answer locally
+es_suggest_breaker = CircuitBreaker(
+    "elasticsearch-suggest",
+    failure_threshold=1,
+    reset_timeout=float(os.getenv("AUTOCOMPLETE_ES_RETRY_AFTER", "5")),
+)
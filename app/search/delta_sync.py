@@ -0,0 +1,239 @@
+"""
+Incremental (delta) product sync from PostgreSQL to Elasticsearch
+Driven by products.updated_at and the product_tombstones table, with the last
+synced position persisted in search_sync_state.
+
+- run_delta_sync(): index products changed / delete products removed since the watermark
+- run_checksum(): compare Postgres and ES per id bucket, repair the buckets that differ
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+import hashlib
+import logging
+import os
+
+from sqlalchemy import text
+from sqlalchemy.orm import selectinload
+
+from .elastic_client import get_es_client
+from .product_index import INDEX_NAME
+from .product_sync import map_product_to_es_doc, load_popularity
+
+logger = logging.getLogger(__name__)
+
+STREAM_NAME = "products"
+# Re-read this much before the watermark: a transaction that stamped updated_at before
+# the previous run started may have committed after it
+DELTA_OVERLAP_SECONDS = int(os.getenv("SEARCH_DELTA_OVERLAP_SECONDS", "60"))
+DELTA_CHUNK_SIZE = 500
+CHECKSUM_BUCKETS = 256
+
+_DB_NOW = text("SELECT now() at time zone 'utc'")
+
+
+def get_watermark(db, name: str = STREAM_NAME) -> Optional[datetime]:
+    from app.models.sqlalchemy import SearchSyncState
+    state = db.get(SearchSyncState, name)
+    return state.watermark if state else None
+
+
+def set_watermark(db, watermark: datetime, name: str = STREAM_NAME):
+    """Persist the watermark (upsert, commits)"""
+    db.execute(text("""
+        INSERT INTO search_sync_state (name, watermark, updated_at)
+        VALUES (:name, :watermark, now() at time zone 'utc')
+        ON CONFLICT (name) DO UPDATE SET watermark = EXCLUDED.watermark, updated_at = EXCLUDED.updated_at
+    """), {"name": name, "watermark": watermark})
+    db.commit()
+
+
+def _bulk(es, actions) -> tuple:
+    from elasticsearch.helpers import bulk
+    success, errors = bulk(es, actions, raise_on_error=False, chunk_size=DELTA_CHUNK_SIZE)
+    # Deleting something that is already gone is fine
+    failed = [e for e in errors if not ("delete" in e and e["delete"].get("status") == 404)]
+    return success, failed
+
+
+def index_products_by_ids(db, product_ids: list, es=None) -> dict:
+    """Index the given products from Postgres; ids no longer in Postgres are deleted"""
+    from app.models.sqlalchemy import Product
+    es = es or get_es_client()
+    indexed, deleted, failed = 0, 0, 0
+    for i in range(0, len(product_ids), DELTA_CHUNK_SIZE):
+        chunk = product_ids[i:i + DELTA_CHUNK_SIZE]
+        products = db.query(Product).options(selectinload(Product.categories)).filter(Product.id.in_(chunk)).all()
+        found = {p.id for p in products}
+        popularity = load_popularity(db, list(found))
+        actions = [
+            {"_op_type": "index", "_index": INDEX_NAME, "_id": str(p.id),
+             "_source": map_product_to_es_doc(p, popularity.get(p.id, 0))}
+            for p in products
+        ] + [
+            {"_op_type": "delete", "_index": INDEX_NAME, "_id": str(pid)}
+            for pid in chunk if pid not in found
+        ]
+        _, errors = _bulk(es, actions)
+        indexed += len(found)
+        deleted += len(chunk) - len(found)
+        failed += len(errors)
+    return {"indexed": indexed, "deleted": deleted, "failed": failed}
+
+
+def run_delta_sync(since: Optional[datetime] = None, dry_run: bool = False) -> dict:
+    """
+    Sync products changed since the persisted watermark (or `since`)
+    The new watermark is the DB clock at the start of the run, stored only when nothing failed.
+    Without any watermark yet, the current time is stored (run a full reindex first).
+    """
+    from app.db import get_db_session
+    from app.models.sqlalchemy import Product, ProductTombstone
+
+    db = get_db_session()
+    try:
+        run_started = db.execute(_DB_NOW).scalar()
+        watermark = since or get_watermark(db)
+        if watermark is None:
+            logger.info("[Delta Sync] No watermark yet - starting from now (run a full reindex first)")
+            if not dry_run:
+                set_watermark(db, run_started)
+            return {"success": True, "indexed": 0, "deleted": 0, "failed": 0, "watermark": run_started}
+
+        lower = watermark - timedelta(seconds=DELTA_OVERLAP_SECONDS)
+        es = get_es_client()
+
+        indexed, failed = 0, 0
+        query = (
+            db.query(Product)
+            .options(selectinload(Product.categories))
+            .filter(Product.updated_at > lower)
+            .order_by(Product.updated_at, Product.id)
+            .execution_options(stream_results=True)
+        )
+        def ship(products) -> int:
+            popularity = load_popularity(db, [p.id for p in products])
+            _, errors = _bulk(es, [
+                {"_op_type": "index", "_index": INDEX_NAME, "_id": str(p.id),
+                 "_source": map_product_to_es_doc(p, popularity.get(p.id, 0))}
+                for p in products
+            ])
+            return len(errors)
+
+        batch = []
+        for product in query.yield_per(DELTA_CHUNK_SIZE):
+            batch.append(product)
+            if len(batch) >= DELTA_CHUNK_SIZE:
+                if not dry_run:
+                    failed += ship(batch)
+                indexed += len(batch)
+                batch = []
+        if batch:
+            if not dry_run:
+                failed += ship(batch)
+            indexed += len(batch)
+
+        tombstones = [
+            pid for (pid,) in db.query(ProductTombstone.product_id).filter(ProductTombstone.deleted_at > lower)
+        ]
+        if tombstones and not dry_run:
+            _, errors = _bulk(es, [
+                {"_op_type": "delete", "_index": INDEX_NAME, "_id": str(pid)} for pid in tombstones
+            ])
+            failed += len(errors)
+
+        if failed == 0 and not dry_run:
+            set_watermark(db, run_started)
+
+        logger.info(
+            f"[Delta Sync] since {lower}: indexed {indexed}, deleted {len(tombstones)}, failed {failed}"
+        )
+        return {"success": failed == 0, "indexed": indexed, "deleted": len(tombstones),
+                "failed": failed, "watermark": run_started if failed == 0 else watermark}
+    except Exception as e:
+        db.rollback()
+        logger.error(f"[Delta Sync] Failed: {e}", exc_info=True)
+        return {"success": False, "error": str(e)}
+    finally:
+        db.close()
+
+
+def purge_tombstones(older_than_days: int = 7) -> int:
+    """Tombstones only matter until every sync has passed them"""
+    from app.db import get_db_session
+    db = get_db_session()
+    try:
+        result = db.execute(
+            text("DELETE FROM product_tombstones WHERE deleted_at < (now() at time zone 'utc') - make_interval(days => :days)"),
+            {"days": older_than_days}
+        )
+        db.commit()
+        return result.rowcount
+    finally:
+        db.close()
+
+
+# =====================
+# Checksum comparison
+# =====================
+
+def _bucket(product_id: int) -> int:
+    return product_id % CHECKSUM_BUCKETS
+
+
+def _digest(entries: dict) -> dict:
+    """{bucket: md5 of the sorted (id, updated_at) pairs in it}"""
+    buckets: dict = {}
+    for pid in sorted(entries):
+        buckets.setdefault(_bucket(pid), hashlib.md5()).update(f"{pid}:{entries[pid]};".encode())
+    return {b: h.hexdigest() for b, h in buckets.items()}
+
+
+def _normalize_ts(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def run_checksum(repair: bool = True) -> dict:
+    """
+    Compare (id, updated_at) between Postgres and ES bucket by bucket; for buckets that
+    differ, re-index missing/stale ids and delete ids that no longer exist in Postgres
+    """
+    from elasticsearch.helpers import scan
+    from app.db import get_db_session
+    from app.models.sqlalchemy import Product
+
+    db = get_db_session()
+    es = get_es_client()
+    try:
+        pg = {
+            pid: _normalize_ts(updated_at)
+            for pid, updated_at in db.query(Product.id, Product.updated_at)
+            .execution_options(stream_results=True).yield_per(5000)
+        }
+        es_docs = {}
+        for hit in scan(es, index=INDEX_NAME, query={"query": {"match_all": {}}}, _source=["updated_at"], size=5000):
+            es_docs[int(hit["_id"])] = _normalize_ts((hit.get("_source") or {}).get("updated_at"))
+
+        pg_digest, es_digest = _digest(pg), _digest(es_docs)
+        bad_buckets = {b for b in set(pg_digest) | set(es_digest) if pg_digest.get(b) != es_digest.get(b)}
+
+        stale = [pid for pid, ts in pg.items() if _bucket(pid) in bad_buckets and es_docs.get(pid) != ts]
+        extra = [pid for pid in es_docs if _bucket(pid) in bad_buckets and pid not in pg]
+
+        logger.info(
+            f"[Checksum] {len(pg)} rows vs {len(es_docs)} docs: {len(bad_buckets)}/{CHECKSUM_BUCKETS} buckets differ, "
+            f"{len(stale)} missing/stale, {len(extra)} extra"
+        )
+        repaired = {}
+        if repair and (stale or extra):
+            repaired = index_products_by_ids(db, stale + extra, es=es)
+        return {"success": True, "rows": len(pg), "docs": len(es_docs), "buckets_differ": len(bad_buckets),
+                "stale": len(stale), "extra": len(extra), "repaired": repaired}
+    except Exception as e:
+        logger.error(f"[Checksum] Failed: {e}", exc_info=True)
+        return {"success": False, "error": str(e)}
+    finally:
+        db.close()
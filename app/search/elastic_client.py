@@ -2,9 +2,13 @@
 Elasticsearch client module
 Provides singleton access to Elasticsearch connection
 Supports both local development and Elastic Cloud with API key
+
+- get_es_client(): sync client for scripts and sync code paths
+- get_async_es_client(): pooled AsyncElasticsearch for request handlers, opened/closed in the app lifespan
 """
-from elasticsearch import Elasticsearch
+from elasticsearch import Elasticsearch, AsyncElasticsearch
 from functools import lru_cache
+from typing import Optional
 import os
 import logging
 
@@ -12,6 +16,12 @@ logger = logging.getLogger(__name__)
 
 ELASTIC_URL = os.getenv("ELASTICSEARCH_URL", "http://localhost:9200")
 ELASTIC_API_KEY = os.getenv("ELASTICSEARCH_API_KEY")  # For Elastic Cloud
+# Keep-alive connections per ES node for the async client (concurrent searches per worker)
+ELASTIC_MAX_CONNECTIONS = int(os.getenv("ELASTICSEARCH_MAX_CONNECTIONS", "20"))
+# Search requests should fail fast rather than hold a request for a minute
+ELASTIC_ASYNC_TIMEOUT = float(os.getenv("ELASTICSEARCH_ASYNC_TIMEOUT", "10"))
+
+_async_client: Optional[AsyncElasticsearch] = None
 
 
 @lru_cache(maxsize=1)
@@ -59,6 +69,55 @@ def get_es_client() -> Elasticsearch:
         raise
 
 
+def _build_async_client() -> AsyncElasticsearch:
+    options = {
+        "request_timeout": ELASTIC_ASYNC_TIMEOUT,
+        "retry_on_timeout": True,
+        "max_retries": 2,
+        "connections_per_node": ELASTIC_MAX_CONNECTIONS,
+    }
+    if ELASTIC_API_KEY:
+        return AsyncElasticsearch(ELASTIC_URL, api_key=ELASTIC_API_KEY, verify_certs=True, **options)
+    return AsyncElasticsearch(ELASTIC_URL, **options)
+
+
+async def init_async_es_client() -> AsyncElasticsearch:
+    """Create the async client - call this on app startup"""
+    global _async_client
+    if _async_client is None:
+        _async_client = _build_async_client()
+        try:
+            if await _async_client.ping():
+                logger.info(f"Async Elasticsearch client connected to {ELASTIC_URL}")
+            else:
+                logger.warning(f"Elasticsearch ping failed at {ELASTIC_URL}")
+        except Exception as e:
+            # Don't fail startup - requests will retry against the same pooled client
+            logger.error(f"Failed to reach Elasticsearch: {e}")
+    return _async_client
+
+
+def get_async_es_client() -> AsyncElasticsearch:
+    """
+    Get the AsyncElasticsearch singleton (created lazily when used outside the app lifespan)
+    
+    Returns:
+        AsyncElasticsearch: pooled async client
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = _build_async_client()
+    return _async_client
+
+
+async def close_async_es_client():
+    """Close the async client's connection pool - call this on app shutdown"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+
 def check_es_health() -> dict:
     """
     Check Elasticsearch cluster health
@@ -77,3 +136,23 @@ def check_es_health() -> dict:
     except Exception as e:
         logger.error(f"Failed to check ES health: {e}")
         return {"status": "unavailable", "error": str(e)}
+
+
+async def check_es_health_async() -> dict:
+    """
+    Check Elasticsearch cluster health without blocking the event loop
+    Returns:
+        dict: Health status information
+    """
+    try:
+        es = get_async_es_client()
+        health = await es.cluster.health()
+        return {
+            "status": health["status"],
+            "cluster_name": health["cluster_name"],
+            "number_of_nodes": health["number_of_nodes"],
+            "active_shards": health["active_shards"],
+        }
+    except Exception as e:
+        logger.error(f"Failed to check ES health: {e}")
+        return {"status": "unavailable", "error": str(e)}
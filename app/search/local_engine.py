@@ -0,0 +1,416 @@
+"""
+In-process product search engine - serves search_products / read_products while
+Elasticsearch is unavailable (es_search_breaker, see app.search.circuit_breaker)
+
+- Inverted index over product_name, blurb, description and ingredients, analyzed like
+  vietnamese_analyzer (text_analysis.tokenize); a term scores with the boost of the best
+  field it occurs in (multi_match best_fields), times idf
+- Name terms also match by prefix (product_name.autocomplete) and unknown query terms
+  fall back to AUTO-fuzziness edits; 75% of the query terms must match
+- Categorical filters are int bitmaps (bit = slot): product_type, category, manufacturer,
+  certification tokens, on_sale
+- price / created_at live in flat arrays; sorted walks use cached slot permutations
+
+Responses mimic the ES search response ({"hits": {"total", "hits"}, "took"}), with ES-style
+sort values, so the router formats them and builds cursors the same way.
+Kept current by product_sync_events (see app.search.sync_events).
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from math import log
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+import time
+
+from .text_analysis import tokenize
+
+logger = logging.getLogger(__name__)
+
+FIELD_BOOSTS = {"product_name": 4.0, "blurb": 2.0, "description": 2.0, "ingredients": 1.0}
+NAME_PREFIX_BOOST = 3.0
+MIN_PREFIX_LENGTH = 2
+MINIMUM_SHOULD_MATCH = 0.75
+# Fields the router needs to format a hit (format_search_hits)
+HIT_FIELDS = (
+    "id", "product_name", "slug", "product_type", "price", "sale_price", "stock",
+    "image_url", "blurb", "has_sale", "discount_percentage",
+)
+_TIEBREAKER = [{"created_at": {"order": "desc"}}, {"id": {"order": "asc"}}]
+
+
+def _epoch_ms(value: Optional[str]) -> int:
+    if not value:
+        return 0
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        # Naive timestamps are UTC (as ES reads them)
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def _fuzzy_edits(term: str) -> int:
+    """ES fuzziness AUTO: exact up to 2 chars, 1 edit up to 5, then 2"""
+    return 0 if len(term) < 3 else 1 if len(term) <= 5 else 2
+
+
+def _within_edits(a: str, b: str, max_edits: int) -> bool:
+    """Levenshtein distance <= max_edits (row minimum lets it stop early)"""
+    if abs(len(a) - len(b)) > max_edits:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > max_edits:
+            return False
+        previous = current
+    return previous[-1] <= max_edits
+
+
+def _set_bit(bitmaps: Dict[str, int], key: str, slot: int):
+    bitmaps[key] = bitmaps.get(key, 0) | (1 << slot)
+
+
+def _clear_bit(bitmaps: Dict[str, int], key: str, slot: int):
+    remaining = bitmaps.get(key, 0) & ~(1 << slot)
+    if remaining:
+        bitmaps[key] = remaining
+    else:
+        bitmaps.pop(key, None)
+
+
+class _IndexData:
+    """One generation of the index (rebuild fills a new one and swaps it in)"""
+
+    def __init__(self):
+        self.slot_of: Dict[int, int] = {}
+        self.free: List[int] = []
+        self.hits: List[Optional[dict]] = []
+        # slot -> (postings terms, name terms, types/categories/... keys) for removal
+        self.keys: List[Optional[tuple]] = []
+        self.price = array("d")
+        self.created = array("q")
+        self.ids: List[str] = []
+        self.alive = 0
+        self.sale = 0
+        self.types: Dict[str, int] = {}
+        self.categories: Dict[str, int] = {}
+        self.manufacturers: Dict[str, int] = {}
+        self.certifications: Dict[str, int] = {}
+        # term -> {slot: best field boost}
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self.name_postings: Dict[str, set] = {}
+        # Derived lazily, dropped on every change
+        self.name_vocab: Optional[List[str]] = None
+        self.orders: Dict[tuple, Tuple[List[int], List[tuple]]] = {}
+
+    def add(self, doc: dict):
+        product_id = int(doc["id"])
+        self.remove(product_id)
+        if self.free:
+            slot = self.free.pop()
+        else:
+            slot = len(self.hits)
+            self.hits.append(None)
+            self.keys.append(None)
+            self.price.append(0.0)
+            self.created.append(0)
+            self.ids.append("")
+        self.slot_of[product_id] = slot
+        self.hits[slot] = {field: doc.get(field) for field in HIT_FIELDS}
+        self.price[slot] = float(doc.get("price") or 0.0)
+        self.created[slot] = _epoch_ms(doc.get("created_at"))
+        self.ids[slot] = str(product_id)
+
+        bit = 1 << slot
+        self.alive |= bit
+        if doc.get("has_sale"):
+            self.sale |= bit
+
+        product_type = doc.get("product_type")
+        categories = tuple(doc.get("categories") or ())
+        manufacturer = doc.get("manufacturer")
+        cert_tokens = tuple(set(tokenize(doc.get("certifications") or "")))
+        if product_type:
+            _set_bit(self.types, product_type, slot)
+        for category in categories:
+            _set_bit(self.categories, category, slot)
+        if manufacturer:
+            _set_bit(self.manufacturers, manufacturer, slot)
+        for token in cert_tokens:
+            _set_bit(self.certifications, token, slot)
+
+        weights: Dict[str, float] = {}
+        for field, boost in FIELD_BOOSTS.items():
+            for term in tokenize(doc.get(field) or ""):
+                if boost > weights.get(term, 0.0):
+                    weights[term] = boost
+        for term, weight in weights.items():
+            self.postings.setdefault(term, {})[slot] = weight
+        name_terms = tuple(set(tokenize(doc.get("product_name") or "")))
+        for term in name_terms:
+            self.name_postings.setdefault(term, set()).add(slot)
+
+        self.keys[slot] = (tuple(weights), name_terms, product_type, categories, manufacturer, cert_tokens)
+        self._changed()
+
+    def remove(self, product_id: int):
+        slot = self.slot_of.pop(product_id, None)
+        if slot is None:
+            return
+        terms, name_terms, product_type, categories, manufacturer, cert_tokens = self.keys[slot]
+        for term in terms:
+            postings = self.postings[term]
+            postings.pop(slot, None)
+            if not postings:
+                del self.postings[term]
+        for term in name_terms:
+            slots = self.name_postings[term]
+            slots.discard(slot)
+            if not slots:
+                del self.name_postings[term]
+        if product_type:
+            _clear_bit(self.types, product_type, slot)
+        for category in categories:
+            _clear_bit(self.categories, category, slot)
+        if manufacturer:
+            _clear_bit(self.manufacturers, manufacturer, slot)
+        for token in cert_tokens:
+            _clear_bit(self.certifications, token, slot)
+        mask = ~(1 << slot)
+        self.alive &= mask
+        self.sale &= mask
+        self.hits[slot] = None
+        self.keys[slot] = None
+        self.free.append(slot)
+        self._changed()
+
+    def _changed(self):
+        self.name_vocab = None
+        self.orders = {}
+
+
+class LocalSearchEngine:
+    """Sync event handler (apply/rebuild) + ES-shaped search over _IndexData"""
+
+    def __init__(self):
+        self._data = _IndexData()
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._data.slot_of)
+
+    # =====================
+    # Updates
+    # =====================
+
+    def rebuild(self, docs: Iterable[dict]):
+        data = _IndexData()
+        for doc in docs:
+            data.add(doc)
+        self._data = data
+        self.loaded = True
+
+    def apply(self, docs: Dict[int, Optional[dict]]):
+        """Sync event handler: {product_id: doc or None when deleted}"""
+        for product_id, doc in docs.items():
+            if doc is None:
+                self._data.remove(product_id)
+            else:
+                self._data.add(doc)
+
+    def stats(self) -> dict:
+        data = self._data
+        return {"loaded": self.loaded, "products": len(data.slot_of), "terms": len(data.postings)}
+
+    # =====================
+    # Search
+    # =====================
+
+    def search(
+        self,
+        q: Optional[str] = None,
+        product_type: Optional[str] = None,
+        category: Optional[str] = None,
+        manufacturer: Optional[str] = None,
+        certification: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        on_sale: Optional[bool] = None,
+        sort: Optional[list] = None,
+        offset: int = 0,
+        size: int = 20,
+        search_after: Optional[list] = None,
+    ) -> dict:
+        """
+        Same filters as build_search_query; sort is a build_search_sort clause list
+        (created_at desc + id asc are always appended so the order is total)
+        """
+        started = time.perf_counter()
+        data = self._data
+
+        mask = data.alive
+        if product_type:
+            mask &= data.types.get(product_type, 0)
+        if category:
+            mask &= data.categories.get(category, 0)
+        if manufacturer:
+            mask &= data.manufacturers.get(manufacturer, 0)
+        if certification:
+            any_token = 0
+            for token in tokenize(certification):
+                any_token |= data.certifications.get(token, 0)
+            mask &= any_token
+        if on_sale:
+            mask &= data.sale
+
+        price = data.price
+        price_filtered = min_price is not None or max_price is not None
+        low = min_price if min_price is not None else float("-inf")
+        high = max_price if max_price is not None else float("inf")
+
+        spec = self._sort_spec(sort or [], scored=bool(q))
+        scores = self._score(data, q, mask) if q else None
+
+        if scores is not None:
+            slots = [s for s in scores if not price_filtered or low <= price[s] <= high]
+            keyed = sorted((self._key(data, spec, s, scores[s]), s) for s in slots)
+            keys = [k for k, _ in keyed]
+            ordered = [s for _, s in keyed]
+            start = bisect_right(keys, self._after_key(spec, search_after)) if search_after else offset
+            page = ordered[start:start + size]
+            total = len(ordered)
+        else:
+            order, keys = self._order(data, spec)
+            in_range = lambda slot: (mask >> slot) & 1 and (not price_filtered or low <= price[slot] <= high)
+            if search_after:
+                walk, skip = order[bisect_right(keys, self._after_key(spec, search_after)):], 0
+            else:
+                walk, skip = order, offset
+            page = []
+            for slot in walk:
+                if not in_range(slot):
+                    continue
+                if skip:
+                    skip -= 1
+                    continue
+                page.append(slot)
+                if len(page) >= size:
+                    break
+            if price_filtered:
+                total = sum(1 for slot in order if (mask >> slot) & 1 and low <= price[slot] <= high)
+            else:
+                total = mask.bit_count()
+
+        hits = []
+        for slot in page:
+            score = scores[slot] if scores is not None else 1.0
+            hits.append({
+                "_id": data.ids[slot],
+                "_score": score,
+                "_source": data.hits[slot],
+                "sort": self._sort_values(data, spec, slot, score),
+            })
+        return {
+            "took": int((time.perf_counter() - started) * 1000),
+            "hits": {"total": {"value": total}, "hits": hits},
+        }
+
+    @staticmethod
+    def _sort_spec(sort: list, scored: bool) -> List[Tuple[str, bool]]:
+        """[(field, descending)] ending in the created_at/id tiebreaker"""
+        spec = []
+        for clause in sort + _TIEBREAKER:
+            field, options = next(iter(clause.items()))
+            descending = options.get("order") == "desc"
+            if field == "_score" and not scored:
+                continue
+            if all(f != field for f, _ in spec):
+                spec.append((field, descending))
+        return spec
+
+    @staticmethod
+    def _sort_values(data: _IndexData, spec, slot: int, score: float) -> list:
+        """ES-style sort values: price as float, created_at in epoch ms, id as the keyword string"""
+        values = {"_score": score, "price": data.price[slot], "created_at": data.created[slot], "id": data.ids[slot]}
+        return [values[field] for field, _ in spec]
+
+    @staticmethod
+    def _comparable(spec, values: list) -> tuple:
+        # Every field except the id is numeric: negate for descending
+        return tuple(
+            (-value if descending else value) if field != "id" else str(value)
+            for (field, descending), value in zip(spec, values)
+        )
+
+    def _key(self, data: _IndexData, spec, slot: int, score: float) -> tuple:
+        return self._comparable(spec, self._sort_values(data, spec, slot, score))
+
+    def _after_key(self, spec, search_after: list) -> tuple:
+        if len(search_after) != len(spec):
+            raise ValueError("search_after does not match the sort")
+        return self._comparable(spec, search_after)
+
+    def _order(self, data: _IndexData, spec) -> Tuple[List[int], List[tuple]]:
+        """All live slots sorted by spec (cached until the next change)"""
+        cache_key = tuple(spec)
+        cached = data.orders.get(cache_key)
+        if cached is None:
+            keyed = sorted((self._key(data, spec, slot, 1.0), slot) for slot in data.slot_of.values())
+            cached = ([slot for _, slot in keyed], [key for key, _ in keyed])
+            data.orders[cache_key] = cached
+        return cached
+
+    def _score(self, data: _IndexData, q: str, mask: int) -> Dict[int, float]:
+        terms = list(dict.fromkeys(tokenize(q)))
+        if not terms:
+            return {slot: 1.0 for slot in data.slot_of.values() if (mask >> slot) & 1}
+        documents = max(1, len(data.slot_of))
+        required = max(1, int(len(terms) * MINIMUM_SHOULD_MATCH))
+        scores: Dict[int, float] = {}
+        matched: Dict[int, int] = {}
+
+        for term in terms:
+            term_scores: Dict[int, float] = {}
+            variants = [term] if term in data.postings else self._fuzzy_variants(data, term)
+            for variant in variants:
+                postings = data.postings[variant]
+                idf = log(1 + documents / len(postings))
+                for slot, weight in postings.items():
+                    term_scores[slot] = max(term_scores.get(slot, 0.0), weight * idf)
+            if len(term) >= MIN_PREFIX_LENGTH:
+                for variant in self._name_prefix_variants(data, term):
+                    slots = data.name_postings[variant]
+                    idf = log(1 + documents / len(slots))
+                    for slot in slots:
+                        term_scores[slot] = max(term_scores.get(slot, 0.0), NAME_PREFIX_BOOST * idf)
+            for slot, score in term_scores.items():
+                if (mask >> slot) & 1:
+                    scores[slot] = scores.get(slot, 0.0) + score
+                    matched[slot] = matched.get(slot, 0) + 1
+
+        return {slot: round(score, 4) for slot, score in scores.items() if matched[slot] >= required}
+
+    @staticmethod
+    def _name_prefix_variants(data: _IndexData, prefix: str) -> List[str]:
+        if data.name_vocab is None:
+            data.name_vocab = sorted(data.name_postings)
+        vocab = data.name_vocab
+        start = bisect_left(vocab, prefix)
+        end = bisect_left(vocab, prefix + "\uffff", start)
+        return vocab[start:end]
+
+    @staticmethod
+    def _fuzzy_variants(data: _IndexData, term: str) -> List[str]:
+        edits = _fuzzy_edits(term)
+        if not edits:
+            return []
+        return [
+            candidate for candidate in data.postings
+            if candidate[:1] == term[:1] and _within_edits(term, candidate, edits)
+        ]
+
+
+local_search_engine = LocalSearchEngine()
@@ -0,0 +1,144 @@
+"""
+In-process prefix index of product names - the autocomplete fallback when Elasticsearch
+is slow or down
+
+Keys are the same inputs the completion suggester gets (suggest_inputs: the full name
+and the name from each later word), folded like suggest_analyzer. They live in one sorted
+list, so a prefix is a bisect range; results are the highest-popularity products in it.
+The most common case, a 2-character prefix on the first keystrokes, is precomputed.
+
+Kept current by product_sync_events (see app.search.sync_events).
+"""
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+import heapq
+import logging
+
+from .product_sync import suggest_inputs
+from .text_analysis import normalize_phrase
+
+logger = logging.getLogger(__name__)
+
+TOP_PREFIX_LENGTH = 2
+TOP_K = 10
+_RANGE_END = "\uffff"
+
+
+class PrefixIndex:
+    """Sorted (key, product_id) pairs plus the display data per product"""
+
+    # Rebuilt from names only (see sync_events.NAME_DOC_FIELDS)
+    doc_fields = ("id", "product_name", "product_type", "popularity")
+
+    def __init__(self, top_prefix_length: int = TOP_PREFIX_LENGTH, top_k: int = TOP_K):
+        self.top_prefix_length = top_prefix_length
+        self.top_k = top_k
+        self._keys: List[Tuple[str, int]] = []
+        # product_id -> (keys, name, product_type, popularity)
+        self._entries: Dict[int, Tuple[List[str], str, Optional[str], int]] = {}
+        # short prefix -> product ids by popularity (top_k)
+        self._top: Dict[str, List[int]] = {}
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _entry(doc: dict) -> Tuple[List[str], str, Optional[str], int]:
+        keys = sorted({normalize_phrase(i) for i in suggest_inputs(doc.get("product_name"))} - {""})
+        return keys, doc.get("product_name"), doc.get("product_type"), int(doc.get("popularity") or 0)
+
+    def _rank(self, product_id: int) -> Tuple[int, int]:
+        # Popularity, then the newer product
+        return self._entries[product_id][3], product_id
+
+    def _best(self, product_ids: Iterable[int], n: int) -> List[int]:
+        return heapq.nlargest(n, set(product_ids), key=self._rank)
+
+    def _ids_in_range(self, prefix: str) -> Iterable[int]:
+        start = bisect_left(self._keys, (prefix,))
+        end = bisect_left(self._keys, (prefix + _RANGE_END,), start)
+        return (pid for _, pid in self._keys[start:end])
+
+    def _top_prefixes(self, keys: Iterable[str]) -> set:
+        return {key[:self.top_prefix_length] for key in keys if len(key) >= self.top_prefix_length}
+
+    def _refresh_top(self, prefixes: Iterable[str]):
+        for prefix in prefixes:
+            best = self._best(self._ids_in_range(prefix), self.top_k)
+            if best:
+                self._top[prefix] = best
+            else:
+                self._top.pop(prefix, None)
+
+    # =====================
+    # Updates
+    # =====================
+
+    def rebuild(self, docs: Iterable[dict]):
+        """Replace the whole index (built aside, then swapped in)"""
+        entries = {int(doc["id"]): self._entry(doc) for doc in docs}
+        keys = sorted((key, pid) for pid, entry in entries.items() for key in entry[0])
+        groups: Dict[str, set] = {}
+        for pid, entry in entries.items():
+            for prefix in self._top_prefixes(entry[0]):
+                groups.setdefault(prefix, set()).add(pid)
+        rank = lambda pid: (entries[pid][3], pid)
+        top = {prefix: heapq.nlargest(self.top_k, pids, key=rank) for prefix, pids in groups.items()}
+        self._keys, self._entries, self._top = keys, entries, top
+        self.loaded = True
+
+    def remove(self, product_id: int):
+        entry = self._entries.pop(product_id, None)
+        if entry is None:
+            return
+        for key in entry[0]:
+            i = bisect_left(self._keys, (key, product_id))
+            if i < len(self._keys) and self._keys[i] == (key, product_id):
+                del self._keys[i]
+        self._refresh_top(self._top_prefixes(entry[0]))
+
+    def upsert(self, doc: dict):
+        product_id = int(doc["id"])
+        self.remove(product_id)
+        entry = self._entry(doc)
+        self._entries[product_id] = entry
+        for key in entry[0]:
+            insort(self._keys, (key, product_id))
+        self._refresh_top(self._top_prefixes(entry[0]))
+
+    def apply(self, docs: Dict[int, Optional[dict]]):
+        """Sync event handler: {product_id: doc or None when deleted}"""
+        for product_id, doc in docs.items():
+            if doc is None:
+                self.remove(product_id)
+            else:
+                self.upsert(doc)
+
+    # =====================
+    # Lookup
+    # =====================
+
+    def suggest(self, query: str, limit: int = 5) -> List[dict]:
+        """Most popular products with a name (or a later part of it) starting with the query"""
+        prefix = normalize_phrase(query)
+        if not prefix:
+            return []
+        if len(prefix) == self.top_prefix_length and limit <= self.top_k:
+            ids = self._top.get(prefix, [])
+        else:
+            ids = self._best(self._ids_in_range(prefix), limit * 2)
+
+        suggestions, seen = [], set()
+        for pid in ids:
+            _, name, product_type, _ = self._entries[pid]
+            if name in seen:
+                continue
+            seen.add(name)
+            suggestions.append({"name": name, "type": product_type})
+            if len(suggestions) >= limit:
+                break
+        return suggestions
+
+
+suggestion_index = PrefixIndex()
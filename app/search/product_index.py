@@ -3,14 +3,20 @@ Product index configuration and management for Elasticsearch
 Includes Vietnamese text analyzer support
 """
 from elasticsearch import NotFoundError
-from .elastic_client import get_es_client
+from .elastic_client import get_es_client, get_async_es_client
 import os
 import logging
 
 logger = logging.getLogger(__name__)
 
+# INDEX_NAME is an alias: readers and writers use it, the data lives in INDEX_NAME_v{N}
+# so a rebuild can happen next to the live index and be swapped in atomically
 INDEX_NAME = os.getenv("ELASTICSEARCH_INDEX_PRODUCTS", "products")
 
+# Settings applied while a fresh version is bulk loaded (restored before the alias swap)
+BULK_LOAD_SETTINGS = {"refresh_interval": "-1", "number_of_replicas": 0}
+SERVING_REPLICAS = int(os.getenv("ELASTICSEARCH_INDEX_REPLICAS", "1"))
+
 # Vietnamese-optimized index mapping with custom analyzer
 PRODUCT_INDEX_MAPPING = {
     "settings": {
@@ -31,6 +37,12 @@ PRODUCT_INDEX_MAPPING = {
                     "type": "custom",
                     "tokenizer": "edge_ngram_tokenizer",
                     "filter": ["lowercase", "asciifolding"]
+                },
+                # Completion suggester input/query analysis (same folding as the local prefix index)
+                "suggest_analyzer": {
+                    "type": "custom",
+                    "tokenizer": "standard",
+                    "filter": ["lowercase", "asciifolding"]
                 }
             },
             "tokenizer": {
@@ -107,43 +119,189 @@ PRODUCT_INDEX_MAPPING = {
             
             # Computed fields
             "has_sale": {"type": "boolean"},
-            "discount_percentage": {"type": "float"}
+            "discount_percentage": {"type": "float"},
+            
+            # Category names (search filter) and the Postgres change timestamp (delta sync checksum)
+            "categories": {"type": "keyword"},
+            "updated_at": {"type": "date"},
+            
+            # Autocomplete: completion suggester weighted by units sold
+            "popularity": {"type": "integer"},
+            "suggest": {
+                "type": "completion",
+                "analyzer": "suggest_analyzer",
+                "max_input_length": 100
+            }
         }
     }
 }
 
 
+def versioned_index_name(version: int) -> str:
+    return f"{INDEX_NAME}_v{version}"
+
+
+def get_index_versions(es=None) -> dict:
+    """
+    Existing versioned indices
+    Returns:
+        dict: {version: index_name}
+    """
+    es = es or get_es_client()
+    versions = {}
+    prefix = f"{INDEX_NAME}_v"
+    for name in es.indices.get(index=f"{prefix}*", ignore_unavailable=True, allow_no_indices=True):
+        suffix = name[len(prefix):]
+        if suffix.isdigit():
+            versions[int(suffix)] = name
+    return versions
+
+
+def get_alias_targets(es=None) -> list:
+    """Indices the INDEX_NAME alias currently points to"""
+    es = es or get_es_client()
+    if not es.indices.exists_alias(name=INDEX_NAME):
+        return []
+    return list(es.indices.get_alias(name=INDEX_NAME).keys())
+
+
+def create_versioned_index(version: int, bulk_load: bool = False, es=None) -> str:
+    """
+    Create INDEX_NAME_v{version} with the current mapping
+    bulk_load=True disables refresh and replicas until finish_bulk_load() is called
+    (falls back to default settings where the cluster doesn't allow them, e.g. Serverless)
+    """
+    es = es or get_es_client()
+    name = versioned_index_name(version)
+    settings = dict(PRODUCT_INDEX_MAPPING["settings"])
+    if bulk_load:
+        try:
+            es.indices.create(index=name, mappings=PRODUCT_INDEX_MAPPING["mappings"],
+                              settings={**settings, **BULK_LOAD_SETTINGS})
+            return name
+        except Exception as e:
+            logger.warning(f"Bulk-load settings rejected ({e}), creating {name} with defaults")
+    es.indices.create(index=name, mappings=PRODUCT_INDEX_MAPPING["mappings"], settings=settings)
+    return name
+
+
+def finish_bulk_load(index: str, es=None):
+    """Restore serving settings on a freshly loaded index and make its documents visible"""
+    es = es or get_es_client()
+    try:
+        es.indices.put_settings(
+            index=index,
+            settings={"index": {"refresh_interval": None, "number_of_replicas": SERVING_REPLICAS}}
+        )
+    except Exception as e:
+        logger.warning(f"Could not restore serving settings on {index}: {e}")
+    es.indices.refresh(index=index)
+
+
+def swap_alias(new_index: str, es=None) -> list:
+    """
+    Point INDEX_NAME at new_index in one atomic update_aliases call
+    A legacy concrete index named INDEX_NAME is removed in the same call.
+    Returns the indices the alias pointed to before.
+    """
+    es = es or get_es_client()
+    previous = get_alias_targets(es)
+    actions = [{"remove": {"index": index, "alias": INDEX_NAME}} for index in previous if index != new_index]
+    if not previous and es.indices.exists(index=INDEX_NAME):
+        # Pre-alias deployment: INDEX_NAME is a real index
+        actions.append({"remove_index": {"index": INDEX_NAME}})
+    actions.append({"add": {"index": new_index, "alias": INDEX_NAME, "is_write_index": True}})
+    es.indices.update_aliases(actions=actions)
+    logger.info(f"Alias {INDEX_NAME} -> {new_index} (was {previous or 'none'})")
+    return previous
+
+
+def cleanup_old_indices(keep: int = 1, es=None) -> list:
+    """Delete versioned indices not behind the alias, keeping the newest `keep` for rollback"""
+    es = es or get_es_client()
+    live = set(get_alias_targets(es))
+    old = [name for version, name in sorted(get_index_versions(es).items(), reverse=True) if name not in live]
+    to_delete = old[keep:]
+    for name in to_delete:
+        es.indices.delete(index=name)
+        logger.info(f"Deleted old index {name}")
+    return to_delete
+
+
 def ensure_product_index():
     """
-    Create product index if it doesn't exist
+    Create product index (INDEX_NAME_v1 behind the INDEX_NAME alias) if it doesn't exist
     Safe to call multiple times (idempotent)
     """
     try:
         es = get_es_client()
         
         if not es.indices.exists(index=INDEX_NAME):
-            logger.info(f"Creating index: {INDEX_NAME}")
-            es.indices.create(
-                index=INDEX_NAME,
+            logger.info(f"Creating index: {versioned_index_name(1)}")
+            create_versioned_index(1, es=es)
+            swap_alias(versioned_index_name(1), es=es)
+            logger.info(f"Index {INDEX_NAME} created successfully")
+        else:
+            logger.info(f"Index {INDEX_NAME} already exists")
+            # New fields are additive - put them on the live index
+            try:
+                es.indices.put_mapping(index=INDEX_NAME, properties=PRODUCT_INDEX_MAPPING["mappings"]["properties"])
+            except Exception as e:
+                logger.warning(f"{INDEX_NAME} mapping is out of date ({e}) - run scripts/reindex_products.py --blue-green")
+            
+    except Exception as e:
+        logger.error(f"Failed to ensure product index: {e}")
+        # Don't raise - allow app to start even if ES is down
+
+
+async def ensure_product_index_async():
+    """
+    Async variant of ensure_product_index for the app lifespan
+    Safe to call multiple times (idempotent)
+    """
+    try:
+        es = get_async_es_client()
+        
+        if not await es.indices.exists(index=INDEX_NAME):
+            name = versioned_index_name(1)
+            logger.info(f"Creating index: {name}")
+            await es.indices.create(
+                index=name,
                 mappings=PRODUCT_INDEX_MAPPING["mappings"],
                 settings=PRODUCT_INDEX_MAPPING["settings"]
             )
+            await es.indices.update_aliases(
+                actions=[{"add": {"index": name, "alias": INDEX_NAME, "is_write_index": True}}]
+            )
             logger.info(f"Index {INDEX_NAME} created successfully")
         else:
             logger.info(f"Index {INDEX_NAME} already exists")
+            # New fields are additive - put them on the live index. Fields that need new
+            # analyzers (e.g. suggest) only arrive with a blue/green reindex.
+            try:
+                await es.indices.put_mapping(
+                    index=INDEX_NAME, properties=PRODUCT_INDEX_MAPPING["mappings"]["properties"]
+                )
+            except Exception as e:
+                logger.warning(f"{INDEX_NAME} mapping is out of date ({e}) - run scripts/reindex_products.py --blue-green")
             
     except Exception as e:
         logger.error(f"Failed to ensure product index: {e}")
         # Don't raise - allow app to start even if ES is down
-        
+
 
 def delete_product_index():
     """
-    Delete product index (use for testing/reset)
+    Delete product index - every version behind the alias (use for testing/reset)
     """
     try:
         es = get_es_client()
-        if es.indices.exists(index=INDEX_NAME):
+        targets = get_alias_targets(es)
+        if targets:
+            for index in targets:
+                es.indices.delete(index=index)
+                logger.info(f"Deleted index: {index}")
+        elif es.indices.exists(index=INDEX_NAME):
             es.indices.delete(index=INDEX_NAME)
             logger.info(f"Deleted index: {INDEX_NAME}")
     except Exception as e:
@@ -159,10 +317,32 @@ def get_index_stats():
     try:
         es = get_es_client()
         stats = es.indices.stats(index=INDEX_NAME)
+        # INDEX_NAME is an alias - stats are keyed by the concrete index behind it
+        index_name, index_stats = next(iter(stats["indices"].items()))
+        return {
+            "index_name": index_name,
+            "doc_count": index_stats["total"]["docs"]["count"],
+            "store_size": index_stats["total"]["store"]["size_in_bytes"],
+        }
+    except Exception as e:
+        logger.error(f"Failed to get index stats: {e}")
+        return {"error": str(e)}
+
+
+async def get_index_stats_async():
+    """
+    Get statistics about the product index (async client)
+    Returns:
+        dict: Index statistics including doc count
+    """
+    try:
+        es = get_async_es_client()
+        stats = await es.indices.stats(index=INDEX_NAME)
+        index_name, index_stats = next(iter(stats["indices"].items()))
         return {
-            "index_name": INDEX_NAME,
-            "doc_count": stats["indices"][INDEX_NAME]["total"]["docs"]["count"],
-            "store_size": stats["indices"][INDEX_NAME]["total"]["store"]["size_in_bytes"],
+            "index_name": index_name,
+            "doc_count": index_stats["total"]["docs"]["count"],
+            "store_size": index_stats["total"]["store"]["size_in_bytes"],
         }
     except Exception as e:
         logger.error(f"Failed to get index stats: {e}")
@@ -2,20 +2,88 @@
 Product synchronization utilities for Elasticsearch
 Handles indexing, updating, and deletion of products in ES with proper error handling
 """
-from .elastic_client import get_es_client
+from .elastic_client import get_es_client, get_async_es_client
 from .product_index import INDEX_NAME
+from .text_analysis import fold
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import json
+import os
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Units sold per product (orders that went through payment) - the autocomplete weight
+_POPULARITY_SQL = """
+    SELECT oi.product_id, SUM(oi.quantity)
+    FROM order_items oi
+    JOIN orders o ON o.id = oi.order_id
+    WHERE o.status NOT IN ('pending', 'cancelled', 'refunded') {filter}
+    GROUP BY oi.product_id
+"""
+SUGGEST_MAX_WORD_OFFSET = 4
+
+
+def _popularity_query(product_ids):
+    from sqlalchemy import text, bindparam
+    if product_ids is None:
+        return text(_POPULARITY_SQL.format(filter="")), {}
+    query = text(_POPULARITY_SQL.format(filter="AND oi.product_id IN :ids")).bindparams(
+        bindparam("ids", expanding=True)
+    )
+    return query, {"ids": list(product_ids)}
+
+
+def load_popularity(db, product_ids: Optional[list] = None) -> Dict[int, int]:
+    """{product_id: units sold} for the given products (all products when None)"""
+    if product_ids is not None and not product_ids:
+        return {}
+    query, params = _popularity_query(product_ids)
+    return {pid: int(units or 0) for pid, units in db.execute(query, params)}
+
+
+async def load_popularity_async(session, product_ids: Optional[list] = None) -> Dict[int, int]:
+    """load_popularity on an AsyncSession"""
+    if product_ids is not None and not product_ids:
+        return {}
+    query, params = _popularity_query(product_ids)
+    return {pid: int(units or 0) for pid, units in await session.execute(query, params)}
+
+
+def _session_popularity(products: list) -> Dict[int, int]:
+    """Popularity through the session the products were loaded with (empty if detached)"""
+    from sqlalchemy.orm import object_session
+    session = object_session(products[0]) if products else None
+    if session is None:
+        return {}
+    try:
+        return load_popularity(session, [p.id for p in products])
+    except Exception as e:
+        logger.warning(f"Could not load product popularity: {e}")
+        return {}
+
+
+def suggest_inputs(name: Optional[str]) -> List[str]:
+    """
+    Completion inputs for a product name: the full name plus the name from each of the
+    next few words, so "c 1000" also suggests "Vitamin C 1000"
+    """
+    if not name:
+        return []
+    words = name.split()
+    inputs = [" ".join(words[i:]) for i in range(min(len(words), SUGGEST_MAX_WORD_OFFSET + 1))]
+    return list(dict.fromkeys(i for i in inputs if len(fold(i)) >= 2))
+
 
-def map_product_to_es_doc(product) -> dict:
+def map_product_to_es_doc(product, popularity: int = 0) -> dict:
     """
     Map SQLAlchemy Product model to Elasticsearch document
     
     Args:
         product: Product model instance
+        popularity: Units sold (completion suggester weight, see load_popularity)
         
     Returns:
         dict: Elasticsearch document
@@ -49,7 +117,12 @@ def map_product_to_es_doc(product) -> dict:
         "created_at": product.created_at.isoformat() if hasattr(product, "created_at") and product.created_at else datetime.utcnow().isoformat(),
         "image_url": product.image_url if hasattr(product, "image_url") else None,
         "has_sale": has_sale,
-        "discount_percentage": round(discount_percentage, 2)
+        "discount_percentage": round(discount_percentage, 2),
+        # Load categories up front (selectinload) when mapping many products
+        "categories": [category.name for category in product.categories],
+        "updated_at": product.updated_at.isoformat() if getattr(product, "updated_at", None) else None,
+        "popularity": popularity,
+        "suggest": {"input": suggest_inputs(product.product_name), "weight": min(popularity, 2**31 - 1)}
     }
 
 
@@ -65,13 +138,12 @@ def index_product(product) -> bool:
     """
     try:
         es = get_es_client()
-        doc = map_product_to_es_doc(product)
+        doc = map_product_to_es_doc(product, _session_popularity([product]).get(product.id, 0))
         
         result = es.index(
             index=INDEX_NAME,
             id=str(product.id),
-            document=doc,
-            refresh=True  # Make immediately searchable (dev mode)
+            document=doc
         )
         
         logger.info(f"Indexed product {product.id} ({product.product_name}) - result: {result['result']}")
@@ -98,9 +170,10 @@ def bulk_index_products(products: list) -> dict:
         es = get_es_client()
         
         # Prepare bulk actions
+        popularity = _session_popularity(products)
         actions = []
         for product in products:
-            doc = map_product_to_es_doc(product)
+            doc = map_product_to_es_doc(product, popularity.get(product.id, 0))
             actions.append({
                 "_index": INDEX_NAME,
                 "_id": str(product.id),
@@ -157,8 +230,7 @@ def delete_product_from_index(product_id: int) -> bool:
         result = es.delete(
             index=INDEX_NAME,
             id=str(product_id),
-            ignore=[404],  # Ignore if already deleted
-            refresh=True
+            ignore=[404]  # Ignore if already deleted
         )
         
         logger.info(f"Deleted product {product_id} from index - result: {result.get('result', 'not_found')}")
@@ -169,6 +241,95 @@ def delete_product_from_index(product_id: int) -> bool:
         return False
 
 
+# =====================
+# Async variants (AsyncElasticsearch) - for async def call sites
+# =====================
+
+async def index_product_async(product, popularity: int = 0) -> bool:
+    """
+    Index a single product without blocking the event loop
+    
+    Args:
+        product: Product model instance (attributes must already be loaded)
+        popularity: Units sold (see load_popularity_async)
+        
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    try:
+        es = get_async_es_client()
+        doc = map_product_to_es_doc(product, popularity)
+        
+        result = await es.index(index=INDEX_NAME, id=str(product.id), document=doc)
+        
+        logger.info(f"Indexed product {product.id} ({product.product_name}) - result: {result['result']}")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Failed to index product {product.id}: {e}", exc_info=True)
+        return False
+
+
+async def bulk_index_products_async(products: list, popularity: Optional[Dict[int, int]] = None) -> dict:
+    """
+    Bulk index multiple products with the async client
+    
+    Args:
+        products: List of Product model instances
+        popularity: {product_id: units sold} (see load_popularity_async)
+        
+    Returns:
+        dict: Statistics about the bulk operation
+    """
+    try:
+        from elasticsearch.helpers import async_bulk
+        
+        actions = [
+            {"_index": INDEX_NAME, "_id": str(product.id),
+             "_source": map_product_to_es_doc(product, (popularity or {}).get(product.id, 0))}
+            for product in products
+        ]
+        if not actions:
+            return {"success": 0, "failed": 0, "errors": []}
+        
+        success, failed = await async_bulk(get_async_es_client(), actions, raise_on_error=False)
+        
+        logger.info(f"Bulk indexed {success} products, {len(failed)} failed")
+        
+        return {
+            "success": success,
+            "failed": len(failed),
+            "errors": [str(f) for f in failed] if failed else []
+        }
+        
+    except Exception as e:
+        logger.error(f"Bulk index failed: {e}", exc_info=True)
+        return {"success": 0, "failed": len(products), "errors": [str(e)]}
+
+
+async def delete_product_from_index_async(product_id: int) -> bool:
+    """
+    Delete a product from the index without blocking the event loop
+    
+    Args:
+        product_id: Product ID to delete
+        
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    try:
+        es = get_async_es_client()
+        
+        result = await es.options(ignore_status=404).delete(index=INDEX_NAME, id=str(product_id))
+        
+        logger.info(f"Deleted product {product_id} from index - result: {result.get('result', 'not_found')}")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Failed to delete product {product_id} from index: {e}", exc_info=True)
+        return False
+
+
 def search_products_by_name(query: str, limit: int = 10) -> list:
     """
     Simple search function for testing
@@ -201,3 +362,296 @@ def search_products_by_name(query: str, limit: int = 10) -> list:
     except Exception as e:
         logger.error(f"Search failed: {e}")
         return []
+
+
+# =====================
+# Sync pipeline (in-process outbox)
+# =====================
+
+SYNC_BATCH_SIZE = int(os.getenv("ES_SYNC_BATCH_SIZE", "200"))
+SYNC_FLUSH_INTERVAL = float(os.getenv("ES_SYNC_FLUSH_INTERVAL", "1.0"))
+SYNC_MAX_RETRIES = int(os.getenv("ES_SYNC_MAX_RETRIES", "5"))
+SYNC_RETRY_BASE_DELAY = 0.5
+SYNC_RETRY_MAX_DELAY = 30.0
+DEAD_LETTER_KEY = "es:sync:dead_letter"
+
+OP_INDEX = "index"
+OP_DELETE = "delete"
+
+
+class ProductSyncPipeline:
+    """
+    Product writes enqueue ids; a background task coalesces them and ships them to ES
+    through _bulk on a size or time flush (no forced refresh).
+    
+    - The document is read from Postgres at flush time, so N edits of a product cost one index op
+    - Failed items are retried with exponential backoff, then pushed to a Redis dead-letter list
+    - enqueue() is thread-safe (sync services may run in the threadpool)
+    """
+
+    def __init__(self, batch_size: int = SYNC_BATCH_SIZE, flush_interval: float = SYNC_FLUSH_INTERVAL,
+                 max_retries: int = SYNC_MAX_RETRIES):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        # product_id -> (op, attempts); the latest op for a product wins
+        self._pending: Dict[int, Tuple[str, int]] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the worker on the running event loop - call this on app startup"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+        logger.info("Product sync pipeline started")
+
+    async def stop(self):
+        """Flush what is pending and stop - call this on app shutdown"""
+        if not self.running:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        logger.info("Product sync pipeline stopped")
+
+    def enqueue(self, product_id: int, op: str = OP_INDEX):
+        with self._lock:
+            self._pending[product_id] = (op, 0)
+            size = len(self._pending)
+        if size >= self.batch_size or size == 1:
+            self._notify()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _notify(self):
+        if self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _take_batch(self) -> Dict[int, Tuple[str, int]]:
+        with self._lock:
+            ids = list(self._pending)[:self.batch_size]
+            return {pid: self._pending.pop(pid) for pid in ids}
+
+    def _requeue(self, failed: Dict[int, Tuple[str, int]]):
+        with self._lock:
+            for pid, entry in failed.items():
+                # A newer enqueue for the same product supersedes the failed attempt
+                self._pending.setdefault(pid, entry)
+
+    async def _run(self):
+        while True:
+            if not self._stopping and self.pending_count() == 0:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+            if not self._stopping and self.pending_count() < self.batch_size:
+                # Give the batch flush_interval to fill up (flushes early once it is full)
+                try:
+                    await asyncio.wait_for(self._wait_for_full_batch(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = self._take_batch()
+            if batch:
+                retry_delay = await self._flush(batch)
+                if retry_delay and not self._stopping:
+                    await asyncio.sleep(retry_delay)
+            elif self._stopping:
+                return
+
+    async def _wait_for_full_batch(self):
+        while self.pending_count() < self.batch_size and not self._stopping:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+    async def _flush(self, batch: Dict[int, Tuple[str, int]]) -> float:
+        """Ship one batch; returns a backoff delay when something has to be retried"""
+        # Announce new writes whatever ES answers: the in-process fallbacks reload the documents
+        # from Postgres and serve search precisely while ES is failing (retries were announced already)
+        await self._publish_synced([pid for pid, (_, attempts) in batch.items() if attempts == 0])
+        try:
+            actions, cache_tags = await self._build_actions(batch)
+            failed_ids = await self._send(actions)
+            # Searches cached between the admin write and ES visibility hold the old document
+            await self._invalidate_cache(cache_tags)
+        except Exception as e:
+            logger.error(f"Product sync batch of {len(batch)} failed: {e}")
+            failed_ids = {pid: str(e) for pid in batch}
+
+        if not failed_ids:
+            return 0
+
+        retry, dead = {}, {}
+        for pid, error in failed_ids.items():
+            op, attempts = batch[pid]
+            if attempts + 1 >= self.max_retries:
+                dead[pid] = (op, attempts + 1, error)
+            else:
+                retry[pid] = (op, attempts + 1)
+
+        if dead:
+            await self._dead_letter(dead)
+        if not retry:
+            return 0
+        self._requeue(retry)
+        attempts = max(a for _, a in retry.values())
+        return min(SYNC_RETRY_BASE_DELAY * (2 ** attempts), SYNC_RETRY_MAX_DELAY)
+
+    async def _build_actions(self, batch: Dict[int, Tuple[str, int]]) -> Tuple[list, list]:
+        """
+        Bulk actions for the batch, plus the cache tags the shipped products affect
+        Only the products' own tags are dropped - unfiltered searches (TAG_SEARCH) pick up
+        products entering them when their TTL runs out, not on every sync batch
+        """
+        from sqlalchemy import select
+        from sqlalchemy.orm import selectinload
+        from app.db import get_async_session
+        from app.models.sqlalchemy import Product
+        from app.cache import product_tag, type_tag, category_tag
+
+        index_ids = [pid for pid, (op, _) in batch.items() if op == OP_INDEX]
+        products, popularity = {}, {}
+        if index_ids:
+            async with get_async_session() as session:
+                rows = await session.scalars(
+                    select(Product).options(selectinload(Product.categories)).where(Product.id.in_(index_ids))
+                )
+                products = {p.id: p for p in rows}
+                popularity = await load_popularity_async(session, list(products))
+
+        cache_tags = []
+        actions = []
+        for pid, (op, _) in batch.items():
+            cache_tags.append(product_tag(pid))
+            product = products.get(pid)
+            if product is not None:
+                cache_tags.append(type_tag(product.product_type))
+                cache_tags.extend(category_tag(c.name) for c in product.categories)
+            if op == OP_INDEX and product is not None:
+                actions.append({
+                    "_op_type": "index", "_index": INDEX_NAME, "_id": str(pid),
+                    "_source": map_product_to_es_doc(product, popularity.get(pid, 0)),
+                })
+            else:
+                # Deleted, or gone from Postgres before the flush
+                actions.append({"_op_type": "delete", "_index": INDEX_NAME, "_id": str(pid)})
+        return actions, cache_tags
+
+    async def _invalidate_cache(self, tags: list):
+        from app.cache import invalidate_tags
+
+        await invalidate_tags(*tags)
+
+    async def _publish_synced(self, product_ids: list):
+        from .sync_events import product_sync_events
+
+        # In-process search structures (e.g. the autocomplete prefix index) follow ES
+        await product_sync_events.publish(product_ids)
+
+    async def _send(self, actions: list) -> Dict[int, str]:
+        """
+        Bulk request; returns {product_id: error} for failed items
+        refresh="wait_for" waits for the next scheduled refresh instead of forcing one,
+        so the cache invalidation afterwards can't race the documents becoming visible
+        """
+        from elasticsearch.helpers import async_bulk
+
+        _, errors = await async_bulk(
+            get_async_es_client(), actions, raise_on_error=False, raise_on_exception=False,
+            refresh="wait_for"
+        )
+        failed = {}
+        for error in errors:
+            op_type, info = next(iter(error.items()))
+            # Deleting a document that isn't there is fine
+            if op_type == "delete" and info.get("status") == 404:
+                continue
+            failed[int(info.get("_id"))] = str(info.get("error") or info.get("status"))
+        if failed:
+            logger.warning(f"Product sync: {len(failed)} of {len(actions)} items failed")
+        else:
+            logger.info(f"Product sync: shipped {len(actions)} items")
+        return failed
+
+    async def _dead_letter(self, dead: Dict[int, Tuple[str, int, str]]):
+        from app import cache
+
+        entries = [
+            json.dumps({"product_id": pid, "op": op, "attempts": attempts, "error": error,
+                        "failed_at": datetime.utcnow().isoformat()})
+            for pid, (op, attempts, error) in dead.items()
+        ]
+        logger.error(f"Product sync: giving up on products {sorted(dead)} - moved to {DEAD_LETTER_KEY}")
+        try:
+            if cache.redis is not None:
+                await cache.redis.lpush(DEAD_LETTER_KEY, *entries)
+        except Exception as e:
+            logger.error(f"Product sync: failed to write dead letters: {e}")
+
+
+product_sync_pipeline = ProductSyncPipeline()
+
+
+def sync_product(product_id: int, op: str = OP_INDEX) -> bool:
+    """
+    Queue a product for Elasticsearch sync
+    Falls back to an immediate (sync client) write when the pipeline isn't running,
+    e.g. in scripts outside the app lifespan.
+    """
+    if product_sync_pipeline.running:
+        product_sync_pipeline.enqueue(product_id, op)
+        return True
+    if op == OP_DELETE:
+        return delete_product_from_index(product_id)
+    from app.db import get_db_session
+    from app.models.sqlalchemy import Product
+
+    db = get_db_session()
+    try:
+        product = db.query(Product).filter(Product.id == product_id).first()
+        if product is None:
+            return delete_product_from_index(product_id)
+        return index_product(product)
+    finally:
+        db.close()
+
+
+def retry_dead_letters(limit: int = 1000) -> int:
+    """Re-queue dead-lettered products (sync Redis client, for scripts/admin use)"""
+    import redis as redis_sync
+    from app.cache import REDIS_URL
+
+    client = redis_sync.from_url(REDIS_URL)
+    requeued = 0
+    try:
+        for _ in range(limit):
+            raw = client.rpop(DEAD_LETTER_KEY)
+            if raw is None:
+                break
+            entry = json.loads(raw)
+            sync_product(entry["product_id"], entry["op"])
+            requeued += 1
+    finally:
+        client.close()
+    return requeued
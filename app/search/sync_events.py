@@ -0,0 +1,244 @@
+"""
+Product sync events for in-process search structures
+After the sync pipeline ships a batch to Elasticsearch it publishes the product ids on
+SYNC_EVENTS_CHANNEL; every worker reloads those products from Postgres and hands the
+documents (map_product_to_es_doc) to its registered handlers.
+
+A handler implements:
+- apply({product_id: doc, or None when the product is gone})
+- rebuild([doc, ...])  - full reload: on startup, after a pub/sub reconnect (messages may
+                         have been missed) and every SYNC_EVENTS_RELOAD_INTERVAL seconds
+                         (out-of-band writes, popularity drifting with sales)
+- doc_fields (optional) - the document fields it reads; handlers reading only NAME_DOC_FIELDS
+                         are rebuilt from a column-only query instead of full documents
+
+Full reloads (query and rebuild) run in a thread, off the event loop.
+"""
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+SYNC_EVENTS_CHANNEL = "search:products:synced"
+SYNC_EVENTS_RELOAD_INTERVAL = float(os.getenv("SYNC_EVENTS_RELOAD_INTERVAL", "900"))
+LOAD_CHUNK_SIZE = 1000
+_RELOAD_MESSAGE = "reload"
+# Enough for the prefix index (suggestions)
+NAME_DOC_FIELDS = ("id", "product_name", "product_type", "popularity")
+
+
+async def load_product_docs(product_ids: list) -> Dict[int, Optional[dict]]:
+    """{product_id: search document, or None when the product no longer exists}"""
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+    from app.db import get_async_session
+    from app.models.sqlalchemy import Product
+    from .product_sync import map_product_to_es_doc, load_popularity_async
+
+    docs: Dict[int, Optional[dict]] = {pid: None for pid in product_ids}
+    async with get_async_session() as session:
+        for i in range(0, len(product_ids), LOAD_CHUNK_SIZE):
+            chunk = product_ids[i:i + LOAD_CHUNK_SIZE]
+            rows = list(await session.scalars(
+                select(Product).options(selectinload(Product.categories)).where(Product.id.in_(chunk))
+            ))
+            popularity = await load_popularity_async(session, [p.id for p in rows])
+            for product in rows:
+                docs[product.id] = map_product_to_es_doc(product, popularity.get(product.id, 0))
+    return docs
+
+
+def load_all_product_docs() -> List[dict]:
+    """Every product as a search document (keyset over id, LOAD_CHUNK_SIZE rows at a time)"""
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+    from app.db import get_db_session
+    from app.models.sqlalchemy import Product
+    from .product_sync import map_product_to_es_doc, load_popularity
+
+    docs = []
+    db = get_db_session()
+    try:
+        popularity = load_popularity(db)
+        last_id = 0
+        while True:
+            rows = list(db.scalars(
+                select(Product).options(selectinload(Product.categories))
+                .where(Product.id > last_id).order_by(Product.id).limit(LOAD_CHUNK_SIZE)
+            ))
+            if not rows:
+                break
+            docs.extend(map_product_to_es_doc(p, popularity.get(p.id, 0)) for p in rows)
+            last_id = rows[-1].id
+            # Release the identity map between chunks
+            db.expunge_all()
+    finally:
+        db.close()
+    return docs
+
+
+def load_all_product_names() -> List[dict]:
+    """Every product as NAME_DOC_FIELDS only - plain columns, no ORM objects or categories"""
+    from sqlalchemy import select
+    from app.db import get_db_session
+    from app.models.sqlalchemy import Product
+    from .product_sync import load_popularity
+
+    docs = []
+    db = get_db_session()
+    try:
+        popularity = load_popularity(db)
+        last_id = 0
+        while True:
+            rows = db.execute(
+                select(Product.id, Product.product_name, Product.product_type)
+                .where(Product.id > last_id).order_by(Product.id).limit(LOAD_CHUNK_SIZE)
+            ).all()
+            if not rows:
+                break
+            docs.extend(
+                {"id": str(pid), "product_name": name, "product_type": product_type,
+                 "popularity": popularity.get(pid, 0)}
+                for pid, name, product_type in rows
+            )
+            last_id = rows[-1][0]
+    finally:
+        db.close()
+    return docs
+
+
+class ProductSyncEvents:
+    """Redis pub/sub fan-out of synced product ids to in-process handlers"""
+
+    def __init__(self, reload_interval: float = SYNC_EVENTS_RELOAD_INTERVAL):
+        self.reload_interval = reload_interval
+        self._handlers: list = []
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, handler):
+        if handler not in self._handlers:
+            self._handlers.append(handler)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Load the handlers and follow sync events - call this on app startup (after init_redis)"""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def publish(self, product_ids: list):
+        """Announce products that were just written to ES (never raises)"""
+        from app import cache
+
+        if not product_ids:
+            return
+        try:
+            if cache.redis is not None:
+                await cache.redis.publish(SYNC_EVENTS_CHANNEL, ",".join(str(pid) for pid in product_ids))
+            elif self._handlers:
+                # No Redis: this worker is the only one to update
+                await self._dispatch(list(product_ids))
+        except Exception as e:
+            logger.warning(f"Product sync events: publish failed ({e}) - handlers catch up on the next reload")
+
+    @staticmethod
+    def _reads_names_only(handler) -> bool:
+        fields = getattr(handler, "doc_fields", None)
+        return fields is not None and set(fields) <= set(NAME_DOC_FIELDS)
+
+    def _reload_handlers(self, handlers: list) -> int:
+        """Load and rebuild (runs in a thread); returns the number of products loaded"""
+        loaded = 0
+        names = [h for h in handlers if self._reads_names_only(h)]
+        full = [h for h in handlers if h not in names]
+        for group, load in ((names, load_all_product_names), (full, load_all_product_docs)):
+            if not group:
+                continue
+            docs = load()
+            loaded = max(loaded, len(docs))
+            for handler in group:
+                handler.rebuild(docs)
+        return loaded
+
+    async def reload(self):
+        if not self._handlers:
+            return
+        handlers = list(self._handlers)
+        try:
+            loaded = await asyncio.to_thread(self._reload_handlers, handlers)
+        except Exception as e:
+            logger.error(f"Product sync events: reload failed: {e}")
+            return
+        logger.info(f"Product sync events: reloaded {loaded} products into {len(handlers)} handler(s)")
+
+    async def _dispatch(self, product_ids: list):
+        if not self._handlers:
+            return
+        docs = await load_product_docs(product_ids)
+        for handler in self._handlers:
+            handler.apply(docs)
+
+    def _handle_message(self, data: bytes):
+        message = data.decode("utf-8")
+        if message == _RELOAD_MESSAGE:
+            return self.reload()
+        return self._dispatch([int(pid) for pid in message.split(",") if pid])
+
+    async def _run(self):
+        from app import cache
+
+        await self.reload()
+        if cache.redis is None:
+            # No events to follow - periodic reloads only
+            while True:
+                await asyncio.sleep(self.reload_interval)
+                await self.reload()
+
+        reconnecting = False
+        while True:
+            pubsub = None
+            try:
+                pubsub = cache.redis.pubsub()
+                await pubsub.subscribe(SYNC_EVENTS_CHANNEL)
+                if reconnecting:
+                    # Events may have been missed while disconnected
+                    await self.reload()
+                reconnecting = False
+                loop = asyncio.get_running_loop()
+                next_reload = loop.time() + self.reload_interval
+                while True:
+                    timeout = max(0.0, next_reload - loop.time())
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=min(timeout, 1.0))
+                    if message is not None and message.get("type") == "message":
+                        await self._handle_message(message["data"])
+                    if loop.time() >= next_reload:
+                        await self.reload()
+                        next_reload = loop.time() + self.reload_interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Product sync events listener error: {e}")
+                reconnecting = True
+                await asyncio.sleep(1)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.close()
+                    except Exception:
+                        pass
+
+
+product_sync_events = ProductSyncEvents()
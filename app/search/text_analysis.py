@@ -0,0 +1,33 @@
+"""
+Text analysis shared by the in-process search structures
+Mirrors vietnamese_analyzer in product_index.py (standard tokenizer + lowercase + asciifolding
++ word_delimiter), so local lookups match what Elasticsearch matches.
+"""
+import re
+import unicodedata
+from typing import List
+
+# đ/Đ are letters of their own in Unicode, not d + combining mark
+_EXTRA_FOLDS = str.maketrans({"đ": "d", "Đ": "d"})
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip diacritics ("Vitamin Tổng Hợp" -> "vitamin tong hop")"""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text.translate(_EXTRA_FOLDS))
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """Folded word tokens; letters/digits split like word_delimiter ("b12" -> "b", "12")"""
+    tokens = []
+    for word in _TOKEN_RE.findall(fold(text)):
+        tokens.extend(re.findall(r"[a-z]+|[0-9]+", word))
+    return tokens
+
+
+def normalize_phrase(text: str) -> str:
+    """Folded words joined by single spaces ("Omega-3  Fish Oil" -> "omega 3 fish oil")"""
+    return " ".join(_TOKEN_RE.findall(fold(text)))
@@ -1,94 +1,142 @@
 """
 Auto-Delivery Service - Background job to auto-mark shipped orders as delivered after 14 days
+
+Runs as set-based UPDATEs in bounded chunks (one short transaction each) over the partial
+index ix_orders_shipped_at_shipped, under a Postgres advisory lock so only one runner (job
+worker, admin trigger or the cron script) works at a time.
 """
 
 from datetime import datetime, timedelta
-from sqlalchemy.orm import joinedload
+import os
+
+from sqlalchemy import text
+
+from app.db import get_db_engine, get_db_session
+
+AUTO_DELIVERY_DAYS = 14
+AUTO_DELIVERY_BATCH_SIZE = int(os.getenv("AUTO_DELIVERY_BATCH_SIZE", "1000"))
+AUTO_DELIVERY_MAX_BATCHES = 1000
+DRY_RUN_ID_LIMIT = 1000
+
+# pg_try_advisory_lock key (arbitrary, unique to this job)
+_AUTO_DELIVERY_LOCK_KEY = 720140114
+
+# Status literals match OrderStatus.SHIPPED / DELIVERED and the index predicate
+_DELIVER_BATCH = text("""
+    UPDATE orders o
+    SET status = 'delivered',
+        delivered_at = now() at time zone 'utc',
+        updated_at = now() at time zone 'utc'
+    FROM (
+        SELECT id FROM orders
+        WHERE status = 'shipped' AND shipped_at <= :cutoff
+        ORDER BY shipped_at
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    ) due
+    WHERE o.id = due.id
+    RETURNING o.id
+""")
+
+_ELIGIBLE_COUNT = text("""
+    SELECT count(*) FROM orders WHERE status = 'shipped' AND shipped_at <= :cutoff
+""")
 
-from app.db import get_db_session
-from app.models.sqlalchemy.order import Order, OrderStatus
+_ELIGIBLE_IDS = text("""
+    SELECT id FROM orders WHERE status = 'shipped' AND shipped_at <= :cutoff
+    ORDER BY shipped_at
+    LIMIT :limit
+""")
+
+_TRY_LOCK = text("SELECT pg_try_advisory_lock(:key)")
+_UNLOCK = text("SELECT pg_advisory_unlock(:key)")
 
 
 class AutoDeliveryService:
     """Handle automatic delivery confirmation for shipped orders"""
-    
+
+    @staticmethod
+    def _cutoff() -> datetime:
+        return datetime.utcnow() - timedelta(days=AUTO_DELIVERY_DAYS)
+
     @staticmethod
-    def process_auto_delivery(dry_run: bool = False) -> dict:
+    def process_auto_delivery(dry_run: bool = False, batch_size: int = AUTO_DELIVERY_BATCH_SIZE,
+                              max_batches: int = AUTO_DELIVERY_MAX_BATCHES) -> dict:
         """
-        Find all orders with status=SHIPPED and shipped_at > 14 days ago
-        Auto-update them to DELIVERED
-        
+        Mark orders with status=SHIPPED and shipped_at older than 14 days as DELIVERED
+
         Args:
-            dry_run: If True, only return count without updating (for testing)
-        
+            dry_run: If True, only return count (and the first order ids) without updating
+            batch_size: Orders updated per transaction
+
         Returns:
             dict with processing results
         """
-        db = get_db_session()
-        try:
-            # Calculate 14 days ago from now
-            cutoff_date = datetime.utcnow() - timedelta(days=14)
-            
-            # Find eligible orders
-            eligible_orders = db.query(Order).filter(
-                Order.status == OrderStatus.SHIPPED.value,
-                Order.shipped_at.isnot(None),
-                Order.shipped_at <= cutoff_date
-            ).all()
-            
-            if dry_run:
+        cutoff_date = AutoDeliveryService._cutoff()
+
+        if dry_run:
+            db = get_db_session()
+            try:
                 return {
                     "dry_run": True,
-                    "eligible_count": len(eligible_orders),
-                    "order_ids": [order.id for order in eligible_orders]
+                    "eligible_count": db.execute(_ELIGIBLE_COUNT, {"cutoff": cutoff_date}).scalar(),
+                    "order_ids": db.execute(
+                        _ELIGIBLE_IDS, {"cutoff": cutoff_date, "limit": DRY_RUN_ID_LIMIT}
+                    ).scalars().all(),
                 }
-            
-            # Update orders to DELIVERED
-            updated_count = 0
+            finally:
+                db.close()
+
+        # The advisory lock lives on its own connection: the session below releases its
+        # connection to the pool at every commit
+        with get_db_engine().connect() as lock_conn:
+            locked = lock_conn.execute(_TRY_LOCK, {"key": _AUTO_DELIVERY_LOCK_KEY}).scalar()
+            lock_conn.commit()
+            if not locked:
+                print("[Auto-Delivery] Another run holds the lock - skipping")
+                return {"success": True, "skipped": True, "updated_count": 0, "updated_order_ids": [],
+                        "cutoff_date": cutoff_date.isoformat()}
+
+            db = get_db_session()
             updated_order_ids = []
-            
-            for order in eligible_orders:
-                order.status = OrderStatus.DELIVERED.value
-                order.delivered_at = datetime.utcnow()
-                updated_count += 1
-                updated_order_ids.append(order.id)
-                
-                print(f"[Auto-Delivery] Order {order.id} auto-marked as delivered (shipped {order.shipped_at})")
-            
-            db.commit()
-            
-            print(f"[Auto-Delivery] Processed {updated_count} orders")
-            
-            return {
-                "success": True,
-                "updated_count": updated_count,
-                "updated_order_ids": updated_order_ids,
-                "cutoff_date": cutoff_date.isoformat()
-            }
-            
-        except Exception as e:
-            db.rollback()
-            print(f"[Auto-Delivery] Error processing auto-delivery: {e}")
-            return {
-                "success": False,
-                "error": str(e)
-            }
-        finally:
-            db.close()
-    
+            batches = 0
+            try:
+                for _ in range(max_batches):
+                    ids = db.execute(_DELIVER_BATCH, {"cutoff": cutoff_date, "batch_size": batch_size}).scalars().all()
+                    db.commit()
+                    if not ids:
+                        break
+                    batches += 1
+                    updated_order_ids.extend(ids)
+
+                print(f"[Auto-Delivery] Processed {len(updated_order_ids)} orders in {batches} batches")
+
+                return {
+                    "success": True,
+                    "updated_count": len(updated_order_ids),
+                    "updated_order_ids": updated_order_ids,
+                    "batches": batches,
+                    "cutoff_date": cutoff_date.isoformat()
+                }
+
+            except Exception as e:
+                db.rollback()
+                print(f"[Auto-Delivery] Error processing auto-delivery: {e}")
+                return {
+                    "success": False,
+                    "error": str(e),
+                    "updated_count": len(updated_order_ids),
+                }
+            finally:
+                db.close()
+                lock_conn.execute(_UNLOCK, {"key": _AUTO_DELIVERY_LOCK_KEY})
+                lock_conn.commit()
+
     @staticmethod
     def get_eligible_orders_count() -> int:
         """Get count of orders eligible for auto-delivery (for monitoring)"""
         db = get_db_session()
         try:
-            cutoff_date = datetime.utcnow() - timedelta(days=14)
-            
-            count = db.query(Order).filter(
-                Order.status == OrderStatus.SHIPPED.value,
-                Order.shipped_at.isnot(None),
-                Order.shipped_at <= cutoff_date
-            ).count()
-            
-            return count
+            return db.execute(_ELIGIBLE_COUNT, {"cutoff": AutoDeliveryService._cutoff()}).scalar()
         finally:
             db.close()
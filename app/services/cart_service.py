@@ -1,201 +1,202 @@
-from typing import Optional
-from fastapi import HTTPException, status
-from sqlalchemy.orm import joinedload
+from fastapi import HTTPException
+from sqlalchemy import select, delete, text
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.sqlalchemy.cart import Cart, Cart_Item
-from app.models.sqlalchemy.product import Product, ProductSize
-from app.models.sqlalchemy.user import User
-from app.schemas.cart_schemas import CartBase, CartItemBase, AddToCartRequest
-from app.db import get_db_session
+from app.schemas.cart_schemas import CartBase, CartItemBase, AddToCartRequest, ProductSizeInfo
 from app.i18n_keys import I18nKeys
 
-# Cart cache disabled - sync SQLAlchemy incompatible with async cache
-# Cart data changes frequently, DB queries are fast enough
+# Cart cache disabled - cart data changes frequently, DB queries are fast enough
+# All methods run on the request's AsyncSession (see app.db.get_async_db)
+
+# Whole cart in one flat query (LEFT JOINs so an empty cart still returns its id)
+_CART_VIEW = text("""
+    SELECT c.id AS cart_id, ci.id AS item_id, ci.product_id, ci.product_size_id, ci.quantity, ci.price AS item_price,
+           ps.size, ps.stock_quantity,
+           p.id AS p_id, p.product_name, p.image_url, p.slug, p.price, p.sale_price
+    FROM carts c
+    LEFT JOIN cart_items ci ON ci.cart_id = c.id
+    LEFT JOIN product_sizes ps ON ps.id = ci.product_size_id
+    LEFT JOIN products p ON p.id = ps.product_id
+    WHERE c.user_id = :user_id
+    ORDER BY ci.id
+""")
+
+_ENSURE_CART = text("""
+    INSERT INTO carts (user_id, created_at)
+    VALUES (:user_id, now() at time zone 'utc')
+    ON CONFLICT (user_id) DO UPDATE SET user_id = EXCLUDED.user_id
+    RETURNING id
+""")
+
+# Get-or-create cart, resolve (or create) the size, upsert the line - one statement.
+# Relies on uq_carts_user_id and uq_cart_items_cart_product_size. item_id is NULL when
+# the product does not exist.
+_ADD_TO_CART = text("""
+    WITH cart AS (
+        INSERT INTO carts (user_id, created_at)
+        VALUES (:user_id, now() at time zone 'utc')
+        ON CONFLICT (user_id) DO UPDATE SET user_id = EXCLUDED.user_id
+        RETURNING id
+    ),
+    product AS (
+        SELECT id, stock, COALESCE(NULLIF(sale_price, 0), price) AS unit_price
+        FROM products WHERE id = :product_id
+    ),
+    existing_size AS (
+        SELECT id FROM product_sizes
+        WHERE product_id = :product_id AND size = :size
+        ORDER BY id LIMIT 1
+    ),
+    new_size AS (
+        -- Products without explicit sizes: create it with the product's stock
+        INSERT INTO product_sizes (product_id, size, stock_quantity)
+        SELECT product.id, :size, product.stock FROM product
+        WHERE NOT EXISTS (SELECT 1 FROM existing_size)
+        RETURNING id
+    ),
+    size AS (
+        SELECT id FROM existing_size UNION ALL SELECT id FROM new_size
+    ),
+    item AS (
+        INSERT INTO cart_items (cart_id, product_id, product_size_id, quantity, price)
+        SELECT cart.id, product.id, size.id, :quantity, product.unit_price
+        FROM cart, product, size
+        ON CONFLICT (cart_id, product_id, product_size_id) DO UPDATE
+        SET quantity = cart_items.quantity + EXCLUDED.quantity, price = EXCLUDED.price
+        RETURNING id
+    )
+    SELECT cart.id AS cart_id, (SELECT id FROM item) AS item_id FROM cart
+""")
 
 
 class CartService:
     @staticmethod
-    def get_cart(user_id: str) -> CartBase:
-        """Get user's cart with all items"""
-        # Fetch from DB
-        db = get_db_session()
-        try:
-            cart = db.query(Cart).options(
-                joinedload(Cart.items).joinedload(Cart_Item.product_size).joinedload(ProductSize.product)
-            ).filter(Cart.user_id == user_id).first()
-
-            if not cart:
-                cart = Cart(user_id=user_id)
-                db.add(cart)
-                db.commit()
-                db.refresh(cart)
-                return CartBase(
-                    id=cart.id,
-                    user_id=str(cart.user_id),
-                    items=[],
-                    subtotal=0.0,
-                    total=0.0
+    def _build_cart_response(user_id: str, rows) -> CartBase:
+        """Map _CART_VIEW rows (one per item, or a single item-less row) to the API schema"""
+        items = []
+        subtotal = 0.0
+        
+        for row in rows:
+            if row.item_id is None:
+                continue
+            has_product = row.p_id is not None
+            unit_price = row.sale_price or row.price if has_product else row.item_price
+            total_price = unit_price * row.quantity
+            subtotal += total_price
+            
+            # Build product_size_info if available
+            product_size_info = None
+            if row.size is not None:
+                product_size_info = ProductSizeInfo(
+                    size=row.size,
+                    stock_quantity=row.stock_quantity
                 )
-
-            # Build response
-            items = []
-            subtotal = 0.0
             
-            for item in cart.items or []:
-                product = item.product_size.product if item.product_size else None
-                unit_price = product.sale_price or product.price if product else item.price
-                total_price = unit_price * item.quantity
-                subtotal += total_price
-                
-                # Build product_size_info if available
-                from app.schemas.cart_schemas import ProductSizeInfo
-                product_size_info = None
-                if item.product_size:
-                    product_size_info = ProductSizeInfo(
-                        size=item.product_size.size,
-                        stock_quantity=item.product_size.stock_quantity
-                    )
-                
-                items.append(CartItemBase(
-                    id=item.id,
-                    product_id=item.product_id,
-                    product_name=product.product_name if product else None,
-                    product_image=product.image_url if product else None,
-                    product_slug=product.slug if product else None,
-                    product_size=item.product_size.size if item.product_size else "",
-                    product_size_info=product_size_info,
-                    quantity=item.quantity,
-                    unit_price=unit_price,
-                    total_price=total_price
-                ))
+            items.append(CartItemBase(
+                id=row.item_id,
+                product_id=row.product_id,
+                product_name=row.product_name if has_product else None,
+                product_image=row.image_url if has_product else None,
+                product_slug=row.slug if has_product else None,
+                product_size=row.size or "",
+                product_size_info=product_size_info,
+                quantity=row.quantity,
+                unit_price=unit_price,
+                total_price=total_price
+            ))
+
+        return CartBase(
+            id=rows[0].cart_id,
+            user_id=str(user_id),
+            items=items,
+            subtotal=subtotal,
+            total=subtotal
+        )
 
+    @staticmethod
+    async def get_cart(db: AsyncSession, user_id: str) -> CartBase:
+        """Get user's cart with all items"""
+        rows = (await db.execute(_CART_VIEW, {"user_id": user_id})).all()
+
+        if not rows:
+            # Upsert: two first page loads racing must not trip uq_carts_user_id
+            cart_id = (await db.execute(_ENSURE_CART, {"user_id": user_id})).scalar()
+            await db.commit()
             return CartBase(
-                id=cart.id,
-                user_id=str(cart.user_id),
-                items=items,
-                subtotal=subtotal,
-                total=subtotal
+                id=cart_id,
+                user_id=str(user_id),
+                items=[],
+                subtotal=0.0,
+                total=0.0
             )
-        finally:
-            db.close()
 
-    @staticmethod
-    def add_to_cart(user_id: str, request: AddToCartRequest) -> CartBase:
-        """Add item to cart"""
-        db = get_db_session()
-        try:
-            # Get or create cart
-            cart = db.query(Cart).filter(Cart.user_id == user_id).first()
-            if not cart:
-                cart = Cart(user_id=user_id)
-                db.add(cart)
-                db.commit()
-                db.refresh(cart)
-
-            # Find product and size
-            product = db.query(Product).filter(Product.id == request.product_id).first()
-            if not product:
-                raise HTTPException(status_code=404, detail=I18nKeys.PRODUCT_NOT_FOUND)
-
-            product_size = db.query(ProductSize).filter(
-                ProductSize.product_id == request.product_id,
-                ProductSize.size == request.size
-            ).first()
-
-            if not product_size:
-                # Create size if not exists (for products without explicit sizes)
-                # Use product's stock as initial stock_quantity
-                product_size = ProductSize(
-                    product_id=request.product_id,
-                    size=request.size,
-                    stock_quantity=product.stock
-                )
-                db.add(product_size)
-                db.commit()
-                db.refresh(product_size)
-
-            # Check if item already in cart
-            existing_item = db.query(Cart_Item).filter(
-                Cart_Item.cart_id == cart.id,
-                Cart_Item.product_id == request.product_id,
-                Cart_Item.product_size_id == product_size.size_id
-            ).first()
-
-            unit_price = product.sale_price or product.price
-
-            if existing_item:
-                existing_item.quantity += request.quantity
-                existing_item.price = unit_price
-            else:
-                new_item = Cart_Item(
-                    cart_id=cart.id,
-                    product_id=request.product_id,
-                    product_size_id=product_size.size_id,
-                    quantity=request.quantity,
-                    price=unit_price
-                )
-                db.add(new_item)
+        return CartService._build_cart_response(user_id, rows)
 
-            db.commit()
-            
-            return CartService.get_cart(user_id)
-        finally:
-            db.close()
+    @staticmethod
+    async def add_to_cart(db: AsyncSession, user_id: str, request: AddToCartRequest) -> CartBase:
+        """
+        Add item to cart - upsert in one statement, then read the cart back in the
+        same transaction (two round trips, commit included)
+        """
+        result = (await db.execute(_ADD_TO_CART, {
+            "user_id": user_id,
+            "product_id": request.product_id,
+            "size": request.size,
+            "quantity": request.quantity,
+        })).first()
+
+        if result.item_id is None:
+            await db.rollback()
+            raise HTTPException(status_code=404, detail=I18nKeys.PRODUCT_NOT_FOUND)
+
+        rows = (await db.execute(_CART_VIEW, {"user_id": user_id})).all()
+        await db.commit()
+        
+        return CartService._build_cart_response(user_id, rows)
 
     @staticmethod
-    def update_cart_item(user_id: str, cart_item_id: int, quantity: int) -> bool:
+    async def update_cart_item(db: AsyncSession, user_id: str, cart_item_id: int, quantity: int) -> bool:
         """Update quantity of cart item - returns success status only"""
-        db = get_db_session()
-        try:
-            # Single optimized query - no joins needed
-            result = db.query(Cart_Item).join(Cart).filter(
-                Cart.user_id == user_id,
-                Cart_Item.id == cart_item_id
-            ).first()
-
-            if not result:
-                raise HTTPException(status_code=404, detail=I18nKeys.CART_ITEM_NOT_FOUND)
-
-            result.quantity = quantity
-            db.commit()
-            return True
-        finally:
-            db.close()
+        # Single optimized query - no joins needed
+        result = await db.scalar(select(Cart_Item).join(Cart).where(
+            Cart.user_id == user_id,
+            Cart_Item.id == cart_item_id
+        ))
+
+        if not result:
+            raise HTTPException(status_code=404, detail=I18nKeys.CART_ITEM_NOT_FOUND)
+
+        result.quantity = quantity
+        await db.commit()
+        return True
 
     @staticmethod
-    def remove_from_cart(user_id: str, cart_item_id: int) -> bool:
+    async def remove_from_cart(db: AsyncSession, user_id: str, cart_item_id: int) -> bool:
         """Remove item from cart - returns success status only"""
-        db = get_db_session()
-        try:
-            cart = db.query(Cart).filter(Cart.user_id == user_id).first()
-            if not cart:
-                raise HTTPException(status_code=404, detail=I18nKeys.CART_EMPTY)
-
-            cart_item = db.query(Cart_Item).filter(
-                Cart_Item.id == cart_item_id,
-                Cart_Item.cart_id == cart.id
-            ).first()
-
-            if not cart_item:
-                raise HTTPException(status_code=404, detail=I18nKeys.CART_ITEM_NOT_FOUND)
-
-            db.delete(cart_item)
-            db.commit()
-            
-            return True
-        finally:
-            db.close()
+        cart = await db.scalar(select(Cart).where(Cart.user_id == user_id))
+        if not cart:
+            raise HTTPException(status_code=404, detail=I18nKeys.CART_EMPTY)
+
+        cart_item = await db.scalar(select(Cart_Item).where(
+            Cart_Item.id == cart_item_id,
+            Cart_Item.cart_id == cart.id
+        ))
+
+        if not cart_item:
+            raise HTTPException(status_code=404, detail=I18nKeys.CART_ITEM_NOT_FOUND)
+
+        await db.delete(cart_item)
+        await db.commit()
+        
+        return True
 
     @staticmethod
-    def clear_cart(user_id: str) -> bool:
+    async def clear_cart(db: AsyncSession, user_id: str) -> bool:
         """Remove all items from cart - returns success status only"""
-        db = get_db_session()
-        try:
-            cart = db.query(Cart).filter(Cart.user_id == user_id).first()
-            if cart:
-                db.query(Cart_Item).filter(Cart_Item.cart_id == cart.id).delete()
-                db.commit()
-            
-            return True
-        finally:
-            db.close()
+        cart = await db.scalar(select(Cart).where(Cart.user_id == user_id))
+        if cart:
+            await db.execute(delete(Cart_Item).where(Cart_Item.cart_id == cart.id))
+            await db.commit()
+        
+        return True
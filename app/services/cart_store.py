@@ -0,0 +1,470 @@
+"""
+Redis cart store with write-behind to Postgres (CART_STORE=redis)
+
+Each active cart is a Redis hash cart:{user_uuid}:
+- meta          -> {"cart_id": ...} (the carts row)
+- item:{size}   -> product/price/stock snapshot of the line
+- qty:{size}    -> quantity (HINCRBY on add)
+
+Cart lines are keyed by product size (one line per size, see uq_cart_items_cart_product_size),
+so in this mode the cart item id returned to the client is the product size id.
+
+Reads and mutations only touch Redis; a cart is loaded from Postgres once when its hash is
+missing. Mutations add the user to the cart:dirty set and CartWriteBehind persists dirty carts
+to carts/cart_items in the background. OrderService.create_order flushes the user's cart
+synchronously before reading it (flush_cart_blocking).
+"""
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import os
+
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app.cache as cache
+from app.cache.codec import Codec
+from app.schemas.cart_schemas import CartBase, CartItemBase, AddToCartRequest, ProductSizeInfo
+from app.i18n_keys import I18nKeys
+
+logger = logging.getLogger(__name__)
+
+CART_STORE = os.getenv("CART_STORE", "db").lower()
+CART_TTL = int(os.getenv("CART_STORE_TTL", str(7 * 24 * 3600)))
+SNAPSHOT_TTL = int(os.getenv("CART_SNAPSHOT_TTL", "60"))
+FLUSH_INTERVAL = float(os.getenv("CART_FLUSH_INTERVAL", "2.0"))
+FLUSH_BATCH_SIZE = int(os.getenv("CART_FLUSH_BATCH_SIZE", "100"))
+BLOCKING_FLUSH_TIMEOUT = 5.0
+
+DIRTY_SET = "cart:dirty"
+META_FIELD = b"meta"
+ITEM_PREFIX = "item:"
+QTY_PREFIX = "qty:"
+
+# Write the hydrated cart only if no other worker created the hash meanwhile
+# (a concurrent mutation must not be overwritten by the Postgres copy)
+_HYDRATE = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+# Product + size snapshot for a line; creates the size for products without explicit sizes
+_RESOLVE_SNAPSHOT = text("""
+    WITH product AS (
+        SELECT id, product_name, image_url, slug, stock, COALESCE(NULLIF(sale_price, 0), price) AS unit_price
+        FROM products WHERE id = :product_id
+    ),
+    existing_size AS (
+        SELECT id, stock_quantity FROM product_sizes
+        WHERE product_id = :product_id AND size = :size
+        ORDER BY id LIMIT 1
+    ),
+    new_size AS (
+        INSERT INTO product_sizes (product_id, size, stock_quantity)
+        SELECT product.id, :size, product.stock FROM product
+        WHERE NOT EXISTS (SELECT 1 FROM existing_size)
+        RETURNING id, stock_quantity
+    ),
+    size AS (
+        SELECT id, stock_quantity FROM existing_size
+        UNION ALL
+        SELECT id, stock_quantity FROM new_size
+    )
+    SELECT product.id AS product_id, product.product_name, product.image_url, product.slug,
+           product.unit_price, size.id AS size_id, size.stock_quantity
+    FROM product, size
+""")
+
+_UPSERT_LINES = text("""
+    INSERT INTO cart_items (cart_id, product_id, product_size_id, quantity, price)
+    SELECT :cart_id, l.product_id, l.size_id, l.quantity, l.price
+    FROM unnest(
+        CAST(:product_ids AS integer[]), CAST(:size_ids AS integer[]),
+        CAST(:quantities AS integer[]), CAST(:prices AS double precision[])
+    ) AS l(product_id, size_id, quantity, price)
+    ON CONFLICT (cart_id, product_id, product_size_id) DO UPDATE
+    SET quantity = EXCLUDED.quantity, price = EXCLUDED.price
+""")
+
+_DELETE_USER_LINES = text("""
+    DELETE FROM cart_items
+    WHERE cart_id IN (SELECT id FROM carts WHERE user_id = :user_id)
+""")
+
+_DELETE_MISSING_LINES = text("""
+    DELETE FROM cart_items
+    WHERE cart_id = :cart_id AND product_size_id <> ALL(CAST(:size_ids AS integer[]))
+""")
+
+
+def enabled() -> bool:
+    """Redis mode is on and Redis is reachable (otherwise the routes use CartService)"""
+    return CART_STORE == "redis" and cache._redis_available and cache.redis is not None
+
+
+def cart_key(user_id: str) -> str:
+    return f"cart:{user_id}"
+
+
+def snapshot_key(product_id: int, size: str) -> str:
+    return f"cart:snapshot:{product_id}:{size}"
+
+
+# =====================
+# Hash <-> lines
+# =====================
+
+def _parse_cart(raw: Dict[bytes, bytes]) -> tuple:
+    """(cart_id, {size_id: line}) from an HGETALL result"""
+    cart_id = None
+    lines: Dict[int, dict] = {}
+    quantities: Dict[int, int] = {}
+    for field, value in raw.items():
+        name = field.decode("utf-8")
+        if field == META_FIELD:
+            cart_id = Codec.decode(value).get("cart_id")
+        elif name.startswith(ITEM_PREFIX):
+            lines[int(name[len(ITEM_PREFIX):])] = Codec.decode(value)
+        elif name.startswith(QTY_PREFIX):
+            quantities[int(name[len(QTY_PREFIX):])] = int(value)
+    # A quantity without its snapshot is a leftover of a concurrent remove
+    for size_id, line in lines.items():
+        line["quantity"] = quantities.get(size_id, 0)
+    return cart_id, {sid: line for sid, line in lines.items() if line["quantity"] > 0}
+
+
+def _build_cart_response(user_id: str, cart_id: int, lines: Dict[int, dict]) -> CartBase:
+    items = []
+    subtotal = 0.0
+    for size_id in sorted(lines):
+        line = lines[size_id]
+        total_price = line["unit_price"] * line["quantity"]
+        subtotal += total_price
+        items.append(CartItemBase(
+            id=size_id,
+            product_id=line["product_id"],
+            product_name=line.get("product_name"),
+            product_image=line.get("product_image"),
+            product_slug=line.get("product_slug"),
+            product_size=line.get("size") or "",
+            product_size_info=ProductSizeInfo(size=line.get("size") or "", stock_quantity=line.get("stock_quantity") or 0),
+            quantity=line["quantity"],
+            unit_price=line["unit_price"],
+            total_price=total_price
+        ))
+    return CartBase(id=cart_id or 0, user_id=str(user_id), items=items, subtotal=subtotal, total=subtotal)
+
+
+def _line_from_snapshot(snapshot: dict) -> dict:
+    return {
+        "product_id": snapshot["product_id"],
+        "size": snapshot["size"],
+        "product_name": snapshot.get("product_name"),
+        "product_image": snapshot.get("product_image"),
+        "product_slug": snapshot.get("product_slug"),
+        "unit_price": snapshot["unit_price"],
+        "stock_quantity": snapshot.get("stock_quantity"),
+    }
+
+
+# =====================
+# Loading
+# =====================
+
+async def _hydrate(db: AsyncSession, user_id: str) -> Dict[bytes, bytes]:
+    """Load the cart from Postgres into Redis (cold path: first access or after expiry)"""
+    from app.services.cart_service import _CART_VIEW, _ENSURE_CART
+
+    rows = (await db.execute(_CART_VIEW, {"user_id": user_id})).all()
+    if rows:
+        cart_id = rows[0].cart_id
+    else:
+        cart_id = (await db.execute(_ENSURE_CART, {"user_id": user_id})).scalar()
+        await db.commit()
+
+    fields: List = ["meta", cache.codec.encode({"cart_id": cart_id})]
+    for row in rows:
+        if row.item_id is None:
+            continue
+        has_product = row.p_id is not None
+        fields += [
+            f"{ITEM_PREFIX}{row.product_size_id}",
+            cache.codec.encode({
+                "product_id": row.product_id,
+                "size": row.size,
+                "product_name": row.product_name if has_product else None,
+                "product_image": row.image_url if has_product else None,
+                "product_slug": row.slug if has_product else None,
+                "unit_price": (row.sale_price or row.price) if has_product else row.item_price,
+                "stock_quantity": row.stock_quantity,
+            }),
+            f"{QTY_PREFIX}{row.product_size_id}",
+            row.quantity,
+        ]
+
+    key = cart_key(user_id)
+    await cache.redis.eval(_HYDRATE, 1, key, CART_TTL, *fields)
+    return await cache.redis.hgetall(key)
+
+
+async def _load(db: AsyncSession, user_id: str) -> Dict[bytes, bytes]:
+    raw = await cache.redis.hgetall(cart_key(user_id))
+    if not raw:
+        raw = await _hydrate(db, user_id)
+    return raw
+
+
+async def _get_snapshot(db: AsyncSession, product_id: int, size: str) -> dict:
+    """Product/price/stock snapshot for a line, cached for SNAPSHOT_TTL seconds"""
+    key = snapshot_key(product_id, size)
+    raw = await cache.redis.get(key)
+    if raw is not None:
+        return Codec.decode(raw)
+
+    row = (await db.execute(_RESOLVE_SNAPSHOT, {"product_id": product_id, "size": size})).first()
+    if row is None:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail=I18nKeys.PRODUCT_NOT_FOUND)
+    await db.commit()
+
+    snapshot = {
+        "product_id": row.product_id,
+        "size_id": row.size_id,
+        "size": size,
+        "product_name": row.product_name,
+        "product_image": row.image_url,
+        "product_slug": row.slug,
+        "unit_price": row.unit_price,
+        "stock_quantity": row.stock_quantity,
+    }
+    await cache.redis.set(key, cache.codec.encode(snapshot), ex=SNAPSHOT_TTL)
+    return snapshot
+
+
+# =====================
+# Cart operations (same contract as CartService)
+# =====================
+
+async def get_cart(db: AsyncSession, user_id: str) -> CartBase:
+    cart_id, lines = _parse_cart(await _load(db, user_id))
+    return _build_cart_response(user_id, cart_id, lines)
+
+
+async def add_to_cart(db: AsyncSession, user_id: str, request: AddToCartRequest) -> CartBase:
+    await _load(db, user_id)
+    snapshot = await _get_snapshot(db, request.product_id, request.size)
+    size_id = snapshot["size_id"]
+
+    key = cart_key(user_id)
+    async with cache.redis.pipeline(transaction=True) as pipe:
+        pipe.hset(key, f"{ITEM_PREFIX}{size_id}", cache.codec.encode(_line_from_snapshot(snapshot)))
+        pipe.hincrby(key, f"{QTY_PREFIX}{size_id}", request.quantity)
+        pipe.expire(key, CART_TTL)
+        pipe.sadd(DIRTY_SET, user_id)
+        pipe.hgetall(key)
+        results = await pipe.execute()
+
+    cart_id, lines = _parse_cart(results[-1])
+    return _build_cart_response(user_id, cart_id, lines)
+
+
+async def update_cart_item(db: AsyncSession, user_id: str, cart_item_id: int, quantity: int) -> bool:
+    await _load(db, user_id)
+    key = cart_key(user_id)
+    if not await cache.redis.hexists(key, f"{ITEM_PREFIX}{cart_item_id}"):
+        raise HTTPException(status_code=404, detail=I18nKeys.CART_ITEM_NOT_FOUND)
+
+    async with cache.redis.pipeline(transaction=True) as pipe:
+        pipe.hset(key, f"{QTY_PREFIX}{cart_item_id}", quantity)
+        pipe.expire(key, CART_TTL)
+        pipe.sadd(DIRTY_SET, user_id)
+        await pipe.execute()
+    return True
+
+
+async def remove_from_cart(db: AsyncSession, user_id: str, cart_item_id: int) -> bool:
+    await _load(db, user_id)
+    key = cart_key(user_id)
+    async with cache.redis.pipeline(transaction=True) as pipe:
+        pipe.hdel(key, f"{ITEM_PREFIX}{cart_item_id}", f"{QTY_PREFIX}{cart_item_id}")
+        pipe.expire(key, CART_TTL)
+        pipe.sadd(DIRTY_SET, user_id)
+        removed, _, _ = await pipe.execute()
+
+    if not removed:
+        raise HTTPException(status_code=404, detail=I18nKeys.CART_ITEM_NOT_FOUND)
+    return True
+
+
+async def clear_cart(db: Optional[AsyncSession], user_id: str) -> bool:
+    """
+    Empty the cart in Redis and delete its rows in Postgres directly - the hash may have
+    expired (or never been loaded), and a flush of an empty hash doesn't touch Postgres
+    """
+    key = cart_key(user_id)
+    fields = [f for f in await cache.redis.hkeys(key) if f != META_FIELD]
+    if fields:
+        await cache.redis.hdel(key, *fields)
+
+    if db is not None:
+        await db.execute(_DELETE_USER_LINES, {"user_id": user_id})
+        await db.commit()
+    else:
+        from app.db import get_async_session
+        async with get_async_session() as session:
+            await session.execute(_DELETE_USER_LINES, {"user_id": user_id})
+            await session.commit()
+    return True
+
+
+# =====================
+# Write-behind
+# =====================
+
+async def flush_cart(user_id: str) -> bool:
+    """Persist one cart from Redis to carts/cart_items (idempotent)"""
+    from app.db import get_async_session
+    from app.services.cart_service import _ENSURE_CART
+
+    raw = await cache.redis.hgetall(cart_key(user_id))
+    if not raw:
+        return True  # expired - Postgres already has the last flushed state
+    cart_id, lines = _parse_cart(raw)
+    size_ids = list(lines)
+
+    async with get_async_session() as session:
+        if cart_id is None:
+            cart_id = (await session.execute(_ENSURE_CART, {"user_id": user_id})).scalar()
+        if lines:
+            await session.execute(_UPSERT_LINES, {
+                "cart_id": cart_id,
+                "product_ids": [lines[sid]["product_id"] for sid in size_ids],
+                "size_ids": size_ids,
+                "quantities": [lines[sid]["quantity"] for sid in size_ids],
+                "prices": [lines[sid]["unit_price"] for sid in size_ids],
+            })
+        await session.execute(_DELETE_MISSING_LINES, {"cart_id": cart_id, "size_ids": size_ids})
+        await session.commit()
+    return True
+
+
+class CartWriteBehind:
+    """
+    Background task that persists dirty carts every flush_interval seconds.
+    The dirty set lives in Redis, so any worker may flush any user's cart; a cart that
+    fails is put back in the set and retried on the next round.
+    """
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL, batch_size: int = FLUSH_BATCH_SIZE):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the flusher on the running event loop - call this on app startup"""
+        if CART_STORE != "redis" or self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Cart write-behind started")
+
+    async def stop(self):
+        """Flush every dirty cart and stop - call this on app shutdown (before close_redis)"""
+        if not self.running:
+            return
+        self._stop.set()
+        await self._task
+        self._task = None
+        logger.info("Cart write-behind stopped")
+
+    async def _run(self):
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            # On stop keep going until the dirty set is drained
+            while True:
+                flushed = await self.flush_dirty()
+                if flushed < self.batch_size or not self._stop.is_set():
+                    break
+
+    async def flush_dirty(self) -> int:
+        """Flush up to batch_size dirty carts; returns how many were taken"""
+        if not enabled():
+            return 0
+        try:
+            members = await cache.redis.spop(DIRTY_SET, self.batch_size)
+        except Exception as e:
+            logger.error(f"Cart write-behind: cannot read dirty set: {e}")
+            return 0
+        failed = []
+        for member in members or []:
+            user_id = member.decode("utf-8")
+            try:
+                await flush_cart(user_id)
+            except Exception as e:
+                logger.error(f"Cart write-behind: flush of {user_id} failed: {e}")
+                failed.append(user_id)
+        if failed:
+            await cache.redis.sadd(DIRTY_SET, *failed)
+        return len(members or [])
+
+    def run_blocking(self, coro_fn, *args):
+        """
+        Run a coroutine on the app loop from a sync route (threadpool) and wait for it.
+        Sync services can't await - this is how they reach the async Redis client.
+        """
+        loop = self._loop
+        if loop is None or not loop.is_running():
+            raise RuntimeError("cart write-behind is not running (call cart_write_behind.start() on startup)")
+        if _on_loop(loop):
+            raise RuntimeError("run_blocking called on the event loop thread")
+        future = asyncio.run_coroutine_threadsafe(coro_fn(*args), loop)
+        return future.result(timeout=BLOCKING_FLUSH_TIMEOUT)
+
+
+def _on_loop(loop: asyncio.AbstractEventLoop) -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+cart_write_behind = CartWriteBehind()
+
+
+def flush_cart_blocking(user_id: str):
+    """Persist the user's Redis cart before checkout (sync callers). No-op in db mode."""
+    if not enabled():
+        return
+    try:
+        cart_write_behind.run_blocking(flush_cart, user_id)
+    except Exception as e:
+        logger.error(f"Cart flush before checkout failed for {user_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=I18nKeys.GENERAL_ERROR
+        )
+
+
+def clear_cart_blocking(user_id: str):
+    """Empty the user's Redis cart after checkout cleared cart_items (sync callers)"""
+    if not enabled():
+        return
+    try:
+        cart_write_behind.run_blocking(clear_cart, None, user_id)
+    except Exception as e:
+        # The next flush would re-add the ordered lines - log loudly, the order itself is fine
+        logger.error(f"Cart clear after checkout failed for {user_id}: {e}")
@@ -7,6 +7,7 @@ import json
 from typing import List, Dict, Optional
 from openai import OpenAI
 from app.db import get_db_session
+from app.metrics import track_dependency
 from app.models.sqlalchemy import Product
 from sqlalchemy import or_, desc
 
@@ -326,12 +327,13 @@ class ChatService:
         full_messages.extend(messages)
         
         try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=full_messages,
-                max_tokens=400,
-                temperature=0.7,
-            )
+            with track_dependency("openai", "chat_completion"):
+                response = client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=full_messages,
+                    max_tokens=400,
+                    temperature=0.7,
+                )
             
             ai_message = response.choices[0].message.content
             
@@ -4,6 +4,7 @@ import os
 from dotenv import load_dotenv
 from fastapi import UploadFile, HTTPException
 from app.i18n_keys import I18nKeys
+from app.metrics import track_dependency
 
 load_dotenv()
 
@@ -31,16 +32,17 @@ class CloudinaryService:
                 )
             
             # Upload to Cloudinary
-            result = cloudinary.uploader.upload(
-                file.file,
-                folder=folder,
-                resource_type="image",
-                transformation=[
-                    {"width": 800, "height": 800, "crop": "limit"},
-                    {"quality": "auto:good"},
-                    {"fetch_format": "auto"}
-                ]
-            )
+            with track_dependency("cloudinary", "upload"):
+                result = cloudinary.uploader.upload(
+                    file.file,
+                    folder=folder,
+                    resource_type="image",
+                    transformation=[
+                        {"width": 800, "height": 800, "crop": "limit"},
+                        {"quality": "auto:good"},
+                        {"fetch_format": "auto"}
+                    ]
+                )
             
             return {
                 "public_id": result.get("public_id"),
@@ -59,7 +61,8 @@ class CloudinaryService:
         Delete image from Cloudinary by public_id
         """
         try:
-            result = cloudinary.uploader.destroy(public_id)
+            with track_dependency("cloudinary", "destroy"):
+                result = cloudinary.uploader.destroy(public_id)
             return result.get("result") == "ok"
         except Exception as e:
             raise HTTPException(status_code=500, detail=I18nKeys.UPLOAD_FAILED)
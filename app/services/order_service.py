@@ -1,6 +1,10 @@
 from typing import List, Optional
+from datetime import datetime
 from fastapi import HTTPException, status
-from sqlalchemy.orm import joinedload
+from sqlalchemy import select, func, text, tuple_, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+import base64
 import math
 
 from app.models.sqlalchemy.order import Order, OrderItem, OrderStatus
@@ -14,12 +18,34 @@ from app.schemas.order_schemas import (
 from app.db import get_db_session
 from app.i18n_keys import I18nKeys
 
+# Below this many rows the planner estimate isn't worth it - COUNT(*) is cheap and exact
+ORDER_COUNT_ESTIMATE_MIN_ROWS = 50000
+
+# created_at placeholder in admin order cursors for rows without a created_at
+_NULL_CURSOR_TS = "null"
+
+_ORDERS_ROW_ESTIMATE = text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'orders'::regclass")
+
+_ORDERS_STATUS_FREQUENCY = text("""
+    SELECT mcv.freq
+    FROM pg_stats s,
+         unnest(s.most_common_vals::text::text[], s.most_common_freqs) AS mcv(val, freq)
+    WHERE s.schemaname = current_schema() AND s.tablename = 'orders' AND s.attname = 'status'
+      AND mcv.val = :status
+""")
+
 
 class OrderService:
     
     @staticmethod
     def create_order(user_id: str, request: CreateOrderRequest) -> OrderResponse:
-        """Create order from user's cart - validates stock at checkout"""
+        """Create order from user's cart - validates and reserves stock at checkout"""
+        from app.services.stock_service import StockService
+        from app.services import cart_store
+        
+        # Redis cart store: persist pending cart changes before reading cart_items
+        cart_store.flush_cart_blocking(user_id)
+        
         db = get_db_session()
         try:
             # Get user's cart with items
@@ -39,6 +65,8 @@ class OrderService:
             subtotal = 0.0
             order_items = []
             out_of_stock_items = []
+            size_quantities = {}  # ProductSize.size_id -> quantity to reserve
+            size_labels = {}
             
             for cart_item in cart.items:
                 product = cart_item.product_size.product if cart_item.product_size else None
@@ -48,8 +76,10 @@ class OrderService:
                 # Phase 5: Stock validation at checkout only
                 # Check size stock first if available, otherwise check product stock
                 if cart_item.product_size:
-                    # If product has sizes, check size stock
-                    available_stock = cart_item.product_size.stock_quantity
+                    # If product has sizes, check size stock not held by other pending orders
+                    available_stock = (
+                        cart_item.product_size.stock_quantity - (cart_item.product_size.reserved_quantity or 0)
+                    )
                 else:
                     # If no size, check product stock
                     available_stock = product.stock
@@ -67,6 +97,11 @@ class OrderService:
                 total_price = unit_price * cart_item.quantity
                 subtotal += total_price
                 
+                if cart_item.product_size:
+                    size_id = cart_item.product_size.size_id
+                    size_quantities[size_id] = size_quantities.get(size_id, 0) + cart_item.quantity
+                    size_labels[size_id] = f"{product.product_name} (size {cart_item.product_size.size})"
+
                 order_items.append({
                     'product_id': cart_item.product_id,
                     'product_name': product.product_name,
@@ -122,11 +157,26 @@ class OrderService:
                 )
                 db.add(order_item)
             
+            # Hold stock until payment or TTL. The pre-check above is only advisory:
+            # the reservation is the atomic guard against concurrent checkouts.
+            reservation = StockService.reserve(db, order.id, size_quantities)
+            if reservation["short"]:
+                db.rollback()
+                items_msg = ", ".join([
+                    f"{size_labels[line['size_id']]}: only {line['available']} left"
+                    for line in reservation["short"]
+                ])
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Some items are out of stock: {items_msg}"
+                )
+            
             # Clear cart
             db.query(Cart_Item).filter(Cart_Item.cart_id == cart.id).delete()
             
             db.commit()
             db.refresh(order)
+            cart_store.clear_cart_blocking(user_id)
             
             return OrderService._map_to_response(order, order_items)
             
@@ -142,25 +192,39 @@ class OrderService:
         finally:
             db.close()
     
+    @staticmethod
+    def _user_orders_query(user_id: str):
+        """Order list columns with the item count as a scalar subquery (no items loaded)"""
+        items_count = (
+            select(func.count(OrderItem.id))
+            .where(OrderItem.order_id == Order.id)
+            .correlate(Order)
+            .scalar_subquery()
+        )
+        return select(
+            Order.id, Order.total_amount, Order.status, Order.created_at, items_count
+        ).where(Order.user_id == user_id).order_by(Order.created_at.desc())
+    
+    @staticmethod
+    def _order_list_items(rows) -> List[OrderListItem]:
+        return [
+            OrderListItem(
+                id=order_id,
+                total_amount=total_amount,
+                status=order_status,
+                items_count=count or 0,
+                created_at=created_at
+            )
+            for order_id, total_amount, order_status, created_at, count in rows
+        ]
+    
     @staticmethod
     def get_user_orders(user_id: str) -> List[OrderListItem]:
         """Get all orders for a user"""
         db = get_db_session()
         try:
-            orders = db.query(Order).options(
-                joinedload(Order.items)
-            ).filter(Order.user_id == user_id).order_by(Order.created_at.desc()).all()
-            
-            return [
-                OrderListItem(
-                    id=order.id,
-                    total_amount=order.total_amount,
-                    status=order.status,
-                    items_count=len(order.items) if order.items else 0,
-                    created_at=order.created_at
-                )
-                for order in orders
-            ]
+            rows = db.execute(OrderService._user_orders_query(user_id)).all()
+            return OrderService._order_list_items(rows)
         finally:
             db.close()
     
@@ -179,45 +243,77 @@ class OrderService:
                     detail=I18nKeys.ORDER_NOT_FOUND
                 )
             
-            items = [
-                OrderItemResponse(
-                    id=item.id,
-                    product_id=item.product_id,
-                    product_name=item.product_name,
-                    product_image=item.product_image,
-                    product_size=item.product_size,
-                    quantity=item.quantity,
-                    unit_price=item.unit_price,
-                    total_price=item.total_price
-                )
-                for item in order.items
-            ]
-            
-            return OrderResponse(
-                id=order.id,
-                user_id=str(order.user_id),
-                shipping_name=order.shipping_name,
-                shipping_phone=order.shipping_phone,
-                shipping_email=order.shipping_email,
-                shipping_address=order.shipping_address,
-                subtotal=order.subtotal,
-                shipping_fee=order.shipping_fee,
-                total_amount=order.total_amount,
-                status=order.status,
-                note=order.note,
-                payment_intent_id=order.payment_intent_id,
-                refund_id=order.refund_id,
-                refund_amount=order.refund_amount,
-                refund_reason=order.refund_reason,
-                refunded_at=order.refunded_at,
-                return_requested_at=order.return_requested_at,
-                items=items,
-                created_at=order.created_at,
-                updated_at=order.updated_at
-            )
+            return OrderService._build_order_response(order)
         finally:
             db.close()
     
+    @staticmethod
+    def _build_order_response(order: Order) -> OrderResponse:
+        """Map an order loaded with its items to the detail response"""
+        items = [
+            OrderItemResponse(
+                id=item.id,
+                product_id=item.product_id,
+                product_name=item.product_name,
+                product_image=item.product_image,
+                product_size=item.product_size,
+                quantity=item.quantity,
+                unit_price=item.unit_price,
+                total_price=item.total_price
+            )
+            for item in order.items
+        ]
+        
+        return OrderResponse(
+            id=order.id,
+            user_id=str(order.user_id),
+            shipping_name=order.shipping_name,
+            shipping_phone=order.shipping_phone,
+            shipping_email=order.shipping_email,
+            shipping_address=order.shipping_address,
+            subtotal=order.subtotal,
+            shipping_fee=order.shipping_fee,
+            total_amount=order.total_amount,
+            status=order.status,
+            note=order.note,
+            payment_intent_id=order.payment_intent_id,
+            refund_id=order.refund_id,
+            refund_amount=order.refund_amount,
+            refund_reason=order.refund_reason,
+            refunded_at=order.refunded_at,
+            return_requested_at=order.return_requested_at,
+            items=items,
+            created_at=order.created_at,
+            updated_at=order.updated_at
+        )
+
+    # =====================
+    # Async read paths (request-scoped AsyncSession)
+    # =====================
+
+    @staticmethod
+    async def get_user_orders_async(db: AsyncSession, user_id: str) -> List[OrderListItem]:
+        """Get all orders for a user (async)"""
+        rows = (await db.execute(OrderService._user_orders_query(user_id))).all()
+        return OrderService._order_list_items(rows)
+
+    @staticmethod
+    async def get_order_detail_async(db: AsyncSession, user_id: str, order_id: int) -> OrderResponse:
+        """Get order detail - only if belongs to user (async)"""
+        order = await db.scalar(
+            select(Order).options(
+                selectinload(Order.items)
+            ).where(Order.id == order_id, Order.user_id == user_id)
+        )
+        
+        if not order:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=I18nKeys.ORDER_NOT_FOUND
+            )
+        
+        return OrderService._build_order_response(order)
+    
     @staticmethod
     def _map_to_response(order: Order, items_data: list) -> OrderResponse:
         """Map order to response"""
@@ -266,31 +362,61 @@ class OrderService:
     def admin_get_all_orders(
         page: int = 1,
         size: int = 20,
-        status_filter: Optional[str] = None
+        status_filter: Optional[str] = None,
+        cursor: Optional[str] = None,
+        estimate_count: bool = False
     ) -> AdminOrdersResponse:
-        """Get all orders with pagination (admin only)"""
+        """
+        Get all orders with pagination (admin only)
+        With cursor (the previous response's next_cursor) the page is read by keyset on
+        (created_at, id) - constant cost however deep; page/offset is kept for old clients.
+        estimate_count uses planner statistics instead of COUNT(*) on large tables.
+        """
+        # Reject a bad cursor before touching the DB
+        after = OrderService._decode_order_cursor(cursor) if cursor else None
+        
         db = get_db_session()
         try:
-            query = db.query(Order).options(
-                joinedload(Order.items)
+            # Item count per order without loading (and multiplying rows by) the items
+            items_count = (
+                select(func.count(OrderItem.id))
+                .where(OrderItem.order_id == Order.id)
+                .correlate(Order)
+                .scalar_subquery()
+                .label("items_count")
             )
+            query = db.query(Order, items_count)
             
             # Filter by status if provided
             if status_filter:
                 query = query.filter(Order.status == status_filter)
             
             # Get total count
-            total = query.count()
+            total, is_estimate = OrderService._count_orders(db, status_filter, estimate_count)
             total_pages = math.ceil(total / size) if total > 0 else 1
             
-            # Paginate and order
-            orders = query.order_by(Order.created_at.desc()).offset((page - 1) * size).limit(size).all()
+            # Paginate and order (id breaks created_at ties so keyset pages never overlap;
+            # legacy rows without created_at come first, as Postgres sorts NULLs in DESC)
+            query = query.order_by(Order.created_at.desc().nullsfirst(), Order.id.desc())
+            if after:
+                created_at, order_id = after
+                if created_at is None:
+                    query = query.filter(or_(
+                        and_(Order.created_at.is_(None), Order.id < order_id),
+                        Order.created_at.isnot(None),
+                    ))
+                else:
+                    query = query.filter(tuple_(Order.created_at, Order.id) < (created_at, order_id))
+            else:
+                query = query.offset((page - 1) * size)
+            rows = query.limit(size).all()
+            orders = [order for order, _ in rows]
             
             # Get user emails for orders
             user_ids = list(set(str(o.user_id) for o in orders))
             users_map = {}
             if user_ids:
-                users = db.query(User).filter(User.uuid.in_(user_ids)).all()
+                users = db.query(User.uuid, User.email).filter(User.uuid.in_(user_ids)).all()
                 users_map = {str(u.uuid): u.email for u in users}
             
             order_items = [
@@ -302,26 +428,76 @@ class OrderService:
                     shipping_email=order.shipping_email,
                     total_amount=order.total_amount,
                     status=order.status,
-                    items_count=len(order.items) if order.items else 0,
+                    items_count=count or 0,
                     created_at=order.created_at,
                     updated_at=order.updated_at,
                     return_evidence_photos=order.return_evidence_photos,
                     return_evidence_video=order.return_evidence_video,
                     return_evidence_description=order.return_evidence_description
                 )
-                for order in orders
+                for order, count in rows
             ]
             
+            next_cursor = None
+            if len(orders) == size:
+                next_cursor = OrderService._encode_order_cursor(orders[-1])
+            
             return AdminOrdersResponse(
                 orders=order_items,
                 total=total,
                 page=page,
                 size=size,
-                total_pages=total_pages
+                total_pages=total_pages,
+                next_cursor=next_cursor,
+                total_is_estimate=is_estimate
             )
         finally:
             db.close()
     
+    @staticmethod
+    def _encode_order_cursor(order: Order) -> str:
+        raw = f"{order.created_at.isoformat() if order.created_at else _NULL_CURSOR_TS}|{order.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+    
+    @staticmethod
+    def _decode_order_cursor(cursor: str) -> tuple:
+        try:
+            raw = base64.urlsafe_b64decode((cursor + "=" * (-len(cursor) % 4)).encode()).decode()
+            created_at, order_id = raw.rsplit("|", 1)
+            if created_at == _NULL_CURSOR_TS:
+                return None, int(order_id)
+            return datetime.fromisoformat(created_at), int(order_id)
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+    
+    @staticmethod
+    def _count_orders(db, status_filter: Optional[str], estimate: bool) -> tuple:
+        """
+        (total, is_estimate). The estimate comes from pg_class.reltuples (times the
+        status frequency from pg_stats when filtered); small tables and statuses that
+        the statistics don't track fall back to an exact COUNT(*).
+        """
+        if estimate:
+            try:
+                rows = db.execute(_ORDERS_ROW_ESTIMATE).scalar() or 0
+                if rows >= ORDER_COUNT_ESTIMATE_MIN_ROWS:
+                    if not status_filter:
+                        return int(rows), True
+                    freq = db.execute(_ORDERS_STATUS_FREQUENCY, {"status": status_filter}).scalar()
+                    if freq is not None:
+                        return int(rows * freq), True
+            except Exception as e:
+                db.rollback()
+                print(f"[Orders] Count estimate unavailable, using exact count: {e}")
+        
+        count_query = db.query(func.count(Order.id))
+        if status_filter:
+            count_query = count_query.filter(Order.status == status_filter)
+        return count_query.scalar() or 0, False
+    
     @staticmethod
     def admin_get_order_detail(order_id: int) -> OrderResponse:
         """Get any order detail (admin only)"""
@@ -337,42 +513,7 @@ class OrderService:
                     detail=I18nKeys.ORDER_NOT_FOUND
                 )
             
-            items = [
-                OrderItemResponse(
-                    id=item.id,
-                    product_id=item.product_id,
-                    product_name=item.product_name,
-                    product_image=item.product_image,
-                    product_size=item.product_size,
-                    quantity=item.quantity,
-                    unit_price=item.unit_price,
-                    total_price=item.total_price
-                )
-                for item in order.items
-            ]
-            
-            return OrderResponse(
-                id=order.id,
-                user_id=str(order.user_id),
-                shipping_name=order.shipping_name,
-                shipping_phone=order.shipping_phone,
-                shipping_email=order.shipping_email,
-                shipping_address=order.shipping_address,
-                subtotal=order.subtotal,
-                shipping_fee=order.shipping_fee,
-                total_amount=order.total_amount,
-                status=order.status,
-                note=order.note,
-                payment_intent_id=order.payment_intent_id,
-                refund_id=order.refund_id,
-                refund_amount=order.refund_amount,
-                refund_reason=order.refund_reason,
-                refunded_at=order.refunded_at,
-                return_requested_at=order.return_requested_at,
-                items=items,
-                created_at=order.created_at,
-                updated_at=order.updated_at
-            )
+            return OrderService._build_order_response(order)
         finally:
             db.close()
     
@@ -384,13 +525,14 @@ class OrderService:
     ) -> OrderResponse:
         """
         Cancel/Return order by user with automatic refund logic
-        - PENDING → CANCELLED (no refund, no stock rollback)
+        - PENDING → CANCELLED (no refund, reservation released)
         - CONFIRMED → REFUND_PENDING → REFUNDED (auto refund + stock rollback via webhook)
         - PROCESSING → Error (need admin approval)
         - SHIPPED → Error (cannot cancel)
         - DELIVERED → RETURN_REQUESTED (need admin approval, 7-day window)
         """
         from app.services.refund_service import RefundService
+        from app.services.stock_service import StockService
         
         db = get_db_session()
         try:
@@ -410,8 +552,9 @@ class OrderService:
             
             # Handle cancel/return based on order status
             if order.status == OrderStatus.PENDING.value:
-                # PENDING: Just cancel - no payment yet, no stock deducted
+                # PENDING: Just cancel - no payment yet, release the stock reservation
                 order.status = OrderStatus.CANCELLED.value
+                StockService.release_for_order(order_id, db=db)
                 db.commit()
                 db.refresh(order)
                 print(f"[Cancel] Order {order_id} cancelled (was PENDING, no refund needed)")
@@ -610,7 +753,12 @@ class OrderService:
             # Check if we need to rollback stock
             old_status = order.status
             if old_status == "confirmed" and new_status in ["cancelled", "refunded"]:
-                OrderService.rollback_stock_on_cancel(order_id)
+                # Same transaction as the status change - both commit or neither does
+                OrderService.rollback_stock_on_cancel(order_id, db=db)
+            elif old_status == OrderStatus.PENDING.value and new_status == OrderStatus.CANCELLED.value:
+                # Never paid - just release the stock reservation
+                from app.services.stock_service import StockService
+                StockService.release_for_order(order_id, db=db)
             
             # Record shipped_at timestamp when status changes to SHIPPED
             if new_status == OrderStatus.SHIPPED.value and old_status != OrderStatus.SHIPPED.value:
@@ -626,99 +774,55 @@ class OrderService:
             db.close()
 
     @staticmethod
-    def deduct_stock_on_payment(order_id: int):
-        """Deduct stock from products when payment is confirmed"""
-        db = get_db_session()
+    def deduct_stock_on_payment(order_id: int, db=None) -> Optional[dict]:
+        """Deduct stock from products when payment is confirmed (set-based, see StockService)
+        
+        Pass `db` to deduct inside the caller's transaction (caller commits).
+        """
+        from app.services.stock_service import StockService
+        
         try:
-            # Get order with items
-            order = db.query(Order).options(
-                joinedload(Order.items)
-            ).filter(Order.id == order_id).first()
-            
-            if not order:
-                print(f"[Stock Deduction] Order {order_id} not found")
-                return
-            
-            # Deduct stock for each item
-            for item in order.items:
-                product = db.query(Product).filter(Product.id == item.product_id).first()
-                if not product:
-                    print(f"[Stock Deduction] Product {item.product_id} not found")
-                    continue
-                
-                # Check if item has size - deduct from size stock if exists
-                if item.product_size:
-                    # Deduct from size-level stock
-                    product_size = db.query(ProductSize).filter(
-                        ProductSize.product_id == product.id,
-                        ProductSize.size == item.product_size
-                    ).first()
-                    
-                    if product_size:
-                        if product_size.stock_quantity >= item.quantity:
-                            product_size.stock_quantity -= item.quantity
-                            print(f"[Stock Deduction] Deducted {item.quantity} from {product.product_name} size {item.product_size}, remaining: {product_size.stock_quantity}")
-                        else:
-                            print(f"[Stock Deduction] Insufficient size stock for {product.product_name} size {item.product_size}: has {product_size.stock_quantity}, need {item.quantity}")
-                    else:
-                        print(f"[Stock Deduction] Size {item.product_size} not found for product {product.product_name}")
-                else:
-                    # No size - deduct from product-level stock
-                    if product.stock >= item.quantity:
-                        product.stock -= item.quantity
-                        print(f"[Stock Deduction] Deducted {item.quantity} from product {product.product_name}, remaining: {product.stock}")
-                    else:
-                        print(f"[Stock Deduction] Insufficient stock for product {product.product_name}: has {product.stock}, need {item.quantity}")
-            
-            db.commit()
+            result = StockService.deduct_for_order(order_id, db=db)
+            if not result["order_found"]:
+                print(f"[Stock Deduction] Order {order_id} not found or has no items")
+                return result
+            
+            for line in result["applied"]:
+                size_label = f" size {line['size']}" if line["size"] else ""
+                print(f"[Stock Deduction] Deducted {line['quantity']} from product {line['product_id']}{size_label}, remaining: {line['stock']}")
+            for line in result["short"]:
+                size_label = f" size {line['size']}" if line["size"] else ""
+                print(f"[Stock Deduction] Insufficient stock or missing product {line['product_id']}{size_label}: need {line['requested']}")
+            return result
         except Exception as e:
-            db.rollback()
             print(f"[Stock Deduction] Error deducting stock for order {order_id}: {e}")
-        finally:
-            db.close()
+            if db is not None:
+                raise
+            return None
 
     @staticmethod
-    def rollback_stock_on_cancel(order_id: int):
-        """Rollback stock when order is cancelled or refunded"""
-        db = get_db_session()
+    def rollback_stock_on_cancel(order_id: int, db=None) -> Optional[dict]:
+        """Rollback stock when order is cancelled or refunded (set-based, see StockService)
+        
+        Pass `db` to restore inside the caller's transaction (caller commits).
+        """
+        from app.services.stock_service import StockService
+        
         try:
-            # Get order with items
-            order = db.query(Order).options(
-                joinedload(Order.items)
-            ).filter(Order.id == order_id).first()
-            
-            if not order:
-                print(f"[Stock Rollback] Order {order_id} not found")
-                return
-            
-            # Add back stock for each item
-            for item in order.items:
-                product = db.query(Product).filter(Product.id == item.product_id).first()
-                if not product:
-                    print(f"[Stock Rollback] Product {item.product_id} not found")
-                    continue
-                
-                # Check if item has size - add back to size stock if exists
-                if item.product_size:
-                    # Add back to size-level stock
-                    product_size = db.query(ProductSize).filter(
-                        ProductSize.product_id == product.id,
-                        ProductSize.size == item.product_size
-                    ).first()
-                    
-                    if product_size:
-                        product_size.stock_quantity += item.quantity
-                        print(f"[Stock Rollback] Added back {item.quantity} to {product.product_name} size {item.product_size}, now: {product_size.stock_quantity}")
-                    else:
-                        print(f"[Stock Rollback] Size {item.product_size} not found for product {product.product_name}")
-                else:
-                    # No size - add back to product-level stock
-                    product.stock += item.quantity
-                    print(f"[Stock Rollback] Added back {item.quantity} to product {product.product_name}, now: {product.stock}")
-            
-            db.commit()
+            result = StockService.restore_for_order(order_id, db=db)
+            if not result["order_found"]:
+                print(f"[Stock Rollback] Order {order_id} not found or has no items")
+                return result
+            
+            for line in result["applied"]:
+                size_label = f" size {line['size']}" if line["size"] else ""
+                print(f"[Stock Rollback] Added back {line['quantity']} to product {line['product_id']}{size_label}, now: {line['stock']}")
+            for line in result["short"]:
+                size_label = f" size {line['size']}" if line["size"] else ""
+                print(f"[Stock Rollback] Product {line['product_id']}{size_label} not found")
+            return result
         except Exception as e:
-            db.rollback()
             print(f"[Stock Rollback] Error rolling back stock for order {order_id}: {e}")
-        finally:
-            db.close()
+            if db is not None:
+                raise
+            return None
@@ -0,0 +1,161 @@
+"""
+Password hashing on a dedicated, bounded process pool
+
+bcrypt burns ~250ms of CPU per call. Run inline (or in the shared threadpool) a login burst
+starves every other request; here it runs in PASSWORD_HASH_WORKERS separate processes, and
+at most PASSWORD_HASH_MAX_QUEUE calls may wait for a worker:
+- queue full                      -> 429 with Retry-After (client backs off)
+- waited PASSWORD_HASH_TIMEOUT s  -> 503
+
+The worker functions only import bcrypt/hashlib, so spawned workers start light.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+import bcrypt
+from fastapi import HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(2, os.cpu_count() or 1))))
+HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))
+# Cost factor for new hashes; logins rehash passwords stored with a different cost
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+
+# =====================
+# Worker functions (run in the pool processes)
+# =====================
+
+def _prehash(password: str) -> bytes:
+    # SHA-256 hex (64 chars) - any password length fits bcrypt's 72-byte limit
+    return hashlib.sha256(password.encode('utf-8')).hexdigest().encode('utf-8')
+
+
+def hash_password_sync(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return bcrypt.hashpw(_prehash(password), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def verify_password_sync(password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(_prehash(password), hashed_password.encode('utf-8'))
+
+
+def hash_cost(hashed_password: str) -> Optional[int]:
+    """Cost factor from a "$2b$12$..." hash"""
+    try:
+        return int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    return hash_cost(hashed_password) != BCRYPT_ROUNDS
+
+
+# =====================
+# Pool
+# =====================
+
+class PasswordHasher:
+    """Bounded process pool for bcrypt with admission control and counters"""
+
+    def __init__(self, workers: int = HASH_WORKERS, max_queue: int = HASH_MAX_QUEUE, timeout: float = HASH_TIMEOUT):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.completed = 0
+        self.total_seconds = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: never fork the event loop / DB pools / Redis connections into workers
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def shutdown(self):
+        """Stop the worker processes - call this on app shutdown"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _admit(self):
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many authentication requests, please retry shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self._in_flight += 1
+            self.submitted += 1
+
+    def _release(self, started: float, future):
+        with self._lock:
+            self._in_flight -= 1
+            if not future.cancelled():
+                self.completed += 1
+                self.total_seconds += time.perf_counter() - started
+
+    async def _run(self, fn, *args):
+        self._admit()
+        started = time.perf_counter()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        # Released when the worker really finishes - a timed-out call still occupies it
+        future.add_done_callback(lambda f: self._release(started, f))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            logger.warning(f"Password hashing timed out after {self.timeout}s ({self.stats()})")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication is busy, please retry",
+                headers={"Retry-After": "2"},
+            )
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password_sync, password, BCRYPT_ROUNDS)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password_sync, password, hashed_password)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "avg_ms": round(self.total_seconds / self.completed * 1000, 1) if self.completed else 0.0,
+            }
+
+
+password_hasher = PasswordHasher()
@@ -1,14 +1,15 @@
 from typing import List, Dict, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.sqlalchemy import Product, ProductSize, Category
 from app.schemas.product_schemas import ProductBase, ProductResponse, CategoryResponse, ProductSizeResponse
-from app.db import get_db_session
+from app.db import ScopedSession
 from fastapi import HTTPException
 from fastapi_pagination import Page, paginate
 from app import app
 from app.i18n_keys import I18nKeys
-from app.search.product_sync import index_product, delete_product_from_index
+from app.search.product_sync import sync_product, OP_DELETE
 import os
 from colorama import Fore
 from datetime import datetime
@@ -16,7 +17,8 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-db = get_db_session()
+# Request-scoped session proxy (see app.db.DBSessionScopeMiddleware)
+db = ScopedSession
 def map_product_to_response(db_product: Product) -> ProductResponse:
     categories = [CategoryResponse(name=category.name, id=category.id) for category in db_product.categories]
     sizes = [ProductSizeResponse(size=size.size, stock_quantity=size.stock_quantity, size_id=size.size_id) for size in db_product.sizes]
@@ -71,9 +73,9 @@ class Product_Service():
                 db.add(db_color)
             db.commit()
 
-        # Sync to Elasticsearch (non-blocking, don't fail if ES is down)
+        # Queue for Elasticsearch sync (batched in the background, don't fail if ES is down)
         try:
-            index_product(db_product)
+            sync_product(db_product.id)
         except Exception as e:
             logger.error(f"Failed to sync product {db_product.id} to Elasticsearch: {e}")
 
@@ -160,6 +162,28 @@ class Product_Service():
             db.rollback()  # Ensure to rollback on any error.
             raise HTTPException(status_code=404, detail=I18nKeys.PRODUCT_NOT_FOUND)
 
+    # Get a single product by slug on the request's AsyncSession
+    async def get_product_async(db: AsyncSession, product_slug: str) -> Product:
+        product = await db.scalar(
+            select(Product)
+            .options(selectinload(Product.categories), selectinload(Product.sizes))
+            .where(Product.slug == product_slug)
+        )
+        if not product:
+            raise HTTPException(status_code=404, detail=I18nKeys.PRODUCT_NOT_FOUND)
+        return product
+
+
+    # Cache-relevant fields of a product (id, type, category names) - used to invalidate
+    # the cache tags a product belonged to before an edit
+    def get_product_cache_info(product_slug: str) -> Optional[Dict]:
+        row = db.query(Product.id, Product.product_type).filter(Product.slug == product_slug).first()
+        if not row:
+            return None
+        category_names = [
+            name for (name,) in db.query(Category.name).join(Product.categories).filter(Product.id == row.id).all()
+        ]
+        return {"id": row.id, "product_type": row.product_type, "categories": category_names}
 
     # Update a product
     def update_product(product_slug: str, product_data: dict) -> Dict:
@@ -176,9 +200,9 @@ class Product_Service():
             db.commit()
             db.refresh(db_product)
             
-            # Sync to Elasticsearch
+            # Queue for Elasticsearch sync
             try:
-                index_product(db_product)
+                sync_product(db_product.id)
             except Exception as e:
                 logger.error(f"Failed to update product {db_product.id} in Elasticsearch: {e}")
             
@@ -201,9 +225,9 @@ class Product_Service():
             db.delete(db_product)
             db.commit()
             
-            # Remove from Elasticsearch
+            # Queue removal from Elasticsearch
             try:
-                delete_product_from_index(product_id)
+                sync_product(product_id, OP_DELETE)
             except Exception as e:
                 logger.error(f"Failed to delete product {product_id} from Elasticsearch: {e}")
             
@@ -225,6 +249,11 @@ class Product_Service():
             db_product.stock = stock
             db.commit()
             db.refresh(db_product)
+            # Search results show stock - queue the product for re-indexing
+            try:
+                sync_product(db_product.id)
+            except Exception as e:
+                logger.error(f"Failed to sync product {db_product.id} to Elasticsearch: {e}")
             return {"message": "Stock updated successfully", "stock": stock}
         except HTTPException:
             raise
@@ -6,9 +6,11 @@ import os
 import stripe
 from datetime import datetime
 from fastapi import HTTPException, status
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, Session
+from typing import Optional
 
 from app.db import get_db_session
+from app.metrics import track_dependency
 from app.models.sqlalchemy.order import Order, OrderStatus
 from app.services.order_service import OrderService
 from app.schemas.order_schemas import OrderResponse
@@ -89,7 +91,8 @@ class RefundService:
                 if refund_amount_cents is not None:
                     refund_params["amount"] = refund_amount_cents
                 
-                refund = stripe.Refund.create(**refund_params)
+                with track_dependency("stripe", "refund_create"):
+                    refund = stripe.Refund.create(**refund_params)
                 
                 print(f"[Refund] Created Stripe refund {refund.id} for order {order_id}")
                 
@@ -131,58 +134,76 @@ class RefundService:
             db.close()
     
     @staticmethod
-    def handle_refund_succeeded(refund_id: str):
+    def handle_refund_succeeded(refund_id: str, db: Optional[Session] = None):
         """
         Handle webhook event when refund succeeded
         - Updates order status to REFUNDED
         - Rollbacks stock
         - Records refunded timestamp
+        
+        Pass `db` to apply inside the caller's transaction (caller commits, errors propagate).
+        charge.refunded and refund.updated both report the same refund - the second is a no-op.
         """
-        db = get_db_session()
+        owns_session = db is None
+        if owns_session:
+            db = get_db_session()
         try:
             order = db.query(Order).options(
                 joinedload(Order.items)
-            ).filter(Order.refund_id == refund_id).first()
+            ).filter(Order.refund_id == refund_id).with_for_update(of=Order).first()
             
             if not order:
                 print(f"[Refund Webhook] Order not found for refund {refund_id}")
                 return
+            if order.status == OrderStatus.REFUNDED.value:
+                print(f"[Refund Webhook] Order {order.id} already refunded for {refund_id}")
+                return
             
             # Update status to refunded
             order.status = OrderStatus.REFUNDED.value
             order.refunded_at = datetime.utcnow()
             
-            # Rollback stock
-            OrderService.rollback_stock_on_cancel(order.id)
+            # Rollback stock in the same transaction as the status change
+            OrderService.rollback_stock_on_cancel(order.id, db=db)
             
-            db.commit()
+            if owns_session:
+                db.commit()
             
             print(f"[Refund Webhook] Order {order.id} refunded successfully and stock rolled back")
             
         except Exception as e:
-            db.rollback()
             print(f"[Refund Webhook] Error handling refund succeeded for {refund_id}: {e}")
+            if not owns_session:
+                raise
+            db.rollback()
         finally:
-            db.close()
+            if owns_session:
+                db.close()
     
     @staticmethod
-    def handle_refund_failed(refund_id: str):
-        """Handle webhook event when refund failed"""
-        db = get_db_session()
+    def handle_refund_failed(refund_id: str, db: Optional[Session] = None):
+        """Handle webhook event when refund failed (pass `db` to apply in the caller's transaction)"""
+        owns_session = db is None
+        if owns_session:
+            db = get_db_session()
         try:
             order = db.query(Order).filter(Order.refund_id == refund_id).first()
             
-            if order:
+            if order and order.status == OrderStatus.REFUND_PENDING.value:
                 # Revert status back to CONFIRMED
                 order.status = OrderStatus.CONFIRMED.value
-                db.commit()
+                if owns_session:
+                    db.commit()
                 
                 print(f"[Refund Webhook] Refund failed for order {order.id}, status reverted to CONFIRMED")
         except Exception as e:
-            db.rollback()
             print(f"[Refund Webhook] Error handling refund failed: {e}")
+            if not owns_session:
+                raise
+            db.rollback()
         finally:
-            db.close()
+            if owns_session:
+                db.close()
     
     @staticmethod
     def get_refund_status(order_id: int) -> dict:
@@ -471,7 +492,8 @@ class RefundService:
         Admin confirms product has been received
         - Validates: status = RETURN_SHIPPING
         - Updates: status → RETURN_RECEIVED, sets return_received_at
-        - Auto triggers: Stripe refund (subtotal only, no shipping fee)
+        - Auto triggers: Stripe refund (subtotal only, no shipping fee) on the job queue
+          (refunds.return_refund → create_return_refund), inline if the enqueue fails
         - Final status: REFUND_PENDING → REFUNDED (via webhook)
         """
         db = get_db_session()
@@ -499,43 +521,37 @@ class RefundService:
                 order.qc_notes = qc_notes
             
             db.commit()
+            refund_amount = order.subtotal  # Refund subtotal only
+            received_at = order.return_received_at
             
-            print(f"[Return] Order {order_id} - Admin confirmed product received. Auto-triggering refund...")
+            print(f"[Return] Order {order_id} - Admin confirmed product received. Queueing refund...")
             
-            # Auto create Stripe refund (subtotal only - no shipping fee for returns)
-            refund_amount = order.subtotal  # Refund subtotal only
+            from app.jobs.tasks import return_refund
             
             try:
-                refund = stripe.Refund.create(
-                    payment_intent=order.payment_intent_id,
-                    amount=int(refund_amount * 100),  # Convert to cents
-                    reason="requested_by_customer",
-                    metadata={"order_id": str(order_id), "type": "return_refund"}
-                )
-                
-                print(f"[Return] Created Stripe refund {refund.id} for ${refund_amount:.2f} (subtotal only)")
-                
-                # Update order with refund info
-                order.status = OrderStatus.REFUND_PENDING.value
-                order.refund_id = refund.id
-                order.refund_amount = refund_amount
-                order.refund_reason = "Product returned and received by admin"
-                
-                db.commit()
-                
+                job_id = return_refund.enqueue(args=(order_id,), unique_key=f"return-refund:{order_id}")
+            except Exception as e:
+                print(f"[Return] Could not queue the refund for order {order_id} ({e}) - refunding inline")
+                result = RefundService.create_return_refund(order_id)
                 return {
                     "success": True,
                     "message": "Product received and refund initiated automatically",
-                    "order_status": order.status,
-                    "received_at": order.return_received_at.isoformat(),
-                    "refund_id": refund.id,
+                    "order_status": result["order_status"],
+                    "received_at": received_at.isoformat(),
+                    "refund_id": result.get("refund_id"),
                     "refund_amount": refund_amount,
                     "note": "Refund includes subtotal only (no shipping fee)"
                 }
-                
-            except stripe.error.InvalidRequestError as e:
-                db.rollback()
-                raise HTTPException(400, f"Stripe refund failed: {str(e)}")
+            
+            return {
+                "success": True,
+                "message": "Product received, refund queued",
+                "order_status": OrderStatus.RETURN_RECEIVED.value,
+                "received_at": received_at.isoformat(),
+                "refund_job_id": job_id,
+                "refund_amount": refund_amount,
+                "note": "Refund includes subtotal only (no shipping fee); the order moves to REFUND_PENDING once Stripe accepts it"
+            }
             
         except HTTPException:
             raise
@@ -546,6 +562,47 @@ class RefundService:
         finally:
             db.close()
     
+    @staticmethod
+    def create_return_refund(order_id: int) -> dict:
+        """
+        Stripe refund of a received return (subtotal only) - run by the refunds.return_refund job
+        - No-op unless the order is still RETURN_RECEIVED without a refund
+        - The idempotency key makes a retried job get back the refund Stripe already created
+        """
+        db = get_db_session()
+        try:
+            order = db.query(Order).filter(Order.id == order_id).with_for_update().first()
+            
+            if not order or order.status != OrderStatus.RETURN_RECEIVED.value or order.refund_id:
+                print(f"[Return] Order {order_id} no longer waits for its return refund - skipping")
+                return {"skipped": True, "order_status": order.status if order else None}
+            
+            refund_amount = order.subtotal
+            with track_dependency("stripe", "refund_create"):
+                refund = stripe.Refund.create(
+                    payment_intent=order.payment_intent_id,
+                    amount=int(refund_amount * 100),  # Convert to cents
+                    reason="requested_by_customer",
+                    metadata={"order_id": str(order_id), "type": "return_refund"},
+                    idempotency_key=f"return-refund-{order_id}"
+                )
+            
+            print(f"[Return] Created Stripe refund {refund.id} for ${refund_amount:.2f} (subtotal only)")
+            
+            order.status = OrderStatus.REFUND_PENDING.value
+            order.refund_id = refund.id
+            order.refund_amount = refund_amount
+            order.refund_reason = "Product returned and received by admin"
+            db.commit()
+            
+            return {"refund_id": refund.id, "refund_amount": refund_amount, "order_status": order.status}
+            
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
     @staticmethod
     def admin_confirm_refund(order_id: int, refund_amount: float = None) -> dict:
         """
@@ -4,13 +4,14 @@ from sqlalchemy import func
 from app.models.sqlalchemy import Review, Product, User
 from app.models.sqlalchemy.order import Order, OrderItem, OrderStatus
 from app.schemas.review_schemas import ReviewCreate, ReviewResponse, ReviewListResponse, ReviewAuthor
-from app.db import get_db_session
+from app.db import get_db_session, ScopedSession
 from fastapi import HTTPException
 from app.i18n_keys import I18nKeys
 import uuid
 
 
-db = get_db_session()
+# Request-scoped session proxy (see app.db.DBSessionScopeMiddleware)
+db = ScopedSession
 
 
 def map_review_to_response(review: Review) -> ReviewResponse:
@@ -0,0 +1,461 @@
+"""
+Stock Service - Set-based stock deduction, rollback and reservations for orders
+Every line of an order is applied with one UPDATE ... RETURNING per stock table,
+so the cost is a constant number of queries no matter how many lines the order has.
+
+Reservations: create_order holds quantities on product_sizes.reserved_quantity
+(one ledger row per size in stock_reservations) while the order is PENDING.
+checkout.session.completed commits them into a deduction, checkout.session.expired
+or the TTL sweeper releases them.
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db import get_db_session
+from app.models.sqlalchemy.order import OrderItem, OrderStatus
+from app.models.sqlalchemy.reservation import ReservationStatus
+
+# How long a PENDING order holds stock. Stripe Checkout sessions must live >= 30 minutes,
+# the payment router uses the same value for the session's expires_at.
+RESERVATION_TTL_MINUTES = int(os.getenv("RESERVATION_TTL_MINUTES", "30"))
+
+
+# Size-level stock (order item has product_size). The condition makes the deduction
+# atomic: a row is only touched when it still has enough stock at UPDATE time.
+_DEDUCT_SIZE_STOCK = text("""
+    UPDATE product_sizes AS ps
+    SET stock_quantity = ps.stock_quantity - v.qty
+    FROM unnest(CAST(:product_ids AS integer[]), CAST(:sizes AS varchar[]), CAST(:qtys AS integer[]))
+        AS v(product_id, size, qty)
+    WHERE ps.product_id = v.product_id
+      AND ps.size = v.size
+      AND ps.stock_quantity >= v.qty
+    RETURNING ps.product_id, ps.size, ps.stock_quantity
+""")
+
+_RESTORE_SIZE_STOCK = text("""
+    UPDATE product_sizes AS ps
+    SET stock_quantity = ps.stock_quantity + v.qty
+    FROM unnest(CAST(:product_ids AS integer[]), CAST(:sizes AS varchar[]), CAST(:qtys AS integer[]))
+        AS v(product_id, size, qty)
+    WHERE ps.product_id = v.product_id
+      AND ps.size = v.size
+    RETURNING ps.product_id, ps.size, ps.stock_quantity
+""")
+
+# Product-level stock (order item without size)
+_DEDUCT_PRODUCT_STOCK = text("""
+    UPDATE products AS p
+    SET stock = p.stock - v.qty
+    FROM unnest(CAST(:product_ids AS integer[]), CAST(:qtys AS integer[])) AS v(product_id, qty)
+    WHERE p.id = v.product_id
+      AND p.stock >= v.qty
+    RETURNING p.id, p.stock
+""")
+
+_RESTORE_PRODUCT_STOCK = text("""
+    UPDATE products AS p
+    SET stock = p.stock + v.qty
+    FROM unnest(CAST(:product_ids AS integer[]), CAST(:qtys AS integer[])) AS v(product_id, qty)
+    WHERE p.id = v.product_id
+    RETURNING p.id, p.stock
+""")
+
+
+# Reserve: one conditional UPDATE on the size primary key per line, ledger rows inserted
+# from the rows that were actually reserved - all in a single statement.
+_RESERVE_SIZES = text("""
+    WITH reserved AS (
+        UPDATE product_sizes AS ps
+        SET reserved_quantity = ps.reserved_quantity + v.qty
+        FROM unnest(CAST(:size_ids AS integer[]), CAST(:qtys AS integer[])) AS v(size_id, qty)
+        WHERE ps.id = v.size_id
+          AND ps.stock_quantity - ps.reserved_quantity >= v.qty
+        RETURNING ps.id AS size_id, v.qty AS qty
+    )
+    INSERT INTO stock_reservations (order_id, size_id, quantity, status, expires_at, created_at)
+    SELECT :order_id, reserved.size_id, reserved.qty, 'active', :expires_at, :now
+    FROM reserved
+    RETURNING size_id
+""")
+
+_AVAILABLE_SIZES = text("""
+    SELECT ps.id, ps.stock_quantity - ps.reserved_quantity
+    FROM product_sizes AS ps
+    WHERE ps.id = ANY(CAST(:size_ids AS integer[]))
+""")
+
+# Commit: active reservations of one order become a real deduction
+_COMMIT_RESERVATIONS = text("""
+    WITH committed AS (
+        UPDATE stock_reservations
+        SET status = 'committed'
+        WHERE order_id = :order_id AND status = 'active'
+        RETURNING size_id, quantity
+    ), totals AS (
+        SELECT size_id, SUM(quantity) AS qty FROM committed GROUP BY size_id
+    )
+    UPDATE product_sizes AS ps
+    SET stock_quantity = ps.stock_quantity - totals.qty,
+        reserved_quantity = GREATEST(ps.reserved_quantity - totals.qty, 0)
+    FROM totals
+    WHERE ps.id = totals.size_id
+    RETURNING ps.product_id, ps.size, ps.stock_quantity, totals.qty
+""")
+
+# Release: active reservations of one order go back to available stock
+_RELEASE_RESERVATIONS = text("""
+    WITH released AS (
+        UPDATE stock_reservations
+        SET status = :status
+        WHERE order_id = :order_id AND status = 'active'
+        RETURNING size_id, quantity
+    ), totals AS (
+        SELECT size_id, SUM(quantity) AS qty FROM released GROUP BY size_id
+    )
+    UPDATE product_sizes AS ps
+    SET reserved_quantity = GREATEST(ps.reserved_quantity - totals.qty, 0)
+    FROM totals
+    WHERE ps.id = totals.size_id
+    RETURNING ps.id
+""")
+
+# Sweeper: expire whole orders, a bounded batch of them (partial index on active expires_at).
+# The order rows are locked first, as payment confirmation does, and orders being paid right
+# now are skipped - an order's reservations are never split between expired and committed.
+_EXPIRE_RESERVATIONS = text("""
+    WITH due_orders AS (
+        SELECT o.id FROM orders AS o
+        WHERE o.id IN (
+            SELECT order_id FROM stock_reservations
+            WHERE status = 'active' AND expires_at <= :now
+            GROUP BY order_id
+            ORDER BY MIN(expires_at)
+            LIMIT :batch_size
+        )
+        FOR UPDATE OF o SKIP LOCKED
+    ), expired AS (
+        UPDATE stock_reservations AS r
+        SET status = 'expired'
+        FROM due_orders
+        WHERE r.order_id = due_orders.id AND r.status = 'active'
+        RETURNING r.size_id, r.quantity
+    ), totals AS (
+        SELECT size_id, SUM(quantity) AS qty FROM expired GROUP BY size_id
+    ), released AS (
+        UPDATE product_sizes AS ps
+        SET reserved_quantity = GREATEST(ps.reserved_quantity - totals.qty, 0)
+        FROM totals
+        WHERE ps.id = totals.size_id
+        RETURNING totals.qty
+    )
+    SELECT (SELECT count(*) FROM expired), (SELECT COALESCE(SUM(qty), 0) FROM released)
+""")
+
+# Serializes reserve_for_order with payment confirmation / cancellation of the same order
+_LOCK_ORDER_STATUS = text("""
+    SELECT status FROM orders WHERE id = :order_id FOR UPDATE
+""")
+
+_EXTEND_RESERVATIONS = text("""
+    UPDATE stock_reservations
+    SET expires_at = :expires_at
+    WHERE order_id = :order_id AND status = 'active'
+    RETURNING id
+""")
+
+_ORDER_SIZE_LINES = text("""
+    SELECT ps.id, SUM(oi.quantity)
+    FROM order_items AS oi
+    JOIN product_sizes AS ps ON ps.product_id = oi.product_id AND ps.size = oi.product_size
+    WHERE oi.order_id = :order_id
+    GROUP BY ps.id
+""")
+
+
+class StockService:
+    """Batched stock engine used by payment confirmation, cancellation and refunds"""
+
+    @staticmethod
+    def aggregate_lines(items) -> tuple[dict, dict]:
+        """
+        Collapse order lines into per-row quantities
+        (UPDATE ... FROM only applies one joined row per target row, so duplicates must be summed first)
+
+        Args:
+            items: iterable of (product_id, product_size, quantity)
+
+        Returns:
+            (sized, unsized): {(product_id, size): qty}, {product_id: qty}
+        """
+        sized: dict = {}
+        unsized: dict = {}
+        for product_id, size, quantity in items:
+            if product_id is None or not quantity:
+                continue
+            if size:
+                key = (product_id, size)
+                sized[key] = sized.get(key, 0) + quantity
+            else:
+                unsized[product_id] = unsized.get(product_id, 0) + quantity
+        return sized, unsized
+
+    @staticmethod
+    def apply_lines(db: Session, sized: dict, unsized: dict, deduct: bool = True) -> dict:
+        """
+        Apply aggregated lines in at most two statements (no commit - caller owns the transaction)
+
+        Returns:
+            dict with "applied" rows (new stock levels) and "short" lines that were not applied
+            (not enough stock when deducting, or product/size no longer exists)
+        """
+        applied = []
+        short = []
+
+        if sized:
+            keys = list(sized.keys())
+            rows = db.execute(
+                _DEDUCT_SIZE_STOCK if deduct else _RESTORE_SIZE_STOCK,
+                {
+                    "product_ids": [k[0] for k in keys],
+                    "sizes": [k[1] for k in keys],
+                    "qtys": [sized[k] for k in keys],
+                }
+            ).all()
+            hit = set()
+            for product_id, size, stock_quantity in rows:
+                hit.add((product_id, size))
+                applied.append({
+                    "product_id": product_id,
+                    "size": size,
+                    "quantity": sized[(product_id, size)],
+                    "stock": stock_quantity
+                })
+            for key in keys:
+                if key not in hit:
+                    short.append({"product_id": key[0], "size": key[1], "requested": sized[key]})
+
+        if unsized:
+            ids = list(unsized.keys())
+            rows = db.execute(
+                _DEDUCT_PRODUCT_STOCK if deduct else _RESTORE_PRODUCT_STOCK,
+                {"product_ids": ids, "qtys": [unsized[i] for i in ids]}
+            ).all()
+            hit = set()
+            for product_id, stock in rows:
+                hit.add(product_id)
+                applied.append({
+                    "product_id": product_id,
+                    "size": None,
+                    "quantity": unsized[product_id],
+                    "stock": stock
+                })
+            for product_id in ids:
+                if product_id not in hit:
+                    short.append({"product_id": product_id, "size": None, "requested": unsized[product_id]})
+
+        return {"applied": applied, "short": short}
+
+    @staticmethod
+    def _apply_order(order_id: int, deduct: bool, db: Optional[Session] = None) -> dict:
+        """Load the order's lines with one query and apply them; commits only when it owns the session"""
+        owns_session = db is None
+        if owns_session:
+            db = get_db_session()
+        try:
+            items = db.query(
+                OrderItem.product_id, OrderItem.product_size, OrderItem.quantity
+            ).filter(OrderItem.order_id == order_id).all()
+
+            if not items:
+                return {"order_found": False, "applied": [], "short": []}
+
+            sized, unsized = StockService.aggregate_lines(items)
+
+            committed = []
+            if deduct:
+                # Reserved orders: the held size quantities become the deduction
+                committed = StockService._commit_reservations(db, order_id)
+                if committed:
+                    sized = {}
+
+            result = StockService.apply_lines(db, sized, unsized, deduct=deduct)
+            result["applied"] = committed + result["applied"]
+
+            if owns_session:
+                db.commit()
+            result["order_found"] = True
+            return result
+        except Exception:
+            if owns_session:
+                db.rollback()
+            raise
+        finally:
+            if owns_session:
+                db.close()
+
+    @staticmethod
+    def deduct_for_order(order_id: int, db: Optional[Session] = None) -> dict:
+        """
+        Deduct stock for every line of an order
+        Commits the order's active reservations if it has any, otherwise deducts directly
+        (lines without enough stock are reported as short)
+        """
+        return StockService._apply_order(order_id, deduct=True, db=db)
+
+    @staticmethod
+    def restore_for_order(order_id: int, db: Optional[Session] = None) -> dict:
+        """Add stock back for every line of an order"""
+        return StockService._apply_order(order_id, deduct=False, db=db)
+
+    # =====================
+    # Reservations
+    # =====================
+
+    @staticmethod
+    def reserve(db: Session, order_id: int, size_quantities: dict, ttl_minutes: int = None) -> dict:
+        """
+        Hold stock for a PENDING order in one statement (no commit - caller owns the transaction)
+
+        Args:
+            size_quantities: {ProductSize.size_id: quantity}
+
+        Returns:
+            dict with "reserved" size_ids and "short" lines [{size_id, requested, available}].
+            When anything is short the caller must roll back so partial holds are undone.
+        """
+        size_quantities = {k: v for k, v in size_quantities.items() if k is not None and v}
+        if not size_quantities:
+            return {"reserved": [], "short": [], "expires_at": None}
+
+        now = datetime.utcnow()
+        expires_at = now + timedelta(minutes=ttl_minutes or RESERVATION_TTL_MINUTES)
+        size_ids = list(size_quantities.keys())
+
+        rows = db.execute(_RESERVE_SIZES, {
+            "order_id": order_id,
+            "size_ids": size_ids,
+            "qtys": [size_quantities[i] for i in size_ids],
+            "expires_at": expires_at,
+            "now": now,
+        }).all()
+        reserved = {row[0] for row in rows}
+
+        short = []
+        missing = [i for i in size_ids if i not in reserved]
+        if missing:
+            # Failure path only: read what is actually available for the error message
+            available = dict(db.execute(_AVAILABLE_SIZES, {"size_ids": missing}).all())
+            short = [
+                {"size_id": i, "requested": size_quantities[i], "available": max(available.get(i, 0), 0)}
+                for i in missing
+            ]
+
+        return {"reserved": list(reserved), "short": short, "expires_at": expires_at}
+
+    @staticmethod
+    def reserve_for_order(order_id: int, db: Optional[Session] = None, ttl_minutes: int = None) -> dict:
+        """
+        Make sure an order holds stock before payment: extend active reservations,
+        or re-reserve from the order's lines when they already expired
+
+        Only PENDING orders hold stock: for any other status (already paid, cancelled, ...)
+        nothing is reserved and the result's "order_status" says why.
+        """
+        owns_session = db is None
+        if owns_session:
+            db = get_db_session()
+        try:
+            order_status = db.execute(_LOCK_ORDER_STATUS, {"order_id": order_id}).scalar()
+            if order_status != OrderStatus.PENDING.value:
+                if owns_session:
+                    db.rollback()
+                return {"reserved": [], "short": [], "expires_at": None, "order_status": order_status}
+
+            expires_at = datetime.utcnow() + timedelta(minutes=ttl_minutes or RESERVATION_TTL_MINUTES)
+            extended = db.execute(_EXTEND_RESERVATIONS, {"order_id": order_id, "expires_at": expires_at}).all()
+            if extended:
+                result = {"reserved": [r[0] for r in extended], "short": [], "expires_at": expires_at}
+            else:
+                lines = dict(db.execute(_ORDER_SIZE_LINES, {"order_id": order_id}).all())
+                result = StockService.reserve(db, order_id, lines, ttl_minutes=ttl_minutes)
+            result["order_status"] = order_status
+
+            if owns_session:
+                if result["short"]:
+                    db.rollback()
+                else:
+                    db.commit()
+            return result
+        except Exception:
+            if owns_session:
+                db.rollback()
+            raise
+        finally:
+            if owns_session:
+                db.close()
+
+    @staticmethod
+    def _commit_reservations(db: Session, order_id: int) -> list:
+        rows = db.execute(_COMMIT_RESERVATIONS, {"order_id": order_id}).all()
+        return [
+            {"product_id": product_id, "size": size, "quantity": int(qty), "stock": stock_quantity}
+            for product_id, size, stock_quantity, qty in rows
+        ]
+
+    @staticmethod
+    def release_for_order(
+        order_id: int,
+        db: Optional[Session] = None,
+        status: str = ReservationStatus.RELEASED.value
+    ) -> int:
+        """Release an order's active reservations (cancel / checkout expired). Returns sizes released."""
+        owns_session = db is None
+        if owns_session:
+            db = get_db_session()
+        try:
+            rows = db.execute(_RELEASE_RESERVATIONS, {"order_id": order_id, "status": status}).all()
+            if owns_session:
+                db.commit()
+            return len(rows)
+        except Exception:
+            if owns_session:
+                db.rollback()
+            raise
+        finally:
+            if owns_session:
+                db.close()
+
+    @staticmethod
+    def release_expired_reservations(batch_size: int = 500, max_batches: int = 100) -> dict:
+        """
+        Sweeper: release reservations whose TTL passed, batch_size orders at a time
+        (one short transaction per batch, SKIP LOCKED so concurrent sweepers and payments don't block)
+        """
+        db = get_db_session()
+        released_quantity = 0
+        batches = 0
+        try:
+            for _ in range(max_batches):
+                expired, released = db.execute(
+                    _EXPIRE_RESERVATIONS, {"now": datetime.utcnow(), "batch_size": batch_size}
+                ).one()
+                db.commit()
+                # Stop on reservations expired, not sizes updated (a size may have been deleted)
+                if not expired:
+                    break
+                batches += 1
+                released_quantity += int(released)
+            if released_quantity:
+                print(f"[Reservations] Released {released_quantity} expired units in {batches} batches")
+            return {"success": True, "released_quantity": released_quantity, "batches": batches}
+        except Exception as e:
+            db.rollback()
+            print(f"[Reservations] Error releasing expired reservations: {e}")
+            return {"success": False, "error": str(e)}
+        finally:
+            db.close()
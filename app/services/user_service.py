@@ -1,18 +1,22 @@
 import os
+import uuid
 import secrets
-import hashlib
-import bcrypt
+from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.sqlalchemy import User
 from app.schemas.user_schemas import UserCreate, UserResponse, LoginRequest, TokenResponse
-from app.db import get_db_session
+from app.db import get_db_session, get_async_db
 from app.i18n_keys import I18nKeys
+from app.cache import cache_get, cache_set, principal_cache_key
+from app.services.password_hasher import password_hasher, hash_password_sync, verify_password_sync, needs_rehash
 
 load_dotenv()
 
@@ -22,6 +26,40 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# Principal cache: L1 + Redis (app.cache). Role/status changes invalidate it right away
+# (invalidate_principal); the TTL only bounds changes made outside the API.
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "300"))
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    What authorization needs about the caller - returned by get_current_user instead of a
+    User row. Routes that need the full profile load it by uuid.
+    """
+    uuid: uuid.UUID
+    email: str
+    role: str
+    is_active: bool
+    token_version: int = 0
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            uuid=user.uuid if isinstance(user.uuid, uuid.UUID) else uuid.UUID(str(user.uuid)),
+            email=user.email,
+            role=user.role,
+            is_active=bool(user.is_active),
+            token_version=user.token_version or 0,
+        )
+
+    def to_cache(self) -> dict:
+        return {**asdict(self), "uuid": str(self.uuid)}
+
+    @classmethod
+    def from_cache(cls, data: dict) -> "Principal":
+        return cls(**{**data, "uuid": uuid.UUID(data["uuid"])})
+
 
 class UserServices:
     ACCESS_TOKEN_EXPIRE_MINUTES = ACCESS_TOKEN_EXPIRE_MINUTES
@@ -32,14 +70,10 @@ class UserServices:
         
         Pre-hash với SHA-256 để handle password dài bất kỳ và tránh bcrypt 72-byte limit.
         SHA-256 output là 64 hex chars (256 bits) - luôn fit trong bcrypt limit.
+        Blocking (~250ms CPU) - request handlers dùng hash_password_async.
         """
-        # Pre-hash password với SHA-256 để normalize length
-        sha256_hash = hashlib.sha256(password.encode('utf-8')).hexdigest()
-        # Bcrypt hash the SHA-256 output (64 chars, luôn safe)
-        salt = bcrypt.gensalt()
-        hashed = bcrypt.hashpw(sha256_hash.encode('utf-8'), salt)
         # Return hashed as string, empty salt (bcrypt stores salt in hash)
-        return hashed.decode('utf-8'), ""
+        return hash_password_sync(password), ""
 
     @staticmethod
     def verify_password(plain_password: str, hashed_password: str, salt: str) -> bool:
@@ -47,56 +81,61 @@ class UserServices:
         
         Must pre-hash với SHA-256 giống như khi hash_password
         """
-        # Pre-hash password với SHA-256
-        sha256_hash = hashlib.sha256(plain_password.encode('utf-8')).hexdigest()
-        # Verify bcrypt hash
-        return bcrypt.checkpw(sha256_hash.encode('utf-8'), hashed_password.encode('utf-8'))
+        return verify_password_sync(plain_password, hashed_password)
 
     @staticmethod
-    def register(user_data: dict) -> UserResponse:
-        db = get_db_session()
-        try:
-            # Check if email exists
-            existing_user = db.query(User).filter(User.email == user_data["email"]).first()
-            if existing_user:
-                raise ValueError(I18nKeys.AUTH_EMAIL_ALREADY_EXISTS)
-
-            # Hash password
-            hashed_password, salt = UserServices.hash_password(user_data["password"])
-
-            # Create user
-            user = User(
-                email=user_data["email"],
-                hashed_password=hashed_password,
-                salt=salt,
-                first_name=user_data.get("first_name"),
-                last_name=user_data.get("last_name"),
-                role="user",
-                is_active=True,
-            )
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-            return UserResponse.model_validate(user)
-        finally:
-            db.close()
+    async def hash_password_async(password: str) -> tuple[str, str]:
+        """hash_password on the password hashing pool (429/503 when saturated)"""
+        return await password_hasher.hash(password), ""
 
     @staticmethod
-    def authenticate(email: str, password: str) -> Optional[User]:
-        db = get_db_session()
-        try:
-            user = db.query(User).filter(User.email == email).first()
-            if not user:
-                return None
-            if not UserServices.verify_password(password, user.hashed_password, user.salt):
-                return None
-            return user
-        finally:
-            db.close()
+    async def verify_password_async(plain_password: str, hashed_password: str, salt: str) -> bool:
+        """verify_password on the password hashing pool (429/503 when saturated)"""
+        return await password_hasher.verify(plain_password, hashed_password)
 
     @staticmethod
-    def create_access_token(user_id: str, role: str, expires_delta: Optional[timedelta] = None) -> str:
-        data = {"sub": user_id, "role": role}
+    async def register(db: AsyncSession, user_data: dict) -> UserResponse:
+        # Check if email exists
+        existing_user = await db.scalar(select(User).where(User.email == user_data["email"]))
+        if existing_user:
+            raise ValueError(I18nKeys.AUTH_EMAIL_ALREADY_EXISTS)
+
+        # Hash password (bcrypt is CPU bound - runs on the password hashing pool)
+        hashed_password, salt = await UserServices.hash_password_async(user_data["password"])
+
+        # Create user
+        user = User(
+            email=user_data["email"],
+            hashed_password=hashed_password,
+            salt=salt,
+            first_name=user_data.get("first_name"),
+            last_name=user_data.get("last_name"),
+            role="user",
+            is_active=True,
+        )
+        db.add(user)
+        await db.commit()
+        await db.refresh(user)
+        return UserResponse.model_validate(user)
+
+    @staticmethod
+    async def authenticate(db: AsyncSession, email: str, password: str) -> Optional[User]:
+        user = await db.scalar(select(User).where(User.email == email))
+        if not user:
+            return None
+        if not await UserServices.verify_password_async(password, user.hashed_password, user.salt):
+            return None
+        if needs_rehash(user.hashed_password):
+            # BCRYPT_ROUNDS changed since this hash was made - upgrade it while we know the password
+            user.hashed_password, user.salt = await UserServices.hash_password_async(password)
+            await db.commit()
+        return user
+
+    @staticmethod
+    def create_access_token(
+        user_id: str, role: str, expires_delta: Optional[timedelta] = None, token_version: int = 0
+    ) -> str:
+        data = {"sub": user_id, "role": role, "ver": token_version}
         if expires_delta:
             expire = datetime.utcnow() + expires_delta
         else:
@@ -106,7 +145,15 @@ class UserServices:
         return encoded_jwt
 
     @staticmethod
-    def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+    async def get_current_user(
+        token: str = Depends(oauth2_scheme),
+        db: AsyncSession = Depends(get_async_db)
+    ) -> Principal:
+        """
+        Verify the JWT and return the caller's Principal
+        The principal comes from the cache (no DB round trip); the token's "ver" claim must
+        match the user's token_version, so tokens issued before a password change are rejected.
+        """
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=I18nKeys.AUTH_TOKEN_INVALID,
@@ -120,14 +167,25 @@ class UserServices:
         except JWTError:
             raise credentials_exception
 
-        db = get_db_session()
-        try:
-            user = db.query(User).filter(User.uuid == user_id).first()
-            if user is None:
-                raise credentials_exception
-            return user
-        finally:
-            db.close()
+        principal = await UserServices.get_principal(db, user_id)
+        if principal is None or payload.get("ver", 0) != principal.token_version:
+            raise credentials_exception
+        return principal
+
+    @staticmethod
+    async def get_principal(db: AsyncSession, user_id: str) -> Optional[Principal]:
+        """Cached principal for a user uuid (loads and caches it on a miss)"""
+        key = principal_cache_key(user_id)
+        cached = await cache_get(key)
+        if cached is not None:
+            return Principal.from_cache(cached)
+
+        user = await db.scalar(select(User).where(User.uuid == user_id))
+        if user is None:
+            return None
+        principal = Principal.from_user(user)
+        await cache_set(key, principal.to_cache(), ttl=PRINCIPAL_CACHE_TTL)
+        return principal
 
     @staticmethod
     def get_user_by_id(user_id: str) -> Optional[User]:
@@ -139,7 +197,7 @@ class UserServices:
 
 
 # Dependencies for route protection
-def require_user(current_user: User = Depends(UserServices.get_current_user)) -> User:
+async def require_user(current_user: Principal = Depends(UserServices.get_current_user)) -> Principal:
     """Dependency: Require authenticated user"""
     if not current_user.is_active:
         raise HTTPException(
@@ -149,7 +207,7 @@ def require_user(current_user: User = Depends(UserServices.get_current_user)) ->
     return current_user
 
 
-def require_admin(current_user: User = Depends(UserServices.get_current_user)) -> User:
+async def require_admin(current_user: Principal = Depends(UserServices.get_current_user)) -> Principal:
     """Dependency: Require admin role"""
     if not current_user.is_active:
         raise HTTPException(
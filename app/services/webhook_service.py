@@ -0,0 +1,340 @@
+"""
+Stripe webhook outbox
+
+The webhook endpoint only verifies the signature and stores the event in webhook_events
+(INSERT ... ON CONFLICT DO NOTHING on the Stripe event id, so Stripe's retries dedupe);
+WebhookWorker drains the table:
+
+- claim: SELECT ... FOR UPDATE SKIP LOCKED - workers never wait on each other's events
+- ordering: an event is only claimable when no earlier pending event has the same
+  ordering_key ("order:<id>"), so an order's events apply in Stripe order, one at a time
+- the handler runs in a savepoint of the claiming transaction; on failure the savepoint is
+  rolled back and the event is rescheduled with exponential backoff in the same commit,
+  after WEBHOOK_MAX_ATTEMPTS it is marked failed
+"""
+from datetime import datetime
+from typing import Optional
+import asyncio
+import json
+import logging
+import os
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db import get_db_session
+from app.models.sqlalchemy.order import Order, OrderStatus
+from app.services.order_service import OrderService
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "2"))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "2.0"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_RETRY_BASE_SECONDS = 5
+WEBHOOK_RETRY_MAX_SECONDS = 3600
+
+# Events the worker acts on; anything else is acknowledged and dropped
+HANDLED_EVENT_TYPES = {
+    "checkout.session.completed",
+    "checkout.session.expired",
+    "charge.refunded",
+    "refund.updated",
+}
+
+_INSERT_EVENT = text("""
+    INSERT INTO webhook_events (id, type, payload, ordering_key, event_created, status, attempts,
+                                next_attempt_at, received_at)
+    VALUES (:id, :type, :payload, :ordering_key, :event_created, 'pending', 0,
+            now() at time zone 'utc', now() at time zone 'utc')
+    ON CONFLICT (id) DO NOTHING
+    RETURNING id
+""")
+
+# Oldest due event whose ordering key has no earlier pending event
+_CLAIM_EVENT = text("""
+    SELECT e.id, e.type, e.payload, e.attempts
+    FROM webhook_events e
+    WHERE e.status = 'pending'
+      AND e.next_attempt_at <= now() at time zone 'utc'
+      AND (e.ordering_key IS NULL OR NOT EXISTS (
+          SELECT 1 FROM webhook_events p
+          WHERE p.status = 'pending'
+            AND p.ordering_key = e.ordering_key
+            AND (p.event_created, p.id) < (e.event_created, e.id)
+      ))
+    ORDER BY e.event_created, e.id
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+""")
+
+_MARK_DONE = text("""
+    UPDATE webhook_events
+    SET status = 'done', attempts = attempts + 1, last_error = NULL,
+        processed_at = now() at time zone 'utc'
+    WHERE id = :id
+""")
+
+_MARK_RETRY = text("""
+    UPDATE webhook_events
+    SET status = CASE WHEN attempts + 1 >= :max_attempts THEN 'failed' ELSE 'pending' END,
+        attempts = attempts + 1,
+        last_error = :error,
+        next_attempt_at = (now() at time zone 'utc') + make_interval(secs => :delay)
+    WHERE id = :id
+    RETURNING status
+""")
+
+_PURGE_DONE = text("""
+    DELETE FROM webhook_events
+    WHERE status = 'done' AND processed_at < (now() at time zone 'utc') - make_interval(days => :days)
+""")
+
+_RETRY_FAILED = text("""
+    UPDATE webhook_events
+    SET status = 'pending', attempts = 0, next_attempt_at = now() at time zone 'utc'
+    WHERE status = 'failed'
+""")
+
+
+class WebhookService:
+
+    # =====================
+    # Intake (webhook endpoint)
+    # =====================
+
+    @staticmethod
+    def ordering_key(event: dict) -> Optional[str]:
+        """Events of one order are applied in order; refunds carry the order id in metadata"""
+        obj = event.get("data", {}).get("object", {}) or {}
+        order_id = (obj.get("metadata") or {}).get("order_id")
+        if not order_id and event.get("type") == "charge.refunded":
+            for refund in (obj.get("refunds") or {}).get("data", []):
+                order_id = (refund.get("metadata") or {}).get("order_id")
+                if order_id:
+                    break
+        if order_id:
+            return f"order:{order_id}"
+        payment_intent = obj.get("payment_intent")
+        return f"pi:{payment_intent}" if payment_intent else None
+
+    @staticmethod
+    async def record_event(event: dict, payload: bytes) -> bool:
+        """Store a verified event; False when this event id was already stored"""
+        from app.db import get_async_session
+
+        created = event.get("created")
+        params = {
+            "id": event["id"],
+            "type": event["type"],
+            "payload": payload.decode("utf-8"),
+            "ordering_key": WebhookService.ordering_key(event),
+            "event_created": datetime.utcfromtimestamp(created) if created else datetime.utcnow(),
+        }
+        async with get_async_session() as session:
+            inserted = (await session.execute(_INSERT_EVENT, params)).first()
+            await session.commit()
+        return inserted is not None
+
+    # =====================
+    # Handlers (run by the worker, inside its transaction - never commit here)
+    # =====================
+
+    @staticmethod
+    def confirm_order_payment(db: Session, order_id: int, payment_intent_id: Optional[str]) -> bool:
+        """Mark the order paid and deduct its stock, once; False when there was nothing to do"""
+        order = db.query(Order).filter(Order.id == order_id).with_for_update().first()
+        if order is None:
+            logger.error(f"[Webhook] Order {order_id} not found in database!")
+            return False
+        if (
+            order.status != OrderStatus.PENDING.value
+            and payment_intent_id is not None
+            and order.payment_intent_id == payment_intent_id
+        ):
+            logger.info(f"[Webhook] Order {order_id} already confirmed for {payment_intent_id}")
+            return False
+
+        logger.info(f"[Webhook] Found order {order_id}, current status: {order.status}")
+        order.status = OrderStatus.CONFIRMED.value
+        if payment_intent_id:
+            order.payment_intent_id = payment_intent_id
+        else:
+            logger.warning("[Webhook] No payment_intent_id in session!")
+
+        # Deduct stock in the same transaction as the status change
+        OrderService.deduct_stock_on_payment(order_id, db=db)
+        logger.info(f"[Webhook] Order {order_id} marked as CONFIRMED (paid) with payment_intent={payment_intent_id}")
+        return True
+
+    @staticmethod
+    def handle_event(db: Session, event: dict):
+        """Apply one Stripe event; raises to have the worker retry it"""
+        from app.services.refund_service import RefundService
+        from app.services.stock_service import StockService
+        from app.models.sqlalchemy.reservation import ReservationStatus
+
+        event_type = event["type"]
+        obj = event["data"]["object"]
+
+        if event_type == "checkout.session.completed":
+            order_id = (obj.get("metadata") or {}).get("order_id")
+            logger.info(f"[Webhook] checkout.session.completed - Order ID: {order_id}")
+            if not order_id:
+                logger.warning("[Webhook] No order_id found in session metadata")
+                return
+            WebhookService.confirm_order_payment(db, int(order_id), obj.get("payment_intent"))
+
+        elif event_type == "checkout.session.expired":
+            order_id = (obj.get("metadata") or {}).get("order_id")
+            logger.info(f"[Webhook] checkout.session.expired - Order ID: {order_id}")
+            if order_id:
+                # Give the held stock back (only active reservations are touched, a paid order has none)
+                released = StockService.release_for_order(
+                    int(order_id), db=db, status=ReservationStatus.EXPIRED.value
+                )
+                logger.info(f"[Webhook] Released {released} reserved sizes for order {order_id}")
+
+        elif event_type == "charge.refunded":
+            for refund in (obj.get("refunds") or {}).get("data", []):
+                refund_id = refund.get("id")
+                if not refund_id:
+                    continue
+                logger.info(f"[Webhook] Processing refund: {refund_id}")
+                if refund.get("status") == "succeeded":
+                    RefundService.handle_refund_succeeded(refund_id, db=db)
+                elif refund.get("status") == "failed":
+                    RefundService.handle_refund_failed(refund_id, db=db)
+
+        elif event_type == "refund.updated":
+            refund_id = obj.get("id")
+            logger.info(f"[Webhook] refund.updated event received - ID: {refund_id}, Status: {obj.get('status')}")
+            if refund_id and obj.get("status") == "succeeded":
+                RefundService.handle_refund_succeeded(refund_id, db=db)
+            elif refund_id and obj.get("status") == "failed":
+                RefundService.handle_refund_failed(refund_id, db=db)
+
+        else:
+            logger.info(f"[Webhook] Unhandled event type: {event_type}")
+
+    # =====================
+    # Worker side
+    # =====================
+
+    @staticmethod
+    def retry_delay(attempts: int) -> int:
+        return min(WEBHOOK_RETRY_BASE_SECONDS * (2 ** max(0, attempts - 1)), WEBHOOK_RETRY_MAX_SECONDS)
+
+    @staticmethod
+    def process_next(max_attempts: int = WEBHOOK_MAX_ATTEMPTS) -> Optional[str]:
+        """Claim and process one due event; returns its id, or None when nothing is due"""
+        db = get_db_session()
+        try:
+            row = db.execute(_CLAIM_EVENT).first()
+            if row is None:
+                db.rollback()
+                return None
+            event_id, event_type, payload, attempts = row
+            try:
+                with db.begin_nested():
+                    WebhookService.handle_event(db, json.loads(payload))
+                db.execute(_MARK_DONE, {"id": event_id})
+            except Exception as e:
+                status = db.execute(_MARK_RETRY, {
+                    "id": event_id,
+                    "error": f"{type(e).__name__}: {e}"[:2000],
+                    "delay": WebhookService.retry_delay(attempts + 1),
+                    "max_attempts": max_attempts,
+                }).scalar()
+                log = logger.error if status == "failed" else logger.warning
+                log(f"[Webhook] {event_type} {event_id} attempt {attempts + 1} failed ({status}): {e}")
+            db.commit()
+            return event_id
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def purge_processed(older_than_days: int = 30) -> int:
+        """Drop processed events (the dedupe window only has to cover Stripe's 3-day retries)"""
+        db = get_db_session()
+        try:
+            result = db.execute(_PURGE_DONE, {"days": older_than_days})
+            db.commit()
+            return result.rowcount
+        finally:
+            db.close()
+
+    @staticmethod
+    def retry_failed() -> int:
+        """Put every failed event back in the queue (after fixing the cause)"""
+        db = get_db_session()
+        try:
+            result = db.execute(_RETRY_FAILED)
+            db.commit()
+            return result.rowcount
+        finally:
+            db.close()
+
+
+class WebhookWorker:
+    """
+    `workers` tasks draining webhook_events; each claim/process runs in a thread with its own
+    session. Idle workers poll every poll_interval seconds, or wake up when this process
+    stores an event (notify).
+    """
+
+    def __init__(self, workers: int = WEBHOOK_WORKERS, poll_interval: float = WEBHOOK_POLL_INTERVAL):
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._tasks: list = []
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    def start(self):
+        """Start the workers on the running event loop - call this on app startup"""
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._run(n)) for n in range(self.workers)]
+        logger.info(f"Webhook worker started ({self.workers} workers)")
+
+    async def stop(self):
+        """Let in-flight events finish and stop - call this on app shutdown"""
+        if not self.running:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Webhook worker stopped")
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self, n: int):
+        while not self._stopping:
+            try:
+                event_id = await asyncio.to_thread(WebhookService.process_next)
+            except Exception as e:
+                logger.error(f"[Webhook] worker {n} error: {e}")
+                event_id = None
+            if event_id is not None:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                if not self._stopping:
+                    self._wakeup.clear()
+            except asyncio.TimeoutError:
+                pass
+
+
+webhook_worker = WebhookWorker()
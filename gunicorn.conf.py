@@ -0,0 +1,28 @@
+"""
+Gunicorn settings:  gunicorn -c gunicorn.conf.py app.app:app
+
+Prometheus metrics from all workers are aggregated through PROMETHEUS_MULTIPROC_DIR
+(defaults to a per-host temp directory, wiped at every start).
+"""
+import os
+import shutil
+import tempfile
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Must be set before the workers import prometheus_client
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "ecommerce-prometheus"))
+
+
+def on_starting(server):
+    # Samples of a previous run would otherwise be summed in
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from app.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
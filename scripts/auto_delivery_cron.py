@@ -2,6 +2,7 @@
 """
 Cron job script to auto-mark shipped orders as delivered after 14 days
 Run daily: 0 2 * * * /path/to/ecommerce-backend/scripts/auto_delivery_cron.py
+(The job worker also runs it daily as orders.auto_delivery; concurrent runs skip via an advisory lock)
 """
 
 import sys
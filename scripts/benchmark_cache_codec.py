@@ -0,0 +1,100 @@
+"""
+Benchmark cache codecs - encode/decode time and stored bytes for representative payloads
+Usage: python scripts/benchmark_cache_codec.py [iterations]
+
+Formats whose optional library (orjson, msgpack, zstandard, lz4) is not installed are skipped.
+"""
+import sys
+import os
+import time
+from datetime import datetime
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.cache.codec import Codec, SERIALIZER_IDS, COMPRESSOR_IDS
+
+
+BLURB = (
+    "High-potency daily multivitamin with 23 essential vitamins and minerals, "
+    "methylated B vitamins and chelated minerals for better absorption. "
+    "Third-party tested, non-GMO, gluten free. "
+)
+
+
+def product_payload(i: int = 1) -> dict:
+    """Shape of a cached product detail (product:slug:{slug})"""
+    return {
+        "id": i,
+        "slug": f"daily-multivitamin-{i}",
+        "product_type": "Vitamins & Minerals",
+        "product_name": f"Daily Multivitamin {i}",
+        "price": 29.99,
+        "sale_price": 24.99,
+        "blurb": BLURB * 2,
+        "description": BLURB * 8,
+        "image_url": f"https://res.cloudinary.com/demo/image/upload/products/{i}.jpg",
+        "categories": [{"id": 1, "name": "Vitamins"}, {"id": 4, "name": "Daily Health"}],
+        "sizes": [{"size": s, "stock_quantity": 40, "size_id": i * 10 + n} for n, s in enumerate(["S", "M", "L"])],
+        "stock": 120,
+        "created_at": datetime(2025, 1, 1, 12, 0, 0),
+    }
+
+
+def search_payload(items: int = 100) -> dict:
+    """Shape of a cached search page (search:{md5}) with full blurbs"""
+    products = []
+    for i in range(items):
+        products.append({
+            "id": i,
+            "product_name": f"Daily Multivitamin {i}",
+            "slug": f"daily-multivitamin-{i}",
+            "product_type": "Vitamins & Minerals",
+            "price": 29.99 + i,
+            "sale_price": None if i % 3 else 19.99 + i,
+            "stock": 100 - i,
+            "image_url": f"https://res.cloudinary.com/demo/image/upload/products/{i}.jpg",
+            "blurb": BLURB * 2,
+            "has_sale": i % 3 == 0,
+            "discount_percentage": 0 if i % 3 else 33,
+            "score": 12.5 - i * 0.1,
+        })
+    return {"items": products, "total": 1000, "page": 0, "limit": items, "total_pages": 10,
+            "query": "vitamin", "took_ms": 7}
+
+
+def bench(codec: Codec, payload: dict, iterations: int) -> tuple:
+    encoded = codec.encode(payload)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.encode(payload)
+    encode_us = (time.perf_counter() - start) / iterations * 1e6
+    start = time.perf_counter()
+    for _ in range(iterations):
+        Codec.decode(encoded)
+    decode_us = (time.perf_counter() - start) / iterations * 1e6
+    return len(encoded), encode_us, decode_us
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    payloads = {"product detail": product_payload(), "search page (100 items)": search_payload()}
+
+    codecs = {}
+    for serializer in SERIALIZER_IDS:
+        for compression in COMPRESSOR_IDS:
+            codec = Codec(serializer=serializer, compression=compression, compress_min_bytes=1024)
+            # Unavailable formats fall back - only keep combinations that are really what they claim
+            if codec.name == f"{serializer}+{compression}":
+                codecs[codec.name] = codec
+
+    for label, payload in payloads.items():
+        print(f"\n{label}")
+        print(f"{'codec':<16}{'bytes':>10}{'encode us':>12}{'decode us':>12}")
+        for name, codec in codecs.items():
+            size, encode_us, decode_us = bench(codec, payload, iterations)
+            print(f"{name:<16}{size:>10}{encode_us:>12.1f}{decode_us:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+"""
+Background job worker (app.jobs) - runs enqueued jobs and the cron jobs in app/jobs/tasks.py
+Run: python scripts/job_worker.py --concurrency 8 --queues default,search
+"""
+
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.jobs.worker import main
+
+
+if __name__ == "__main__":
+    main()
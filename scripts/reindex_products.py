@@ -1,17 +1,29 @@
 """
 Re-index script to sync all existing products from PostgreSQL to Elasticsearch
 Run this after setting up Elasticsearch for the first time
+
+--blue-green builds a new products_v{N} index next to the live one (streamed from Postgres,
+parallel bulk load, refresh/replicas off while loading), swaps the alias atomically and
+deletes old versions. Use it for mapping changes and full rebuilds without a search outage.
 """
 import sys
 import os
+import time
 
 # Add parent directory to path to import app modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app.db import get_db_session
 from app.models.sqlalchemy import Product
-from app.search.product_sync import bulk_index_products
-from app.search.product_index import ensure_product_index, get_index_stats
+from sqlalchemy import text
+from sqlalchemy.orm import selectinload
+from app.search.elastic_client import get_es_client
+from app.search.product_sync import bulk_index_products, map_product_to_es_doc, load_popularity
+from app.search.delta_sync import run_delta_sync
+from app.search.product_index import (
+    ensure_product_index, get_index_stats, get_index_versions, create_versioned_index,
+    finish_bulk_load, swap_alias, cleanup_old_indices
+)
 import logging
 
 logging.basicConfig(
@@ -37,7 +49,7 @@ def reindex_all_products():
     try:
         # Fetch all products
         logger.info("Fetching all products from PostgreSQL...")
-        products = db.query(Product).all()
+        products = db.query(Product).options(selectinload(Product.categories)).all()
         total_products = len(products)
         
         if total_products == 0:
@@ -92,6 +104,90 @@ def reindex_all_products():
         db.close()
 
 
+def stream_product_docs(db, chunk_size: int, index_name: str):
+    """
+    Yield bulk actions while reading products through a server-side cursor
+    (yield_per keeps at most chunk_size rows in memory)
+    """
+    # Units sold for the whole catalog in one aggregate (a small {id: int} dict)
+    popularity = load_popularity(db)
+    query = (
+        db.query(Product)
+        .options(selectinload(Product.categories))
+        .order_by(Product.id)
+        .execution_options(stream_results=True)
+    )
+    for product in query.yield_per(chunk_size):
+        yield {
+            "_index": index_name,
+            "_id": str(product.id),
+            "_source": map_product_to_es_doc(product, popularity.get(product.id, 0))
+        }
+
+
+def reindex_blue_green(chunk_size: int = 500, threads: int = 4, keep: int = 1):
+    """
+    Build products_v{N+1}, load it, swap the alias, garbage-collect old versions
+    The live index keeps serving until the atomic swap.
+    """
+    from elasticsearch.helpers import parallel_bulk
+    
+    es = get_es_client()
+    versions = get_index_versions(es)
+    version = max(versions, default=0) + 1
+    
+    new_index = create_versioned_index(version, bulk_load=True, es=es)
+    logger.info(f"Building {new_index} (chunk_size={chunk_size}, threads={threads})")
+    
+    db = get_db_session()
+    started = time.monotonic()
+    # Changes committed while the new index loads are replayed by a delta sync after the swap
+    build_started_at = db.execute(text("SELECT now() at time zone 'utc'")).scalar()
+    total_indexed = 0
+    total_failed = 0
+    try:
+        for ok, item in parallel_bulk(
+            es,
+            stream_product_docs(db, chunk_size, new_index),
+            thread_count=threads,
+            chunk_size=chunk_size,
+            raise_on_error=False,
+            raise_on_exception=False,
+        ):
+            if ok:
+                total_indexed += 1
+            else:
+                total_failed += 1
+                if total_failed <= 5:
+                    logger.error(f"  - {item}")
+            if (total_indexed + total_failed) % (chunk_size * 10) == 0:
+                logger.info(f"  ... {total_indexed + total_failed} products processed")
+    except Exception:
+        db.close()
+        logger.error(f"Load failed - deleting partial index {new_index}")
+        es.indices.delete(index=new_index, ignore_unavailable=True)
+        raise
+    db.close()
+    
+    finish_bulk_load(new_index, es=es)
+    doc_count = es.count(index=new_index)["count"]
+    logger.info(f"Loaded {doc_count} documents in {time.monotonic() - started:.1f}s ({total_failed} failed)")
+    
+    if total_failed or doc_count != total_indexed:
+        logger.error(f"⚠️  Not swapping: {total_failed} failures, {doc_count} docs vs {total_indexed} indexed. "
+                     f"{new_index} kept for inspection.")
+        return False
+    
+    previous = swap_alias(new_index, es=es)
+    catch_up = run_delta_sync(since=build_started_at)
+    logger.info(f"Catch-up delta sync: {catch_up}")
+    deleted = cleanup_old_indices(keep=keep, es=es)
+    logger.info("=" * 60)
+    logger.info(f"✅ {new_index} is live (previous: {previous or 'none'}, deleted: {deleted or 'none'})")
+    logger.info("=" * 60)
+    return True
+
+
 if __name__ == "__main__":
     import argparse
     
@@ -101,13 +197,25 @@ if __name__ == "__main__":
         action="store_true",
         help="Confirm re-indexing (required to prevent accidental runs)"
     )
+    parser.add_argument(
+        "--blue-green",
+        action="store_true",
+        help="Build a new versioned index and swap the alias (no search outage)"
+    )
+    parser.add_argument("--chunk-size", type=int, default=500, help="Rows per DB fetch / bulk request")
+    parser.add_argument("--threads", type=int, default=4, help="Parallel bulk workers")
+    parser.add_argument("--keep", type=int, default=1, help="Old index versions to keep for rollback")
     
     args = parser.parse_args()
     
     if not args.confirm:
         print("⚠️  This will re-index ALL products to Elasticsearch.")
         print("   Run with --confirm flag to proceed:")
-        print("   python scripts/reindex_products.py --confirm")
+        print("   python scripts/reindex_products.py --confirm [--blue-green]")
         sys.exit(0)
     
-    reindex_all_products()
+    if args.blue_green:
+        if not reindex_blue_green(chunk_size=args.chunk_size, threads=args.threads, keep=args.keep):
+            sys.exit(1)
+    else:
+        reindex_all_products()
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Cron job script to release stock reservations of unpaid orders after their TTL
+Run every 5 minutes: */5 * * * * /path/to/ecommerce-backend/scripts/release_expired_reservations.py
+"""
+
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.stock_service import StockService
+
+
+if __name__ == "__main__":
+    print("[Reservation Sweeper] Releasing expired reservations...")
+    
+    result = StockService.release_expired_reservations()
+    
+    if result.get("success"):
+        print(f"[Reservation Sweeper] SUCCESS - Released {result['released_quantity']} units in {result['batches']} batches")
+    else:
+        print(f"[Reservation Sweeper] FAILED - {result.get('error')}")
+        sys.exit(1)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Incremental product sync to Elasticsearch (changes since the last watermark)
+Run every minute:   * * * * * /path/to/ecommerce-backend/scripts/search_delta_sync.py
+Or as a worker:     python scripts/search_delta_sync.py --loop --interval 60
+Nightly checksum:   0 3 * * * /path/to/ecommerce-backend/scripts/search_delta_sync.py --checksum
+"""
+
+import sys
+import os
+import time
+import argparse
+import logging
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.search.delta_sync import run_delta_sync, run_checksum, purge_tombstones
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delta sync products to Elasticsearch")
+    parser.add_argument("--loop", action="store_true", help="Keep running, one sync every --interval seconds")
+    parser.add_argument("--interval", type=int, default=60, help="Seconds between syncs with --loop")
+    parser.add_argument("--checksum", action="store_true", help="Compare Postgres and ES and repair differences")
+    parser.add_argument("--no-repair", action="store_true", help="With --checksum: only report")
+    parser.add_argument("--dry-run", action="store_true", help="Count changes without writing to ES")
+    args = parser.parse_args()
+
+    if args.checksum:
+        result = run_checksum(repair=not args.no_repair)
+        print(f"[Search Checksum] {result}")
+        purged = purge_tombstones()
+        print(f"[Search Checksum] Purged {purged} old tombstones")
+        sys.exit(0 if result.get("success") else 1)
+
+    while True:
+        result = run_delta_sync(dry_run=args.dry_run)
+        if result.get("success"):
+            print(f"[Delta Sync] SUCCESS - indexed {result['indexed']}, deleted {result['deleted']}")
+        else:
+            print(f"[Delta Sync] FAILED - {result.get('error') or str(result['failed']) + ' items failed'}")
+            if not args.loop:
+                sys.exit(1)
+        if not args.loop:
+            break
+        time.sleep(args.interval)
@@ -0,0 +1,69 @@
+import pytest
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+
+from app.services.order_service import OrderService
+from app.models.sqlalchemy import Order, OrderItem
+
+
+def _make_orders(db_session, sample_user, count):
+    base = datetime(2025, 1, 1, 12, 0, 0)
+    orders = []
+    for i in range(count):
+        order = Order(
+            user_id=sample_user.uuid,
+            shipping_name="Test User",
+            shipping_phone="123456789",
+            shipping_email="test@example.com",
+            shipping_address="Test Address",
+            total_amount=100.0,
+            status="pending",
+            # Hai order cùng created_at để kiểm tra tie-break theo id
+            created_at=base + timedelta(minutes=i // 2)
+        )
+        db_session.add(order)
+        orders.append(order)
+    db_session.flush()
+    for order in orders:
+        db_session.add(OrderItem(order_id=order.id, product_name="P", quantity=1, unit_price=50.0, total_price=50.0))
+        db_session.add(OrderItem(order_id=order.id, product_name="Q", quantity=1, unit_price=50.0, total_price=50.0))
+    db_session.commit()
+    return orders
+
+
+class TestAdminOrderKeysetPagination:
+    """Test phân trang keyset (created_at, id) cho danh sách order admin"""
+
+    def test_cursor_pages_cover_all_orders_once(self, db_session, sample_user):
+        """Test đi hết các trang bằng cursor không trùng và không sót order"""
+        orders = _make_orders(db_session, sample_user, 7)
+
+        seen = []
+        result = OrderService.admin_get_all_orders(size=3)
+        seen += [o.id for o in result.orders]
+        while result.next_cursor:
+            result = OrderService.admin_get_all_orders(size=3, cursor=result.next_cursor)
+            seen += [o.id for o in result.orders]
+
+        assert sorted(seen) == sorted(o.id for o in orders)
+        assert len(seen) == len(set(seen))
+        assert result.total == 7
+
+    def test_items_count_from_subquery(self, db_session, sample_user):
+        """Test items_count đúng khi không load items"""
+        _make_orders(db_session, sample_user, 2)
+
+        result = OrderService.admin_get_all_orders(size=10)
+
+        assert all(o.items_count == 2 for o in result.orders)
+
+    def test_invalid_cursor_rejected(self):
+        """Test cursor hỏng trả về 400"""
+        with pytest.raises(HTTPException) as exc:
+            OrderService.admin_get_all_orders(cursor="garbage")
+        assert exc.value.status_code == 400
+
+    def test_cursor_without_created_at_round_trips(self):
+        """Test cursor của order thiếu created_at vẫn decode được"""
+        cursor = OrderService._encode_order_cursor(Order(id=42, created_at=None))
+        assert OrderService._decode_order_cursor(cursor) == (None, 42)
@@ -0,0 +1,35 @@
+from datetime import datetime
+from app.cache.codec import Codec, MAGIC
+
+
+class TestCacheCodec:
+    """Test codec cho giá trị cache (header + serialize + nén)"""
+
+    def test_roundtrip_with_compression(self):
+        """Test payload lớn được nén và giải mã lại đúng"""
+        codec = Codec(serializer="orjson", compression="zlib", compress_min_bytes=100)
+        payload = {"items": [{"id": i, "blurb": "vitamin " * 20} for i in range(50)]}
+
+        encoded = codec.encode(payload)
+
+        assert encoded[:1] == MAGIC
+        assert encoded[2] != 0  # compressed
+        assert len(encoded) < len(str(payload))
+        assert Codec.decode(encoded) == payload
+
+    def test_small_payload_not_compressed(self):
+        """Test payload nhỏ hơn ngưỡng không bị nén"""
+        codec = Codec(serializer="json", compression="zlib", compress_min_bytes=1024)
+        encoded = codec.encode({"id": 1})
+        assert encoded[2] == 0
+        assert Codec.decode(encoded) == {"id": 1}
+
+    def test_datetime_serialized_as_string(self):
+        """Test datetime (created_at) được lưu dạng chuỗi"""
+        codec = Codec(serializer="json", compression="none")
+        decoded = Codec.decode(codec.encode({"created_at": datetime(2025, 1, 1)}))
+        assert decoded["created_at"].startswith("2025-01-01")
+
+    def test_decode_legacy_json(self):
+        """Test entry cũ (JSON text, không có header) vẫn đọc được"""
+        assert Codec.decode(b'{"id": 1}') == {"id": 1}
@@ -0,0 +1,41 @@
+import asyncio
+import pytest
+import app.cache as cache
+
+
+class TestCachedSingleFlight:
+    """Test cached() chỉ gọi loader một lần khi nhiều request cùng miss"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_load(self, monkeypatch):
+        """Test 10 request đồng thời chỉ gọi loader 1 lần (không có Redis)"""
+        monkeypatch.setattr(cache, "_redis_available", False)
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return {"items": [1, 2, 3]}
+
+        results = await asyncio.gather(*[cache.cached("search:test", loader, ttl=60) for _ in range(10)])
+
+        assert calls == 1
+        assert all(r == {"items": [1, 2, 3]} for r in results)
+
+    @pytest.mark.asyncio
+    async def test_loader_error_reaches_every_caller(self, monkeypatch):
+        """Test lỗi của loader được trả về cho mọi request đang chờ"""
+        monkeypatch.setattr(cache, "_redis_available", False)
+
+        async def loader():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("backend down")
+
+        results = await asyncio.gather(
+            *[cache.cached("search:error", loader, ttl=60) for _ in range(3)],
+            return_exceptions=True
+        )
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert "search:error" not in cache._inflight
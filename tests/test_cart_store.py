@@ -0,0 +1,50 @@
+import app.cache as cache
+from app.services import cart_store
+
+
+def _line(product_id, size, price):
+    return cache.codec.encode({
+        "product_id": product_id, "size": size, "product_name": "Vitamin C",
+        "product_image": None, "product_slug": "vitamin-c", "unit_price": price, "stock_quantity": 10,
+    })
+
+
+class TestCartStoreHash:
+    """Test đọc cart từ Redis hash (không cần Postgres)"""
+
+    def test_parse_cart_joins_snapshot_and_quantity(self):
+        """Test snapshot item:{size} và qty:{size} được ghép thành một dòng"""
+        raw = {
+            b"meta": cache.codec.encode({"cart_id": 7}),
+            b"item:11": _line(1, "M", 10.0),
+            b"qty:11": b"3",
+        }
+
+        cart_id, lines = cart_store._parse_cart(raw)
+
+        assert cart_id == 7
+        assert lines[11]["quantity"] == 3
+        assert lines[11]["product_id"] == 1
+
+    def test_orphan_quantity_ignored(self):
+        """Test qty còn sót lại sau khi xoá item không tạo ra dòng mới"""
+        raw = {b"meta": cache.codec.encode({"cart_id": 7}), b"qty:11": b"2"}
+
+        _, lines = cart_store._parse_cart(raw)
+
+        assert lines == {}
+
+    def test_response_totals(self):
+        """Test subtotal tính từ giá snapshot và id của item là size id"""
+        raw = {
+            b"meta": cache.codec.encode({"cart_id": 7}),
+            b"item:11": _line(1, "M", 10.0), b"qty:11": b"2",
+            b"item:12": _line(1, "L", 12.5), b"qty:12": b"1",
+        }
+        cart_id, lines = cart_store._parse_cart(raw)
+
+        cart = cart_store._build_cart_response("user-uuid", cart_id, lines)
+
+        assert [item.id for item in cart.items] == [11, 12]
+        assert cart.subtotal == 32.5
+        assert cart.total == 32.5
@@ -0,0 +1,29 @@
+from datetime import datetime
+from app.search.delta_sync import _digest, _bucket, _normalize_ts
+
+
+class TestDeltaSyncChecksum:
+    """Test checksum theo bucket giữa Postgres và ES"""
+
+    def test_identical_sets_have_identical_digests(self):
+        """Test cùng (id, updated_at) thì digest giống nhau"""
+        ts = _normalize_ts(datetime(2025, 1, 1, 12, 0, 0))
+        assert _digest({1: ts, 2: ts}) == _digest({2: ts, 1: ts})
+
+    def test_stale_row_changes_only_its_bucket(self):
+        """Test 1 product bị lệch updated_at chỉ làm lệch bucket của nó"""
+        old = _normalize_ts(datetime(2025, 1, 1))
+        new = _normalize_ts(datetime(2025, 1, 2))
+        pg = {i: old for i in range(1, 1000)}
+        es = dict(pg)
+        es[42] = new
+
+        pg_digest, es_digest = _digest(pg), _digest(es)
+        differ = {b for b in pg_digest if pg_digest[b] != es_digest.get(b)}
+
+        assert differ == {_bucket(42)}
+
+    def test_normalize_matches_indexed_string(self):
+        """Test timestamp Postgres và chuỗi lưu trong ES được so sánh giống nhau"""
+        ts = datetime(2025, 1, 1, 12, 30, 15, 123456)
+        assert _normalize_ts(ts) == _normalize_ts(ts.isoformat())
@@ -0,0 +1,148 @@
+from datetime import datetime
+import time
+
+import pytest
+
+from app.jobs import job, set_backend, MemoryBackend, job_metrics
+from app.jobs.cron import CronSchedule
+from app.jobs.worker import Worker
+
+
+@pytest.fixture
+def backend():
+    memory = MemoryBackend()
+    set_backend(memory)
+    job_metrics.reset()
+    yield memory
+    set_backend(None)
+
+
+class TestCronSchedule:
+    """Test parse biểu thức cron 5 trường (UTC)"""
+
+    def test_next_daily_run(self):
+        """Test job 2h sáng hàng ngày"""
+        schedule = CronSchedule("0 2 * * *")
+        assert schedule.next_after(datetime(2026, 1, 1, 1, 30)) == datetime(2026, 1, 1, 2, 0)
+        assert schedule.next_after(datetime(2026, 1, 1, 2, 0)) == datetime(2026, 1, 2, 2, 0)
+
+    def test_step_and_weekday(self):
+        """Test */5 phút và thứ Hai (1)"""
+        assert CronSchedule("*/5 * * * *").next_after(datetime(2026, 1, 1, 10, 7)) == datetime(2026, 1, 1, 10, 10)
+        # 2026-01-01 là thứ Năm -> thứ Hai kế tiếp là 05/01
+        assert CronSchedule("0 9 * * 1").next_after(datetime(2026, 1, 1, 12, 0)) == datetime(2026, 1, 5, 9, 0)
+
+    def test_invalid_expression(self):
+        """Test biểu thức sai bị từ chối"""
+        with pytest.raises(ValueError):
+            CronSchedule("0 25 * * *")
+        with pytest.raises(ValueError):
+            CronSchedule("* * *")
+
+
+class TestJobWorker:
+    """Test enqueue/chạy job với memory backend"""
+
+    @pytest.mark.asyncio
+    async def test_runs_sync_and_async_jobs(self, backend):
+        """Test job sync (thread) và async đều chạy, lưu kết quả"""
+        @job(name="test.add")
+        def add(a, b):
+            return a + b
+
+        @job(name="test.async_double")
+        async def double(x):
+            return x * 2
+
+        first = add.delay(2, 3)
+        second = double.delay(21)
+        assert await Worker(backend=backend, queues=["default"], scheduler=False).drain() == 2
+        assert backend.get_result(first) == {"status": "done", "result": 5}
+        assert backend.get_result(second) == {"status": "done", "result": 42}
+        assert job_metrics.snapshot()["test.add"]["succeeded"] == 1
+
+    @pytest.mark.asyncio
+    async def test_retry_with_backoff_then_fail(self, backend):
+        """Test job lỗi được retry (backoff) rồi failed khi hết lượt"""
+        calls = []
+
+        @job(name="test.flaky", retries=1, backoff=0.01)
+        def flaky():
+            calls.append(1)
+            raise RuntimeError("boom")
+
+        job_id = flaky.delay()
+        worker = Worker(backend=backend, queues=["default"], scheduler=False)
+        await worker.drain()
+        assert len(calls) == 1  # retry chưa tới hạn
+        time.sleep(0.05)
+        await worker.drain()
+        assert len(calls) == 2
+        assert backend.get_result(job_id)["status"] == "failed"
+        stats = job_metrics.snapshot()["test.flaky"]
+        assert (stats["retried"], stats["failed"]) == (1, 1)
+
+    def test_unique_key_enqueues_once(self, backend):
+        """Test unique_key chống enqueue trùng (cron nhiều worker)"""
+        @job(name="test.noop")
+        def noop():
+            pass
+
+        assert noop.enqueue(unique_key="cron:test.noop:1") is not None
+        assert noop.enqueue(unique_key="cron:test.noop:1") is None
+        assert backend.stats()["queued"] == {"default": 1}
+
+    def test_expired_lease_is_recovered(self, backend):
+        """Test job của worker chết được trả lại queue khi hết lease"""
+        @job(name="test.lease")
+        def lease():
+            pass
+
+        lease.delay()
+        assert len(backend.claim(["default"], 10, visibility_timeout=-1)) == 1
+        assert backend.claim(["default"], 10, visibility_timeout=60) == []
+        assert backend.recover() == 1
+        assert len(backend.claim(["default"], 10, visibility_timeout=60)) == 1
+
+    def test_scheduler_enqueues_due_cron_jobs(self, backend):
+        """Test scheduler enqueue cron job đúng giờ, một lần mỗi lần fire"""
+        @job(name="test.cron", cron="0 2 * * *")
+        def nightly():
+            pass
+
+        worker = Worker(backend=backend, queues=["default"])
+        worker.schedule_due(datetime(2026, 1, 1, 1, 0))   # tính lần fire kế tiếp
+        assert worker.schedule_due(datetime(2026, 1, 1, 1, 59)) == 0
+        assert worker.schedule_due(datetime(2026, 1, 1, 2, 0)) == 1
+        # Worker khác cùng lần fire không enqueue lại
+        other = Worker(backend=backend, queues=["default"])
+        other._next_fire["test.cron"] = datetime(2026, 1, 1, 2, 0)
+        assert other.schedule_due(datetime(2026, 1, 1, 2, 0, 30)) == 0
+
+    @pytest.mark.asyncio
+    async def test_timed_out_sync_job_not_retried_while_running(self, backend):
+        """Test job sync quá timeout chỉ được retry khi thread của nó đã xong"""
+        import threading
+        finished = threading.Event()
+
+        @job(name="test.slow", retries=1, backoff=0.01, timeout=0.05)
+        def slow():
+            time.sleep(0.2)
+            finished.set()
+
+        slow.delay()
+        worker = Worker(backend=backend, queues=["default"], scheduler=False)
+        await worker.drain()
+        assert finished.is_set()  # drain chỉ trả về sau khi thread chạy xong
+        assert job_metrics.snapshot()["test.slow"]["retried"] == 1
+
+    def test_extend_keeps_lease_alive(self, backend):
+        """Test gia hạn lease để recover() không trả job đang chạy về queue"""
+        @job(name="test.long")
+        def long_job():
+            pass
+
+        long_job.delay()
+        record = backend.claim(["default"], 1, visibility_timeout=-1)[0]
+        backend.extend(record, 60)
+        assert backend.recover() == 0
@@ -0,0 +1,48 @@
+import time
+from app.cache.local import LocalCache
+
+
+class TestLocalCache:
+    """Test L1 cache trong process (LRU + TTL + giới hạn bytes)"""
+
+    def test_get_returns_stored_value(self):
+        """Test set rồi get trả về đúng giá trị"""
+        cache = LocalCache(max_entries=10, max_bytes=1024, default_ttl=30)
+        cache.set("product:slug:a", {"id": 1}, size=10)
+        assert cache.get("product:slug:a") == {"id": 1}
+
+    def test_evicts_least_recently_used(self):
+        """Test vượt max_entries thì key ít dùng nhất bị loại"""
+        cache = LocalCache(max_entries=2, max_bytes=1024, default_ttl=30)
+        cache.set("a", 1, size=1)
+        cache.set("b", 2, size=1)
+        cache.get("a")
+        cache.set("c", 3, size=1)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_byte_budget(self):
+        """Test tổng bytes không vượt max_bytes"""
+        cache = LocalCache(max_entries=100, max_bytes=100, default_ttl=30)
+        for i in range(10):
+            cache.set(f"k{i}", i, size=20)
+        assert cache.stats()["bytes"] <= 100
+        assert cache.get("k9") == 9
+        assert cache.get("k0") is None
+
+    def test_ttl_capped_by_default_ttl(self):
+        """Test TTL của entry không dài hơn default_ttl và hết hạn đúng"""
+        cache = LocalCache(max_entries=10, max_bytes=1024, default_ttl=0.05)
+        cache.set("a", 1, size=1, ttl=300)
+        time.sleep(0.1)
+        assert cache.get("a") is None
+
+    def test_delete_pattern(self):
+        """Test xóa theo pattern kiểu Redis"""
+        cache = LocalCache(max_entries=10, max_bytes=1024, default_ttl=30)
+        cache.set("search:q=a", 1, size=1)
+        cache.set("search:q=b", 2, size=1)
+        cache.set("product:slug:a", 3, size=1)
+        assert cache.delete_pattern("search:*") == 2
+        assert cache.get("product:slug:a") == 3
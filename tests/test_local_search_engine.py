@@ -0,0 +1,105 @@
+import time
+
+from app.search.circuit_breaker import CircuitBreaker, STATE_OPEN, STATE_CLOSED
+from app.search.local_engine import LocalSearchEngine
+from app.routers.search_router import build_search_sort
+
+
+def doc(pid, name, price, created_at, product_type="Vitamins", sale=False, **extra):
+    return {
+        "id": str(pid), "product_name": name, "slug": f"p-{pid}", "product_type": product_type,
+        "price": price, "sale_price": price - 1 if sale else None, "has_sale": sale,
+        "created_at": created_at, "categories": extra.pop("categories", []), **extra,
+    }
+
+
+def make_engine():
+    engine = LocalSearchEngine()
+    engine.rebuild([
+        doc(1, "Vitamin C 1000mg", 12.0, "2024-01-01T00:00:00", description="Tăng cường miễn dịch"),
+        doc(2, "Dầu Cá Omega 3", 25.0, "2024-02-01T00:00:00", product_type="Omega", sale=True),
+        doc(3, "Vitamin D3 K2", 18.0, "2024-03-01T00:00:00", categories=["Bone"]),
+        doc(4, "Whey Protein", 40.0, "2024-04-01T00:00:00", product_type="Protein",
+            ingredients="whey isolate, vitamin b6"),
+    ])
+    return engine
+
+
+def ids(result):
+    return [hit["_id"] for hit in result["hits"]["hits"]]
+
+
+class TestLocalSearchEngine:
+    """Test search engine trong process dùng khi Elasticsearch lỗi"""
+
+    def test_full_text_ranks_name_above_ingredients(self):
+        """Test tìm theo tên được ưu tiên hơn thành phần"""
+        result = make_engine().search(q="vitamin", sort=build_search_sort("relevance", tiebreaker=True))
+        assert ids(result)[-1] == "4"
+        assert set(ids(result)) == {"1", "3", "4"}
+
+    def test_folding_prefix_and_fuzzy(self):
+        """Test không dấu, tìm theo prefix tên và gõ sai 1 ký tự"""
+        engine = make_engine()
+        assert ids(engine.search(q="dau ca")) == ["2"]
+        assert ids(engine.search(q="mien dich")) == ["1"]
+        assert ids(engine.search(q="prot")) == ["4"]
+        assert ids(engine.search(q="omegs")) == ["2"]
+
+    def test_filters_and_price_sort(self):
+        """Test filter bitmap + khoảng giá + sort giá"""
+        engine = make_engine()
+        result = engine.search(product_type="Vitamins", sort=build_search_sort("price_desc", tiebreaker=True))
+        assert ids(result) == ["3", "1"]
+        assert result["hits"]["total"]["value"] == 2
+        assert ids(engine.search(on_sale=True)) == ["2"]
+        assert ids(engine.search(category="Bone")) == ["3"]
+        result = engine.search(min_price=15, max_price=30, sort=build_search_sort("price_asc", tiebreaker=True))
+        assert ids(result) == ["3", "2"]
+
+    def test_offset_and_search_after_pages(self):
+        """Test phân trang offset và search_after cho cùng kết quả"""
+        engine = make_engine()
+        sort = build_search_sort("newest", tiebreaker=True)
+        assert ids(engine.search(sort=sort, offset=1, size=2)) == ["3", "2"]
+        first = engine.search(sort=sort, size=2)
+        after = engine.search(sort=sort, size=2, search_after=first["hits"]["hits"][-1]["sort"])
+        assert ids(first) + ids(after) == ["4", "3", "2", "1"]
+
+    def test_sync_events_update_and_delete(self):
+        """Test sync event cập nhật và xoá sản phẩm"""
+        engine = make_engine()
+        engine.apply({2: None, 4: doc(4, "Plant Protein", 35.0, "2024-04-01T00:00:00", product_type="Protein")})
+        assert ids(engine.search(q="omega")) == []
+        assert ids(engine.search(q="plant")) == ["4"]
+        assert engine.search()["hits"]["total"]["value"] == 3
+
+
+class TestCircuitBreaker:
+    """Test circuit breaker cho Elasticsearch"""
+
+    def test_opens_after_failures_then_probes(self):
+        """Test mở sau N lỗi liên tiếp, half-open cho 1 request thử"""
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure(RuntimeError("down"))
+        assert breaker.allow()
+        breaker.record_failure(RuntimeError("down"))
+        assert breaker.state == STATE_OPEN
+        assert not breaker.allow()
+
+        time.sleep(0.06)
+        assert breaker.allow()
+        assert not breaker.allow()  # only one probe
+        breaker.record_success()
+        assert breaker.state == STATE_CLOSED
+        assert breaker.allow()
+
+    def test_abandoned_probe_is_released(self):
+        """Test probe bị huỷ (không record) không khoá breaker mãi"""
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure(RuntimeError("down"))
+        time.sleep(0.06)
+        assert breaker.allow()  # probe bị cancel, không gọi record_*
+        assert not breaker.allow()
+        time.sleep(0.06)
+        assert breaker.allow()
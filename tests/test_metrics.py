@@ -0,0 +1,33 @@
+import pytest
+from prometheus_client import REGISTRY
+
+from app.metrics import track_dependency, count_cache
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestMetrics:
+    """Test các helper đo latency dependency và cache"""
+
+    def test_track_dependency_records_outcome(self):
+        """Test ghi latency theo outcome success/error"""
+        labels = {"dependency": "stripe", "operation": "test_op"}
+        ok_before = sample("dependency_request_duration_seconds_count", outcome="success", **labels)
+        err_before = sample("dependency_request_duration_seconds_count", outcome="error", **labels)
+
+        with track_dependency("stripe", "test_op"):
+            pass
+        with pytest.raises(RuntimeError):
+            with track_dependency("stripe", "test_op"):
+                raise RuntimeError("boom")
+
+        assert sample("dependency_request_duration_seconds_count", outcome="success", **labels) == ok_before + 1
+        assert sample("dependency_request_duration_seconds_count", outcome="error", **labels) == err_before + 1
+
+    def test_count_cache(self):
+        """Test đếm hit/miss theo layer"""
+        before = sample("cache_requests_total", layer="l1", result="hit")
+        count_cache("l1", "hit")
+        assert sample("cache_requests_total", layer="l1", result="hit") == before + 1
@@ -0,0 +1,36 @@
+import pytest
+from fastapi import HTTPException
+
+from app.services import password_hasher as ph
+
+
+class TestPasswordHasher:
+    """Test pool băm mật khẩu: giới hạn hàng đợi và rehash khi đổi cost"""
+
+    def test_hash_cost_and_rehash(self, monkeypatch):
+        """Test đọc cost từ hash bcrypt và phát hiện cần rehash"""
+        monkeypatch.setattr(ph, "BCRYPT_ROUNDS", 12)
+
+        assert ph.hash_cost("$2b$10$abcdefghijklmnopqrstuv") == 10
+        assert ph.needs_rehash("$2b$10$abcdefghijklmnopqrstuv")
+        assert not ph.needs_rehash("$2b$12$abcdefghijklmnopqrstuv")
+
+    def test_verify_matches_hash(self):
+        """Test verify đúng với mật khẩu đã băm (cost thấp cho test nhanh)"""
+        hashed = ph.hash_password_sync("Secret&123", rounds=4)
+
+        assert ph.verify_password_sync("Secret&123", hashed)
+        assert not ph.verify_password_sync("wrong", hashed)
+
+    @pytest.mark.asyncio
+    async def test_full_queue_rejected_with_429(self):
+        """Test hàng đợi đầy trả về 429 mà không gửi việc vào pool"""
+        hasher = ph.PasswordHasher(workers=1, max_queue=0)
+        hasher._in_flight = 1
+
+        with pytest.raises(HTTPException) as exc:
+            await hasher.hash("pw")
+
+        assert exc.value.status_code == 429
+        assert hasher.stats()["rejected"] == 1
+        assert hasher._executor is None
@@ -0,0 +1,88 @@
+from app.search import sync_events
+from app.search.prefix_index import PrefixIndex
+from app.search.sync_events import ProductSyncEvents
+from app.search.text_analysis import fold, tokenize
+
+
+def doc(pid, name, popularity=0, product_type="vitamin"):
+    return {"id": str(pid), "product_name": name, "product_type": product_type, "popularity": popularity}
+
+
+class TestTextAnalysis:
+    """Test chuẩn hoá text giống vietnamese_analyzer"""
+
+    def test_fold_strips_vietnamese_diacritics(self):
+        """Test bỏ dấu tiếng Việt và chữ đ"""
+        assert fold("Viên Uống Đẹp Da") == "vien uong dep da"
+
+    def test_tokenize_splits_letters_and_digits(self):
+        """Test tách chữ/số như word_delimiter"""
+        assert tokenize("Vitamin B12 Omega-3") == ["vitamin", "b", "12", "omega", "3"]
+
+
+class TestPrefixIndex:
+    """Test prefix index dùng cho autocomplete khi ES chậm/down"""
+
+    def test_suggest_orders_by_popularity(self):
+        """Test gợi ý sắp xếp theo số lượng bán"""
+        index = PrefixIndex()
+        index.rebuild([doc(1, "Vitamin C 500mg", 3), doc(2, "Vitamin D3", 40), doc(3, "Viên Canxi", 10)])
+        names = [s["name"] for s in index.suggest("vi", 5)]
+        assert names == ["Vitamin D3", "Viên Canxi", "Vitamin C 500mg"]
+        assert [s["name"] for s in index.suggest("vitamin c", 5)] == ["Vitamin C 500mg"]
+
+    def test_matches_later_words_and_folded_query(self):
+        """Test khớp từ giữa tên và query không dấu"""
+        index = PrefixIndex()
+        index.rebuild([doc(1, "Dầu Cá Omega 3", 5)])
+        assert index.suggest("omega", 5)[0]["name"] == "Dầu Cá Omega 3"
+        assert index.suggest("dau ca", 5)[0]["name"] == "Dầu Cá Omega 3"
+        assert index.suggest("zz", 5) == []
+
+    def test_apply_updates_and_removes(self):
+        """Test sync event: sửa tên, đổi popularity, xoá sản phẩm"""
+        index = PrefixIndex()
+        index.rebuild([doc(1, "Collagen Plus", 1), doc(2, "Collagen Gold", 2)])
+        index.apply({1: doc(1, "Collagen Max", 9), 2: None})
+        assert [s["name"] for s in index.suggest("co", 5)] == ["Collagen Max"]
+        assert index.suggest("collagen p", 5) == []
+        assert len(index) == 1
+
+    def test_short_prefix_top_k_matches_scan(self):
+        """Test top-k precompute cho prefix 2 ký tự khớp với quét range"""
+        index = PrefixIndex(top_k=3)
+        index.rebuild([doc(i, f"Protein {i}", i) for i in range(10)])
+        index.upsert(doc(42, "Protein Whey", 100))
+        assert [s["name"] for s in index.suggest("pr", 3)] == ["Protein Whey", "Protein 9", "Protein 8"]
+        assert index.suggest("pr", 3) == index.suggest("pro", 3)
+
+
+class FullDocHandler:
+    def __init__(self):
+        self.docs = None
+
+    def rebuild(self, docs):
+        self.docs = docs
+
+
+class TestSyncEventsReload:
+    """Test reload: prefix index chỉ nạp tên, handler khác nạp document đầy đủ (trong thread)"""
+
+    def test_reload_loads_names_for_prefix_index(self, monkeypatch):
+        """Test prefix index không cần document đầy đủ"""
+        loads = []
+        monkeypatch.setattr(sync_events, "load_all_product_names",
+                            lambda: loads.append("names") or [doc(1, "Vitamin D3", 4)])
+        monkeypatch.setattr(sync_events, "load_all_product_docs",
+                            lambda: loads.append("docs") or [dict(doc(1, "Vitamin D3", 4), price=10.0)])
+        index, full = PrefixIndex(), FullDocHandler()
+        events = ProductSyncEvents()
+        events.register(index)
+        assert events._reload_handlers([index]) == 1
+        assert loads == ["names"]
+
+        events.register(full)
+        events._reload_handlers([index, full])
+        assert loads == ["names", "names", "docs"]
+        assert index.suggest("vi", 5)[0]["name"] == "Vitamin D3"
+        assert full.docs[0]["price"] == 10.0
@@ -0,0 +1,47 @@
+import uuid
+import pytest
+from fastapi import HTTPException
+
+from app.services.user_service import UserServices, Principal
+
+
+def _principal(version=0):
+    return Principal(uuid=uuid.uuid4(), email="test@example.com", role="user", is_active=True, token_version=version)
+
+
+class TestPrincipalCache:
+    """Test xác thực JWT dùng principal cache thay vì query User"""
+
+    def test_cache_round_trip(self):
+        """Test principal lưu vào cache rồi đọc lại không đổi"""
+        principal = _principal(3)
+
+        assert Principal.from_cache(principal.to_cache()) == principal
+
+    @pytest.mark.asyncio
+    async def test_valid_token_uses_cached_principal(self, monkeypatch):
+        """Test token hợp lệ trả về principal mà không cần DB"""
+        principal = _principal(2)
+
+        async def fake_get_principal(db, user_id):
+            return principal
+        monkeypatch.setattr(UserServices, "get_principal", staticmethod(fake_get_principal))
+
+        token = UserServices.create_access_token(str(principal.uuid), "user", token_version=2)
+        result = await UserServices.get_current_user(token=token, db=None)
+
+        assert result == principal
+
+    @pytest.mark.asyncio
+    async def test_old_token_version_rejected(self, monkeypatch):
+        """Test token cấp trước khi đổi mật khẩu (ver cũ) bị từ chối"""
+        principal = _principal(2)
+
+        async def fake_get_principal(db, user_id):
+            return principal
+        monkeypatch.setattr(UserServices, "get_principal", staticmethod(fake_get_principal))
+
+        token = UserServices.create_access_token(str(principal.uuid), "user", token_version=1)
+        with pytest.raises(HTTPException) as exc:
+            await UserServices.get_current_user(token=token, db=None)
+        assert exc.value.status_code == 401
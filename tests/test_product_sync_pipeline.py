@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+from app.search.product_sync import ProductSyncPipeline, OP_INDEX, OP_DELETE
+
+
+def make_pipeline(monkeypatch, fail_ids=()):
+    """Pipeline với _build_actions/_send giả lập (không cần DB/ES)"""
+    pipeline = ProductSyncPipeline(batch_size=50, flush_interval=0.01, max_retries=3)
+    sent = []
+    dead = {}
+
+    async def build_actions(batch):
+        return [(pid, op) for pid, (op, _) in batch.items()], []
+
+    async def send(actions):
+        sent.append(actions)
+        return {pid: "boom" for pid, _ in actions if pid in fail_ids}
+
+    async def no_op(*args):
+        return None
+
+    async def dead_letter(entries):
+        dead.update(entries)
+
+    monkeypatch.setattr(pipeline, "_build_actions", build_actions)
+    monkeypatch.setattr(pipeline, "_send", send)
+    monkeypatch.setattr(pipeline, "_invalidate_cache", no_op)
+    monkeypatch.setattr(pipeline, "_publish_synced", no_op)
+    monkeypatch.setattr(pipeline, "_dead_letter", dead_letter)
+    monkeypatch.setattr("app.search.product_sync.SYNC_RETRY_BASE_DELAY", 0.001)
+    return pipeline, sent, dead
+
+
+class TestProductSyncPipeline:
+    """Test pipeline đồng bộ product -> Elasticsearch"""
+
+    @pytest.mark.asyncio
+    async def test_duplicate_writes_are_coalesced(self, monkeypatch):
+        """Test nhiều lần sửa cùng product chỉ gửi 1 action, op cuối cùng thắng"""
+        pipeline, sent, _ = make_pipeline(monkeypatch)
+        pipeline.start()
+        pipeline.enqueue(1)
+        pipeline.enqueue(1)
+        pipeline.enqueue(2)
+        pipeline.enqueue(2, OP_DELETE)
+        await pipeline.stop()
+
+        shipped = [action for batch in sent for action in batch]
+        assert sorted(shipped) == [(1, OP_INDEX), (2, OP_DELETE)]
+
+    @pytest.mark.asyncio
+    async def test_failed_items_retried_then_dead_lettered(self, monkeypatch):
+        """Test item lỗi được retry đến max_retries rồi vào dead-letter"""
+        pipeline, sent, dead = make_pipeline(monkeypatch, fail_ids={7})
+        pipeline.start()
+        pipeline.enqueue(7)
+        pipeline.enqueue(8)
+        for _ in range(100):
+            if dead:
+                break
+            await asyncio.sleep(0.01)
+        await pipeline.stop()
+
+        assert sum(1 for batch in sent for pid, _ in batch if pid == 7) == 3
+        assert sum(1 for batch in sent for pid, _ in batch if pid == 8) == 1
+        assert list(dead) == [7]
+
+    @pytest.mark.asyncio
+    async def test_sync_events_published_while_es_fails(self, monkeypatch):
+        """Test sự kiện sync vẫn được phát khi ES lỗi (fallback cục bộ cần cập nhật), retry không phát lại"""
+        pipeline, sent, dead = make_pipeline(monkeypatch, fail_ids={7})
+        published = []
+
+        async def publish(product_ids):
+            published.append(sorted(product_ids))
+
+        monkeypatch.setattr(pipeline, "_publish_synced", publish)
+        pipeline.start()
+        pipeline.enqueue(7)
+        pipeline.enqueue(8)
+        for _ in range(100):
+            if dead:
+                break
+            await asyncio.sleep(0.01)
+        await pipeline.stop()
+
+        assert published[0] == [7, 8]
+        assert all(ids == [] for ids in published[1:])
@@ -0,0 +1,69 @@
+import logging
+
+import pytest
+
+from app.db import instrumentation
+from app.db.instrumentation import (
+    QueryStats, QueryInstrumentationMiddleware, current_query_stats,
+    _before_cursor_execute, _after_cursor_execute,
+)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.info = {}
+
+
+def run_query(conn, statement):
+    _before_cursor_execute(conn, None, statement, {}, None, False)
+    _after_cursor_execute(conn, None, statement, {}, None, False)
+
+
+class TestQueryInstrumentation:
+    """Test đếm query theo request, phát hiện N+1 và Server-Timing"""
+
+    def test_repeated_statements(self):
+        """Test statement lặp >= ngưỡng bị coi là N+1"""
+        stats = QueryStats("/orders")
+        for _ in range(6):
+            stats.record("SELECT * FROM products WHERE id = %(id)s", 0.001)
+        stats.record("SELECT * FROM orders", 0.002)
+        assert stats.count == 7
+        assert stats.repeated(5) == [("SELECT * FROM products WHERE id = %(id)s", 6)]
+
+    @pytest.mark.asyncio
+    async def test_middleware_collects_and_reports(self, monkeypatch, caplog):
+        """Test middleware gom query của request, log N+1 và thêm header Server-Timing"""
+        monkeypatch.setattr(instrumentation, "SERVER_TIMING", True)
+        conn = FakeConnection()
+        seen = {}
+
+        async def app(scope, receive, send):
+            for _ in range(5):
+                run_query(conn, "SELECT * FROM product_sizes WHERE product_id = %(id)s")
+            seen["stats"] = current_query_stats()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "GET", "route_template": "/orders/{order_id}"}
+        with caplog.at_level(logging.WARNING, logger="app.db.instrumentation"):
+            await QueryInstrumentationMiddleware(app)(scope, None, send)
+
+        assert seen["stats"].count == 5
+        assert current_query_stats() is None
+        headers = dict(sent[0]["headers"])
+        assert headers[b"server-timing"].startswith(b"db;dur=")
+        assert b'desc="5 queries"' in headers[b"server-timing"]
+        assert "Possible N+1 on GET /orders/{order_id}" in caplog.text
+
+    def test_slow_query_logged_outside_request(self, monkeypatch, caplog):
+        """Test query chậm được log kể cả ngoài request (script, job)"""
+        monkeypatch.setattr(instrumentation, "SLOW_QUERY_MS", 0)
+        with caplog.at_level(logging.WARNING, logger="app.db.instrumentation"):
+            run_query(FakeConnection(), "SELECT pg_sleep(1)")
+        assert "Slow query" in caplog.text and "route=-" in caplog.text
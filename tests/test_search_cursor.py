@@ -0,0 +1,100 @@
+import pytest
+from fastapi import HTTPException
+
+from app.routers.search_router import encode_cursor, decode_cursor, build_search_sort
+
+
+class TestSearchCursor:
+    """Test cursor phân trang (point-in-time + search_after)"""
+
+    def test_cursor_round_trip(self):
+        """Test encode rồi decode cursor giữ nguyên trạng thái"""
+        state = {"pit": "abc==", "sa": [12.5, 1700000000000, 42], "f": "deadbeef0001"}
+        cursor = encode_cursor(state)
+
+        assert "=" not in cursor
+        assert decode_cursor(cursor) == state
+
+    def test_invalid_cursor_rejected(self):
+        """Test cursor hỏng trả về 400"""
+        with pytest.raises(HTTPException) as exc:
+            decode_cursor("not-a-cursor")
+        assert exc.value.status_code == 400
+
+    def test_cursor_sort_has_unique_tiebreaker(self):
+        """Test sort cho cursor luôn kết thúc bằng id để search_after không bỏ sót/lặp"""
+        for sort_by in ["relevance", "price_asc", "price_desc", "newest"]:
+            sort = build_search_sort(sort_by, tiebreaker=True)
+            assert sort[-1] == {"id": {"order": "asc"}}
+
+
+class FakeES:
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.opened = 0
+        self.closed = []
+        self.searches = []
+
+    async def open_point_in_time(self, index, keep_alive):
+        self.opened += 1
+        return {"id": f"pit-{self.opened}"}
+
+    async def close_point_in_time(self, id):
+        self.closed.append(id)
+
+    async def search(self, index=None, body=None):
+        self.searches.append((index, body.get("pit")))
+        n = self.pages.pop(0)
+        hits = [{"_source": {"id": str(i)}, "sort": [i]} for i in range(n)]
+        return {"hits": {"hits": hits, "total": {"value": 5}}, "took": 1}
+
+
+class TestCursorPointInTime:
+    """Test PIT chỉ mở khi cần trang tiếp theo và bị giới hạn số lượng"""
+
+    @pytest.fixture
+    def es(self, monkeypatch):
+        import app.routers.search_router as search_router
+
+        def use(pages, max_open=50):
+            fake = FakeES(pages)
+            monkeypatch.setattr(search_router, "get_async_es_client", lambda: fake)
+            monkeypatch.setattr(search_router, "build_search_query", lambda *filters: {"match_all": {}})
+            monkeypatch.setattr(search_router, "format_search_hits", lambda hits: hits)
+            monkeypatch.setattr(search_router, "PIT_MAX_OPEN", max_open)
+            monkeypatch.setattr(search_router, "_open_pits", {})
+            return fake
+        return use
+
+    @pytest.mark.asyncio
+    async def test_single_page_walk_opens_no_pit(self, es):
+        """Test trang đầu không đầy thì không mở PIT"""
+        from app.routers.search_router import search_with_cursor
+        fake = es([3])
+        result = await search_with_cursor(("q",), None, 10, "*")
+        assert result["next_cursor"] is None
+        assert fake.opened == 0
+        assert fake.searches[0][1] is None
+
+    @pytest.mark.asyncio
+    async def test_pit_opened_after_full_first_page_and_closed_at_end(self, es):
+        """Test PIT mở sau trang đầu đầy, dùng cho trang sau và đóng ở trang cuối"""
+        from app.routers.search_router import search_with_cursor
+        fake = es([2, 1])
+        first = await search_with_cursor(("q",), None, 2, "*")
+        assert decode_cursor(first["next_cursor"])["pit"] == "pit-1"
+        last = await search_with_cursor(("q",), None, 2, first["next_cursor"])
+        assert last["next_cursor"] is None
+        assert fake.searches[1][1]["id"] == "pit-1"
+        assert fake.closed == ["pit-1"]
+
+    @pytest.mark.asyncio
+    async def test_walk_continues_without_pit_over_the_cap(self, es):
+        """Test vượt PIT_MAX_OPEN thì tiếp tục search_after không cần PIT"""
+        from app.routers.search_router import search_with_cursor
+        fake = es([2, 2], max_open=0)
+        first = await search_with_cursor(("q",), None, 2, "*")
+        assert decode_cursor(first["next_cursor"])["pit"] is None
+        await search_with_cursor(("q",), None, 2, first["next_cursor"])
+        assert fake.opened == 0
+        assert fake.searches[1][0] is not None
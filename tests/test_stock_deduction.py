@@ -1,6 +1,6 @@
 import pytest
 from app.services.order_service import OrderService
-from app.models.sqlalchemy import Order, OrderItem
+from app.models.sqlalchemy import Order, OrderItem, Product
 
 
 class TestOrderServiceStockDeduction:
@@ -44,7 +44,7 @@ class TestOrderServiceStockDeduction:
         assert updated_product.stock == initial_stock - 5
 
     def test_deduct_stock_insufficient_stock(self, db_session, sample_product):
-        """Test trừ stock khi stock không đủ (edge case)"""
+        """Test trừ stock khi stock không đủ: dòng bị báo short, stock giữ nguyên"""
         # Set low stock
         sample_product.stock = 2
         db_session.commit()
@@ -73,12 +73,13 @@ class TestOrderServiceStockDeduction:
         db_session.add(order_item)
         db_session.commit()
 
-        # This should still deduct (assuming payment already validated stock)
-        OrderService.deduct_stock_on_payment(order.id)
+        # Deduction is conditional: the line is reported short, nothing is deducted
+        result = OrderService.deduct_stock_on_payment(order.id)
 
-        # Stock goes negative (business logic decision)
+        assert result["short"] == [{"product_id": sample_product.id, "size": None, "requested": 5}]
+        assert result["applied"] == []
         updated_product = db_session.query(Product).filter(Product.id == sample_product.id).first()
-        assert updated_product.stock == 2 - 5  # = -3
+        assert updated_product.stock == 2
 
     def test_deduct_stock_order_not_found(self, db_session):
         """Test deduct stock với order không tồn tại"""
@@ -0,0 +1,208 @@
+import pytest
+from app.services.stock_service import StockService
+from app.models.sqlalchemy import Order, OrderItem, Product, ProductSize
+
+
+class TestStockServiceAggregation:
+    """Test StockService.aggregate_lines gom các dòng trùng trước khi UPDATE"""
+
+    def test_aggregate_sums_duplicate_sized_lines(self):
+        """Test 2 dòng cùng product + size được cộng dồn"""
+        sized, unsized = StockService.aggregate_lines([
+            (1, "M", 2),
+            (1, "M", 3),
+            (1, "L", 1),
+        ])
+        assert sized == {(1, "M"): 5, (1, "L"): 1}
+        assert unsized == {}
+
+    def test_aggregate_splits_unsized_lines(self):
+        """Test dòng không có size đi vào product-level stock"""
+        sized, unsized = StockService.aggregate_lines([
+            (1, None, 2),
+            (1, "", 1),
+            (2, "S", 4),
+        ])
+        assert sized == {(2, "S"): 4}
+        assert unsized == {1: 3}
+
+    def test_aggregate_skips_empty_lines(self):
+        """Test bỏ qua dòng không có product hoặc quantity = 0"""
+        sized, unsized = StockService.aggregate_lines([
+            (None, "M", 2),
+            (3, "M", 0),
+        ])
+        assert sized == {}
+        assert unsized == {}
+
+
+class TestStockServiceDeduction:
+    """Test StockService deduct/restore với set-based UPDATE"""
+
+    def test_deduct_reports_short_lines(self, db_session, sample_product):
+        """Test dòng thiếu stock được báo short, dòng đủ stock bị trừ"""
+        size_ok = ProductSize(product_id=sample_product.id, size="M", stock_quantity=10)
+        size_low = ProductSize(product_id=sample_product.id, size="L", stock_quantity=1)
+        db_session.add_all([size_ok, size_low])
+
+        order = Order(
+            user_id="test-user",
+            shipping_name="Test User",
+            shipping_phone="123456789",
+            shipping_email="test@example.com",
+            shipping_address="Test Address",
+            subtotal=500.0,
+            shipping_fee=10.0,
+            total_amount=510.0,
+            status="pending"
+        )
+        db_session.add(order)
+        db_session.flush()
+
+        db_session.add_all([
+            OrderItem(order_id=order.id, product_id=sample_product.id, product_name="Test Product",
+                      product_size="M", quantity=4, unit_price=100.0, total_price=400.0),
+            OrderItem(order_id=order.id, product_id=sample_product.id, product_name="Test Product",
+                      product_size="L", quantity=3, unit_price=100.0, total_price=300.0),
+        ])
+        db_session.commit()
+
+        result = StockService.deduct_for_order(order.id, db=db_session)
+
+        assert result["order_found"] is True
+        assert [line["size"] for line in result["applied"]] == ["M"]
+        assert result["short"] == [{"product_id": sample_product.id, "size": "L", "requested": 3}]
+
+        db_session.refresh(size_ok)
+        db_session.refresh(size_low)
+        assert size_ok.stock_quantity == 6
+        assert size_low.stock_quantity == 1
+
+    def test_restore_adds_back_product_stock(self, db_session, sample_product):
+        """Test restore cộng lại stock cho dòng không có size"""
+        order = Order(
+            user_id="test-user",
+            shipping_name="Test User",
+            shipping_phone="123456789",
+            shipping_email="test@example.com",
+            shipping_address="Test Address",
+            subtotal=500.0,
+            shipping_fee=10.0,
+            total_amount=510.0,
+            status="confirmed"
+        )
+        db_session.add(order)
+        db_session.flush()
+        db_session.add(OrderItem(order_id=order.id, product_id=sample_product.id, product_name="Test Product",
+                                 quantity=5, unit_price=100.0, total_price=500.0))
+        db_session.commit()
+
+        StockService.restore_for_order(order.id, db=db_session)
+
+        updated_product = db_session.query(Product).filter(Product.id == sample_product.id).first()
+        assert updated_product.stock == 55
+
+
+class TestStockReservation:
+    """Test giữ hàng (reservation) cho đơn PENDING"""
+
+    def _pending_order(self, db_session):
+        order = Order(
+            user_id="test-user",
+            shipping_name="Test User",
+            shipping_phone="123456789",
+            shipping_email="test@example.com",
+            shipping_address="Test Address",
+            subtotal=300.0,
+            shipping_fee=10.0,
+            total_amount=310.0,
+            status="pending"
+        )
+        db_session.add(order)
+        db_session.flush()
+        return order
+
+    def test_reserve_blocks_second_order(self, db_session, sample_product):
+        """Test đơn thứ hai không giữ được hàng khi stock đã bị giữ hết"""
+        size = ProductSize(product_id=sample_product.id, size="M", stock_quantity=3)
+        db_session.add(size)
+        db_session.flush()
+
+        first = self._pending_order(db_session)
+        result = StockService.reserve(db_session, first.id, {size.size_id: 3})
+        assert result["short"] == []
+
+        second = self._pending_order(db_session)
+        result = StockService.reserve(db_session, second.id, {size.size_id: 1})
+        assert result["short"] == [{"size_id": size.size_id, "requested": 1, "available": 0}]
+
+        db_session.refresh(size)
+        assert size.reserved_quantity == 3
+        assert size.stock_quantity == 3
+
+    def test_deduct_commits_reservation(self, db_session, sample_product):
+        """Test thanh toán chuyển phần giữ hàng thành trừ stock"""
+        size = ProductSize(product_id=sample_product.id, size="M", stock_quantity=5)
+        db_session.add(size)
+        db_session.flush()
+        order = self._pending_order(db_session)
+        db_session.add(OrderItem(order_id=order.id, product_id=sample_product.id, product_name="Test Product",
+                                 product_size="M", quantity=2, unit_price=100.0, total_price=200.0))
+        StockService.reserve(db_session, order.id, {size.size_id: 2})
+        db_session.commit()
+
+        result = StockService.deduct_for_order(order.id, db=db_session)
+
+        assert result["short"] == []
+        db_session.refresh(size)
+        assert size.stock_quantity == 3
+        assert size.reserved_quantity == 0
+
+    def test_release_returns_reserved_stock(self, db_session, sample_product):
+        """Test hủy đơn PENDING trả lại phần đã giữ"""
+        size = ProductSize(product_id=sample_product.id, size="M", stock_quantity=5)
+        db_session.add(size)
+        db_session.flush()
+        order = self._pending_order(db_session)
+        StockService.reserve(db_session, order.id, {size.size_id: 4})
+
+        released = StockService.release_for_order(order.id, db=db_session)
+
+        assert released == 1
+        db_session.refresh(size)
+        assert size.reserved_quantity == 0
+        assert size.stock_quantity == 5
+
+    def test_reserve_for_order_refuses_paid_order(self, db_session, sample_product):
+        """Test đơn đã thanh toán/hủy không giữ hàng lại khi tạo session lần nữa"""
+        size = ProductSize(product_id=sample_product.id, size="M", stock_quantity=5)
+        db_session.add(size)
+        db_session.flush()
+        order = self._pending_order(db_session)
+        db_session.add(OrderItem(order_id=order.id, product_id=sample_product.id, product_name="Test Product",
+                                 product_size="M", quantity=2, unit_price=100.0, total_price=200.0))
+        order.status = "confirmed"
+        db_session.flush()
+
+        result = StockService.reserve_for_order(order.id, db=db_session)
+
+        assert result["order_status"] == "confirmed"
+        assert result["reserved"] == []
+        db_session.refresh(size)
+        assert size.reserved_quantity == 0
+
+    def test_sweeper_expires_whole_orders(self, db_session, sample_product):
+        """Test sweeper hết hạn cả đơn trong một batch (không tách các dòng của đơn)"""
+        sizes = [ProductSize(product_id=sample_product.id, size=s, stock_quantity=5) for s in ("M", "L")]
+        db_session.add_all(sizes)
+        db_session.flush()
+        order = self._pending_order(db_session)
+        StockService.reserve(db_session, order.id, {sizes[0].size_id: 1, sizes[1].size_id: 2}, ttl_minutes=-1)
+        db_session.commit()
+
+        result = StockService.release_expired_reservations(batch_size=1)
+
+        assert result == {"success": True, "released_quantity": 3, "batches": 1}
+        for size in sizes:
+            db_session.refresh(size)
+            assert size.reserved_quantity == 0
@@ -2,6 +2,7 @@ import pytest
 from unittest.mock import patch, MagicMock, AsyncMock
 from fastapi import HTTPException
 from app.routers.webhook_router import stripe_webhook
+from app.services.webhook_service import WebhookService
 from app.models.sqlalchemy import Order, OrderItem, Product
 
 
@@ -45,22 +46,20 @@ class TestWebhookStockHandling:
                 "object": {
                     "metadata": {
                         "order_id": str(order.id)
-                    }
+                    },
+                    "payment_intent": "pi_test"
                 }
             }
         }
 
-        # Mock Stripe webhook verification
-        with patch('stripe.Webhook.construct_event', return_value=payload):
-            with patch('stripe.Webhook') as mock_webhook:
-                # Call webhook
-                result = stripe_webhook(MagicMock(), MagicMock())
-
-                assert result == {"status": "success"}
+        # Worker applies the stored event
+        WebhookService.handle_event(db_session, payload)
 
-                # Verify stock was deducted
-                updated_product = db_session.query(Product).filter(Product.id == sample_product.id).first()
-                assert updated_product.stock == initial_stock - 5
+        # Verify stock was deducted once (the order is already confirmed for this payment)
+        updated_product = db_session.query(Product).filter(Product.id == sample_product.id).first()
+        assert updated_product.stock == initial_stock - 5
+        assert WebhookService.confirm_order_payment(db_session, order.id, "pi_test") is False
+        assert updated_product.stock == initial_stock - 5
 
     def test_webhook_checkout_expired_no_stock_change(self, db_session, sample_product):
         """Test webhook checkout.session.expired doesn't change stock"""
@@ -94,16 +93,12 @@ class TestWebhookStockHandling:
             }
         }
 
-        # Mock Stripe webhook verification
-        with patch('stripe.Webhook.construct_event', return_value=payload):
-            # Call webhook
-            result = stripe_webhook(MagicMock(), MagicMock())
-
-            assert result == {"status": "success"}
+        # Worker applies the stored event
+        WebhookService.handle_event(db_session, payload)
 
-            # Verify stock unchanged
-            updated_product = db_session.query(Product).filter(Product.id == sample_product.id).first()
-            assert updated_product.stock == initial_stock
+        # Verify stock unchanged
+        updated_product = db_session.query(Product).filter(Product.id == sample_product.id).first()
+        assert updated_product.stock == initial_stock
 
     @pytest.mark.asyncio
     async def test_webhook_invalid_signature(self):
@@ -131,13 +126,43 @@ class TestWebhookStockHandling:
             }
         }
 
-        # Mock Stripe webhook verification
-        with patch('stripe.Webhook.construct_event', return_value=payload):
-            mock_request = MagicMock()
-            mock_request.body = AsyncMock(return_value=b'payload')
-            mock_request.headers.get = MagicMock(return_value='signature')
-            
-            # Call webhook - should not crash
-            result = stripe_webhook(mock_request)
+        # Worker handler - should not crash
+        WebhookService.handle_event(db_session, payload)
+        assert WebhookService.ordering_key(payload) is None
+
+    @pytest.mark.asyncio
+    async def test_webhook_stores_event_and_returns(self):
+        """Test webhook chỉ lưu event vào outbox rồi trả về ngay"""
+        payload = {
+            "id": "evt_1",
+            "type": "checkout.session.completed",
+            "created": 1700000000,
+            "data": {"object": {"metadata": {"order_id": "42"}, "payment_intent": "pi_1"}}
+        }
+        mock_request = MagicMock()
+        mock_request.body = AsyncMock(return_value=b'{"id": "evt_1"}')
+        mock_request.headers.get = MagicMock(return_value='signature')
+
+        with patch('stripe.Webhook.construct_event', return_value=payload), \
+                patch.object(WebhookService, 'record_event', AsyncMock(return_value=True)) as record, \
+                patch.object(WebhookService, 'handle_event') as handle:
+            result = await stripe_webhook(mock_request)
+
+        assert result == {"status": "success"}
+        record.assert_awaited_once()
+        handle.assert_not_called()
+        assert WebhookService.ordering_key(payload) == "order:42"
+
+    @pytest.mark.asyncio
+    async def test_webhook_ignores_unhandled_event_types(self):
+        """Test event không xử lý thì không lưu"""
+        mock_request = MagicMock()
+        mock_request.body = AsyncMock(return_value=b'{}')
+        mock_request.headers.get = MagicMock(return_value='signature')
+
+        with patch('stripe.Webhook.construct_event', return_value={"id": "evt_2", "type": "customer.created"}), \
+                patch.object(WebhookService, 'record_event', AsyncMock()) as record:
+            result = await stripe_webhook(mock_request)
 
-            assert result == {"status": "success"}
\ No newline at end of file
+        assert result == {"status": "success"}
+        record.assert_not_called()
\ No newline at end of file